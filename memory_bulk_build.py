@@ -0,0 +1,57 @@
+"""
+从全部历史聊天记录批量构建记忆
+
+按群、按时间顺序读取 messages 集合中的所有消息，分段压缩后写入记忆图，进度保存在数据库中，
+中断后重新运行同一命令即可从上次的位置继续。
+
+建议在 [memory] maintenance = "worker" 下、停止 memory_worker.py 后运行：
+此时本命令代替维护进程写入记忆，运行中的机器人会实时收到变更。
+
+用法:
+    python memory_bulk_build.py
+    python memory_bulk_build.py --max-tokens 2000000 --batch 32
+    python memory_bulk_build.py --groups 123456 654321
+    python memory_bulk_build.py --reset
+"""
+
+import argparse
+import asyncio
+
+from memory_worker import init_memory_process
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='从历史聊天记录批量构建记忆')
+    parser.add_argument('--run-id', default='default', help='构建任务名，不同任务分别记录进度')
+    parser.add_argument('--window', type=int, default=20, help='每个片段的消息条数')
+    parser.add_argument('--batch', type=int, default=16, help='每批并发压缩的片段数')
+    parser.add_argument('--min-chars', type=int, default=50, help='文本少于该字数的片段跳过')
+    parser.add_argument('--min-density', type=float, default=None, help='平均每条消息的信息量低于该值的片段跳过，默认使用 [memory] sample_min_density')
+    parser.add_argument('--max-tokens', type=int, default=None, help='累计 token 上限')
+    parser.add_argument('--max-cost', type=float, default=None, help='累计费用上限')
+    parser.add_argument('--groups', type=int, nargs='*', default=None, help='只处理这些群')
+    parser.add_argument('--reset', action='store_true', help='丢弃已有进度，从头开始')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    init_memory_process()
+    from src.common.database import Database
+    from src.plugins.memory_system.bulk_builder import BulkMemoryBuilder
+    from src.plugins.memory_system.memory import memory_partitions
+
+    builder = BulkMemoryBuilder(
+        memory_partitions,
+        Database.get_instance(),
+        run_id=args.run_id,
+        window_size=args.window,
+        batch_windows=args.batch,
+        min_window_chars=args.min_chars,
+        max_tokens=args.max_tokens,
+        max_cost=args.max_cost,
+        min_density=args.min_density,
+    )
+    if args.reset:
+        builder.reset()
+    asyncio.run(builder.run(args.groups))
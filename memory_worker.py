@@ -0,0 +1,128 @@
+"""
+独立的记忆维护进程
+
+负责记忆构建（抽取聊天记录、调用LLM总结）、记忆整合和记忆遗忘，每次写入数据库后把图的变更发布到
+graph_data.deltas 集合，机器人进程定期拉取并应用这些变更，不再在自己的事件循环里做这些耗时工作。
+两个进程只通过 MongoDB 交换数据，可以运行在不同的核心甚至不同的机器上。
+机器人进程检索记忆时记录的回忆时间写入 recalls 集合，由维护进程合并后保存，遗忘时按真实的回忆时间挑选记忆。
+
+用法:
+    1. 在 config/bot_config.toml 的 [memory] 中设置 maintenance = "worker"
+    2. 与 bot.py 一起运行: python memory_worker.py
+
+同一时间只能运行一个维护进程。
+
+清理已有记忆中的近似重复项（运行一次后退出）:
+    python memory_worker.py --compact-duplicates
+
+为旧版本写入的、没有时间信息的记忆补上元数据（运行一次后退出）:
+    python memory_worker.py --migrate-item-meta
+
+[memory] item_storage 为 "collection"（默认）时，把仍以数组保存的记忆一次性改为逐条保存（运行一次后退出）:
+    python memory_worker.py --migrate-item-storage
+
+把已有记忆中同一概念的不同写法（如"原神"、"原神游戏"、"玩原神"）合并为一个节点，并报告节点数的变化（运行一次后退出）:
+    python memory_worker.py --merge-synonyms
+"""
+
+import argparse
+import asyncio
+import os
+import platform
+import time
+
+import nonebot
+from loguru import logger
+
+from bot import init_env, load_env, scan_provider
+
+
+async def run_worker(memory_partitions, global_config):
+    """按配置的间隔循环执行记忆构建、整合和遗忘"""
+    memory_partitions.schedule_embedding()
+    next_build = time.time()
+    next_merge = time.time() + global_config.build_memory_interval + 10
+    next_forget = time.time() + global_config.forget_memory_interval
+    while True:
+        now = time.time()
+        if now >= next_build:
+            print("\033[1;32m[记忆构建]\033[0m 维护进程开始构建记忆")
+            try:
+                await memory_partitions.operation_build_memory(chat_size=20)
+            except Exception as e:
+                logger.exception(f"记忆构建失败: {e}")
+            print(f"\033[1;32m[记忆构建]\033[0m 记忆构建完成：耗时: {time.time() - now:.2f} 秒")
+            next_build = time.time() + global_config.build_memory_interval
+        if now >= next_merge and global_config.memory_merge_threshold > 0:
+            try:
+                await memory_partitions.operation_merge_memory()
+            except Exception as e:
+                logger.exception(f"记忆整合失败: {e}")
+            next_merge = time.time() + global_config.build_memory_interval + 10
+        if now >= next_forget:
+            # 不开启遗忘时同样保存机器人进程记录的回忆时间
+            try:
+                await memory_partitions.operation_apply_recalls()
+            except Exception as e:
+                logger.exception(f"合并回忆时间失败: {e}")
+            if global_config.memory_forget_enable:
+                print("\033[1;32m[记忆遗忘]\033[0m 维护进程开始遗忘记忆...")
+                try:
+                    await memory_partitions.operation_forget_topic()
+                except Exception as e:
+                    logger.exception(f"记忆遗忘失败: {e}")
+            next_forget = time.time() + global_config.forget_memory_interval
+        await asyncio.sleep(1)
+
+
+def init_memory_process():
+    """按机器人的方式加载环境变量和配置，完成数据库与记忆系统的初始化
+
+    不启动驱动器，因此不会连接QQ或运行机器人的定时任务
+    """
+    if platform.system().lower() != 'windows':
+        time.tzset()
+
+    init_env()
+    load_env()
+
+    env_config = {key: os.getenv(key) for key in os.environ}
+    scan_provider(env_config)
+
+    # 维护进程使用自己的本地快照目录，避免与同一台机器上的机器人进程冲突
+    os.environ["MAIMBOT_MEMORY_WORKER"] = "1"
+    nonebot.init(log_level="INFO", **env_config)
+
+    # 与机器人相同的加载顺序
+    nonebot.load_plugin("src.plugins.chat")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='记忆维护进程')
+    parser.add_argument('--compact-duplicates', action='store_true', help='清理所有分区中的近似重复记忆后退出')
+    parser.add_argument('--migrate-item-meta', action='store_true', help='为旧记忆写入时间信息后退出')
+    parser.add_argument('--migrate-item-storage', action='store_true', help='把以数组保存的记忆改为逐条保存后退出')
+    parser.add_argument('--merge-synonyms', action='store_true', help='合并所有分区中的同义节点后退出')
+    args = parser.parse_args()
+
+    init_memory_process()
+    from src.plugins.chat.config import global_config
+    from src.plugins.memory_system.memory import memory_partitions
+
+    if args.compact_duplicates:
+        asyncio.run(memory_partitions.operation_compact_duplicates())
+        raise SystemExit(0)
+    if args.migrate_item_meta:
+        asyncio.run(memory_partitions.operation_migrate_item_meta())
+        raise SystemExit(0)
+    if args.migrate_item_storage:
+        asyncio.run(memory_partitions.operation_migrate_item_storage())
+        raise SystemExit(0)
+    if args.merge_synonyms:
+        asyncio.run(memory_partitions.operation_merge_synonyms())
+        raise SystemExit(0)
+
+    if global_config.memory_maintenance != "worker":
+        logger.warning('bot_config.toml 中 [memory] maintenance 不是 "worker"，机器人进程仍会自己维护记忆，变更也不会被发布')
+
+    asyncio.run(run_worker(memory_partitions, global_config))
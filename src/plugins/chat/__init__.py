@@ -41,7 +41,7 @@ print("\033[1;32m[初始化数据库完成]\033[0m")
 
 
 # 导入其他模块
-from ..memory_system.memory import hippocampus, memory_graph
+from ..memory_system.memory import memory_graph, memory_partitions
 from .bot import ChatBot
 
 # from .message_send_control import message_sender
@@ -77,6 +77,10 @@ async def start_background_tasks():
     await bot_schedule.initialize()
     bot_schedule.print_schedule()
     
+    # 启用语义匹配时，在后台补齐记忆节点的embedding（worker 模式下由维护进程负责）
+    if global_config.memory_maintenance != "worker":
+        memory_partitions.schedule_embedding()
+    
 @driver.on_startup
 async def init_relationships():
     """在 NoneBot2 启动时初始化关系管理器"""
@@ -110,25 +114,38 @@ async def _(bot: Bot, event: GroupMessageEvent, state: T_State):
 @scheduler.scheduled_job("interval", seconds=global_config.build_memory_interval, id="build_memory")
 async def build_memory_task():
     """每build_memory_interval秒执行一次记忆构建"""
+    if global_config.memory_maintenance == "worker":
+        return
     print("\033[1;32m[记忆构建]\033[0m -------------------------------------------开始构建记忆-------------------------------------------")
     start_time = time.time()
-    await hippocampus.operation_build_memory(chat_size=20)
+    await memory_partitions.operation_build_memory(chat_size=20)
     end_time = time.time()
     print(f"\033[1;32m[记忆构建]\033[0m -------------------------------------------记忆构建完成：耗时: {end_time - start_time:.2f} 秒-------------------------------------------")
     
 @scheduler.scheduled_job("interval", seconds=global_config.forget_memory_interval, id="forget_memory") 
 async def forget_memory_task():
-    """每30秒执行一次记忆构建"""
-    # print("\033[1;32m[记忆遗忘]\033[0m 开始遗忘记忆...")
-    # await hippocampus.operation_forget_topic(percentage=0.1)
-    # print("\033[1;32m[记忆遗忘]\033[0m 记忆遗忘完成")
+    """每forget_memory_interval秒执行一次记忆遗忘"""
+    if global_config.memory_maintenance == "worker" or not global_config.memory_forget_enable:
+        return
+    print("\033[1;32m[记忆遗忘]\033[0m 开始遗忘记忆...")
+    await memory_partitions.operation_forget_topic()
+    print("\033[1;32m[记忆遗忘]\033[0m 记忆遗忘完成")
 
 @scheduler.scheduled_job("interval", seconds=global_config.build_memory_interval + 10, id="merge_memory")
 async def merge_memory_task():
-    """每30秒执行一次记忆构建"""
-    # print("\033[1;32m[记忆整合]\033[0m 开始整合")
-    # await hippocampus.operation_merge_memory(percentage=0.1)
-    # print("\033[1;32m[记忆整合]\033[0m 记忆整合完成")
+    """定期合并记忆条数达到阈值、正在排队的节点"""
+    if global_config.memory_maintenance == "worker" or global_config.memory_merge_threshold <= 0:
+        return
+    print("\033[1;32m[记忆整合]\033[0m 开始整合")
+    await memory_partitions.operation_merge_memory()
+    print("\033[1;32m[记忆整合]\033[0m 记忆整合完成")
+
+@scheduler.scheduled_job("interval", seconds=global_config.memory_delta_poll_interval, id="apply_memory_delta")
+async def apply_memory_delta_task():
+    """worker 模式下定期应用记忆维护进程发布的图变更"""
+    if global_config.memory_maintenance != "worker":
+        return
+    await memory_partitions.apply_worker_deltas()
 
 @scheduler.scheduled_job("interval", seconds=30, id="print_mood")
 async def print_mood_task():
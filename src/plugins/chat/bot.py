@@ -4,7 +4,7 @@ from random import random
 from loguru import logger
 from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent
 
-from ..memory_system.memory import hippocampus
+from ..memory_system.memory import memory_partitions
 from ..moods.moods import MoodManager  # 导入情绪管理器
 from .config import global_config
 from .cq_code import CQCode  # 导入CQCode模块
@@ -81,7 +81,7 @@ class ChatBot:
         # topic=await topic_identifier.identify_topic_llm(message.processed_plain_text)
         topic = ''
         interested_rate = 0
-        interested_rate = await hippocampus.memory_activate_value(message.processed_plain_text)/100
+        interested_rate = await memory_partitions.memory_activate_value(message.processed_plain_text, group_id=message.group_id)/100
         print(f"\033[1;32m[记忆激活]\033[0m 对{message.processed_plain_text}的激活度:---------------------------------------{interested_rate}\n")
         # logger.info(f"\033[1;32m[主题识别]\033[0m 使用{global_config.topic_extract}主题: {topic}")
         
@@ -35,6 +35,45 @@ class BotConfig:
     
     build_memory_interval: int = 30  # 记忆构建间隔（秒）
     forget_memory_interval: int = 300  # 记忆遗忘间隔（秒）
+    memory_semantic_match: bool = False  # 是否使用embedding进行记忆主题匹配
+    memory_semantic_threshold: float = 0.75  # embedding匹配的相似度阈值
+    memory_semantic_top_k: int = 5  # 每个主题最多匹配的记忆节点数
+    memory_graph_backend: str = "networkx"  # 记忆图存储后端: networkx / compact
+    memory_dedup_distance: int = -1  # 新记忆与已有记忆的 SimHash 汉明距离不超过该值时视为重复，-1 表示不去重
+    memory_retrieval_mode: str = "direct"  # 记忆检索方式: direct 只取匹配主题的记忆 / spreading 沿连接扩散激活
+    memory_spread_decay: float = 0.5  # 扩散激活每传播一跳的衰减系数
+    memory_spread_max_hops: int = 2  # 扩散激活最多传播的跳数
+    memory_spread_max_nodes: int = 30  # 扩散激活最多激活的主题数
+    memory_spread_min_activation: float = 0.05  # 激活值低于该值时停止扩散
+    memory_spread_time_budget_ms: float = 20  # 每次扩散激活的耗时上限（毫秒）
+    memory_recency_weight: float = 0.0  # 检索时记忆新近程度的权重，0 表示随机抽取相关记忆
+    memory_recency_half_life: float = 72  # 记忆新近程度衰减一半所需的小时数
+    memory_item_storage: str = "collection"  # 记忆的存储方式，"collection" 每条记忆一个文档，"array" 每个节点一个数组（旧版本的方式）
+    memory_node_capacity: int = -1  # 每个节点最多保存的记忆条数，超出后按水库抽样保留，-1 表示不限制
+    memory_merge_threshold: int = -1  # 节点的记忆条数达到该值时排队等待合并，-1 表示不合并
+    memory_merge_batch_size: int = 10  # 每次记忆合并最多处理的节点数
+    memory_merge_concurrency: int = 2  # 同时合并的节点数
+    memory_merge_queue_size: int = 1000  # 合并队列最多容纳的节点数，满了以后按水库抽样替换
+    memory_sample_mode: str = "random"  # 记忆构建的采样方式: density 按片段信息量挑选 / random 随机时间点
+    memory_sample_min_density: float = 5.0  # 平均每条消息的信息量（比特）低于该值的片段不用于构建记忆
+    memory_canonicalize: bool = False  # 构建记忆时是否把新话题归并到已有的同义节点
+    memory_canonical_threshold: float = 0.9  # 按写法归并的相似度阈值，应明显高于 1/√2
+    memory_canonical_embedding_threshold: float = 0.92  # embedding 归并的相似度阈值（需启用语义匹配），不大于 0 表示只看词语重合
+    memory_retrieval_cache_size: int = 512  # 记忆检索缓存的最大条目数
+    memory_retrieval_cache_ttl: float = 600  # 记忆检索缓存条目的存活时间（秒）
+    memory_partition_mode: str = "global"  # 记忆分区方式: global 所有群共用一张记忆图 / group 每个群独立
+    memory_partition_include_global: bool = True  # group 模式下检索时是否同时查询全局记忆
+    memory_partition_budget_mb: float = 256  # 已加载的群记忆分区的内存预算（MB）
+    memory_maintenance: str = "inline"  # 记忆维护方式: inline 在机器人进程内 / worker 由独立的 memory_worker.py 进程完成
+    memory_delta_poll_interval: int = 10  # worker 模式下机器人拉取图变更的间隔（秒）
+    memory_strength_half_life: float = 168  # 记忆强度衰减一半所需的小时数
+    memory_forget_enable: bool = False  # 是否定期遗忘衰减后强度过低的记忆
+    memory_forget_threshold: float = 0.5  # 衰减后强度低于该值的节点和连接会被遗忘，需低于新记忆的初始强度 1
+    memory_forget_min_age: float = 24  # 节点最近一次强化后至少经过多少小时才可能被遗忘
+    memory_forget_batch_size: int = 20  # 每次遗忘最多处理的节点数
+    memory_compress_mode: str = "per_topic"  # 记忆压缩模式: per_topic 每个话题一次请求 / batch 一次请求概括所有话题
+    memory_build_concurrency: int = 4  # 记忆构建时每个模型服务商的最大并发请求数
+    memory_provider_concurrency: Dict[str, int] = field(default_factory=lambda: {})  # 单独指定部分服务商的并发数
     EMOJI_CHECK_INTERVAL: int = 120  # 表情包检查间隔（分钟）
     EMOJI_REGISTER_INTERVAL: int = 10  # 表情包注册间隔（分钟）
     EMOJI_SAVE: bool = True  # 偷表情包
@@ -277,6 +316,45 @@ class BotConfig:
             memory_config = parent["memory"]
             config.build_memory_interval = memory_config.get("build_memory_interval", config.build_memory_interval)
             config.forget_memory_interval = memory_config.get("forget_memory_interval", config.forget_memory_interval)
+            config.memory_semantic_match = memory_config.get("semantic_match", config.memory_semantic_match)
+            config.memory_semantic_threshold = memory_config.get("semantic_threshold", config.memory_semantic_threshold)
+            config.memory_semantic_top_k = memory_config.get("semantic_top_k", config.memory_semantic_top_k)
+            config.memory_graph_backend = memory_config.get("graph_backend", config.memory_graph_backend)
+            config.memory_dedup_distance = memory_config.get("dedup_distance", config.memory_dedup_distance)
+            config.memory_retrieval_mode = memory_config.get("retrieval_mode", config.memory_retrieval_mode)
+            config.memory_spread_decay = memory_config.get("spread_decay", config.memory_spread_decay)
+            config.memory_spread_max_hops = memory_config.get("spread_max_hops", config.memory_spread_max_hops)
+            config.memory_spread_max_nodes = memory_config.get("spread_max_nodes", config.memory_spread_max_nodes)
+            config.memory_spread_min_activation = memory_config.get("spread_min_activation", config.memory_spread_min_activation)
+            config.memory_spread_time_budget_ms = memory_config.get("spread_time_budget_ms", config.memory_spread_time_budget_ms)
+            config.memory_recency_weight = memory_config.get("recency_weight", config.memory_recency_weight)
+            config.memory_recency_half_life = memory_config.get("recency_half_life", config.memory_recency_half_life)
+            config.memory_item_storage = memory_config.get("item_storage", config.memory_item_storage)
+            config.memory_node_capacity = memory_config.get("node_capacity", config.memory_node_capacity)
+            config.memory_merge_threshold = memory_config.get("merge_threshold", config.memory_merge_threshold)
+            config.memory_merge_batch_size = memory_config.get("merge_batch_size", config.memory_merge_batch_size)
+            config.memory_merge_concurrency = memory_config.get("merge_concurrency", config.memory_merge_concurrency)
+            config.memory_merge_queue_size = memory_config.get("merge_queue_size", config.memory_merge_queue_size)
+            config.memory_sample_mode = memory_config.get("sample_mode", config.memory_sample_mode)
+            config.memory_sample_min_density = memory_config.get("sample_min_density", config.memory_sample_min_density)
+            config.memory_canonicalize = memory_config.get("canonicalize", config.memory_canonicalize)
+            config.memory_canonical_threshold = memory_config.get("canonical_threshold", config.memory_canonical_threshold)
+            config.memory_canonical_embedding_threshold = memory_config.get("canonical_embedding_threshold", config.memory_canonical_embedding_threshold)
+            config.memory_retrieval_cache_size = memory_config.get("retrieval_cache_size", config.memory_retrieval_cache_size)
+            config.memory_retrieval_cache_ttl = memory_config.get("retrieval_cache_ttl", config.memory_retrieval_cache_ttl)
+            config.memory_partition_mode = memory_config.get("partition_mode", config.memory_partition_mode)
+            config.memory_partition_include_global = memory_config.get("partition_include_global", config.memory_partition_include_global)
+            config.memory_partition_budget_mb = memory_config.get("partition_budget_mb", config.memory_partition_budget_mb)
+            config.memory_maintenance = memory_config.get("maintenance", config.memory_maintenance)
+            config.memory_delta_poll_interval = memory_config.get("delta_poll_interval", config.memory_delta_poll_interval)
+            config.memory_strength_half_life = memory_config.get("strength_half_life", config.memory_strength_half_life)
+            config.memory_forget_enable = memory_config.get("forget_enable", config.memory_forget_enable)
+            config.memory_forget_threshold = memory_config.get("forget_threshold", config.memory_forget_threshold)
+            config.memory_forget_min_age = memory_config.get("forget_min_age", config.memory_forget_min_age)
+            config.memory_forget_batch_size = memory_config.get("forget_batch_size", config.memory_forget_batch_size)
+            config.memory_compress_mode = memory_config.get("compress_mode", config.memory_compress_mode)
+            config.memory_build_concurrency = memory_config.get("build_concurrency", config.memory_build_concurrency)
+            config.memory_provider_concurrency = memory_config.get("provider_concurrency", config.memory_provider_concurrency)
 
         def mood(parent: dict):
             mood_config = parent["mood"]
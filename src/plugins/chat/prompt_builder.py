@@ -3,7 +3,7 @@ import time
 from typing import Optional
 
 from ...common.database import Database
-from ..memory_system.memory import hippocampus, memory_graph
+from ..memory_system.memory import memory_partitions
 from ..moods.moods import MoodManager
 from ..schedule.schedule_generator import bot_schedule
 from .config import global_config
@@ -85,8 +85,9 @@ class PromptBuilder:
         start_time = time.time()
         
         # 调用 hippocampus 的 get_relevant_memories 方法
-        relevant_memories = await hippocampus.get_relevant_memories(
+        relevant_memories = await memory_partitions.get_relevant_memories(
             text=message_txt,
+            group_id=group_id,
             max_topics=5,
             similarity_threshold=0.4,
             max_memory_num=5
@@ -201,9 +202,10 @@ class PromptBuilder:
             # print(f"\033[1;34m[调试]\033[0m 已从数据库获取群 {group_id} 的消息记录:{chat_talking_prompt}")
 
         # 获取主动发言的话题
-        all_nodes=memory_graph.dots
-        all_nodes=filter(lambda dot:len(dot[1]['memory_items'])>3,all_nodes)
-        nodes_for_select=random.sample(all_nodes,5)
+        # 读取已发布的记忆图版本，不受正在进行的记忆构建影响；按记忆条数筛选，只读取选中话题的记忆
+        memory_snapshot=memory_partitions.peek(group_id).memory_graph.snapshot()
+        candidates=[concept for concept in memory_snapshot.nodes() if memory_snapshot.memory_count(concept)>3]
+        nodes_for_select=[memory_snapshot.get_dot(concept) for concept in random.sample(candidates,min(5,len(candidates)))]
         topics=[info[0] for info in nodes_for_select]
         infos=[info[1] for info in nodes_for_select]
 
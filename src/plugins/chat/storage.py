@@ -2,6 +2,7 @@ from typing import Optional
 
 from ...common.database import Database
 from .message import Message
+from .utils import calculate_message_information
 
 
 class MessageStorage:
@@ -11,6 +12,8 @@ class MessageStorage:
     async def store_message(self, message: Message, topic: Optional[str] = None) -> None:
         """存储消息到数据库"""
         try:
+            # 记忆构建按片段的信息量挑选聊天记录，采样前由片段索引批量读取
+            information = 0.0 if message.is_emoji else calculate_message_information(message.processed_plain_text)
             if not message.is_emoji:
                 message_data = {
                     "group_id": message.group_id,
@@ -25,6 +28,7 @@ class MessageStorage:
                     "group_name": message.group_name,
                     "topic": topic,
                     "detailed_plain_text": message.detailed_plain_text,
+                    "info": information,
                 }
             else:
                 message_data = {
@@ -40,6 +44,7 @@ class MessageStorage:
                     "group_name": message.group_name,
                     "topic": topic,
                     "detailed_plain_text": message.detailed_plain_text,
+                    "info": information,
                 }
                 
             self.db.db.messages.insert_one(message_data)
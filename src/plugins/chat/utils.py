@@ -1,5 +1,6 @@
 import math
 import random
+import re
 import time
 from collections import Counter
 from typing import Dict, List
@@ -97,38 +98,20 @@ def calculate_information_content(text):
     return entropy
 
 
-def get_cloest_chat_from_db(db, length: int, timestamp: str):
-    """从数据库中获取最接近指定时间戳的聊天记录，并记录读取次数"""
-    chat_text = ''
-    closest_record = db.db.messages.find_one({"time": {"$lte": timestamp}}, sort=[('time', -1)])
-
-    if closest_record and closest_record.get('memorized', 0) < 4:
-        closest_time = closest_record['time']
-        group_id = closest_record['group_id']  # 获取groupid
-        # 获取该时间戳之后的length条消息，且groupid相同
-        chat_records = list(db.db.messages.find(
-            {"time": {"$gt": closest_time}, "group_id": group_id}
-        ).sort('time', 1).limit(length))
-
-        # 更新每条消息的memorized属性
-        for record in chat_records:
-            # 检查当前记录的memorized值
-            current_memorized = record.get('memorized', 0)
-            if current_memorized > 3:
-                # print(f"消息已读取3次，跳过")
-                return ''
-
-            # 更新memorized值
-            db.db.messages.update_one(
-                {"_id": record["_id"]},
-                {"$set": {"memorized": current_memorized + 1}}
-            )
+# 不携带信息的占位符：表情包、@、回复引用（内容与被回复的消息重复），以及[图片]、[表情]这类没有描述的短标记
+_PLACEHOLDER_PATTERN = re.compile(r'\[(?:表情包|回复|@)[^\]]*\]|\[[^\]：:]{0,10}\]')
 
-            chat_text += record["detailed_plain_text"]
 
-        return chat_text
-    # print(f"消息已读取3次，跳过")
-    return ''
+def calculate_message_information(text: str, max_chars: int = 200) -> float:
+    """估计一条消息的信息量（比特）
+    
+    去掉表情包、@、回复引用等占位符后，以字符熵乘以字数计算；"哈哈哈哈"这类重复字符的消息接近 0，
+    超过 max_chars 字的消息按 max_chars 字计算，避免一段长文本独占整个片段的分数
+    """
+    text = _PLACEHOLDER_PATTERN.sub('', text or '').strip()
+    if not text:
+        return 0.0
+    return calculate_information_content(text) * min(len(text), max_chars)
 
 
 async def get_recent_group_messages(db, group_id: int, limit: int = 12) -> list:
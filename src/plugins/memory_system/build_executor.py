@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+
+class ProviderLimiter:
+    """按模型服务商限制记忆构建中的并发请求数
+
+    同一服务商的所有模型共用一个信号量，不同服务商之间互不影响
+    """
+
+    def __init__(self, default_limit: int = 4, limits: dict = None):
+        """
+        Args:
+            default_limit: 未单独配置的服务商的最大并发数
+            limits: 服务商 -> 最大并发数
+        """
+        self.default_limit = max(1, int(default_limit))
+        self.limits = {provider: max(1, int(limit)) for provider, limit in (limits or {}).items()}
+        self._semaphores = {}
+
+    @staticmethod
+    def provider_of(model: dict) -> str:
+        """从模型配置中取出服务商名，配置里 base_url 的形式为 "{provider}_BASE_URL" """
+        base_url = model.get("base_url", "")
+        return base_url[:-len("_BASE_URL")] if base_url.endswith("_BASE_URL") else base_url
+
+    def limit_of(self, provider: str) -> int:
+        return self.limits.get(provider, self.default_limit)
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        # 信号量在第一次使用时创建，保证绑定到正在运行的事件循环
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit_of(provider))
+            self._semaphores[provider] = semaphore
+        return semaphore
+
+    async def run(self, provider: str, coro):
+        """在服务商的并发限制内执行协程"""
+        async with self._semaphore(provider):
+            return await coro
+
+    async def gather(self, provider: str, coros) -> list:
+        """并发执行一组请求，结果按输入顺序返回，失败的请求返回异常对象"""
+        tasks = [asyncio.ensure_future(self.run(provider, coro)) for coro in coros]
+        return await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import time
+import uuid
+
+from .sampling_ledger import window_range
+from .window_index import window_density
+
+
+class BulkMemoryBuilder:
+    """把已有的全部聊天记录系统地转换为记忆
+
+    按群、按时间顺序流式读取 messages，每 window_size 条消息为一个片段，
+    每批 batch_windows 个片段并发压缩（并发数仍由海马体的 build_limiter 按服务商限制），
+    写入对应的记忆分区并批量同步到数据库。下一批消息在压缩当前批时预先读取。
+
+    进度（每个群最后处理的消息、累计消息数和花费）保存在 memory_bulk_build 集合中，
+    每批写入记忆后更新，中断后重新运行会从上次的位置继续。总结过的片段同时记入采样账本，
+    之后的定时记忆构建会把它们算作已经总结过一次。
+
+    每次运行的模型请求在 llm_usage 中记在专用的用户下，花费只统计本次运行自己的请求，
+    不包括同时进行的定时记忆构建。写入后的分区与机器人进程一样按内存预算卸载。
+    """
+
+    def __init__(self, partitions, db, run_id: str = "default", window_size: int = 20, batch_windows: int = 16,
+                 min_window_chars: int = 50, max_tokens: int = None, max_cost: float = None, min_density: float = None):
+        """
+        Args:
+            partitions: 记忆分区管理器
+            db: 数据库实例
+            run_id: 构建任务名，不同任务的进度互不影响
+            window_size: 每个片段的消息条数
+            batch_windows: 每批并发压缩的片段数
+            min_window_chars: 文本少于该字数的片段直接跳过
+            max_tokens: 累计 token 上限（含之前中断的运行），达到后停止
+            max_cost: 累计费用上限，达到后停止
+            min_density: 平均每条消息的信息量低于该值的片段直接跳过，默认与定时记忆构建相同
+        """
+        self.partitions = partitions
+        self.hippocampus = partitions.global_partition
+        self.ledger = self.hippocampus.chat_sampler.ledger
+        self.db = db
+        self.run_id = run_id
+        self.window_size = window_size
+        self.batch_windows = batch_windows
+        self.min_window_chars = min_window_chars
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.min_density = min_density if min_density is not None else self.hippocampus.chat_sampler.min_density
+        self.usage_user_id = f"memory_bulk:{run_id}:{uuid.uuid4().hex[:8]}"
+
+    def load_state(self) -> dict:
+        state = self.db.db.memory_bulk_build.find_one({'_id': self.run_id})
+        if state is None:
+            state = {
+                '_id': self.run_id,
+                'groups': {},  # 群号 -> {'time': 最后处理的消息时间, 'id': 消息 _id, 'done': 是否处理完}
+                'messages': 0,
+                'windows': 0,
+                'skipped_windows': 0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'cost': 0.0,
+            }
+        return state
+
+    def save_state(self, state: dict):
+        self.db.db.memory_bulk_build.replace_one({'_id': self.run_id}, state, upsert=True)
+
+    def reset(self):
+        """丢弃保存的进度，下次从头开始"""
+        self.db.db.memory_bulk_build.delete_one({'_id': self.run_id})
+
+    def over_budget(self, state: dict) -> bool:
+        if self.max_tokens is not None and state['prompt_tokens'] + state['completion_tokens'] >= self.max_tokens:
+            return True
+        return self.max_cost is not None and state['cost'] >= self.max_cost
+
+    def list_groups(self) -> list:
+        return sorted(self.db.db.messages.distinct('group_id'), key=str)
+
+    def read_windows(self, group_id, position: dict) -> list:
+        """读取某个群在 position 之后的一批片段
+
+        Returns:
+            list: 片段列表，每个片段是按时间排列的消息文档
+        """
+        query = {'group_id': group_id}
+        if position:
+            # 时间相同的消息按 _id 区分，保证不重复也不遗漏
+            query['$or'] = [
+                {'time': {'$gt': position['time']}},
+                {'time': position['time'], '_id': {'$gt': position['id']}},
+            ]
+        records = list(self.db.db.messages.find(
+            query,
+            {'_id': 1, 'time': 1, 'detailed_plain_text': 1, 'processed_plain_text': 1, 'info': 1}
+        ).sort([('time', 1), ('_id', 1)]).limit(self.window_size * self.batch_windows))
+        return [records[i:i + self.window_size] for i in range(0, len(records), self.window_size)]
+
+    async def run(self, groups: list = None) -> dict:
+        """执行（或继续）批量构建
+
+        Args:
+            groups: 只处理这些群，默认处理数据库中的所有群
+
+        Returns:
+            dict: 最新的进度状态
+        """
+        previous_user_id = self.hippocampus.usage_user_id
+        self.hippocampus.usage_user_id = self.usage_user_id
+        try:
+            return await self._run(groups)
+        finally:
+            self.hippocampus.usage_user_id = previous_user_id
+
+    async def _run(self, groups: list = None) -> dict:
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.load_state)
+        if groups is None:
+            groups = await loop.run_in_executor(None, self.list_groups)
+        start_time = time.time()
+        start_messages = state['messages']
+        start_tokens = state['prompt_tokens'] + state['completion_tokens']
+
+        for group_id in groups:
+            group_state = state['groups'].get(str(group_id), {})
+            if group_state.get('done'):
+                continue
+            print(f"\033[1;32m[批量构建]\033[0m 开始处理群 {group_id}")
+            await loop.run_in_executor(None, self.ledger.load, [group_id])
+            pending_read = loop.run_in_executor(None, self.read_windows, group_id, group_state)
+            while True:
+                if self.over_budget(state):
+                    print(f"\033[1;33m[批量构建]\033[0m 已达到花费上限 (tokens {state['prompt_tokens'] + state['completion_tokens']}, 费用 {state['cost']:.4f})，停止构建，下次运行将从这里继续")
+                    await pending_read
+                    return state
+                windows = await pending_read
+                if not windows:
+                    group_state['done'] = True
+                    state['groups'][str(group_id)] = group_state
+                    await loop.run_in_executor(None, self.save_state, state)
+                    break
+                last = windows[-1][-1]
+                position = {'time': last['time'], 'id': last['_id']}
+                # 压缩当前批的同时读取下一批
+                pending_read = loop.run_in_executor(None, self.read_windows, group_id, position)
+
+                texts = []
+                built = []
+                for records in windows:
+                    text = ''.join(record.get('detailed_plain_text', '') for record in records)
+                    if len(text) >= self.min_window_chars and window_density(records) >= self.min_density:
+                        texts.append(text)
+                        built.append(records)
+                batch_started_at = datetime.datetime.now()
+                results = await self.hippocampus.compress_samples(texts) if texts else []
+                if any(results):
+                    key = self.partitions.key_of(group_id)
+                    partition = await self.partitions.get(key)
+                    with self.partitions.pinned(key):
+                        results = await partition.canonicalize_topics(results)
+                        partition.commit_memories(results, [group_id] * len(results))
+                        partition.sync_memory_to_db()
+                    # 超出内存预算时卸载其他分区，已处理完的群最先卸载
+                    self.partitions.refresh_size(key)
+                for records in built:
+                    self.ledger.record(group_id, *window_range(records[0]['time'], records[-1]['time']))
+                try:
+                    await loop.run_in_executor(None, self.ledger.save)
+                except Exception as e:
+                    print(f"\033[1;31m[错误]\033[0m 写入采样账本失败: {e}")
+
+                usage = await loop.run_in_executor(None, self.hippocampus.build_usage, batch_started_at, self.usage_user_id)
+                for item in usage:
+                    state['prompt_tokens'] += item['prompt_tokens']
+                    state['completion_tokens'] += item['completion_tokens']
+                    state['cost'] += item.get('cost') or 0.0
+                state['messages'] += sum(len(records) for records in windows)
+                state['windows'] += len(texts)
+                state['skipped_windows'] += len(windows) - len(texts)
+                group_state = dict(position)
+                state['groups'][str(group_id)] = group_state
+                # 记忆写入数据库之后再记录进度，中断时最多重做一批
+                await loop.run_in_executor(None, self.save_state, state)
+                self.report(state, start_time, start_messages, start_tokens)
+        print("\033[1;32m[批量构建]\033[0m 所有群处理完成")
+        return state
+
+    @staticmethod
+    def report(state: dict, start_time: float, start_messages: int, start_tokens: int):
+        elapsed = max(time.time() - start_time, 1e-6)
+        messages = state['messages'] - start_messages
+        tokens = state['prompt_tokens'] + state['completion_tokens'] - start_tokens
+        print(
+            f"\033[1;32m[批量构建]\033[0m 累计消息 {state['messages']} 条, 片段 {state['windows']} 个 (跳过 {state['skipped_windows']}), "
+            f"tokens {state['prompt_tokens'] + state['completion_tokens']}, 费用 {state['cost']:.4f} | "
+            f"本次 {messages / elapsed:.1f} 条消息/秒, {tokens / elapsed:.1f} tokens/秒"
+        )
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import random
+
+from pymongo.errors import OperationFailure
+
+from .sampling_ledger import SamplingLedger, window_range
+from .window_index import ChatWindowIndex, window_density
+
+
+class ChatSampler:
+    """为记忆构建批量抽取聊天记录片段
+
+    每个采样时间点对应一个窗口：找到该时间点之前最近的一条消息，
+    取同一群组在它之后的 length 条消息。所有窗口通过一次聚合查询
+    （$unionWith + $lookup）取回，被采用的片段记入采样账本，不修改 messages 集合。
+
+    sample_dense 则先把新存储的消息批量计入片段信息量索引，再从中挑选各时间段内信息量最高、还没有总结过的片段。
+    两种方式都会跳过平均信息量低于 min_density 的片段，这些片段不会产生任何模型请求。
+    """
+
+    MAX_MEMORIZED = 3  # 消息被读取超过该次数后不再用于构建记忆
+    CANDIDATE_FACTOR = 4  # 每个时间段从索引中多取几倍的候选片段，排除已经总结过的之后仍然够用
+
+    def __init__(self, db, min_density: float = 0.0):
+        """
+        Args:
+            db: 数据库实例
+            min_density: 平均每条消息的信息量（比特）低于该值的片段不用于构建记忆
+        """
+        self.db = db
+        self.min_density = min_density
+        self.round_trips = 0  # 最近一次采样的数据库往返次数
+        self.skipped_windows = 0  # 最近一次采样因信息量过低跳过的片段数
+        self._aggregate_supported = True
+        self.ledger = SamplingLedger(db.db.memory_sampling_ledger)
+        self.window_index = ChatWindowIndex(db.db.memory_chat_windows)
+
+    def ensure_indexes(self):
+        """确保采样所需的消息索引存在"""
+        try:
+            self.db.db.messages.create_index([('group_id', 1), ('time', 1)])
+            self.db.db.messages.create_index([('time', 1)])
+            self.window_index.ensure_indexes()
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 创建消息索引失败: {e}")
+
+    def _window_pipeline(self, window: int, timestamp: float, length: int) -> list:
+        return [
+            {'$match': {'time': {'$lte': timestamp}}},
+            {'$sort': {'time': -1}},
+            {'$limit': 1},
+            {'$lookup': {
+                'from': 'messages',
+                'let': {'group_id': '$group_id', 'time': '$time'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$and': [
+                        {'$eq': ['$group_id', '$$group_id']},
+                        {'$gt': ['$time', '$$time']},
+                    ]}}},
+                    {'$sort': {'time': 1}},
+                    {'$limit': length},
+                    {'$project': {'detailed_plain_text': 1, 'processed_plain_text': 1, 'info': 1, 'time': 1, 'memorized': 1}},
+                ],
+                'as': 'records',
+            }},
+            {'$project': {'_id': 0, 'window': {'$literal': window}, 'group_id': 1, 'time': 1, 'memorized': 1, 'records': 1}},
+        ]
+
+    def _fetch_windows(self, timestamps: list, length: int) -> list:
+        """一次聚合取回所有窗口，按采样顺序返回窗口文档，找不到锚点消息的窗口为 None"""
+        pipeline = self._window_pipeline(0, timestamps[0], length)
+        for window, timestamp in enumerate(timestamps[1:], 1):
+            pipeline.append({'$unionWith': {
+                'coll': 'messages',
+                'pipeline': self._window_pipeline(window, timestamp, length),
+            }})
+        results = list(self.db.db.messages.aggregate(pipeline))
+        self.round_trips += 1
+        by_window = {doc['window']: doc for doc in results}
+        return [by_window.get(window) for window in range(len(timestamps))]
+
+    def _fetch_windows_one_by_one(self, timestamps: list, length: int) -> list:
+        """不支持 $unionWith 的旧版本数据库：每个窗口查询两次，返回与 _fetch_windows 相同格式的窗口文档"""
+        windows = []
+        for timestamp in timestamps:
+            anchor = self.db.db.messages.find_one(
+                {'time': {'$lte': timestamp}},
+                {'_id': 0, 'group_id': 1, 'time': 1, 'memorized': 1},
+                sort=[('time', -1)]
+            )
+            self.round_trips += 1
+            if anchor is None:
+                windows.append(None)
+                continue
+            anchor['records'] = list(self.db.db.messages.find(
+                {'time': {'$gt': anchor['time']}, 'group_id': anchor.get('group_id')},
+                {'detailed_plain_text': 1, 'processed_plain_text': 1, 'info': 1, 'time': 1, 'memorized': 1}
+            ).sort('time', 1).limit(length))
+            self.round_trips += 1
+            windows.append(anchor)
+        return windows
+
+    def sample(self, timestamps: list, length: int, with_group: bool = False) -> list:
+        """按给定时间点抽取聊天片段
+
+        Args:
+            timestamps: 采样时间点列表
+            length: 每个片段的消息条数
+            with_group: 是否同时返回片段所属的群号
+
+        Returns:
+            list: 非空的聊天文本列表，与时间点顺序一致；with_group 为 True 时为 (群号, 文本) 列表
+        """
+        self.round_trips = 0
+        self.skipped_windows = 0
+        if not timestamps:
+            return []
+        windows = None
+        if self._aggregate_supported:
+            try:
+                windows = self._fetch_windows(timestamps, length)
+            except OperationFailure as e:
+                # $unionWith 需要 MongoDB 4.4 及以上，旧版本退回逐个窗口查询
+                print(f"\033[1;33m[记忆采样]\033[0m 数据库不支持批量采样，改为逐个查询: {e}")
+                self._aggregate_supported = False
+        if windows is None:
+            windows = self._fetch_windows_one_by_one(timestamps, length)
+
+        self.round_trips += self.ledger.load(window.get('group_id') for window in windows if window is not None and window.get('records'))
+        chat_texts = []
+        for window in windows:
+            if window is None or not window['records']:
+                continue
+            records = window['records']
+            group_id = window.get('group_id')
+            # 锚点消息到片段最后一条消息之间有消息已经被总结过多次时，整个窗口都不使用；
+            # 旧版本写在消息上的 memorized 计数仍然参与判断，但不再更新
+            if self.ledger.max_count(group_id, *window_range(window['time'], records[-1]['time'])) > self.MAX_MEMORIZED:
+                continue
+            if window.get('memorized', 0) > self.MAX_MEMORIZED or any(record.get('memorized', 0) > self.MAX_MEMORIZED for record in records):
+                continue
+            if window_density(records) < self.min_density:
+                self.skipped_windows += 1
+                continue
+            text = ''.join(record['detailed_plain_text'] for record in records)
+            chat_texts.append((group_id, text) if with_group else text)
+            self.ledger.record(group_id, *window_range(records[0]['time'], records[-1]['time']))
+
+        self._save_ledger()
+        self._report_skipped()
+        return chat_texts
+
+    def _save_ledger(self):
+        try:
+            self.round_trips += self.ledger.save()
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 写入采样账本失败: {e}")
+
+    def _report_skipped(self):
+        if self.skipped_windows:
+            print(f"\033[1;32m[记忆采样]\033[0m 跳过 {self.skipped_windows} 个信息量过低的片段")
+
+    def sample_dense(self, bands: list, length: int, with_group: bool = False) -> list:
+        """从片段信息量索引中挑选信息量最高、还没有总结过的片段
+
+        索引中没有任何合格片段的时间段（例如启用索引之前的聊天记录）退回按随机时间点采样。
+        某个时间段的候选片段都已经总结过时，缺的片段数顺延到下一个时间段；最后仍然缺的，
+        在这些时间段内按随机时间点采样补上，每轮构建的片段数不因高信息量的片段被用完而减少。
+
+        Args:
+            bands: (开始时间, 结束时间, 片段数) 列表
+            length: 随机采样时每个片段的消息条数
+            with_group: 是否同时返回片段所属的群号
+
+        Returns:
+            list: 与 sample 相同格式的聊天文本列表
+        """
+        self.round_trips = 0
+        self.skipped_windows = 0
+        bands = [(start, end, count) for start, end, count in bands if count > 0]
+        try:
+            self.round_trips += self.window_index.refresh(self.db.db.messages)
+        except Exception as e:
+            # 补录失败时仍使用索引中已有的片段
+            print(f"\033[1;31m[错误]\033[0m 更新聊天片段信息量失败: {e}")
+        candidates = self.window_index.top_windows(
+            [(start, end, count * self.CANDIDATE_FACTOR) for start, end, count in bands],
+            self.min_density
+        )
+        self.round_trips += 1
+        self.round_trips += self.ledger.load({window['group_id'] for band in candidates for window in band})
+
+        chosen = []
+        fallback_timestamps = []
+        carried = 0
+        short_bands = []
+        for (start, end, count), band in zip(bands, candidates):
+            if not band:
+                fallback_timestamps += [random.uniform(start, end) for _ in range(count)]
+                continue
+            fresh = [
+                window for window in band
+                if self.ledger.max_count(window['group_id'], *window_range(window['start'], window['end'])) == 0
+            ]
+            wanted = count + carried
+            chosen += fresh[:wanted]
+            carried = max(0, wanted - len(fresh))
+            if len(fresh) < count:
+                short_bands.append((start, end))
+        if carried:
+            fallback_timestamps += [random.uniform(*random.choice(short_bands)) for _ in range(carried)]
+
+        chat_texts = []
+        if chosen:
+            # 所有选中片段的消息一次取回
+            records = list(self.db.db.messages.find(
+                {'$or': [{'group_id': window['group_id'], 'time': {'$gte': window['start'], '$lte': window['end']}} for window in chosen]},
+                {'_id': 0, 'group_id': 1, 'time': 1, 'detailed_plain_text': 1}
+            ).sort('time', 1))
+            self.round_trips += 1
+            for window in chosen:
+                group_id = window['group_id']
+                window_records = [
+                    record for record in records
+                    if record.get('group_id') == group_id and window['start'] <= record['time'] <= window['end']
+                ]
+                if not window_records:
+                    continue
+                text = ''.join(record['detailed_plain_text'] for record in window_records)
+                chat_texts.append((group_id, text) if with_group else text)
+                self.ledger.record(group_id, *window_range(window['start'], window['end']))
+
+        if fallback_timestamps:
+            round_trips = self.round_trips
+            # sample 会一并写回上面记录的片段
+            chat_texts += self.sample(fallback_timestamps, length, with_group=with_group)
+            self.round_trips += round_trips
+        else:
+            self._save_ledger()
+        return chat_texts
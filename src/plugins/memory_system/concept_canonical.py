@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import math
+from collections import Counter
+
+from .topic_index import TopicIndex, tokenize_topic
+
+# 否定词和改变所指的修饰词：只有一方带有时两者意思不同甚至相反（"不喜欢"与"喜欢"、"新版本"与"版本"）
+MODIFIER_WORDS = frozenset({
+    '不', '没', '没有', '别', '非', '无', '未', '莫', '勿', '不是', '不要', '不会', '不能', '不想', '不用', '不再', '并非',
+    '很', '太', '超', '最', '更', '非常', '前', '新', '旧', '老', '假', '伪', '反', '副', '准',
+})
+# 分词时可能与后面的字连在一起（"未成年"、"前女友"），开头是这些字时同样视为带有修饰
+MODIFIER_PREFIXES = frozenset('不没非无未别莫勿反伪假前')
+# 只改变写法、不改变所指的词（"玩原神"、"原神的"之于"原神"），比较时去掉
+SURFACE_WORDS = frozenset({'的', '了', '啊', '吧', '呢', '呀', '嘛', '这个', '那个', '这些', '那些', '一下', '玩', '话题', '相关'})
+
+
+def _cosine(vector1: Counter, vector2: Counter) -> float:
+    norm = math.sqrt(sum(count * count for count in vector1.values()) * sum(count * count for count in vector2.values()))
+    if norm == 0:
+        return 0.0
+    return sum(count * vector2.get(word, 0) for word, count in vector1.items()) / norm
+
+
+def _modifiers(text: str, words) -> frozenset:
+    markers = {word for word in words if word in MODIFIER_WORDS}
+    if text[:1] in MODIFIER_PREFIXES:
+        markers.add(text[0])
+    return frozenset(markers)
+
+
+class ConceptCanonicalizer:
+    """把同一概念的不同写法（"原神"、"原神的"、"玩原神"）归并到同一个节点
+
+    两种判定方式，先看写法，没有结果时再看 embedding：
+    - 写法：候选节点的名字出现在主题中，两者去掉 SURFACE_WORDS 后词频向量的余弦相似度不低于 token_threshold。
+      主题多出的实词说明它是更具体的概念（"苹果手机"之于"苹果"、"猫粮"之于"猫"），相似度最多 1/√2，不会归并
+    - embedding：启用语义匹配时，两者 embedding 的余弦相似度不低于 embedding_threshold，
+      且候选节点不是主题去掉实词后的上位概念
+
+    两种方式都要求两者带有相同的否定词和修饰词（MODIFIER_WORDS），"不开心"不会并入"开心"。
+
+    只会归并到比自己更"规范"的节点：词更少；词数相同时记忆更多；再相同时名字更短。
+    这是一个全序，归并关系不会成环，连续的归并（A -> B -> C）最终都指向同一个节点。
+    """
+
+    def __init__(self, token_threshold: float = 0.9, embedding_threshold: float = 0.92, top_k: int = 5):
+        """
+        Args:
+            token_threshold: 写法判定的相似度阈值，应明显高于 1/√2，否则两个词的组合会并入其中任意一个词
+            embedding_threshold: embedding 判定的相似度阈值，不大于 0 时只使用写法判定
+            top_k: embedding 判定时每个主题最多比较的节点数
+        """
+        self.token_threshold = token_threshold
+        self.embedding_threshold = embedding_threshold
+        self.top_k = top_k
+
+    @staticmethod
+    def rank(graph, concept) -> tuple:
+        """概念的规范程度，越小越规范；不在图中的主题记忆数为 0"""
+        return graph.topic_index.token_count(concept), -graph.memory_count(concept), len(concept), concept
+
+    def surface_similarity(self, topic: str, concept: str) -> float:
+        """concept 作为 topic 的另一种写法的相似度，不是同一概念的写法时返回 0"""
+        if concept == topic or concept not in topic:
+            return 0.0
+        topic_words = tokenize_topic(topic)
+        concept_words = tokenize_topic(concept)
+        if _modifiers(topic, topic_words) != _modifiers(concept, concept_words):
+            return 0.0
+        core = Counter({word: count for word, count in topic_words.items() if word not in SURFACE_WORDS})
+        concept_core = Counter({word: count for word, count in concept_words.items() if word not in SURFACE_WORDS})
+        return _cosine(core, concept_core)
+
+    def _surface_variants(self, index: TopicIndex, topic: str) -> list:
+        # 倒排索引先找出词都出现在主题中的节点，再逐个检查写法
+        candidates = []
+        for concept, _ in index.generalizations(topic, 0.0):
+            similarity = self.surface_similarity(topic, concept)
+            if similarity >= self.token_threshold:
+                candidates.append((concept, similarity))
+        return candidates
+
+    def _candidates(self, graph, topic, vector, pending: TopicIndex = None) -> list:
+        rank = self.rank(graph, topic)
+        candidates = [
+            (concept, similarity)
+            for concept, similarity in self._surface_variants(graph.topic_index, topic)
+            if self.rank(graph, concept) < rank
+        ]
+        if pending is not None:
+            # 同一批中更规范的新主题，排在它们之后的主题也可以归并过去
+            candidates += self._surface_variants(pending, topic)
+        if candidates or vector is None or graph.embedding_index is None or self.embedding_threshold <= 0:
+            return candidates
+        topic_words = tokenize_topic(topic)
+        modifiers = _modifiers(topic, topic_words)
+        candidates = []
+        for concept, similarity in graph.embedding_index.query(vector, top_k=self.top_k, similarity_threshold=self.embedding_threshold):
+            if concept == topic or concept not in graph or self.rank(graph, concept) >= rank:
+                continue
+            concept_words = tokenize_topic(concept)
+            if _modifiers(concept, concept_words) != modifiers:
+                continue
+            if concept_words.keys() < topic_words.keys():
+                # 写法判定没有通过的上位概念（"苹果"之于"苹果手机"）
+                continue
+            candidates.append((concept, similarity))
+        return candidates
+
+    def find(self, graph, topic, vector=None, pending: TopicIndex = None):
+        """查找主题应当归并到的节点
+
+        Args:
+            graph: 记忆图
+            topic: 主题
+            vector: 主题的 embedding，没有时只使用词语重合
+            pending: 同一批中已经确定要新建的主题
+
+        Returns:
+            str: 归并到的节点，没有合适的节点时返回 None
+        """
+        candidates = self._candidates(graph, topic, vector, pending)
+        if not candidates:
+            return None
+        candidates.sort(key=lambda x: x[1], reverse=True)
+        if len(candidates) > 1 and candidates[1][1] >= candidates[0][1] - 1e-9:
+            # 同样好的写法不止一个（如已有"原神"和"游戏"时的"原神游戏"），说明主题是几个概念的组合，不归并
+            return None
+        return candidates[0][0]
+
+    def resolve_new(self, graph, topics: list, vectors: dict = None) -> dict:
+        """为一批还不在图中的主题找出归并到的节点
+
+        按规范程度从高到低处理，这样同一批里的"原神游戏"也能归并到同一批新出现的"原神"
+
+        Returns:
+            dict: 主题 -> 归并到的概念，不需要归并的主题不在其中
+        """
+        vectors = vectors or {}
+        pending = TopicIndex()
+        mapping = {}
+        for topic in sorted(topics, key=lambda topic: self.rank(graph, topic)):
+            target = self.find(graph, topic, vectors.get(topic), pending)
+            if target is None:
+                pending.add(topic)
+            else:
+                mapping[topic] = target
+        return mapping
+
+    def plan(self, graph) -> dict:
+        """为图中已有的近似重复节点制定合并计划
+
+        Returns:
+            dict: 被合并的节点 -> 最终并入的节点，被并入的节点本身不会再被合并
+        """
+        targets = {}
+        for concept in graph.nodes():
+            vector = graph.embedding_index.get(concept) if graph.embedding_index is not None else None
+            target = self.find(graph, concept, vector)
+            if target is not None:
+                targets[concept] = target
+        merges = {}
+        for source, target in targets.items():
+            while target in targets:
+                target = targets[target]
+            merges[source] = target
+        return merges
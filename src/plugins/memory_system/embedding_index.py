@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class ConceptEmbeddingIndex:
+    """记忆概念的向量索引
+
+    所有概念的 embedding 归一化后存放在一个 float32 矩阵中，
+    一次矩阵向量乘法即可得到查询向量与全部概念的余弦相似度。
+    新概念追加到矩阵末尾，容量不足时按倍数扩容，不需要重建整个矩阵。
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._initial_capacity = initial_capacity
+        self._matrix = None  # 第一次加入向量时根据维度分配
+        self._concepts = []  # 行号 -> 概念
+        self._rows = {}  # 概念 -> 行号
+        self.version = 0  # 每次增删向量时递增
+
+    def __contains__(self, concept) -> bool:
+        return concept in self._rows
+
+    def __len__(self) -> int:
+        return len(self._concepts)
+
+    @property
+    def dim(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[1]
+
+    @staticmethod
+    def normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def add(self, concept: str, vector):
+        """加入或替换一个概念的向量"""
+        vector = self.normalize(vector)
+        if self._matrix is None:
+            self._matrix = np.zeros((self._initial_capacity, vector.shape[0]), dtype=np.float32)
+        elif vector.shape[0] != self._matrix.shape[1]:
+            raise ValueError(f"向量维度不一致: {vector.shape[0]} != {self._matrix.shape[1]}")
+
+        self.version += 1
+        row = self._rows.get(concept)
+        if row is None:
+            row = len(self._concepts)
+            if row >= self._matrix.shape[0]:
+                grown = np.zeros((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            self._rows[concept] = row
+            self._concepts.append(concept)
+        self._matrix[row] = vector
+
+    def remove(self, concept: str):
+        """移除概念，用最后一行填补空位"""
+        row = self._rows.pop(concept, None)
+        if row is None:
+            return
+        self.version += 1
+        last = len(self._concepts) - 1
+        if row != last:
+            last_concept = self._concepts[last]
+            self._matrix[row] = self._matrix[last]
+            self._concepts[row] = last_concept
+            self._rows[last_concept] = row
+        self._concepts.pop()
+
+    def retain(self, concepts):
+        """只保留给定集合中的概念"""
+        for concept in [c for c in self._concepts if c not in concepts]:
+            self.remove(concept)
+
+    def clear(self):
+        self.version += 1
+        self._matrix = None
+        self._concepts = []
+        self._rows = {}
+
+    def get(self, concept: str):
+        row = self._rows.get(concept)
+        return None if row is None else self._matrix[row]
+
+    def query(self, vector, top_k: int = 5, similarity_threshold: float = 0.0) -> list:
+        """查找与向量最相似的概念
+
+        Args:
+            vector: 查询向量
+            top_k: 最多返回的概念数
+            similarity_threshold: 相似度阈值
+
+        Returns:
+            list: 按相似度降序排列的 (概念, 相似度) 元组列表
+        """
+        size = len(self._concepts)
+        if size == 0 or top_k <= 0:
+            return []
+        query = self.normalize(vector)
+        if query.shape[0] != self._matrix.shape[1]:
+            return []
+        scores = self._matrix[:size] @ query
+        if size > top_k:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(size)
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [
+            (self._concepts[row], float(scores[row]))
+            for row in candidates
+            if scores[row] >= similarity_threshold
+        ]
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import math
+
+
+class ForgetQueue:
+    """按衰减后强度排序的遗忘候选队列
+
+    强度随时间按半衰期衰减: w(t) = w0 * 0.5 ** ((t - t0) / half_life)。
+    所有条目的衰减速度相同，因此 log2(w0) + t0 / half_life 的大小顺序
+    与任意时刻衰减后强度的大小顺序一致。队列以该值为键，条目只有在被强化
+    或内容变化时才需要更新，不会因为时间流逝而失效。
+    """
+
+    def __init__(self, half_life: float):
+        """
+        Args:
+            half_life: 强度衰减一半所需的秒数
+        """
+        self.half_life = float(half_life)
+        self._heap = []  # (键, 序号, 概念)
+        self._entries = {}  # 概念 -> (序号, 强度, 强化时间)
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, concept) -> bool:
+        return concept in self._entries
+
+    def decayed(self, weight: float, reinforced_at: float, now: float) -> float:
+        """强度在 now 时刻衰减后的值"""
+        return weight * 0.5 ** (max(0.0, now - reinforced_at) / self.half_life)
+
+    def _key(self, weight: float, reinforced_at: float) -> float:
+        if weight <= 0:
+            return -math.inf
+        return math.log2(weight) + reinforced_at / self.half_life
+
+    def update(self, concept, weight: float, reinforced_at: float):
+        """加入或更新一个概念，旧条目在出队时惰性丢弃"""
+        seq = next(self._counter)
+        self._entries[concept] = (seq, weight, reinforced_at)
+        heapq.heappush(self._heap, (self._key(weight, reinforced_at), seq, concept))
+        # 失效条目过多时整体重建，避免堆无限增长
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._rebuild_heap()
+
+    def remove(self, concept):
+        self._entries.pop(concept, None)
+
+    def clear(self):
+        self._heap = []
+        self._entries = {}
+
+    def rebuild(self, entries):
+        """用 (概念, 强度, 强化时间) 列表一次性重建队列"""
+        self._entries = {}
+        for concept, weight, reinforced_at in entries:
+            self._entries[concept] = (next(self._counter), weight, reinforced_at)
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [
+            (self._key(weight, reinforced_at), seq, concept)
+            for concept, (seq, weight, reinforced_at) in self._entries.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def pop_weakest(self, count: int, now: float, threshold: float, reinforced_before: float = None) -> list:
+        """取出衰减后强度最低且低于阈值的至多 count 个概念
+
+        Args:
+            reinforced_before: 只取出在该时刻之前最后一次强化的概念，之后强化过的留在队列中
+
+        Returns:
+            list: (概念, 衰减后强度) 列表，从弱到强排列
+        """
+        result = []
+        skipped = []
+        while self._heap and len(result) < count:
+            key, seq, concept = self._heap[0]
+            entry = self._entries.get(concept)
+            if entry is None or entry[0] != seq:
+                heapq.heappop(self._heap)
+                continue
+            _, weight, reinforced_at = entry
+            strength = self.decayed(weight, reinforced_at, now)
+            if strength >= threshold:
+                break
+            heapq.heappop(self._heap)
+            if reinforced_before is not None and reinforced_at > reinforced_before:
+                skipped.append((key, seq, concept))
+                continue
+            del self._entries[concept]
+            result.append((concept, strength))
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return result
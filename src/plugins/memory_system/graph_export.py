@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+记忆图导出与可视化
+
+直接读取记忆图的本地快照，不需要启动机器人或连接数据库。只保留按连接数或记忆数排名靠前的节点
+和强度不低于阈值的边，布局坐标保存在缓存文件中，之后只为新出现的节点计算位置。
+图片使用 matplotlib 的 Agg 后端生成，可以在没有显示器的服务器上运行。
+
+用法:
+    python -m src.plugins.memory_system.graph_export --out data/memory_graph.svg
+    python -m src.plugins.memory_system.graph_export --top-k 500 --rank-by memory --min-strength 2 \\
+        --out data/memory_graph.png --out data/memory_graph.graphml --out data/memory_graph.json
+    python -m src.plugins.memory_system.graph_export --checkpoint-dir data/memory_graph/partitions/group_123456
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+
+import networkx as nx
+import numpy as np
+
+from .memory_checkpoint import MemoryCheckpoint
+
+
+def select_subgraph(memory_counts: dict, edges: dict, top_k: int = 300, rank_by: str = "degree", min_strength: float = 0.0) -> nx.Graph:
+    """按细节层级筛选要展示的子图
+
+    Args:
+        memory_counts: 概念 -> 记忆条数
+        edges: (source, target) -> 强度
+        top_k: 保留的节点数，小于等于0表示全部保留
+        rank_by: 节点排名依据，degree（连接数）或 memory（记忆数）
+        min_strength: 低于该强度的边不展示，也不计入连接数
+
+    Returns:
+        nx.Graph: 节点带有 memory_count 属性、边带有 strength 属性的子图
+    """
+    kept_edges = [(source, target, strength) for (source, target), strength in edges.items()
+                  if strength >= min_strength and source in memory_counts and target in memory_counts]
+    degrees = dict.fromkeys(memory_counts, 0)
+    for source, target, _ in kept_edges:
+        degrees[source] += 1
+        degrees[target] += 1
+
+    if rank_by == "memory":
+        score = lambda concept: (memory_counts[concept], degrees[concept])  # noqa: E731
+    else:
+        score = lambda concept: (degrees[concept], memory_counts[concept])  # noqa: E731
+    selected = sorted(memory_counts, key=score, reverse=True)
+    if top_k > 0:
+        selected = selected[:top_k]
+    selected = set(selected)
+
+    G = nx.Graph()
+    for concept in selected:
+        G.add_node(concept, memory_count=memory_counts[concept])
+    for source, target, strength in kept_edges:
+        if source in selected and target in selected:
+            G.add_edge(source, target, strength=strength)
+    return G
+
+
+def force_layout(G: nx.Graph, pos: dict, movable: list, k: float, iterations: int) -> dict:
+    """Fruchterman-Reingold 力导向布局，只移动 movable 中的节点
+
+    只为可移动的节点计算受力，增量布局的开销与新节点数成正比；
+    边的 strength 越大吸引力越强。只依赖 numpy，不需要 scipy。
+    """
+    concepts = list(G)
+    index = {concept: i for i, concept in enumerate(concepts)}
+    positions = np.array([pos[concept] for concept in concepts], dtype=np.float64)
+    rows = np.array([index[concept] for concept in movable], dtype=np.int64)
+    if len(rows) == 0:
+        return pos
+    weights = np.zeros((len(rows), len(concepts)), dtype=np.float32)
+    row_of = {concept: i for i, concept in enumerate(movable)}
+    for source, target, strength in G.edges(data="strength", default=1):
+        if source in row_of:
+            weights[row_of[source], index[target]] = strength
+        if target in row_of:
+            weights[row_of[target], index[source]] = strength
+
+    spread = max(float(np.ptp(positions[:, 0])), float(np.ptp(positions[:, 1])), 1e-3)
+    temperature = 0.1 * spread
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        delta = positions[rows][:, None, :] - positions[None, :, :]
+        distance = np.maximum(np.linalg.norm(delta, axis=-1), 0.01)
+        force = k * k / distance ** 2 - weights * distance / k
+        displacement = np.einsum("ijk,ij->ik", delta, force)
+        length = np.maximum(np.linalg.norm(displacement, axis=-1), 0.01)
+        positions[rows] += displacement * (temperature / length)[:, None]
+        temperature -= cooling
+    return {concept: (float(x), float(y)) for concept, (x, y) in zip(concepts, positions)}
+
+
+class LayoutCache:
+    """持久化的节点坐标
+
+    第一次布局时完整运行力导向算法；之后已有坐标的节点保持不动，
+    新节点先放在已布局邻居的中心附近，再只对新节点做少量迭代。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.positions = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.positions = {concept: tuple(pos) for concept, pos in json.load(f).items()}
+        except (OSError, ValueError):
+            self.positions = {}
+
+    def save(self, keep=None):
+        """保存坐标，keep 给出时丢弃不在其中的概念（已被遗忘的节点）"""
+        if keep is not None:
+            self.positions = {concept: pos for concept, pos in self.positions.items() if concept in keep}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({concept: list(pos) for concept, pos in self.positions.items()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def layout(self, G: nx.Graph, full_iterations: int = 100, refine_iterations: int = 30, seed: int = 42) -> dict:
+        """计算子图的布局，复用并更新缓存中的坐标
+
+        Returns:
+            dict: 概念 -> (x, y)
+        """
+        known = [concept for concept in G if concept in self.positions]
+        new = [concept for concept in G if concept not in self.positions]
+        if not new:
+            return {concept: self.positions[concept] for concept in G}
+
+        rng = random.Random(seed)
+        if not known:
+            initial = {concept: (rng.random(), rng.random()) for concept in G}
+            pos = force_layout(G, initial, list(G), 1 / math.sqrt(max(len(G), 1)), full_iterations)
+        else:
+            xs = [self.positions[concept][0] for concept in known]
+            ys = [self.positions[concept][1] for concept in known]
+            spread = max(max(xs) - min(xs), max(ys) - min(ys), 1e-3)
+            initial = {concept: self.positions[concept] for concept in known}
+            for concept in new:
+                anchors = [initial[neighbor] for neighbor in G.neighbors(concept) if neighbor in initial]
+                if anchors:
+                    cx = sum(x for x, _ in anchors) / len(anchors)
+                    cy = sum(y for _, y in anchors) / len(anchors)
+                    jitter = spread * 0.05
+                else:
+                    cx, cy = (max(xs) + min(xs)) / 2, (max(ys) + min(ys)) / 2
+                    jitter = spread / 2
+                initial[concept] = (cx + rng.uniform(-jitter, jitter), cy + rng.uniform(-jitter, jitter))
+            pos = force_layout(G, initial, new, spread / math.sqrt(max(len(G), 1)), refine_iterations)
+        for concept, (x, y) in pos.items():
+            self.positions[concept] = (float(x), float(y))
+        return {concept: self.positions[concept] for concept in G}
+
+
+def _node_style(G: nx.Graph):
+    """节点大小表示记忆数量，颜色从蓝（连接少）到红（连接多）渐变，与离线可视化脚本一致"""
+    max_memories = max((count for _, count in G.nodes(data="memory_count")), default=1) or 1
+    sizes, colors = [], []
+    for concept in G:
+        ratio = G.nodes[concept]["memory_count"] / max_memories
+        sizes.append(100 + 1200 * ratio ** 2)
+        degree = G.degree(concept)
+        color_ratio = min(1.0, (degree - 1) / 29.0) if degree > 1 else 0
+        colors.append((min(0.9, color_ratio), 0, max(0.0, 1.0 - color_ratio)))
+    return sizes, colors
+
+
+def export_image(G: nx.Graph, pos: dict, path: str, label_limit: int = 150, title: str = ""):
+    """导出 SVG 或 PNG（按扩展名），只为记忆最多的 label_limit 个节点显示标签"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Noto Sans CJK SC', 'Microsoft YaHei', 'DejaVu Sans']  # 用来正常显示中文标签
+    plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
+
+    size = min(40, 8 + math.sqrt(len(G)))
+    fig = plt.figure(figsize=(size, size * 0.75))
+    sizes, colors = _node_style(G)
+    strengths = [strength for _, _, strength in G.edges(data="strength")]
+    max_strength = max(strengths, default=1) or 1
+    nx.draw_networkx_edges(G, pos, edge_color="gray", alpha=0.4, width=[0.5 + 2 * s / max_strength for s in strengths])
+    nx.draw_networkx_nodes(G, pos, node_size=sizes, node_color=colors, alpha=0.85)
+    labeled = sorted(G, key=lambda concept: G.nodes[concept]["memory_count"], reverse=True)[:label_limit]
+    nx.draw_networkx_labels(G, pos, labels={concept: concept for concept in labeled}, font_size=9)
+    if title:
+        plt.title(title, fontsize=14)
+    plt.axis("off")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def export_graphml(G: nx.Graph, pos: dict, path: str):
+    H = G.copy()
+    for concept, (x, y) in pos.items():
+        H.nodes[concept]["x"] = x
+        H.nodes[concept]["y"] = y
+    nx.write_graphml(H, path)
+
+
+def export_json(G: nx.Graph, pos: dict, path: str):
+    data = {
+        "nodes": [
+            {"id": concept, "memory_count": G.nodes[concept]["memory_count"], "degree": G.degree(concept),
+             "x": pos[concept][0], "y": pos[concept][1]}
+            for concept in G
+        ],
+        "edges": [
+            {"source": source, "target": target, "strength": strength}
+            for source, target, strength in G.edges(data="strength")
+        ],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+EXPORTERS = {
+    ".svg": export_image,
+    ".png": export_image,
+    ".graphml": export_graphml,
+    ".json": export_json,
+}
+
+
+def decay_edges(edges: dict, edge_times: dict, half_life_hours: float, now: float = None) -> dict:
+    """按半衰期计算边当前的强度"""
+    if not half_life_hours or half_life_hours <= 0:
+        return edges
+    now = time.time() if now is None else now
+    half_life = half_life_hours * 3600
+    return {
+        key: strength * 0.5 ** (max(0.0, now - edge_times.get(key, now)) / half_life)
+        for key, strength in edges.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出记忆图的可视化和数据文件")
+    parser.add_argument("--checkpoint-dir", default=os.path.join("data", "memory_graph"), help="记忆图本地快照所在目录")
+    parser.add_argument("--out", action="append", required=True, help="输出文件，按扩展名决定格式: .svg .png .graphml .json，可重复")
+    parser.add_argument("--top-k", type=int, default=300, help="最多展示的节点数，0 表示全部")
+    parser.add_argument("--rank-by", choices=["degree", "memory"], default="degree", help="节点排名依据")
+    parser.add_argument("--min-strength", type=float, default=0.0, help="展示的边的最低强度（衰减后）")
+    parser.add_argument("--half-life", type=float, default=168, help="强度半衰期（小时），0 表示使用原始强度")
+    parser.add_argument("--labels", type=int, default=150, help="图片中显示标签的节点数")
+    parser.add_argument("--layout-cache", default=None, help="布局缓存文件，默认放在快照目录下")
+    args = parser.parse_args()
+
+    loaded = MemoryCheckpoint(args.checkpoint_dir).load()
+    if loaded is None:
+        print(f"\033[1;31m[错误]\033[0m 没有找到可用的记忆图快照: {args.checkpoint_dir}")
+        return
+    version, nodes, edges, _, edge_times, item_meta = loaded
+    edges = decay_edges(edges, edge_times, args.half_life)
+    # 记忆逐条存储时，快照中未加载的节点只有记忆条数
+    memory_counts = {concept: len(items) if items is not None else item_meta.get(concept, 0) for concept, items in nodes.items()}
+
+    start_time = time.time()
+    G = select_subgraph(memory_counts, edges, args.top_k, args.rank_by, args.min_strength)
+    cache = LayoutCache(args.layout_cache or os.path.join(args.checkpoint_dir, "layout_cache.json"))
+    cached = sum(1 for concept in G if concept in cache.positions)
+    pos = cache.layout(G)
+    cache.save(keep=nodes)
+    print(f"\033[1;32m[记忆图导出]\033[0m 版本 {version}: 全图 {len(nodes)} 个节点, 展示 {len(G)} 个节点 {G.number_of_edges()} 条边, "
+          f"复用坐标 {cached} 个, 布局耗时 {time.time() - start_time:.2f} 秒")
+
+    title = f"记忆图谱 (版本 {version}, 前 {len(G)} 个节点, 按{'连接数' if args.rank_by == 'degree' else '记忆数'}排序)"
+    for path in args.out:
+        extension = os.path.splitext(path)[1].lower()
+        exporter = EXPORTERS.get(extension)
+        if exporter is None:
+            print(f"\033[1;31m[错误]\033[0m 不支持的输出格式: {path}")
+            continue
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if exporter is export_image:
+            exporter(G, pos, path, label_limit=args.labels, title=title)
+        else:
+            exporter(G, pos, path)
+        print(f"\033[1;32m[记忆图导出]\033[0m 已写入 {path}")
+
+
+if __name__ == "__main__":
+    main()
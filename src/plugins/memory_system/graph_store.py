@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+from array import array
+from bisect import bisect_left
+
+import networkx as nx
+import numpy as np
+
+
+def _strength_value(weight):
+    """float32 存储的强度值还原为 Python 数值，整数强度保持为 int"""
+    weight = float(weight)
+    return int(weight) if weight.is_integer() else weight
+
+
+class NxGraphStore:
+    """基于 networkx.Graph 的记忆图存储"""
+
+    def __init__(self):
+        self.G = nx.Graph()
+
+    def __contains__(self, concept) -> bool:
+        return concept in self.G
+
+    def __len__(self) -> int:
+        return self.G.number_of_nodes()
+
+    def nodes(self):
+        return self.G.nodes()
+
+    def number_of_edges(self) -> int:
+        return self.G.number_of_edges()
+
+    def add_node(self, concept):
+        if concept not in self.G:
+            self.G.add_node(concept, memory_items=[], reinforced_at=0.0)
+
+    def remove_node(self, concept):
+        self.G.remove_node(concept)
+
+    def get_items(self, concept) -> list:
+        memory_items = self.G.nodes[concept].get('memory_items', [])
+        if not isinstance(memory_items, list):
+            memory_items = [memory_items] if memory_items else []
+        return list(memory_items)
+
+    def item_count(self, concept) -> int:
+        memory_items = self.G.nodes[concept].get('memory_items', [])
+        if not isinstance(memory_items, list):
+            return 1 if memory_items else 0
+        return len(memory_items)
+
+    def set_items(self, concept, memory_items):
+        self.G.nodes[concept]['memory_items'] = list(memory_items)
+
+    def get_node_time(self, concept) -> float:
+        return self.G.nodes[concept].get('reinforced_at', 0.0)
+
+    def set_node_time(self, concept, reinforced_at: float):
+        self.G.nodes[concept]['reinforced_at'] = reinforced_at
+
+    def append_item(self, concept, memory):
+        node_data = self.G.nodes[concept]
+        memory_items = node_data.get('memory_items')
+        if memory_items is None:
+            node_data['memory_items'] = [memory]
+        elif not isinstance(memory_items, list):
+            # 如果当前不是列表，将其转换为列表
+            node_data['memory_items'] = [memory_items, memory]
+        else:
+            memory_items.append(memory)
+
+    def has_edge(self, concept1, concept2) -> bool:
+        return self.G.has_edge(concept1, concept2)
+
+    def get_strength(self, concept1, concept2, default=None):
+        if not self.G.has_edge(concept1, concept2):
+            return default
+        return self.G[concept1][concept2].get('strength', 1)
+
+    def get_edge_time(self, concept1, concept2, default=0.0):
+        if not self.G.has_edge(concept1, concept2):
+            return default
+        return self.G[concept1][concept2].get('reinforced_at', default)
+
+    def set_strength(self, concept1, concept2, strength, reinforced_at=None):
+        """设置边的强度，reinforced_at 为 None 时保留原来的强化时间"""
+        if reinforced_at is None:
+            self.G.add_edge(concept1, concept2, strength=strength)
+        else:
+            self.G.add_edge(concept1, concept2, strength=strength, reinforced_at=reinforced_at)
+
+    def remove_edge(self, concept1, concept2):
+        if self.G.has_edge(concept1, concept2):
+            self.G.remove_edge(concept1, concept2)
+
+    def neighbors(self, concept):
+        return self.G.neighbors(concept)
+
+    def degree(self, concept) -> int:
+        return self.G.degree(concept)
+
+    def edges(self):
+        for source, target, data in self.G.edges(data=True):
+            yield source, target, data.get('strength', 1)
+
+    def clear(self):
+        self.G.clear()
+
+    def load(self, nodes: dict, edges: dict, node_times: dict = None, edge_times: dict = None):
+        node_times = node_times or {}
+        edge_times = edge_times or {}
+        self.G.clear()
+        self.G.add_nodes_from(
+            (concept, {'memory_items': list(memory_items), 'reinforced_at': node_times.get(concept, 0.0)})
+            for concept, memory_items in nodes.items()
+        )
+        # 只有当源节点和目标节点都存在时才添加边
+        self.G.add_edges_from(
+            (source, target, {'strength': strength, 'reinforced_at': edge_times.get((source, target), 0.0)})
+            for (source, target), strength in edges.items()
+            if source in nodes and target in nodes
+        )
+
+    def to_networkx(self) -> nx.Graph:
+        return self.G
+
+
+class StringArena:
+    """把大量短字符串连续存放在一块 bytearray 中
+
+    每个字符串用一个整数 id 引用，删除后空间在垃圾超过一半时整体压缩回收
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array('Q')
+        self._lengths = array('I')
+        self._free_ids = []
+        self._live_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._offsets) - len(self._free_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data) + self._offsets.itemsize * len(self._offsets) + self._lengths.itemsize * len(self._lengths)
+
+    def add(self, text: str) -> int:
+        encoded = text.encode('utf-8')
+        offset = len(self._data)
+        self._data += encoded
+        self._live_bytes += len(encoded)
+        if self._free_ids:
+            string_id = self._free_ids.pop()
+            self._offsets[string_id] = offset
+            self._lengths[string_id] = len(encoded)
+        else:
+            string_id = len(self._offsets)
+            self._offsets.append(offset)
+            self._lengths.append(len(encoded))
+        return string_id
+
+    def get(self, string_id: int) -> str:
+        offset = self._offsets[string_id]
+        return self._data[offset:offset + self._lengths[string_id]].decode('utf-8')
+
+    def remove(self, string_id: int):
+        self._live_bytes -= self._lengths[string_id]
+        self._lengths[string_id] = 0
+        self._free_ids.append(string_id)
+        if len(self._data) > 4096 and self._live_bytes * 2 < len(self._data):
+            self._compact()
+
+    def clear(self):
+        self.__init__()
+
+    def _compact(self):
+        free = set(self._free_ids)
+        data = bytearray()
+        for string_id in range(len(self._offsets)):
+            if string_id in free:
+                self._offsets[string_id] = 0
+                continue
+            offset = self._offsets[string_id]
+            self._offsets[string_id] = len(data)
+            data += self._data[offset:offset + self._lengths[string_id]]
+        self._data = data
+
+
+class CompactGraphStore:
+    """紧凑的数组化记忆图存储
+
+    - 概念名被映射为连续的整数 id
+    - 邻接关系以 CSR 形式存放（int32 邻居 + float32 强度），
+      新增或修改的边先写入增量缓冲区，积累到一定数量后再合并进 CSR
+    - 节点和边的最近强化时间存放在 float64 数组中
+    - 记忆项文本存放在 StringArena 中，每个节点只保存 uint32 的字符串 id
+    """
+
+    def __init__(self, delta_ratio: float = 0.25, min_delta: int = 4096):
+        """
+        Args:
+            delta_ratio: 增量缓冲区边数超过 CSR 边数的该比例时合并
+            min_delta: 触发合并的最小增量边数
+        """
+        self.delta_ratio = delta_ratio
+        self.min_delta = min_delta
+        self.clear()
+
+    def clear(self):
+        self._ids = {}  # 概念 -> id
+        self._names = []  # id -> 概念，已删除为 None
+        self._free_ids = []
+        self._items = []  # id -> array('I') 字符串 id
+        self._node_times = array('d')  # id -> 最近强化时间
+        self._arena = StringArena()
+        # CSR 部分，只覆盖 id < len(indptr) - 1 的节点
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._times = np.zeros(0, dtype=np.float64)
+        self._indices_view = memoryview(self._indices)
+        self._weights_view = memoryview(self._weights)
+        self._times_view = memoryview(self._times)
+        self._removed = set()  # 已从 CSR 中删除的 (u << 32) | v
+        self._delta = {}  # u -> {v: (强度, 强化时间)}，覆盖 CSR 中的同名边
+        self._delta_edges = 0
+
+    # ---------- 节点 ----------
+
+    def __contains__(self, concept) -> bool:
+        return concept in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def nodes(self):
+        return list(self._ids)
+
+    def _node_id(self, concept) -> int:
+        try:
+            return self._ids[concept]
+        except KeyError:
+            raise KeyError(f"节点不存在: {concept}") from None
+
+    def add_node(self, concept):
+        if concept in self._ids:
+            return
+        if self._free_ids:
+            node_id = self._free_ids.pop()
+            self._names[node_id] = concept
+            self._items[node_id] = array('I')
+            self._node_times[node_id] = 0.0
+        else:
+            node_id = len(self._names)
+            self._names.append(concept)
+            self._items.append(array('I'))
+            self._node_times.append(0.0)
+        self._ids[concept] = node_id
+
+    def remove_node(self, concept):
+        node_id = self._node_id(concept)
+        for neighbor_id in list(self._neighbor_ids(node_id)):
+            self._remove_edge_ids(node_id, neighbor_id)
+        for string_id in self._items[node_id]:
+            self._arena.remove(string_id)
+        self._items[node_id] = array('I')
+        self._names[node_id] = None
+        del self._ids[concept]
+        self._free_ids.append(node_id)
+
+    def get_items(self, concept) -> list:
+        return [self._arena.get(string_id) for string_id in self._items[self._node_id(concept)]]
+
+    def item_count(self, concept) -> int:
+        return len(self._items[self._node_id(concept)])
+
+    def set_items(self, concept, memory_items):
+        node_id = self._node_id(concept)
+        for string_id in self._items[node_id]:
+            self._arena.remove(string_id)
+        self._items[node_id] = array('I', (self._arena.add(memory) for memory in memory_items))
+
+    def append_item(self, concept, memory):
+        self._items[self._node_id(concept)].append(self._arena.add(memory))
+
+    def get_node_time(self, concept) -> float:
+        return self._node_times[self._node_id(concept)]
+
+    def set_node_time(self, concept, reinforced_at: float):
+        self._node_times[self._node_id(concept)] = reinforced_at
+
+    # ---------- 边 ----------
+
+    def _base_range(self, node_id):
+        if node_id + 1 >= len(self._indptr):
+            return 0, 0
+        return int(self._indptr[node_id]), int(self._indptr[node_id + 1])
+
+    def _base_edge(self, u, v):
+        if ((u << 32) | v) in self._removed:
+            return None
+        start, end = self._base_range(u)
+        # 每行的邻居有序，行通常很短，直接在 memoryview 上二分比 numpy 调用开销小
+        pos = bisect_left(self._indices_view, v, start, end)
+        if pos < end and self._indices_view[pos] == v:
+            return self._weights_view[pos], self._times_view[pos]
+        return None
+
+    def _edge_ids(self, u, v):
+        """返回 (强度, 强化时间)，边不存在时返回 None"""
+        delta_row = self._delta.get(u)
+        if delta_row is not None and v in delta_row:
+            return delta_row[v]
+        return self._base_edge(u, v)
+
+    def _strength_ids(self, u, v):
+        edge = self._edge_ids(u, v)
+        return None if edge is None else edge[0]
+
+    def _neighbor_ids(self, node_id):
+        delta_row = self._delta.get(node_id, {})
+        start, end = self._base_range(node_id)
+        removed = self._removed
+        for v in self._indices_view[start:end]:
+            if v not in delta_row and ((node_id << 32) | v) not in removed:
+                yield v
+        yield from delta_row
+
+    def has_edge(self, concept1, concept2) -> bool:
+        return self.get_strength(concept1, concept2) is not None
+
+    def get_strength(self, concept1, concept2, default=None):
+        u, v = self._ids.get(concept1), self._ids.get(concept2)
+        if u is None or v is None:
+            return default
+        strength = self._strength_ids(u, v)
+        return default if strength is None else _strength_value(strength)
+
+    def get_edge_time(self, concept1, concept2, default=0.0):
+        u, v = self._ids.get(concept1), self._ids.get(concept2)
+        if u is None or v is None:
+            return default
+        edge = self._edge_ids(u, v)
+        return default if edge is None else edge[1]
+
+    def set_strength(self, concept1, concept2, strength, reinforced_at=None):
+        """设置边的强度，reinforced_at 为 None 时保留原来的强化时间"""
+        self.add_node(concept1)
+        self.add_node(concept2)
+        u, v = self._ids[concept1], self._ids[concept2]
+        if reinforced_at is None:
+            edge = self._edge_ids(u, v)
+            reinforced_at = 0.0 if edge is None else edge[1]
+        for a, b in ((u, v), (v, u)):
+            delta_row = self._delta.setdefault(a, {})
+            if b not in delta_row:
+                self._delta_edges += 1
+            delta_row[b] = (strength, reinforced_at)
+        if self._delta_edges > max(self.min_delta, self.delta_ratio * len(self._indices)):
+            self._merge_delta()
+
+    def _remove_edge_ids(self, u, v):
+        for a, b in ((u, v), (v, u)):
+            delta_row = self._delta.get(a)
+            if delta_row is not None and b in delta_row:
+                del delta_row[b]
+                self._delta_edges -= 1
+                if not delta_row:
+                    del self._delta[a]
+            self._removed.add((a << 32) | b)
+
+    def remove_edge(self, concept1, concept2):
+        u, v = self._ids.get(concept1), self._ids.get(concept2)
+        if u is None or v is None:
+            return
+        self._remove_edge_ids(u, v)
+
+    def neighbors(self, concept):
+        names = self._names
+        return (names[v] for v in self._neighbor_ids(self._node_id(concept)))
+
+    def degree(self, concept) -> int:
+        node_id = self._node_id(concept)
+        # 与 networkx 一致，自环计两次
+        return sum(2 if v == node_id else 1 for v in self._neighbor_ids(node_id))
+
+    def number_of_edges(self) -> int:
+        return sum(1 for _ in self.edges())
+
+    def edges(self):
+        names = self._names
+        for u, name in enumerate(names):
+            if name is None:
+                continue
+            for v in self._neighbor_ids(u):
+                if u <= v:
+                    yield name, names[v], _strength_value(self._strength_ids(u, v))
+
+    def _merge_delta(self):
+        """把增量缓冲区和删除标记合并进 CSR"""
+        sources, targets, weights, times = [], [], [], []
+        for u, name in enumerate(self._names):
+            if name is None:
+                continue
+            for v in self._neighbor_ids(u):
+                strength, reinforced_at = self._edge_ids(u, v)
+                sources.append(u)
+                targets.append(v)
+                weights.append(strength)
+                times.append(reinforced_at)
+        self._build_csr(sources, targets, weights, times)
+
+    def _build_csr(self, sources, targets, weights, times):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int32)
+        node_count = len(self._names)
+        order = np.lexsort((targets, sources))
+        self._indices = targets[order]
+        self._weights = np.asarray(weights, dtype=np.float32)[order]
+        self._times = np.asarray(times, dtype=np.float64)[order]
+        self._indices_view = memoryview(self._indices)
+        self._weights_view = memoryview(self._weights)
+        self._times_view = memoryview(self._times)
+        counts = np.bincount(sources, minlength=node_count) if len(sources) else np.zeros(node_count, dtype=np.int64)
+        self._indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._indptr[1:])
+        self._removed = set()
+        self._delta = {}
+        self._delta_edges = 0
+
+    def load(self, nodes: dict, edges: dict, node_times: dict = None, edge_times: dict = None):
+        node_times = node_times or {}
+        edge_times = edge_times or {}
+        self.clear()
+        for concept, memory_items in nodes.items():
+            self.add_node(concept)
+            self.set_items(concept, memory_items)
+            self._node_times[self._ids[concept]] = node_times.get(concept, 0.0)
+        sources, targets, weights, times = [], [], [], []
+        seen = set()
+        for (source, target), strength in edges.items():
+            u, v = self._ids.get(source), self._ids.get(target)
+            # 只有当源节点和目标节点都存在时才添加边
+            if u is None or v is None:
+                continue
+            key = (u, v) if u <= v else (v, u)
+            if key in seen:
+                continue
+            seen.add(key)
+            reinforced_at = edge_times.get((source, target), 0.0)
+            sources.append(u)
+            targets.append(v)
+            weights.append(strength)
+            times.append(reinforced_at)
+            if u != v:
+                sources.append(v)
+                targets.append(u)
+                weights.append(strength)
+                times.append(reinforced_at)
+        self._build_csr(sources, targets, weights, times)
+
+    def to_networkx(self) -> nx.Graph:
+        """导出为 networkx 图，仅用于可视化等离线场景"""
+        G = nx.Graph()
+        G.add_nodes_from(
+            (concept, {'memory_items': self.get_items(concept), 'reinforced_at': self.get_node_time(concept)})
+            for concept in self._ids
+        )
+        G.add_edges_from(
+            (source, target, {'strength': strength, 'reinforced_at': self.get_edge_time(source, target)})
+            for source, target, strength in self.edges()
+        )
+        return G
+
+    @property
+    def nbytes(self) -> int:
+        """数组部分占用的字节数（不含概念名字典）"""
+        item_bytes = sum(items.itemsize * len(items) for items in self._items)
+        return (
+            self._arena.nbytes + item_bytes + self._node_times.itemsize * len(self._node_times)
+            + self._indptr.nbytes + self._indices.nbytes + self._weights.nbytes + self._times.nbytes
+        )
+
+
+def create_graph_store(backend: str = "networkx"):
+    """根据配置创建记忆图存储后端"""
+    if backend == "compact":
+        return CompactGraphStore()
+    return NxGraphStore()
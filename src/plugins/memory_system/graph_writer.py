@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from pymongo import DeleteMany, DeleteOne, UpdateOne
+
+from .item_meta import encode_meta
+
+
+def node_hash(concept, memory_items) -> str:
+    """计算节点的特征值"""
+    if not isinstance(memory_items, list):
+        memory_items = [memory_items] if memory_items else []
+    sorted_items = sorted(memory_items)
+    content = f"{concept}:{'|'.join(sorted_items)}"
+    # 不使用内置 hash()，它在每个进程中的盐值不同，重启后所有节点都会被判定为已变化
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def edge_hash(source, target) -> str:
+    """计算边的特征值"""
+    nodes = sorted([source, target])
+    return hashlib.md5(f"{nodes[0]}:{nodes[1]}".encode('utf-8')).hexdigest()
+
+
+def recall_ops(recalls: dict) -> list:
+    """把回忆时间转换为 recalls 集合上的写操作，同一条记忆只保留最晚的时间，维护进程取走之前不会无限增长
+
+    Args:
+        recalls: (概念, 创建时间, 记忆) -> 最近使用时间
+    """
+    return [
+        UpdateOne({'concept': concept, 'created': created, 'text': item}, {'$max': {'accessed': accessed}}, upsert=True)
+        for (concept, created, item), accessed in recalls.items()
+    ]
+
+
+class GraphWriter:
+    """把记忆图自上次同步以来的变更批量写入数据库
+
+    只处理 Memory_graph 记录的变更，每个集合一次 bulk_write，耗时与变更量成正比而与图的大小无关。
+    只被强化或只有连接变化的节点只写强化时间和记忆条数，记忆尚未加载的节点不会因此从数据库读取。
+    """
+
+    def __init__(self, nodes, edges, items, item_storage: bool = False):
+        """
+        Args:
+            nodes: 节点集合
+            edges: 边集合
+            items: 记忆按条存储时的记忆集合
+            item_storage: 是否每条记忆一个文档，否则每个节点的记忆整体保存为数组
+        """
+        self.nodes = nodes
+        self.edges = edges
+        self.items = items
+        self.item_storage = item_storage
+
+    @staticmethod
+    def item_upsert(concept, item, row):
+        """按 (概念, 创建时间, 文本) 写入一条记忆，重试时不会重复插入"""
+        created, accessed, group = row
+        return UpdateOne(
+            {'concept': concept, 'created': created, 'text': item},
+            {'$set': {'accessed': accessed, 'group': group}},
+            upsert=True
+        )
+
+    @classmethod
+    def item_write_ops(cls, concept, change) -> list:
+        """把一个节点逐条的记忆变更转换为 items 集合上的写操作"""
+        ops = [DeleteMany({'concept': concept})] if change['reset'] else []
+        for op in change['ops']:
+            if op[0] == 'add':
+                ops.append(cls.item_upsert(concept, op[1], op[2]))
+            else:
+                ops.append(DeleteOne({'concept': concept, 'created': op[1], 'text': op[2]}))
+        return ops
+
+    def write(self, graph) -> tuple:
+        """取出图的变更并写入数据库，写入失败时把变更放回图中后抛出异常
+
+        Returns:
+            tuple: (数据库往返次数, 写入的图变更)。图变更为 (节点变更, 删除的节点, 边变更, 删除的边)，
+                用于日志和发布给机器人进程；只更新了记忆的最近使用时间时为 None
+        """
+        changes = graph.pop_changes()
+        dirty_nodes, deleted_nodes, dirty_edges, deleted_edges, item_changes, accessed_updates = changes
+        # 日志和发布的变更同样只包含逐条的记忆增删
+        accessed_concepts = {concept for concept, _, _ in accessed_updates}
+
+        node_ops = []
+        node_changes = []
+        item_ops = []
+        rewritten = set()  # 整体写入了记忆和元数据的节点
+        migrated = set()
+        for concept in dirty_nodes:
+            if concept not in graph:
+                continue
+            reinforced_at = graph.get_node_time(concept)
+            count = graph.memory_count(concept)
+            change = item_changes.get(concept)
+            node_changes.append((
+                concept, reinforced_at, count,
+                bool(change and change['reset']), list(change['ops']) if change is not None else []
+            ))
+            if not self.item_storage:
+                update = {'reinforced_at': reinforced_at}
+                if change is not None or concept in accessed_concepts:
+                    # 记忆以数组保存时只能整体写入
+                    memory_items = graph.get_memory_items(concept)
+                    update.update({
+                        'memory_items': memory_items,
+                        'item_meta': encode_meta(graph.get_item_meta(concept)),
+                        'hash': node_hash(concept, memory_items)
+                    })
+                    rewritten.add(concept)
+                node_ops.append(UpdateOne({'concept': concept}, {'$set': update}, upsert=True))
+                continue
+            update = {'$set': {'reinforced_at': reinforced_at, 'item_count': count}}
+            if concept in graph.legacy_layout:
+                # 旧格式的节点整体迁移：删除数组，全部记忆逐条写入
+                memory_items = graph.get_memory_items(concept)
+                meta = graph.get_item_meta(concept)
+                update['$unset'] = {'memory_items': '', 'item_meta': '', 'hash': ''}
+                item_ops.append(DeleteMany({'concept': concept}))
+                item_ops.extend(self.item_upsert(concept, item, row) for item, row in zip(memory_items, meta.tolist()))
+                migrated.add(concept)
+                rewritten.add(concept)
+            elif change is not None:
+                item_ops.extend(self.item_write_ops(concept, change))
+            node_ops.append(UpdateOne({'concept': concept}, update, upsert=True))
+        for concept in deleted_nodes:
+            node_ops.append(DeleteMany({'concept': concept}))
+            if self.item_storage:
+                item_ops.append(DeleteMany({'concept': concept}))
+        if self.item_storage:
+            # 最近使用时间不影响图的内容，不计入图版本
+            item_ops.extend(
+                UpdateOne({'concept': concept, 'created': created, 'text': item}, {'$set': {'accessed': accessed}})
+                for (concept, created, item), accessed in accessed_updates.items()
+                if concept in graph and concept not in migrated
+            )
+
+        edge_ops = []
+        edge_upserts = []
+        for source, target in dirty_edges:
+            strength = graph.get_strength(source, target)
+            if strength is None:
+                continue
+            reinforced_at = graph.get_edge_time(source, target)
+            edge_upserts.append((source, target, strength, reinforced_at))
+            # 旧数据中的边方向不固定，先删除反向记录再按规范方向写入
+            if source != target:
+                edge_ops.append(DeleteMany({'source': target, 'target': source}))
+            edge_ops.append(UpdateOne(
+                {'source': source, 'target': target},
+                {'$set': {
+                    'strength': strength,
+                    'reinforced_at': reinforced_at,
+                    'hash': edge_hash(source, target)
+                }},
+                upsert=True
+            ))
+        for source, target in deleted_edges:
+            edge_ops.append(DeleteMany({'$or': [
+                {'source': source, 'target': target},
+                {'source': target, 'target': source}
+            ]}))
+
+        round_trips = 0
+        try:
+            if item_ops:
+                # 记忆的删除和写入要按发生顺序执行
+                self.items.bulk_write(item_ops, ordered=True)
+                round_trips += 1
+            if node_ops:
+                self.nodes.bulk_write(node_ops, ordered=False)
+                round_trips += 1
+            if edge_ops:
+                self.edges.bulk_write(edge_ops, ordered=True)
+                round_trips += 1
+        except Exception:
+            # 保留变更，下次同步时重试
+            graph.restore_changes(changes)
+            raise
+        graph.legacy_meta -= rewritten
+        graph.legacy_layout -= migrated | deleted_nodes
+
+        if not (node_ops or edge_ops):
+            return round_trips, None
+        return round_trips, (node_changes, list(deleted_nodes), edge_upserts, list(deleted_edges))
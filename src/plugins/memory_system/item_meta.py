@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_right
+
+import numpy as np
+
+# 每条记忆的元数据，与节点的 memory_items 一一对应，按创建时间升序排列
+ITEM_META_DTYPE = np.dtype([('created', '<f8'), ('accessed', '<f8'), ('group', '<i8')])
+UNKNOWN_GROUP = -1
+
+
+def group_code(group_id) -> int:
+    """群号转为整数存储，没有群号（或无法识别）时为 UNKNOWN_GROUP"""
+    try:
+        return int(group_id) if group_id is not None else UNKNOWN_GROUP
+    except (TypeError, ValueError):
+        return UNKNOWN_GROUP
+
+
+def new_meta(count: int, created: float, group: int = UNKNOWN_GROUP) -> np.ndarray:
+    meta = np.empty(count, dtype=ITEM_META_DTYPE)
+    meta['created'] = created
+    meta['accessed'] = created
+    meta['group'] = group
+    return meta
+
+
+def encode_meta(meta: np.ndarray) -> bytes:
+    return meta.astype(ITEM_META_DTYPE, copy=False).tobytes()
+
+
+def decode_meta(data, count: int, fallback_time: float) -> tuple:
+    """解析数据库或快照中保存的元数据
+
+    没有元数据（旧版本写入的记忆）或条数与记忆不一致时，所有记忆的时间取节点的强化时间
+
+    Returns:
+        tuple: (元数据数组, 是否为补全的元数据)
+    """
+    if data is not None and len(data) == count * ITEM_META_DTYPE.itemsize:
+        return np.frombuffer(bytes(data), dtype=ITEM_META_DTYPE).copy(), False
+    return new_meta(count, fallback_time), True
+
+
+def realign_meta(old_items: list, old_meta: np.ndarray, new_items: list, now: float) -> tuple:
+    """记忆列表被整体替换后，按文本找回保留下来的记忆的元数据，新出现的记忆视为刚刚创建
+
+    Returns:
+        tuple: (按创建时间排好序的记忆列表, 对应的元数据)
+    """
+    positions = {}
+    for index, item in enumerate(old_items):
+        positions.setdefault(item, []).append(index)
+    meta = new_meta(len(new_items), now)
+    for index, item in enumerate(new_items):
+        candidates = positions.get(item)
+        if candidates:
+            meta[index] = old_meta[candidates.pop(0)]
+    # 稳定排序，创建时间相同的记忆保持原来的相对顺序
+    order = np.argsort(meta['created'], kind='stable')
+    if np.any(order[1:] < order[:-1]):
+        return [new_items[i] for i in order], meta[order]
+    return list(new_items), meta
+
+
+def apply_item_ops(memory_items: list, meta: np.ndarray, ops: list) -> tuple:
+    """按发生顺序应用逐条的记忆变更
+    
+    Args:
+        ops: ('add', 记忆, 元数据行) / ('remove', 创建时间, 记忆) 列表，新增的记忆按创建时间插入到同一时间的记忆之后
+    
+    Returns:
+        tuple: (记忆列表, 对应的元数据)
+    """
+    memory_items = list(memory_items)
+    rows = [tuple(row) for row in meta.tolist()]
+    for op in ops:
+        if op[0] == 'add':
+            row = tuple(op[2])
+            index = bisect_right([existing[0] for existing in rows], row[0])
+            memory_items.insert(index, op[1])
+            rows.insert(index, row)
+            continue
+        _, created, item = op
+        for index, existing in enumerate(rows):
+            if existing[0] == created and memory_items[index] == item:
+                del memory_items[index]
+                del rows[index]
+                break
+    return memory_items, np.array(rows, dtype=ITEM_META_DTYPE)
+
+
+def recent_slice(meta: np.ndarray, k: int) -> slice:
+    """最新的 k 条记忆"""
+    return slice(max(0, len(meta) - k), len(meta))
+
+
+def older_than_slice(meta: np.ndarray, timestamp: float) -> slice:
+    """创建时间早于 timestamp 的记忆"""
+    return slice(0, int(np.searchsorted(meta['created'], timestamp, side='left')))
+
+
+def recency_scores(created, now: float, half_life: float) -> np.ndarray:
+    """记忆的新近程度，刚创建时为 1，每过 half_life 秒减半"""
+    age = np.maximum(0.0, now - np.asarray(created, dtype=np.float64))
+    return 0.5 ** (age / half_life)
@@ -1,140 +1,111 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import datetime
 import math
+import os
 import random
 import time
 
 import jieba
-import networkx as nx
+import numpy as np
+from pymongo import DeleteOne, ReturnDocument
 
 from ...common.database import Database  # 使用正确的导入语法
 from ..chat.config import global_config
-from ..chat.utils import (
-    calculate_information_content,
-    cosine_similarity,
-    get_cloest_chat_from_db,
-    text_to_vector,
-)
+from ..chat.utils import calculate_information_content
 from ..models.utils_model import LLM_request
+from .build_executor import ProviderLimiter
+from .chat_sampler import ChatSampler
+from .concept_canonical import ConceptCanonicalizer
+from .embedding_index import ConceptEmbeddingIndex
+from .graph_writer import GraphWriter, edge_hash, node_hash, recall_ops
+from .item_meta import UNKNOWN_GROUP, encode_meta, new_meta, recency_scores
+from .memory_cache import LRUCache, RetrievalCache
+from .memory_checkpoint import MemoryCheckpoint
+from .memory_graph import Memory_graph
+from .partitions import MemoryPartitions
+from .simhash import dedupe_items
+from .snapshot import GraphSnapshot
+from .spreading_activation import select_activated_memories, spread_activation
+from .summary_parser import parse_topic_summaries
 
-
-class Memory_graph:
-    def __init__(self):
-        self.G = nx.Graph()  # 使用 networkx 的图结构
-        self.db = Database.get_instance()
-        
-    def connect_dot(self, concept1, concept2):
-        # 如果边已存在，增加 strength
-        if self.G.has_edge(concept1, concept2):
-            self.G[concept1][concept2]['strength'] = self.G[concept1][concept2].get('strength', 1) + 1
-        else:
-            # 如果是新边，初始化 strength 为 1
-            self.G.add_edge(concept1, concept2, strength=1)
-    
-    def add_dot(self, concept, memory):
-        if concept in self.G:
-            # 如果节点已存在，将新记忆添加到现有列表中
-            if 'memory_items' in self.G.nodes[concept]:
-                if not isinstance(self.G.nodes[concept]['memory_items'], list):
-                    # 如果当前不是列表，将其转换为列表
-                    self.G.nodes[concept]['memory_items'] = [self.G.nodes[concept]['memory_items']]
-                self.G.nodes[concept]['memory_items'].append(memory)
-            else:
-                self.G.nodes[concept]['memory_items'] = [memory]
-        else:
-            # 如果是新节点，创建新的记忆列表
-            self.G.add_node(concept, memory_items=[memory])
-        
-    def get_dot(self, concept):
-        # 检查节点是否存在于图中
-        if concept in self.G:
-            # 从图中获取节点数据
-            node_data = self.G.nodes[concept]
-            return concept, node_data
-        return None
-
-    def get_related_item(self, topic, depth=1):
-        if topic not in self.G:
-            return [], []
-            
-        first_layer_items = []
-        second_layer_items = []
-        
-        # 获取相邻节点
-        neighbors = list(self.G.neighbors(topic))
-        
-        # 获取当前节点的记忆项
-        node_data = self.get_dot(topic)
-        if node_data:
-            concept, data = node_data
-            if 'memory_items' in data:
-                memory_items = data['memory_items']
-                if isinstance(memory_items, list):
-                    first_layer_items.extend(memory_items)
-                else:
-                    first_layer_items.append(memory_items)
-        
-        # 只在depth=2时获取第二层记忆
-        if depth >= 2:
-            # 获取相邻节点的记忆项
-            for neighbor in neighbors:
-                node_data = self.get_dot(neighbor)
-                if node_data:
-                    concept, data = node_data
-                    if 'memory_items' in data:
-                        memory_items = data['memory_items']
-                        if isinstance(memory_items, list):
-                            second_layer_items.extend(memory_items)
-                        else:
-                            second_layer_items.append(memory_items)
-        
-        return first_layer_items, second_layer_items
-    
-    @property
-    def dots(self):
-        # 返回所有节点对应的 Memory_dot 对象
-        return [self.get_dot(node) for node in self.G.nodes()]
-
-    def forget_topic(self, topic):
-        """随机删除指定话题中的一条记忆，如果话题没有记忆则移除该话题节点"""
-        if topic not in self.G:
-            return None
-            
-        # 获取话题节点数据
-        node_data = self.G.nodes[topic]
-        
-        # 如果节点存在memory_items
-        if 'memory_items' in node_data:
-            memory_items = node_data['memory_items']
-            
-            # 确保memory_items是列表
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-                
-            # 如果有记忆项可以删除
-            if memory_items:
-                # 随机选择一个记忆项删除
-                removed_item = random.choice(memory_items)
-                memory_items.remove(removed_item)
-                
-                # 更新节点的记忆项
-                if memory_items:
-                    self.G.nodes[topic]['memory_items'] = memory_items
-                else:
-                    # 如果没有记忆项了，删除整个节点
-                    self.G.remove_node(topic)
-                    
-                return removed_item
-        
-        return None
+# 项目根目录
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
 
 # 海马体 
 class Hippocampus:
-    def __init__(self,memory_graph:Memory_graph):
+    # 记忆构建时各时间段的采样数量
+    BUILD_TIME_FREQUENCY = {'near': 2, 'mid': 4, 'far': 2}
+
+    def __init__(self, memory_graph: Memory_graph, checkpoint_dir: str = None, namespace: str = 'graph_data', shared: "Hippocampus" = None):
+        """
+        Args:
+            memory_graph: 这个海马体管理的记忆图
+            checkpoint_dir: 本地快照目录
+            namespace: 记忆图在数据库中的集合前缀，全局记忆图为 graph_data
+            shared: 分区记忆图复用其模型、缓存和采样器的海马体
+        """
         self.memory_graph = memory_graph
+        self.namespace = namespace
+        self.graph_data = self.memory_graph.db.db[namespace]
+        # 概念的embedding与所在分区无关，所有分区共用
+        self.embedding_collection = self.memory_graph.db.db.graph_data.embeddings
+        # 内存中的图对应的数据库版本
+        self.graph_version = None
+        self._pending_embeddings = set()  # 等待维护进程算出embedding的概念
+        # 记忆按条存储时，每条记忆是 items 集合中的一个文档，节点的记忆在第一次使用时才读取；
+        # 切换回数组存储后，已经逐条保存的节点仍按需读取，在下次写入时改回数组
+        self.item_storage = global_config.memory_item_storage == "collection"
+        self.item_collection = self.graph_data['items']
+        self.memory_graph.item_loader = self._load_node_items
+        self.graph_writer = GraphWriter(self.graph_data.nodes, self.graph_data.edges, self.item_collection, self.item_storage)
+        self._ensure_graph_indexes()
+        # 记忆图的本地快照与变更日志，用于快速启动
+        self.checkpoint = MemoryCheckpoint(checkpoint_dir or os.path.join(ROOT_PATH, 'data', 'memory_graph'))
+        self.embedding_index = None
+        # 主题集合 -> 检索结果，键中带有图版本，图被修改后旧结果自然失效
+        self.retrieval_cache = RetrievalCache(max_size=global_config.memory_retrieval_cache_size, ttl=global_config.memory_retrieval_cache_ttl)
+        # 新话题归并到图中已有的同义节点
+        self.canonicalizer = ConceptCanonicalizer(global_config.memory_canonical_threshold, global_config.memory_canonical_embedding_threshold)
+        self.canonical_stats = {'topics': 0, 'merged': 0}
+        # 记忆构建请求在 llm_usage 中记录的用户，批量构建时换成本次运行专用的值，统计用量时不会算入其他进程的构建
+        self.usage_user_id = "system"
+        if shared is not None:
+            self.llm_topic_judge = shared.llm_topic_judge
+            self.llm_summary_by_topic = shared.llm_summary_by_topic
+            self.build_limiter = shared.build_limiter
+            self.topic_judge_provider = shared.topic_judge_provider
+            self.summary_provider = shared.summary_provider
+            self.topic_cache = shared.topic_cache
+            self._pending_topic_tasks = shared._pending_topic_tasks
+            self.chat_sampler = shared.chat_sampler
+            self._embedding_tasks = shared._embedding_tasks
+            if shared.embedding_index is not None:
+                self.llm_embedding = shared.llm_embedding
+                self.topic_embedding_cache = shared.topic_embedding_cache
+                self.embedding_index = ConceptEmbeddingIndex()
+                self.memory_graph.set_embedding_index(self.embedding_index)
+            return
         self.llm_topic_judge = LLM_request(model = global_config.llm_topic_judge,temperature=0.5)
         self.llm_summary_by_topic = LLM_request(model = global_config.llm_summary_by_topic,temperature=0.5)
+        # 记忆构建时按服务商限制并发的模型请求
+        self.build_limiter = ProviderLimiter(global_config.memory_build_concurrency, global_config.memory_provider_concurrency)
+        self.topic_judge_provider = ProviderLimiter.provider_of(global_config.llm_topic_judge)
+        self.summary_provider = ProviderLimiter.provider_of(global_config.llm_summary_by_topic)
+        # 同一条消息的主题识别结果在记忆激活和记忆检索之间复用
+        self.topic_cache = LRUCache(max_size=256, ttl=120)
+        self._pending_topic_tasks = {}
+        # 记忆构建的聊天记录采样
+        self.chat_sampler = ChatSampler(self.memory_graph.db, global_config.memory_sample_min_density)
+        self.chat_sampler.ensure_indexes()
+        # 基于embedding的语义匹配（可选），每个概念只计算一次embedding并持久化
+        self._embedding_tasks = set()
+        if global_config.memory_semantic_match:
+            self.llm_embedding = LLM_request(model=global_config.embedding)
+            self.embedding_index = ConceptEmbeddingIndex()
+            self.memory_graph.set_embedding_index(self.embedding_index)
+            self.topic_embedding_cache = LRUCache(max_size=512, ttl=600)
         
     def get_all_node_names(self) -> list:
         """获取记忆图中所有节点的名字列表
@@ -142,45 +113,48 @@ class Hippocampus:
         Returns:
             list: 包含所有节点名字的列表
         """
-        return list(self.memory_graph.G.nodes())
+        return self.memory_graph.nodes()
 
     def calculate_node_hash(self, concept, memory_items):
         """计算节点的特征值"""
-        if not isinstance(memory_items, list):
-            memory_items = [memory_items] if memory_items else []
-        sorted_items = sorted(memory_items)
-        content = f"{concept}:{'|'.join(sorted_items)}"
-        return hash(content)
+        return node_hash(concept, memory_items)
 
     def calculate_edge_hash(self, source, target):
         """计算边的特征值"""
-        nodes = sorted([source, target])
-        return hash(f"{nodes[0]}:{nodes[1]}")
+        return edge_hash(source, target)
         
-    def get_memory_sample(self,chat_size=20,time_frequency:dict={'near':2,'mid':4,'far':3}):
+    def get_memory_sample(self,chat_size=20,time_frequency:dict={'near':2,'mid':4,'far':3}, with_group: bool = False):
         current_timestamp = datetime.datetime.now().timestamp()
-        chat_text = []
         #短期：1h   中期：4h   长期：24h
-        for _ in range(time_frequency.get('near')):  # 循环10次
-            random_time = current_timestamp - random.randint(1, 3600)  # 随机时间
-            chat_ = get_cloest_chat_from_db(db=self.memory_graph.db, length=chat_size, timestamp=random_time)
-            chat_text.append(chat_)  
-        for _ in range(time_frequency.get('mid')):  # 循环10次
-            random_time = current_timestamp - random.randint(3600, 3600*4)  # 随机时间
-            chat_ = get_cloest_chat_from_db(db=self.memory_graph.db, length=chat_size, timestamp=random_time)
-            chat_text.append(chat_)  
-        for _ in range(time_frequency.get('far')):  # 循环10次
-            random_time = current_timestamp - random.randint(3600*4, 3600*24)  # 随机时间
-            chat_ = get_cloest_chat_from_db(db=self.memory_graph.db, length=chat_size, timestamp=random_time)
-            chat_text.append(chat_)
-        return [text for text in chat_text if text]
+        if global_config.memory_sample_mode == "density":
+            # 每个时间段内挑选信息量最高、还没有总结过的片段
+            bands = [
+                (current_timestamp - 3600, current_timestamp, time_frequency.get('near')),
+                (current_timestamp - 3600*4, current_timestamp - 3600, time_frequency.get('mid')),
+                (current_timestamp - 3600*24, current_timestamp - 3600*4, time_frequency.get('far')),
+            ]
+            return self.chat_sampler.sample_dense(bands, chat_size, with_group=with_group)
+        timestamps = []
+        timestamps += [current_timestamp - random.randint(1, 3600) for _ in range(time_frequency.get('near'))]
+        timestamps += [current_timestamp - random.randint(3600, 3600*4) for _ in range(time_frequency.get('mid'))]
+        timestamps += [current_timestamp - random.randint(3600*4, 3600*24) for _ in range(time_frequency.get('far'))]
+        # 所有时间点的聊天记录一次取回
+        return self.chat_sampler.sample(timestamps, chat_size, with_group=with_group)
     
     async def memory_compress(self, input_text, compress_rate=0.1):
+        """从文本中提取话题并为每个话题生成概括
+        
+        Returns:
+            list: (话题, 记忆) 元组列表，顺序与模型给出的话题顺序一致
+        """
         print(input_text)
         
         #获取topics
         topic_num = self.calculate_topic_num(input_text, compress_rate)
-        topics_response = await self.llm_topic_judge.generate_response(self.find_topic_llm(input_text, topic_num))
+        topics_response = await self.build_limiter.run(
+            self.topic_judge_provider,
+            self.llm_topic_judge.generate_response(self.find_topic_llm(input_text, topic_num), request_type="memory_topic", user_id=self.usage_user_id)
+        )
         # 修改话题处理逻辑
         # 定义需要过滤的关键词
         filter_keywords = ['表情包', '图片', '回复', '聊天记录']
@@ -188,27 +162,53 @@ class Hippocampus:
         # 过滤topics
         topics = [topic.strip() for topic in topics_response[0].replace("，", ",").replace("、", ",").replace(" ", ",").split(",") if topic.strip()]
         filtered_topics = [topic for topic in topics if not any(keyword in topic for keyword in filter_keywords)]
+        filtered_topics = list(dict.fromkeys(filtered_topics))
         
         # print(f"原始话题: {topics}")
         print(f"过滤后话题: {filtered_topics}")
         
-        # 使用过滤后的话题继续处理
-        tasks = []
-        for topic in filtered_topics:
-            topic_what_prompt = self.topic_what(input_text, topic)
-            # 创建异步任务
-            task = self.llm_summary_by_topic.generate_response_async(topic_what_prompt)
-            tasks.append((topic.strip(), task))
+        summaries = {}
+        if global_config.memory_compress_mode == "batch" and filtered_topics:
+            # 一次请求概括所有话题
+            summaries = await self._summarize_topics_batch(input_text, filtered_topics)
             
-        # 等待所有任务完成
-        compressed_memory = set()
-        for topic, task in tasks:
-            response = await task
+        # 逐个话题请求概括（批量模式下只补充缺失的话题），并发执行
+        missing_topics = [topic for topic in filtered_topics if topic not in summaries]
+        if summaries and missing_topics:
+            print(f"\033[1;33m[记忆压缩]\033[0m 批量概括缺少 {len(missing_topics)} 个话题，逐个补充: {missing_topics}")
+        responses = await self.build_limiter.gather(
+            self.summary_provider,
+            (
+                self.llm_summary_by_topic.generate_response_async(self.topic_what(input_text, topic), request_type="memory_summary", user_id=self.usage_user_id)
+                for topic in missing_topics
+            )
+        )
+        for topic, response in zip(missing_topics, responses):
+            if isinstance(response, Exception):
+                print(f"\033[1;31m[错误]\033[0m 概括话题「{topic}」失败: {response}")
+                continue
             if response:
-                compressed_memory.add((topic, response[0]))
-                
+                summaries[topic] = response[0]
+        
+        compressed_memory = [(topic, summaries[topic]) for topic in filtered_topics if topic in summaries]
         return compressed_memory
 
+    async def _summarize_topics_batch(self, input_text, topics: list) -> dict:
+        """用一次请求概括多个话题
+        
+        Returns:
+            dict: 话题 -> 概括，解析失败或缺失的话题不在其中
+        """
+        try:
+            response = await self.build_limiter.run(
+                self.summary_provider,
+                self.llm_summary_by_topic.generate_response_async(self.topics_what(input_text, topics), request_type="memory_summary_batch", user_id=self.usage_user_id)
+            )
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 批量概括话题失败: {e}")
+            return {}
+        return parse_topic_summaries(response[0] if response else "", topics)
+
     def calculate_topic_num(self,text, compress_rate):
         """计算文本的话题数量"""
         information_content = calculate_information_content(text)
@@ -218,200 +218,639 @@ class Hippocampus:
         print(f"topic_by_length: {topic_by_length}, topic_by_information_content: {topic_by_information_content}, topic_num: {topic_num}")
         return topic_num
 
-    async def operation_build_memory(self,chat_size=20):
-        # 最近消息获取频率
-        time_frequency = {'near':2,'mid':4,'far':2}
-        memory_sample = self.get_memory_sample(chat_size,time_frequency)
+    async def _compress_sample(self, index, total, input_text):
+        """压缩一个聊天片段并记录耗时，失败时返回空列表"""
+        start_time = time.time()
+        try:
+            compressed_memory = await self.memory_compress(input_text, 0.1)
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 第 {index} 个片段的记忆压缩失败: {e}")
+            compressed_memory = []
+        print(f"\033[1;33m[记忆构建]\033[0m 片段 {index}/{total} 完成，压缩后记忆数量: {len(compressed_memory)}，耗时 {time.time() - start_time:.2f} 秒")
+        return compressed_memory
+
+    async def compress_samples(self, memory_sample: list) -> list:
+        """并发压缩一组聊天片段，模型请求数由 build_limiter 按服务商限制
         
-        for i, input_text in enumerate(memory_sample, 1):
+        Returns:
+            list: 每个片段的 (话题, 记忆) 列表，顺序与输入一致
+        """
+        start_time = time.time()
+        results = await asyncio.gather(*(
+            self._compress_sample(i, len(memory_sample), input_text)
+            for i, input_text in enumerate(memory_sample, 1)
+        ))
+        print(f"\033[1;32m[记忆构建]\033[0m {len(memory_sample)} 个片段压缩完成，总耗时 {time.time() - start_time:.2f} 秒")
+        return results
+
+    def commit_memories(self, results: list, group_ids: list = None):
+        """按采样顺序把压缩结果写入图谱，保证结果与完成先后无关
+        
+        Args:
+            results: 每个片段的 (话题, 记忆) 列表
+            group_ids: 每个片段来自的群，记录在记忆的元数据中
+        """
+        for i, compressed_memory in enumerate(results, 1):
+            group_id = group_ids[i - 1] if group_ids else None
             # 加载进度可视化
             all_topics = []
-            progress = (i / len(memory_sample)) * 100
+            progress = (i / len(results)) * 100
             bar_length = 30
-            filled_length = int(bar_length * i // len(memory_sample))
+            filled_length = int(bar_length * i // len(results))
             bar = '█' * filled_length + '-' * (bar_length - filled_length)
-            print(f"\n进度: [{bar}] {progress:.1f}% ({i}/{len(memory_sample)})")
-
-            # 生成压缩后记忆 ,表现为 (话题,记忆) 的元组
-            compressed_memory = set()
-            compress_rate = 0.1
-            compressed_memory = await self.memory_compress(input_text, compress_rate)
-            print(f"\033[1;33m压缩后记忆数量\033[0m: {len(compressed_memory)}")
+            print(f"\n进度: [{bar}] {progress:.1f}% ({i}/{len(results)})")
             
             # 将记忆加入到图谱中
             for topic, memory in compressed_memory:
                 print(f"\033[1;32m添加节点\033[0m: {topic}")
-                self.memory_graph.add_dot(topic, memory)
+                self.memory_graph.add_dot(topic, memory, group_id=group_id)
                 all_topics.append(topic)  # 收集所有话题
+            # 归并后同一片段的几个话题可能是同一个节点
+            all_topics = list(dict.fromkeys(all_topics))
             for i in range(len(all_topics)):
                 for j in range(i + 1, len(all_topics)):
                     print(f"\033[1;32m连接节点\033[0m: {all_topics[i]} 和 {all_topics[j]}")
                     self.memory_graph.connect_dot(all_topics[i], all_topics[j])
+            # 新节点的embedding在后台计算，不阻塞记忆构建
+            self.schedule_embedding(all_topics)
+        # 整批结果写完后才对读者可见
+        self.memory_graph.publish()
+        dedup = self.memory_graph.dedup_stats
+        if dedup['rejected'] or dedup['replaced']:
+            print(f"\033[1;32m[记忆去重]\033[0m 累计拒绝 {dedup['rejected']} 条、替换 {dedup['replaced']} 条近似重复的记忆，节省 {dedup['bytes_saved'] / 1024:.1f} KB")
+
+    async def canonicalize_topics(self, results: list) -> list:
+        """把压缩结果中还不在图中的话题换成图中已有的同义节点，避免同一概念的不同写法各自成为节点
+        
+        Args:
+            results: 每个片段的 (话题, 记忆) 列表
+            
+        Returns:
+            list: 话题归并后的结果，结构与输入一致
+        """
+        if not global_config.memory_canonicalize:
+            return results
+        graph = self.memory_graph
+        topics = list(dict.fromkeys(topic for compressed_memory in results for topic, _ in compressed_memory if topic not in graph))
+        if not topics:
+            return results
+        vectors = {}
+        if self.embedding_index is not None and len(self.embedding_index) > 0 and self.canonicalizer.embedding_threshold > 0:
+            embeddings = await asyncio.gather(*(self._get_topic_embedding(topic) for topic in topics))
+            vectors = {topic: vector for topic, vector in zip(topics, embeddings) if vector is not None}
+        # 查找和改写之间没有 await，用的是同一个版本的图
+        mapping = self.canonicalizer.resolve_new(graph, topics, vectors)
+        self.canonical_stats['topics'] += len(topics)
+        self.canonical_stats['merged'] += len(mapping)
+        for topic, target in mapping.items():
+            print(f"\033[1;32m[概念归并]\033[0m 话题「{topic}」并入已有节点「{target}」")
+        if mapping:
+            print(f"\033[1;32m[概念归并]\033[0m 本轮 {len(topics)} 个新话题中有 {len(mapping)} 个并入已有节点 (累计 {self.canonical_stats['merged']}/{self.canonical_stats['topics']})")
+        return [[(mapping.get(topic, topic), memory) for topic, memory in compressed_memory] for compressed_memory in results]
+
+    def merge_synonyms(self) -> dict:
+        """把图中同一概念的不同写法合并为一个节点，记忆和连接都并入保留的节点
+        
+        Returns:
+            dict: 合并前后的节点数、被合并的节点数和移动的记忆数
+        """
+        graph = self.memory_graph
+        start_time = time.time()
+        nodes_before = len(graph)
+        merges = self.canonicalizer.plan(graph)
+        items_moved = 0
+        for source, target in merges.items():
+            print(f"\033[1;32m合并节点\033[0m: {source} -> {target}")
+            items_moved += graph.merge_nodes(source, target)
+        # 不同写法下的记忆可能说的是同一件事
+        max_distance = graph.dedup_distance if graph.dedup_distance is not None else global_config.memory_dedup_distance
+        if max_distance >= 0:
+            for target in set(merges.values()):
+                memory_items = graph.get_memory_items(target)
+                kept, _ = dedupe_items(memory_items, max_distance)
+                if len(kept) < len(memory_items):
+                    graph.set_memory_items(target, kept)
+        graph.publish()
+        if merges:
+            self.sync_memory_to_db()
+        stats = {'nodes_before': nodes_before, 'nodes_after': len(graph), 'merged': len(merges), 'items_moved': items_moved}
+        shrink = (nodes_before - stats['nodes_after']) / nodes_before * 100 if nodes_before else 0.0
+        print(f"\033[1;32m[概念归并]\033[0m {self.namespace}: 节点数 {nodes_before} -> {stats['nodes_after']} (减少 {shrink:.1f}%)，移动 {items_moved} 条记忆，耗时 {time.time() - start_time:.2f} 秒")
+        return stats
+
+    def compact_duplicates(self) -> dict:
+        """一次性清理图中每个节点里的近似重复记忆，每组保留最长的一条
+        
+        Returns:
+            dict: 处理的节点数、删除的记忆数和节省的字节数
+        """
+        graph = self.memory_graph
+        max_distance = graph.dedup_distance if graph.dedup_distance is not None else global_config.memory_dedup_distance
+        start_time = time.time()
+        stats = {'nodes': 0, 'items_removed': 0, 'bytes_saved': 0}
+        if max_distance < 0:
+            print("\033[1;33m[记忆去重]\033[0m 未设置 memory.dedup_distance，不清理近似重复的记忆")
+            return stats
+        graph.ensure_loaded(graph.nodes())
+        for concept in graph.nodes():
+            memory_items = graph.get_memory_items(concept)
+            if len(memory_items) < 2:
+                continue
+            kept, _ = dedupe_items(memory_items, max_distance)
+            if len(kept) == len(memory_items):
+                continue
+            stats['nodes'] += 1
+            stats['items_removed'] += len(memory_items) - len(kept)
+            stats['bytes_saved'] += sum(len(item.encode('utf-8')) for item in memory_items) - sum(len(item.encode('utf-8')) for item in kept)
+            graph.set_memory_items(concept, kept)
+        if stats['nodes']:
+            self.sync_memory_to_db()
+        print(f"\033[1;32m[记忆去重]\033[0m {self.namespace}: {stats['nodes']} 个节点共删除 {stats['items_removed']} 条近似重复的记忆，节省 {stats['bytes_saved'] / 1024:.1f} KB，耗时 {time.time() - start_time:.2f} 秒")
+        return stats
+
+    def migrate_item_meta(self) -> int:
+        """为旧数据中没有元数据的记忆写入元数据（时间取节点的强化时间）
+        
+        Returns:
+            int: 写回的节点数
+        """
+        count = self.memory_graph.mark_legacy_meta_dirty()
+        if count:
+            self.sync_memory_to_db()
+        print(f"\033[1;32m[记忆迁移]\033[0m {self.namespace}: 为 {count} 个节点的记忆写入了时间信息")
+        return count
+
+    def migrate_item_storage(self) -> int:
+        """把仍以数组保存记忆的节点改为逐条保存到 items 集合
+        
+        Returns:
+            int: 迁移的节点数
+        """
+        if not self.item_storage:
+            print("\033[1;33m[记忆迁移]\033[0m 未启用 memory.item_storage = \"collection\"，不需要迁移")
+            return 0
+        count = self.memory_graph.mark_nodes_dirty(self.memory_graph.legacy_layout)
+        if count:
+            self.sync_memory_to_db()
+        print(f"\033[1;32m[记忆迁移]\033[0m {self.namespace}: {count} 个节点的记忆改为逐条保存")
+        return count
+
+    async def operation_build_memory(self,chat_size=20):
+        # 采样查询放到线程池执行，不阻塞事件循环
+        loop = asyncio.get_running_loop()
+        memory_sample = await loop.run_in_executor(None, self.get_memory_sample, chat_size, self.BUILD_TIME_FREQUENCY, True)
+        
+        build_started_at = datetime.datetime.now()
+        results = await self.compress_samples([text for _, text in memory_sample])
+        results = await self.canonicalize_topics(results)
+        self.commit_memories(results, [group_id for group_id, _ in memory_sample])
                 
-        self.sync_memory_to_db()
+        sync_round_trips = self.sync_memory_to_db()
+        print(f"\033[1;32m[记忆构建]\033[0m 本轮数据库往返 {self.chat_sampler.round_trips + sync_round_trips} 次 (采样 {self.chat_sampler.round_trips}, 写入 {sync_round_trips})")
+        self._report_build_usage(build_started_at)
+
+    BUILD_REQUEST_TYPES = ['memory_topic', 'memory_summary', 'memory_summary_batch']
+
+    def build_usage(self, since, user_id: str = None) -> list:
+        """从 llm_usage 按请求类型统计某个时间之后记忆构建的请求数、token 和费用
+
+        Args:
+            since: 只统计该时间之后的请求
+            user_id: 只统计以该用户记录的请求，默认不区分
+        """
+        match = {
+            'timestamp': {'$gte': since},
+            'request_type': {'$in': self.BUILD_REQUEST_TYPES}
+        }
+        if user_id is not None:
+            match['user_id'] = user_id
+        return list(self.memory_graph.db.db.llm_usage.aggregate([
+            {'$match': match},
+            {'$group': {
+                '_id': '$request_type',
+                'requests': {'$sum': 1},
+                'prompt_tokens': {'$sum': '$prompt_tokens'},
+                'completion_tokens': {'$sum': '$completion_tokens'},
+                'cost': {'$sum': '$cost'}
+            }}
+        ]))
+
+    def _report_build_usage(self, since):
+        """从 llm_usage 统计本轮记忆构建消耗的token，按请求类型分别输出"""
+        try:
+            usage = self.build_usage(since, self.usage_user_id)
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 统计记忆构建token用量失败: {e}")
+            return
+        for item in sorted(usage, key=lambda x: x['_id']):
+            print(f"\033[1;32m[记忆构建]\033[0m {item['_id']}: 请求 {item['requests']} 次, 输入 {item['prompt_tokens']} tokens, 输出 {item['completion_tokens']} tokens (压缩模式: {global_config.memory_compress_mode})")
+
+    def _ensure_graph_indexes(self):
+        """确保记忆图集合上有按概念和边端点查找所需的索引"""
+        try:
+            self.graph_data.nodes.create_index([('concept', 1)])
+            self.graph_data.edges.create_index([('source', 1), ('target', 1)])
+            if self.item_storage:
+                self.item_collection.create_index([('concept', 1), ('created', 1)])
+            self.embedding_collection.create_index([('model', 1), ('concept', 1)])
+            # 维护进程发布的图变更，保留7天
+            self.graph_data.deltas.create_index([('version', 1)], unique=True)
+            self.graph_data.deltas.create_index([('created_at', 1)], expireAfterSeconds=7 * 24 * 3600)
+            # 机器人进程交给维护进程的回忆时间，每条记忆一个文档
+            self.graph_data.recalls.create_index([('concept', 1), ('created', 1), ('text', 1)], unique=True)
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 创建记忆图索引失败: {e}")
+
+    def _load_node_items(self, concepts: list) -> dict:
+        """从 items 集合批量读取节点的记忆
+
+        Returns:
+            dict: 概念 -> (按创建时间排列的记忆列表, 元数据)，没有记忆的节点不在其中
+        """
+        rows = {}
+        cursor = self.item_collection.find(
+            {'concept': {'$in': list(concepts)}},
+            {'_id': 0, 'concept': 1, 'text': 1, 'created': 1, 'accessed': 1, 'group': 1}
+        ).sort([('concept', 1), ('created', 1), ('_id', 1)])
+        for doc in cursor:
+            rows.setdefault(doc['concept'], []).append(doc)
+        result = {}
+        for concept, docs in rows.items():
+            meta = new_meta(len(docs), 0.0)
+            meta['created'] = [doc['created'] for doc in docs]
+            meta['accessed'] = [doc.get('accessed', doc['created']) for doc in docs]
+            meta['group'] = [doc.get('group', UNKNOWN_GROUP) for doc in docs]
+            result[concept] = ([doc['text'] for doc in docs], meta)
+        return result
 
     def sync_memory_to_db(self):
-        """检查并同步内存中的图结构与数据库"""
-        # 获取数据库中所有节点和内存中所有节点
-        db_nodes = list(self.memory_graph.db.db.graph_data.nodes.find())
-        memory_nodes = list(self.memory_graph.G.nodes(data=True))
+        """将自上次同步以来变化的节点和边批量写入数据库，写入后递增图版本并记入日志
         
-        # 转换数据库节点为字典格式，方便查找
-        db_nodes_dict = {node['concept']: node for node in db_nodes}
+        Returns:
+            int: 本次同步的数据库往返次数
+        """
+        # 写入数据库的修改也对读者发布
+        self.memory_graph.publish()
+        try:
+            round_trips, delta = self.graph_writer.write(self.memory_graph)
+        except Exception as e:
+            # 变更已放回图中，下次同步时重试
+            print(f"\033[1;31m[错误]\033[0m 同步记忆图到数据库失败: {e}")
+            return 0
+        if delta is None:
+            return round_trips
+        node_changes, node_deletes, edge_upserts, edge_deletes = delta
+        print(f"\033[1;32m[记忆同步]\033[0m 写入节点变更 {len(node_changes) + len(node_deletes)} 个，边变更 {len(edge_upserts) + len(edge_deletes)} 条")
+        version = self._bump_graph_version()
+        round_trips += 1
+        self.graph_version = version
+        if global_config.memory_maintenance == "worker":
+            self._publish_delta(version, node_changes, node_deletes, edge_upserts, edge_deletes)
+            round_trips += 1
+        self._journal_changes(version, node_changes, node_deletes, edge_upserts, edge_deletes)
+        return round_trips
+
+    def _get_graph_version(self):
+        """获取数据库中记忆图的版本号，从未记录过版本时返回 None"""
+        meta = self.graph_data.meta.find_one({'_id': 'memory_graph'})
+        return meta.get('version') if meta else None
+
+    def _bump_graph_version(self) -> int:
+        """每次向数据库写入记忆图变更后递增版本号"""
+        meta = self.graph_data.meta.find_one_and_update(
+            {'_id': 'memory_graph'},
+            {'$inc': {'version': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return meta['version']
+
+    def _publish_delta(self, version, node_changes, node_deletes, edge_upserts, edge_deletes):
+        """把已写入数据库的变更发布给机器人进程"""
+        try:
+            self.graph_data.deltas.insert_one({
+                'version': version,
+                'node_changes': node_changes,
+                'node_deletes': node_deletes,
+                'edge_upserts': edge_upserts,
+                'edge_deletes': edge_deletes,
+                'created_at': datetime.datetime.now()
+            })
+        except Exception as e:
+            # 机器人进程发现版本不连续时会从数据库完整重新加载
+            print(f"\033[1;31m[错误]\033[0m 发布记忆图变更失败: {e}")
+
+    def _fetch_deltas(self, limit: int = 50):
+        """读取维护进程发布的、比内存中的图更新的变更，以及新概念的embedding"""
+        deltas = list(self.graph_data.deltas.find(
+            {'version': {'$gt': self.graph_version or 0}},
+            {'_id': 0, 'created_at': 0}
+        ).sort('version', 1).limit(limit))
+        embeddings = {}
+        if self.embedding_index is not None:
+            # 维护进程在发布变更之后才计算新概念的embedding，没取到的留到下次再取
+            concepts = {node[0] for delta in deltas for node in delta.get('node_changes', [])} | self._pending_embeddings
+            concepts = [concept for concept in concepts if concept not in self.embedding_index]
+            if concepts:
+                cursor = self.embedding_collection.find(
+                    {'model': self.llm_embedding.model_name, 'concept': {'$in': concepts}},
+                    {'_id': 0, 'concept': 1, 'embedding': 1}
+                )
+                embeddings = {doc['concept']: np.frombuffer(doc['embedding'], dtype=np.float32) for doc in cursor}
+        return deltas, embeddings
+
+    def _write_recalls(self, recalls: dict):
+        self.graph_data.recalls.bulk_write(recall_ops(recalls), ordered=False)
+
+    async def operation_apply_recalls(self) -> int:
+        """维护进程合并机器人进程记录的回忆时间并写入数据库，遗忘时按真实的回忆时间挑选记忆
+
+        Returns:
+            int: 更新了最近使用时间的记忆条数
+        """
+        try:
+            docs = list(self.graph_data.recalls.find({}, {'concept': 1, 'created': 1, 'text': 1, 'accessed': 1}))
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 读取回忆时间失败: {e}")
+            return 0
+        if not docs:
+            return 0
+        applied = self.memory_graph.apply_recalls({(doc['concept'], doc['created'], doc['text']): doc['accessed'] for doc in docs})
+        if applied:
+            self.sync_memory_to_db()
+        try:
+            # 读取之后又被更新为更晚时间的记录保留到下一次
+            self.graph_data.recalls.bulk_write([DeleteOne({'_id': doc['_id'], 'accessed': doc['accessed']}) for doc in docs], ordered=False)
+        except Exception as e:
+            # 没删掉的记录下次重复应用，不会把时间往前推
+            print(f"\033[1;31m[错误]\033[0m 清理回忆时间失败: {e}")
+        return applied
+
+    async def apply_worker_deltas(self):
+        """拉取并应用维护进程发布的图变更，并把回忆时间交给维护进程
         
-        # 检查并更新节点
-        for concept, data in memory_nodes:
-            memory_items = data.get('memory_items', [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-            
-            # 计算内存中节点的特征值
-            memory_hash = self.calculate_node_hash(concept, memory_items)
-                
-            if concept not in db_nodes_dict:
-                # 数据库中缺少的节点，添加
-                node_data = {
-                    'concept': concept,
-                    'memory_items': memory_items,
-                    'hash': memory_hash
-                }
-                self.memory_graph.db.db.graph_data.nodes.insert_one(node_data)
-            else:
-                # 获取数据库中节点的特征值
-                db_node = db_nodes_dict[concept]
-                db_hash = db_node.get('hash', None)
-                
-                # 如果特征值不同，则更新节点
-                if db_hash != memory_hash:
-                    self.memory_graph.db.db.graph_data.nodes.update_one(
-                        {'concept': concept},
-                        {'$set': {
-                            'memory_items': memory_items,
-                            'hash': memory_hash
-                        }}
-                    )
-                    
-        # 检查并删除数据库中多余的节点
-        memory_concepts = set(node[0] for node in memory_nodes)
-        for db_node in db_nodes:
-            if db_node['concept'] not in memory_concepts:
-                self.memory_graph.db.db.graph_data.nodes.delete_one({'concept': db_node['concept']})
-                
-        # 处理边的信息
-        db_edges = list(self.memory_graph.db.db.graph_data.edges.find())
-        memory_edges = list(self.memory_graph.G.edges())
-        
-        # 创建边的哈希值字典
-        db_edge_dict = {}
-        for edge in db_edges:
-            edge_hash = self.calculate_edge_hash(edge['source'], edge['target'])
-            db_edge_dict[(edge['source'], edge['target'])] = {
-                'hash': edge_hash,
-                'strength': edge.get('strength', 1)
+        数据库读写在线程池中完成，事件循环里只做内存中的小规模修改
+        """
+        loop = asyncio.get_running_loop()
+        recalls = self.memory_graph.pop_accessed_updates()
+        if recalls:
+            try:
+                await loop.run_in_executor(None, self._write_recalls, recalls)
+            except Exception as e:
+                # 放回去下次再交，同一条记忆只保留一个时间
+                print(f"\033[1;31m[错误]\033[0m 提交回忆时间失败: {e}")
+                self.memory_graph.restore_changes((set(), set(), set(), set(), {}, recalls))
+        deltas, embeddings = await loop.run_in_executor(None, self._fetch_deltas)
+        for delta in deltas:
+            if self.graph_version is not None and delta['version'] != self.graph_version + 1:
+                print(f"\033[1;33m[记忆同步]\033[0m 记忆图变更不连续 (本地版本 {self.graph_version}, 收到 {delta['version']})，从数据库重新加载")
+                self.sync_memory_from_db()
+                return
+            if 'node_changes' not in delta:
+                print("\033[1;33m[记忆同步]\033[0m 收到旧版本维护进程发布的变更，从数据库重新加载")
+                self.sync_memory_from_db()
+                return
+            node_changes = [(concept, reinforced_at, count, reset, [tuple(op) for op in ops])
+                            for concept, reinforced_at, count, reset, ops in delta['node_changes']]
+            consistent = self.memory_graph.apply_delta(node_changes, delta['node_deletes'], delta['edge_upserts'], delta['edge_deletes'])
+            if not consistent:
+                print(f"\033[1;33m[记忆同步]\033[0m 应用版本 {delta['version']} 的变更后记忆条数与维护进程不一致，从数据库重新加载")
+                self.sync_memory_from_db()
+                return
+            self.graph_version = delta['version']
+            self._journal_changes(
+                delta['version'],
+                node_changes,
+                delta['node_deletes'],
+                [tuple(edge) for edge in delta['edge_upserts']],
+                [tuple(edge) for edge in delta['edge_deletes']]
+            )
+        # 这一批变更全部应用后一起发布
+        self.memory_graph.publish()
+        if self.embedding_index is not None:
+            for concept, vector in embeddings.items():
+                if concept in self.memory_graph:
+                    self.embedding_index.add(concept, vector)
+            new_concepts = {node[0] for delta in deltas for node in delta['node_changes']}
+            self._pending_embeddings = {
+                concept for concept in new_concepts | self._pending_embeddings
+                if concept in self.memory_graph and concept not in self.embedding_index
             }
-            
-        # 检查并更新边
-        for source, target in memory_edges:
-            edge_hash = self.calculate_edge_hash(source, target)
-            edge_key = (source, target)
-            strength = self.memory_graph.G[source][target].get('strength', 1)
-            
-            if edge_key not in db_edge_dict:
-                # 添加新边
-                edge_data = {
-                    'source': source,
-                    'target': target,
-                    'strength': strength,
-                    'hash': edge_hash
-                }
-                self.memory_graph.db.db.graph_data.edges.insert_one(edge_data)
+        if deltas:
+            print(f"\033[1;32m[记忆同步]\033[0m 应用了 {len(deltas)} 个来自维护进程的变更，当前版本 {self.graph_version}")
+
+    def _journal_changes(self, version, node_changes, node_deletes, edge_upserts, edge_deletes):
+        """把已写入数据库的变更追加到本地日志，日志过长时重新生成快照"""
+        try:
+            if self.checkpoint.needs_compaction:
+                self._write_checkpoint(version)
             else:
-                # 检查边的特征值是否变化
-                if db_edge_dict[edge_key]['hash'] != edge_hash:
-                    self.memory_graph.db.db.graph_data.edges.update_one(
-                        {'source': source, 'target': target},
-                        {'$set': {
-                            'hash': edge_hash,
-                            'strength': strength
-                        }}
-                    )
-                    
-        # 删除多余的边
-        memory_edge_set = set(memory_edges)
-        for edge_key in db_edge_dict:
-            if edge_key not in memory_edge_set:
-                source, target = edge_key
-                self.memory_graph.db.db.graph_data.edges.delete_one({
-                    'source': source,
-                    'target': target
-                })
+                self.checkpoint.append(version, node_changes, node_deletes, edge_upserts, edge_deletes)
+        except OSError as e:
+            # 日志写入失败时快照版本会落后于数据库，下次启动自动回退到数据库加载
+            print(f"\033[1;31m[错误]\033[0m 写入记忆图日志失败: {e}")
+
+    def _write_checkpoint(self, version):
+        graph = self.memory_graph
+        nodes = {}
+        node_times = {}
+        item_meta = {}
+        for concept in graph.nodes():
+            node_times[concept] = graph.get_node_time(concept)
+            count = graph.unloaded_count(concept)
+            if count is not None:
+                # 记忆尚未加载的节点只记录条数，从快照启动后仍按需读取
+                nodes[concept] = None
+                item_meta[concept] = count
+                continue
+            nodes[concept] = graph.get_memory_items(concept)
+            item_meta[concept] = encode_meta(graph.get_item_meta(concept))
+        edges = {}
+        edge_times = {}
+        for source, target, strength in graph.edges():
+            key = graph.edge_key(source, target)
+            edges[key] = strength
+            edge_times[key] = graph.get_edge_time(source, target)
+        self.checkpoint.write_checkpoint(version, nodes, edges, node_times, edge_times, item_meta)
+
+    def _load_graph(self, nodes: dict, edges: dict, node_times: dict = None, edge_times: dict = None, item_meta: dict = None):
+        """用节点和边字典一次性替换内存中的图"""
+        # 同时重建主题倒排索引和遗忘队列，并清空变更记录（内存与数据库此时一致）
+        self.memory_graph.load(nodes, edges, node_times, edge_times, item_meta)
+        if self.embedding_index is not None:
+            self._load_embeddings()
+
+    def _load_embeddings(self):
+        """从数据库加载已经计算过的概念embedding"""
+        # 换成新的索引，重新加载之前发布的快照继续使用原来的
+        self.embedding_index = ConceptEmbeddingIndex()
+        self.memory_graph.set_embedding_index(self.embedding_index)
+        query = {'model': self.llm_embedding.model_name}
+        if len(self.memory_graph) <= 5000:
+            # 分区记忆图通常很小，只取自己的概念，不扫描所有分区共用的embedding集合
+            query['concept'] = {'$in': self.memory_graph.nodes()}
+        cursor = self.embedding_collection.find(
+            query,
+            {'_id': 0, 'concept': 1, 'embedding': 1}
+        )
+        for doc in cursor:
+            if doc['concept'] in self.memory_graph:
+                self.embedding_index.add(doc['concept'], np.frombuffer(doc['embedding'], dtype=np.float32))
+
+    async def _embed_concepts(self, concepts: list):
+        """计算概念的embedding，写入数据库并追加到向量索引"""
+        for concept in concepts:
+            if concept in self.embedding_index or concept not in self.memory_graph:
+                continue
+            # 归并新话题时可能已经算过
+            vector = self.topic_embedding_cache.get(concept)
+            if vector is None:
+                try:
+                    embedding = await self.llm_embedding.get_embedding(concept)
+                except Exception as e:
+                    print(f"\033[1;31m[错误]\033[0m 获取概念「{concept}」的embedding失败: {e}")
+                    continue
+                if not embedding:
+                    continue
+                vector = np.asarray(embedding, dtype=np.float32)
+            self.embedding_collection.update_one(
+                {'model': self.llm_embedding.model_name, 'concept': concept},
+                {'$set': {'embedding': vector.tobytes()}},
+                upsert=True
+            )
+            # 计算期间节点可能已被遗忘
+            if concept in self.memory_graph:
+                self.embedding_index.add(concept, vector)
+
+    def schedule_embedding(self, concepts: list = None):
+        """在后台为还没有embedding的概念计算向量，默认检查全部节点"""
+        if self.embedding_index is None:
+            return
+        if concepts is None:
+            concepts = self.get_all_node_names()
+        missing = [concept for concept in dict.fromkeys(concepts) if concept not in self.embedding_index]
+        if not missing:
+            return
+        task = asyncio.create_task(self._embed_concepts(missing))
+        self._embedding_tasks.add(task)
+        task.add_done_callback(self._embedding_tasks.discard)
+
+    async def _get_topic_embedding(self, topic: str):
+        """获取主题的embedding，已是记忆节点的主题直接复用索引中的向量"""
+        vector = self.embedding_index.get(topic)
+        if vector is not None:
+            return vector
+        vector = self.topic_embedding_cache.get(topic)
+        if vector is not None:
+            return vector
+        try:
+            embedding = await self.llm_embedding.get_embedding(topic)
+        except Exception as e:
+            print(f"\033[1;31m[错误]\033[0m 获取主题「{topic}」的embedding失败: {e}")
+            return None
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        self.topic_embedding_cache.set(topic, vector)
+        return vector
 
-    def sync_memory_from_db(self):
-        """从数据库同步数据到内存中的图结构"""
-        # 清空当前图
-        self.memory_graph.G.clear()
+    def sync_memory_from_db(self, use_checkpoint: bool = True):
+        """从数据库同步数据到内存中的图结构
+        
+        优先读取本地快照并重放日志；快照不存在或版本与数据库不一致时，
+        从数据库完整加载并重新生成快照
+        
+        Args:
+            use_checkpoint: 是否尝试使用本地快照
+        """
+        db_version = self._get_graph_version()
+        
+        if use_checkpoint and db_version is not None:
+            loaded = self.checkpoint.load()
+            if loaded is not None and loaded[0] == db_version:
+                _, nodes, edges, node_times, edge_times, item_meta = loaded
+                self._load_graph(nodes, edges, node_times, edge_times, item_meta)
+                if self.item_storage:
+                    self.memory_graph.legacy_layout = {
+                        node['concept'] for node in self.graph_data.nodes.find({'memory_items': {'$exists': True}}, {'_id': 0, 'concept': 1})
+                    }
+                self.graph_version = db_version
+                print(f"\033[1;32m[记忆加载]\033[0m 从本地快照加载记忆图 (版本 {db_version}, 节点 {len(nodes)}, 日志 {self.checkpoint.journal_entries} 条)")
+                return
+        
+        # 旧数据没有强化时间，视为刚刚强化过，避免升级后大量记忆被立即遗忘
+        now = time.time()
         
         # 从数据库加载所有节点
-        nodes = self.memory_graph.db.db.graph_data.nodes.find()
-        for node in nodes:
-            concept = node['concept']
+        nodes = {}
+        node_times = {}
+        item_meta = {}
+        legacy_layout = set()
+        for node in self.graph_data.nodes.find({}, {'_id': 0, 'concept': 1, 'memory_items': 1, 'item_meta': 1, 'item_count': 1, 'reinforced_at': 1}):
+            if 'memory_items' not in node and 'item_count' in node:
+                # 记忆在 items 集合中，第一次使用时再读取
+                nodes[node['concept']] = None
+                node_times[node['concept']] = node.get('reinforced_at', now)
+                item_meta[node['concept']] = node['item_count']
+                continue
+            if self.item_storage:
+                legacy_layout.add(node['concept'])
             memory_items = node.get('memory_items', [])
             # 确保memory_items是列表
             if not isinstance(memory_items, list):
                 memory_items = [memory_items] if memory_items else []
-            # 添加节点到图中
-            self.memory_graph.G.add_node(concept, memory_items=memory_items)
+            nodes[node['concept']] = memory_items
+            node_times[node['concept']] = node.get('reinforced_at', now)
+            item_meta[node['concept']] = node.get('item_meta')
             
         # 从数据库加载所有边
-        edges = self.memory_graph.db.db.graph_data.edges.find()
-        for edge in edges:
-            source = edge['source']
-            target = edge['target']
-            strength = edge.get('strength', 1)  # 获取 strength，默认为 1
-            # 只有当源节点和目标节点都存在时才添加边
-            if source in self.memory_graph.G and target in self.memory_graph.G:
-                self.memory_graph.G.add_edge(source, target, strength=strength)
-        
-    async def operation_forget_topic(self, percentage=0.1):
-        """随机选择图中一定比例的节点进行检查，根据条件决定是否遗忘"""
-        # 获取所有节点
-        all_nodes = list(self.memory_graph.G.nodes())
-        # 计算要检查的节点数量
-        check_count = max(1, int(len(all_nodes) * percentage))
-        # 随机选择节点
-        nodes_to_check = random.sample(all_nodes, check_count)
-        
-        forgotten_nodes = []
-        for node in nodes_to_check:
-            # 获取节点的连接数
-            connections = self.memory_graph.G.degree(node)
-            
-            # 获取节点的内容条数
-            memory_items = self.memory_graph.G.nodes[node].get('memory_items', [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-            content_count = len(memory_items)
-            
-            # 检查连接强度
-            weak_connections = True
-            if connections > 1:  # 只有当连接数大于1时才检查强度
-                for neighbor in self.memory_graph.G.neighbors(node):
-                    strength = self.memory_graph.G[node][neighbor].get('strength', 1)
-                    if strength > 2:
-                        weak_connections = False
-                        break
-            
-            # 如果满足遗忘条件
-            if (connections <= 1 and weak_connections) or content_count <= 2:
-                removed_item = self.memory_graph.forget_topic(node)
-                if removed_item:
-                    forgotten_nodes.append((node, removed_item))
-                    print(f"遗忘节点 {node} 的记忆: {removed_item}")
+        edges = {}
+        edge_times = {}
+        for edge in self.graph_data.edges.find({}, {'_id': 0, 'source': 1, 'target': 1, 'strength': 1, 'reinforced_at': 1}):
+            key = self.memory_graph.edge_key(edge['source'], edge['target'])
+            edges[key] = edge.get('strength', 1)  # 获取 strength，默认为 1
+            edge_times[key] = edge.get('reinforced_at', now)
+        
+        self._load_graph(nodes, edges, node_times, edge_times, item_meta)
+        self.memory_graph.legacy_layout = legacy_layout
+        if self.memory_graph.legacy_meta:
+            print(f"\033[1;33m[记忆加载]\033[0m {len(self.memory_graph.legacy_meta)} 个节点的记忆没有时间信息，暂用节点的强化时间，可运行 python memory_worker.py --migrate-item-meta 写回数据库")
+        if legacy_layout:
+            print(f"\033[1;33m[记忆加载]\033[0m {len(legacy_layout)} 个节点的记忆仍以数组保存，将在下次写入时改为逐条保存，可运行 python memory_worker.py --migrate-item-storage 一次性迁移")
+        
+        if db_version is None:
+            # 旧数据库没有版本记录，从这里开始计数
+            db_version = self._bump_graph_version()
+        self.graph_version = db_version
+        try:
+            self._write_checkpoint(db_version)
+        except OSError as e:
+            print(f"\033[1;31m[错误]\033[0m 写入记忆图快照失败: {e}")
+        
+    async def operation_forget_topic(self, max_count: int = None):
+        """从遗忘队列中取出衰减后强度最低的节点进行遗忘
+        
+        每个节点遗忘一条记忆，并删除它衰减到阈值以下的连接；没有记忆项的节点直接删除。
+        只处理低于阈值、且强化后超过最短保留时间的节点，耗时 O(N log V)，与图的大小基本无关
+        
+        Args:
+            max_count: 本次最多处理的节点数，默认使用配置中的 forget_batch_size
+        """
+        if max_count is None:
+            max_count = global_config.memory_forget_batch_size
+        forgotten_nodes, removed_edges = self.memory_graph.forget_weakest(
+            max_count, global_config.memory_forget_threshold, global_config.memory_forget_min_age * 3600
+        )
+        for node, removed_item, strength in forgotten_nodes:
+            if removed_item is None:
+                print(f"遗忘节点 {node} (强度 {strength:.3f})")
+            else:
+                print(f"遗忘节点 {node} 的记忆 (强度 {strength:.3f}): {removed_item}")
         
         # 同步到数据库
-        if forgotten_nodes:
+        if forgotten_nodes or removed_edges:
             self.sync_memory_to_db()
-            print(f"完成遗忘操作，共遗忘 {len(forgotten_nodes)} 个节点的记忆")
+            print(f"完成遗忘操作，共遗忘 {len(forgotten_nodes)} 个节点的记忆，删除 {removed_edges} 条弱连接")
         else:
             print("本次检查没有节点满足遗忘条件")
 
@@ -423,16 +862,18 @@ class Hippocampus:
             topic: 要合并的话题节点
         """
         # 获取节点的记忆项
-        memory_items = self.memory_graph.G.nodes[topic].get('memory_items', [])
-        if not isinstance(memory_items, list):
-            memory_items = [memory_items] if memory_items else []
+        memory_items = self.memory_graph.get_memory_items(topic)
             
         # 如果记忆项不足，直接返回
         if len(memory_items) < 10:
             return
             
-        # 随机选择10条记忆
-        selected_memories = random.sample(memory_items, 10)
+        # 记忆按创建时间排列，合并最早的若干条：至少10条，尽量让节点回到合并阈值以下，
+        # 一次最多50条以控制提示词长度，仍超过阈值的节点会重新进入合并队列
+        merge_count = 10
+        if self.memory_graph.merge_threshold is not None:
+            merge_count = min(50, max(merge_count, len(memory_items) - self.memory_graph.merge_threshold + 10))
+        selected_memories = memory_items[:merge_count]
         
         # 拼接成文本
         merged_text = "\n".join(selected_memories)
@@ -442,9 +883,15 @@ class Hippocampus:
         # 使用memory_compress生成新的压缩记忆
         compressed_memories = await self.memory_compress(merged_text, 0.1)
         
+        # 压缩期间节点可能有了新的记忆或已被遗忘，在当前的记忆列表上应用这次合并
+        if topic not in self.memory_graph:
+            return
+        memory_items = self.memory_graph.get_memory_items(topic)
+        
         # 从原记忆列表中移除被选中的记忆
         for memory in selected_memories:
-            memory_items.remove(memory)
+            if memory in memory_items:
+                memory_items.remove(memory)
             
         # 添加新的压缩记忆
         for _, compressed_memory in compressed_memories:
@@ -452,43 +899,49 @@ class Hippocampus:
             print(f"添加压缩记忆: {compressed_memory}")
             
         # 更新节点的记忆项
-        self.memory_graph.G.nodes[topic]['memory_items'] = memory_items
+        self.memory_graph.set_memory_items(topic, memory_items)
+        self.memory_graph.publish()
         print(f"完成记忆合并，当前记忆数量: {len(memory_items)}")
         
-    async def operation_merge_memory(self, percentage=0.1):
+    async def operation_merge_memory(self, max_nodes: int = None):
         """
-        随机检查一定比例的节点，对内容数量超过100的节点进行记忆合并
+        从合并队列中取出记忆条数达到合并阈值的节点进行记忆合并，同时合并的节点数有上限
         
         Args:
-            percentage: 要检查的节点比例，默认为0.1（10%）
+            max_nodes: 本次最多处理的节点数，默认使用配置中的 merge_batch_size
         """
-        # 获取所有节点
-        all_nodes = list(self.memory_graph.G.nodes())
-        # 计算要检查的节点数量
-        check_count = max(1, int(len(all_nodes) * percentage))
-        # 随机选择节点
-        nodes_to_check = random.sample(all_nodes, check_count)
-        
-        merged_nodes = []
-        for node in nodes_to_check:
-            # 获取节点的内容条数
-            memory_items = self.memory_graph.G.nodes[node].get('memory_items', [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-            content_count = len(memory_items)
-            
-            # 如果内容数量超过100，进行合并
-            if content_count > 100:
-                print(f"\n检查节点: {node}, 当前记忆数量: {content_count}")
-                await self.merge_memory(node)
-                merged_nodes.append(node)
+        graph = self.memory_graph
+        if max_nodes is None:
+            max_nodes = global_config.memory_merge_batch_size
+        # 入队之后节点可能已被遗忘或合并过
+        nodes = [
+            node for node in graph.merge_queue.pop(max_nodes)
+            if node in graph and graph.merge_threshold is not None and graph.memory_count(node) >= graph.merge_threshold
+        ]
+        if not nodes:
+            print("\n本次检查没有需要合并的节点")
+            return
+        
+        semaphore = asyncio.Semaphore(max(1, global_config.memory_merge_concurrency))
+        
+        async def merge(node):
+            async with semaphore:
+                print(f"\n检查节点: {node}, 当前记忆数量: {graph.memory_count(node)}")
+                try:
+                    await self.merge_memory(node)
+                except Exception as e:
+                    print(f"\033[1;31m[错误]\033[0m 合并节点「{node}」的记忆失败: {e}")
+                    # 放回队列，下次再试
+                    if node in graph:
+                        graph.merge_queue.push(node)
+                    
+        await asyncio.gather(*(merge(node) for node in nodes))
         
         # 同步到数据库
-        if merged_nodes:
-            self.sync_memory_to_db()
-            print(f"\n完成记忆合并操作，共处理 {len(merged_nodes)} 个节点")
-        else:
-            print("\n本次检查没有需要合并的节点")
+        self.sync_memory_to_db()
+        capacity = graph.capacity_stats
+        print(f"\n完成记忆合并操作，共处理 {len(nodes)} 个节点，队列中还有 {len(graph.merge_queue)} 个"
+              f" (队列已满时未入队 {graph.merge_queue.dropped} 次，容量上限处抽样替换 {capacity['replaced']} 条、舍弃 {capacity['sampled_out']} 条记忆)")
 
     def find_topic_llm(self,text, topic_num):
         prompt = f'这是一段文字：{text}。请你从这段话中总结出{topic_num}个关键的概念，可以是名词，动词，或者特定人物，帮我列出来，用逗号,隔开，尽可能精简。只需要列举{topic_num}个话题就好，不要有序号，不要告诉我其他内容。'
@@ -498,68 +951,114 @@ class Hippocampus:
         prompt = f'这是一段文字：{text}。我想让你基于这段文字来概括"{topic}"这个概念，帮我总结成一句自然的话，可以包含时间和人物，以及具体的观点。只输出这句话就好'
         return prompt
 
+    def topics_what(self, text, topics):
+        topic_list = "、".join(f'"{topic}"' for topic in topics)
+        prompt = f'这是一段文字：{text}。我想让你基于这段文字分别概括{topic_list}这几个概念，每个概念总结成一句自然的话，可以包含时间和人物，以及具体的观点。请只输出一个JSON对象，键是概念原文，值是对应的那句话，不要输出其他内容。'
+        return prompt
+
+    @staticmethod
+    def _normalize_topic_text(text: str) -> str:
+        """归一化文本，作为主题缓存的键"""
+        return " ".join(text.split())
+
     async def _identify_topics(self, text: str) -> list:
         """从文本中识别可能的主题
         
+        同一文本的识别结果会被缓存，正在进行中的识别请求也会被复用，
+        保证一条消息只调用一次主题识别模型
+        
         Args:
             text: 输入文本
             
         Returns:
             list: 识别出的主题列表
         """
+        key = self._normalize_topic_text(text)
+        topics = self.topic_cache.get(key)
+        if topics is not None:
+            return list(topics)
+        
+        pending = self._pending_topic_tasks.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._request_topics(key, text))
+            self._pending_topic_tasks[key] = pending
+            pending.add_done_callback(lambda _: self._pending_topic_tasks.pop(key, None))
+        topics = await asyncio.shield(pending)
+        return list(topics)
+
+    async def _request_topics(self, key: str, text: str) -> tuple:
+        """调用模型识别主题，并写入主题缓存"""
         topics_response = await self.llm_topic_judge.generate_response(self.find_topic_llm(text, 5))
         # print(f"话题: {topics_response[0]}")
-        topics = [topic.strip() for topic in topics_response[0].replace("，", ",").replace("、", ",").replace(" ", ",").split(",") if topic.strip()]
+        topics = tuple(topic.strip() for topic in topics_response[0].replace("，", ",").replace("、", ",").replace(" ", ",").split(",") if topic.strip())
         # print(f"话题: {topics}")
-                    
+        self.topic_cache.set(key, topics)
         return topics
         
-    def _find_similar_topics(self, topics: list, similarity_threshold: float = 0.4, debug_info: str = "") -> list:
+    def _find_similar_topics(self, topics: list, similarity_threshold: float = 0.4, debug_info: str = "", snapshot: GraphSnapshot = None) -> list:
         """查找与给定主题相似的记忆主题
         
         Args:
             topics: 主题列表
             similarity_threshold: 相似度阈值
             debug_info: 调试信息前缀
+            snapshot: 读取的图版本，默认为最新发布的版本
             
         Returns:
             list: (主题, 相似度) 元组列表
         """
-        all_memory_topics = self.get_all_node_names()
+        snapshot = snapshot or self.memory_graph.snapshot()
         all_similar_topics = []
         
-        # 计算每个识别出的主题与记忆主题的相似度
+        # 计算每个识别出的主题与记忆主题的相似度，只对倒排索引命中的候选节点打分
         for topic in topics:
             if debug_info:
                 # print(f"\033[1;32m[{debug_info}]\033[0m 正在思考有没有见过: {topic}")
                 pass
                 
-            topic_vector = text_to_vector(topic)
-            has_similar_topic = False
+            similar_topics = snapshot.query_topics(topic, similarity_threshold)
             
-            for memory_topic in all_memory_topics:
-                memory_vector = text_to_vector(memory_topic)
-                # 获取所有唯一词
-                all_words = set(topic_vector.keys()) | set(memory_vector.keys())
-                # 构建向量
-                v1 = [topic_vector.get(word, 0) for word in all_words]
-                v2 = [memory_vector.get(word, 0) for word in all_words]
-                # 计算相似度
-                similarity = cosine_similarity(v1, v2)
-                
-                if similarity >= similarity_threshold:
-                    has_similar_topic = True
-                    if debug_info:
-                        # print(f"\033[1;32m[{debug_info}]\033[0m 找到相似主题: {topic} -> {memory_topic} (相似度: {similarity:.2f})")
-                        pass
-                    all_similar_topics.append((memory_topic, similarity))
+            for memory_topic, similarity in similar_topics:
+                if debug_info:
+                    # print(f"\033[1;32m[{debug_info}]\033[0m 找到相似主题: {topic} -> {memory_topic} (相似度: {similarity:.2f})")
+                    pass
+                all_similar_topics.append((memory_topic, similarity))
                     
-            if not has_similar_topic and debug_info:
+            if not similar_topics and debug_info:
                 # print(f"\033[1;31m[{debug_info}]\033[0m 没有见过: {topic}  ，呃呃")
                 pass
                 
         return all_similar_topics
         
+    async def _match_topics(self, snapshot: GraphSnapshot, topics: list, similarity_threshold: float = 0.4) -> dict:
+        """为每个识别出的主题查找相似的记忆主题
+        
+        启用语义匹配时使用embedding向量索引，否则（或embedding获取失败时）使用词频倒排索引
+        
+        Args:
+            snapshot: 读取的图版本，只返回这个版本中存在的主题
+            topics: 主题列表
+            similarity_threshold: 词频匹配的相似度阈值
+            
+        Returns:
+            dict: 主题 -> (记忆主题, 相似度) 元组列表
+        """
+        vectors = [None] * len(topics)
+        if self.embedding_index is not None and len(self.embedding_index) > 0:
+            vectors = await asyncio.gather(*(self._get_topic_embedding(topic) for topic in topics))
+            
+        topic_matches = {}
+        for topic, vector in zip(topics, vectors):
+            if vector is not None:
+                topic_matches[topic] = snapshot.query_embeddings(
+                    vector,
+                    top_k=global_config.memory_semantic_top_k,
+                    similarity_threshold=global_config.memory_semantic_threshold
+                )
+            else:
+                topic_matches[topic] = self._find_similar_topics([topic], similarity_threshold, snapshot=snapshot)
+        return topic_matches
+        
     def _get_top_topics(self, similar_topics: list, max_topics: int = 5) -> list:
         """获取相似度最高的主题
         
@@ -580,21 +1079,37 @@ class Hippocampus:
                 
         return top_topics
 
+    def retrieval_stats(self) -> dict:
+        return self.retrieval_cache.stats()
+
+    def _format_retrieval_stats(self) -> str:
+        stats = self.retrieval_stats()
+        return f"检索缓存 命中率: {stats['hit_rate']:.1%} ({stats['hits']}/{stats['hits'] + stats['misses']}), 累计节省 {stats['saved_time']:.2f} 秒"
+
     async def memory_activate_value(self, text: str, max_topics: int = 5, similarity_threshold: float = 0.3) -> int:
         """计算输入文本对记忆的激活程度"""
-        print(f"\033[1;32m[记忆激活]\033[0m 识别主题: {await self._identify_topics(text)}")
-        
         # 识别主题
         identified_topics = await self._identify_topics(text)
+        cache_stats = self.topic_cache.stats()
+        print(f"\033[1;32m[记忆激活]\033[0m 识别主题: {identified_topics} (主题缓存 命中: {cache_stats['hits']}, 未命中: {cache_stats['misses']})")
         if not identified_topics:
             return 0
-            
-        # 查找相似主题
-        all_similar_topics = self._find_similar_topics(
-            identified_topics, 
-            similarity_threshold=similarity_threshold,
-            debug_info="记忆激活"
+        
+        # 整个计算过程读取同一个版本，期间的记忆构建不会影响结果
+        snapshot = self.memory_graph.snapshot()
+        key = self.retrieval_cache.key(snapshot, 'activate', identified_topics, max_topics, similarity_threshold)
+        activation, hit = await self.retrieval_cache.get_or_compute(
+            key, lambda: self._compute_activation(snapshot, identified_topics, max_topics, similarity_threshold)
         )
+        if hit:
+            print(f"\033[1;32m[记忆激活]\033[0m 使用缓存的激活值: {activation} ({self._format_retrieval_stats()})")
+        return activation
+
+    async def _compute_activation(self, snapshot: GraphSnapshot, identified_topics: list, max_topics: int, similarity_threshold: float) -> int:
+        """根据识别出的主题计算激活值"""
+        # 查找相似主题
+        topic_matches = await self._match_topics(snapshot, identified_topics, similarity_threshold)
+        all_similar_topics = [match for matches in topic_matches.values() for match in matches]
         
         if not all_similar_topics:
             return 0
@@ -606,10 +1121,7 @@ class Hippocampus:
         if len(top_topics) == 1:
             topic, score = top_topics[0]
             # 获取主题内容数量并计算惩罚系数
-            memory_items = self.memory_graph.G.nodes[topic].get('memory_items', [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-            content_count = len(memory_items)
+            content_count = snapshot.memory_count(topic)
             penalty = 1.0 / (1 + math.log(content_count + 1))
             
             activation = int(score * 50 * penalty)
@@ -619,24 +1131,17 @@ class Hippocampus:
         # 计算关键词匹配率，同时考虑内容数量
         matched_topics = set()
         topic_similarities = {}
+        match_maps = {topic: dict(matches) for topic, matches in topic_matches.items()}
         
         for memory_topic, similarity in top_topics:
             # 计算内容数量惩罚
-            memory_items = self.memory_graph.G.nodes[memory_topic].get('memory_items', [])
-            if not isinstance(memory_items, list):
-                memory_items = [memory_items] if memory_items else []
-            content_count = len(memory_items)
+            content_count = snapshot.memory_count(memory_topic)
             penalty = 1.0 / (1 + math.log(content_count + 1))
             
             # 对每个记忆主题，检查它与哪些输入主题相似
             for input_topic in identified_topics:
-                topic_vector = text_to_vector(input_topic)
-                memory_vector = text_to_vector(memory_topic)
-                all_words = set(topic_vector.keys()) | set(memory_vector.keys())
-                v1 = [topic_vector.get(word, 0) for word in all_words]
-                v2 = [memory_vector.get(word, 0) for word in all_words]
-                sim = cosine_similarity(v1, v2)
-                if sim >= similarity_threshold:
+                sim = match_maps[input_topic].get(memory_topic)
+                if sim is not None:
                     matched_topics.add(input_topic)
                     adjusted_sim = sim * penalty
                     topic_similarities[input_topic] = max(topic_similarities.get(input_topic, 0), adjusted_sim)
@@ -652,26 +1157,93 @@ class Hippocampus:
         
         return activation
 
+    async def _collect_relevant_topics(self, snapshot: GraphSnapshot, identified_topics: list, max_topics: int, similarity_threshold: float) -> list:
+        """查找最相关的记忆主题及其第一层记忆
+        
+        Returns:
+            list: (主题, 相似度, 记忆列表, 记忆创建时间) 元组列表
+        """
+        # 查找相似主题
+        topic_matches = await self._match_topics(snapshot, identified_topics, similarity_threshold)
+        all_similar_topics = [match for matches in topic_matches.values() for match in matches]
+        
+        # 获取最相关的主题
+        relevant_topics = self._get_top_topics(all_similar_topics, max_topics)
+        # 尚未加载的记忆在线程池中一次读取，不在事件循环中逐个查询数据库
+        await asyncio.get_running_loop().run_in_executor(None, snapshot.preload_items, [topic for topic, _ in relevant_topics])
+        result = []
+        for topic, score in relevant_topics:
+            first_layer, _ = snapshot.get_related_item(topic, depth=1)
+            result.append((topic, score, first_layer, snapshot.get_item_meta(topic)['created']))
+        return result
+
+    async def _collect_spread_topics(self, snapshot: GraphSnapshot, identified_topics: list, max_topics: int, similarity_threshold: float) -> list:
+        """从匹配到的主题出发沿连接扩散激活，收集被激活的主题及其记忆
+        
+        Returns:
+            list: (主题, 激活值, 记忆列表, 记忆创建时间) 元组列表，按激活值从高到低排列
+        """
+        topic_matches = await self._match_topics(snapshot, identified_topics, similarity_threshold)
+        all_similar_topics = [match for matches in topic_matches.values() for match in matches]
+        seeds = dict(self._get_top_topics(all_similar_topics, max_topics))
+        if not seeds:
+            return []
+        
+        activated, stats = spread_activation(
+            snapshot,
+            seeds,
+            decay=global_config.memory_spread_decay,
+            max_hops=global_config.memory_spread_max_hops,
+            max_nodes=global_config.memory_spread_max_nodes,
+            min_activation=global_config.memory_spread_min_activation,
+            time_budget=global_config.memory_spread_time_budget_ms / 1000,
+        )
+        await asyncio.get_running_loop().run_in_executor(None, snapshot.preload_items, [topic for topic, _, _ in activated])
+        print(f"\033[1;32m[记忆检索]\033[0m 扩散激活: 种子 {len(seeds)} 个，激活 {stats['nodes']} 个主题，扫描 {stats['edges_scanned']} 条连接，耗时 {stats['elapsed'] * 1000:.1f} ms{'（超出时间预算，提前结束）' if stats['truncated'] else ''}")
+        return [
+            (topic, activation, snapshot.get_memory_items(topic), snapshot.get_item_meta(topic)['created'])
+            for topic, activation, _ in activated
+        ]
+
     async def get_relevant_memories(self, text: str, max_topics: int = 5, similarity_threshold: float = 0.4, max_memory_num: int = 5) -> list:
-        """根据输入文本获取相关的记忆内容"""
+        """根据输入文本获取相关的记忆内容
+        
+        retrieval_mode 为 spreading 时记忆也来自与匹配主题相连的主题，按激活值取最高的几条；
+        recency_weight 大于 0 时每条记忆的得分按创建时间加权，取得分最高的几条而不是随机抽取
+        """
         # 识别主题
         identified_topics = await self._identify_topics(text)
         
-        # 查找相似主题
-        all_similar_topics = self._find_similar_topics(
-            identified_topics, 
-            similarity_threshold=similarity_threshold,
-            debug_info="记忆检索"
+        # 相关主题和记忆按图版本缓存，随机抽取每次重新进行
+        spreading = global_config.memory_retrieval_mode == "spreading"
+        snapshot = self.memory_graph.snapshot()
+        if spreading:
+            key = self.retrieval_cache.key(snapshot, 'spread', identified_topics, max_topics, similarity_threshold)
+            collect = self._collect_spread_topics
+        else:
+            key = self.retrieval_cache.key(snapshot, 'relevant', identified_topics, max_topics, similarity_threshold)
+            collect = self._collect_relevant_topics
+        relevant_topics, hit = await self.retrieval_cache.get_or_compute(
+            key, lambda: collect(snapshot, identified_topics, max_topics, similarity_threshold)
         )
+        print(f"\033[1;32m[记忆检索]\033[0m {'命中' if hit else '未命中'}缓存，相关主题 {len(relevant_topics)} 个 ({self._format_retrieval_stats()})")
         
-        # 获取最相关的主题
-        relevant_topics = self._get_top_topics(all_similar_topics, max_topics)
+        recency_weight = global_config.memory_recency_weight
+        if recency_weight > 0:
+            relevant_memories = self._select_recent_memories(relevant_topics, max_memory_num, recency_weight)
+            for topic in {memory['topic'] for memory in relevant_memories}:
+                self.memory_graph.touch_items(topic, [memory['content'] for memory in relevant_memories if memory['topic'] == topic])
+            return relevant_memories
+        
+        if spreading:
+            relevant_memories = select_activated_memories(relevant_topics, max_memory_num)
+            for topic in {memory['topic'] for memory in relevant_memories}:
+                self.memory_graph.touch_items(topic, [memory['content'] for memory in relevant_memories if memory['topic'] == topic])
+            return relevant_memories
         
         # 获取相关记忆内容
         relevant_memories = []
-        for topic, score in relevant_topics:
-            # 获取该主题的记忆内容
-            first_layer, _ = self.memory_graph.get_related_item(topic, depth=1)
+        for topic, score, first_layer, _ in relevant_topics:
             if first_layer:
                 # 如果记忆条数超过限制，随机选择指定数量的记忆
                 if len(first_layer) > max_memory_num/2:
@@ -691,8 +1263,29 @@ class Hippocampus:
         if len(relevant_memories) > max_memory_num:
             relevant_memories = random.sample(relevant_memories, max_memory_num)
         
+        for topic in {memory['topic'] for memory in relevant_memories}:
+            self.memory_graph.touch_items(topic, [memory['content'] for memory in relevant_memories if memory['topic'] == topic])
         return relevant_memories
 
+    def _select_recent_memories(self, relevant_topics: list, max_memory_num: int, recency_weight: float) -> list:
+        """按 相似度 × ((1 - w) + w × 新近程度) 选出得分最高的记忆，每个主题最多 max_memory_num // 2 条"""
+        now = time.time()
+        half_life = global_config.memory_recency_half_life * 3600
+        per_topic = max(1, max_memory_num // 2)
+        candidates = []
+        for topic, score, memories, created in relevant_topics:
+            if not memories:
+                continue
+            scores = score * ((1 - recency_weight) + recency_weight * recency_scores(created, now, half_life))
+            for index in np.argsort(-scores, kind='stable')[:per_topic]:
+                candidates.append({
+                    'topic': topic,
+                    'similarity': float(scores[index]),
+                    'content': memories[index]
+                })
+        candidates.sort(key=lambda x: x['similarity'], reverse=True)
+        return candidates[:max_memory_num]
+
 
 def segment_text(text):
     seg_text = list(jieba.cut(text))
@@ -714,12 +1307,54 @@ Database.initialize(
     password= config.MONGODB_PASSWORD,
     auth_source=config.MONGODB_AUTH_SOURCE
 )
+def _create_memory_graph() -> Memory_graph:
+    return Memory_graph(
+        global_config.memory_graph_backend,
+        global_config.memory_strength_half_life * 3600,
+        dedup_distance=global_config.memory_dedup_distance if global_config.memory_dedup_distance >= 0 else None,
+        node_capacity=global_config.memory_node_capacity if global_config.memory_node_capacity > 0 else None,
+        merge_threshold=global_config.memory_merge_threshold if global_config.memory_merge_threshold > 0 else None,
+        merge_queue_size=global_config.memory_merge_queue_size
+    )
+
+
 #创建记忆图
-memory_graph = Memory_graph()
-#创建海马体
-hippocampus = Hippocampus(memory_graph)
+memory_graph = _create_memory_graph()
+#创建海马体，独立的记忆维护进程使用自己的本地快照目录，基准测试等工具可以用环境变量指定临时目录
+IS_MEMORY_WORKER = os.getenv("MAIMBOT_MEMORY_WORKER") == "1"
+CHECKPOINT_ROOT = os.getenv("MAIMBOT_MEMORY_CHECKPOINT_DIR") or os.path.join(ROOT_PATH, 'data', 'memory_worker' if IS_MEMORY_WORKER else 'memory_graph')
+hippocampus = Hippocampus(memory_graph, checkpoint_dir=CHECKPOINT_ROOT)
 #从数据库加载记忆图
 hippocampus.sync_memory_from_db()
 
+
+def _create_partition(key: str) -> Hippocampus:
+    """创建群记忆分区，数据库集合和本地快照按分区名隔离"""
+    return Hippocampus(
+        _create_memory_graph(),
+        checkpoint_dir=os.path.join(CHECKPOINT_ROOT, 'partitions', key),
+        namespace=f'memory_{key}',
+        shared=hippocampus
+    )
+
+
+def _stored_partition_keys() -> list:
+    """数据库中已有的群分区"""
+    names = Database.get_instance().db.list_collection_names()
+    return sorted(name[len('memory_'):-len('.nodes')] for name in names if name.startswith('memory_group_') and name.endswith('.nodes'))
+
+
+#按群划分的记忆分区，默认只有全局分区
+memory_partitions = MemoryPartitions(
+    hippocampus,
+    _create_partition,
+    list_keys=_stored_partition_keys,
+    mode=global_config.memory_partition_mode,
+    include_global=global_config.memory_partition_include_global,
+    ranked=global_config.memory_retrieval_mode == "spreading" or global_config.memory_recency_weight > 0,
+    budget_bytes=int(global_config.memory_partition_budget_mb * 1024 * 1024),
+    embed_on_load=IS_MEMORY_WORKER or global_config.memory_maintenance != "worker"
+)
+
 end_time = time.time()
 print(f"\033[32m[加载海马体耗时: {end_time - start_time:.2f} 秒]\033[0m")
\ No newline at end of file
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """带过期时间的LRU缓存，记录命中与未命中次数"""
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int = 256, ttl: float = 60):
+        """
+        Args:
+            max_size: 最大缓存条目数
+            ttl: 条目存活时间（秒），小于等于0表示不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (写入时间, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, self._MISSING)
+        if entry is self._MISSING:
+            self.misses += 1
+            return default
+        stored_at, value = entry
+        if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class RetrievalCache:
+    """主题集合 -> 检索结果的缓存
+
+    键中带有读取的图版本和向量索引版本，图被修改并发布后旧版本的结果不会再被命中，
+    无需主动清理，过期的条目由 LRU 淘汰。命中时累计当初计算该结果的耗时，作为节省的时间。
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 600):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.saved_time = 0.0
+
+    @staticmethod
+    def key(snapshot, kind: str, topics: list, *params) -> tuple:
+        """检索缓存的键：主题集合、检索参数以及读取的图版本和向量索引的版本"""
+        return (kind, frozenset(topics), params, snapshot.version, snapshot.embedding_version)
+
+    async def get_or_compute(self, key: tuple, compute):
+        """查询缓存，未命中时执行 compute 并记录耗时
+
+        Returns:
+            tuple: (结果, 是否命中)
+        """
+        cached = self.cache.get(key, LRUCache._MISSING)
+        if cached is not LRUCache._MISSING:
+            result, cost = cached
+            self.saved_time += cost
+            return result, True
+        start_time = time.perf_counter()
+        result = await compute()
+        self.cache.set(key, (result, time.perf_counter() - start_time))
+        return result, False
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats['saved_time'] = self.saved_time
+        return stats
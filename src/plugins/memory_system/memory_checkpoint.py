@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import struct
+
+from .item_meta import apply_item_ops, decode_meta, encode_meta, new_meta
+
+_CHECKPOINT_MAGIC = b"MMCK"
+_JOURNAL_MAGIC = b"MMJL"
+_FORMAT_VERSION = 4  # 2: 节点和边带有强化时间 3: 记忆带有元数据 4: 日志只记录逐条的记忆变更
+_HEADER = struct.Struct("<4sHq")  # 魔数, 格式版本, 图版本
+_FRAME = struct.Struct("<I")  # 日志记录长度
+
+
+class MemoryCheckpoint:
+    """记忆图的本地快照与变更日志
+
+    快照文件保存某个图版本下的全部节点（含 memory_items 及其元数据）和边的强度，以及它们的强化时间，
+    日志文件按顺序追加此后每次同步到数据库的变更，节点的记忆只记录逐条的增删。
+    启动时读取快照并重放日志即可恢复记忆图，无需逐条从 MongoDB 读取。
+    """
+
+    def __init__(self, directory: str, compact_threshold: int = 2000):
+        """
+        Args:
+            directory: 快照与日志所在目录
+            compact_threshold: 日志记录数超过该值时建议重新生成快照
+        """
+        self.directory = directory
+        self.compact_threshold = compact_threshold
+        self.checkpoint_path = os.path.join(directory, "memory_graph.ckpt")
+        self.journal_path = os.path.join(directory, "memory_graph.journal")
+        self.journal_entries = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.journal_entries >= self.compact_threshold
+
+    def write_checkpoint(self, version: int, nodes: dict, edges: dict, node_times: dict = None, edge_times: dict = None,
+                         item_meta: dict = None):
+        """写入完整快照并清空日志
+
+        Args:
+            version: 快照对应的图版本
+            nodes: 概念 -> memory_items 列表，记忆尚未从数据库加载的节点为 None
+            edges: (source, target) -> strength
+            node_times: 概念 -> 强化时间
+            edge_times: (source, target) -> 强化时间
+            item_meta: 概念 -> 编码后的记忆元数据，记忆尚未加载的节点为记忆条数
+        """
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_CHECKPOINT_MAGIC, _FORMAT_VERSION, version))
+            pickle.dump((nodes, edges, node_times or {}, edge_times or {}, item_meta or {}), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+        # 快照已包含之前的所有变更，日志从该版本重新开始
+        with open(self.journal_path, "wb") as f:
+            f.write(_HEADER.pack(_JOURNAL_MAGIC, _FORMAT_VERSION, version))
+        self.journal_entries = 0
+
+    def append(self, version: int, node_changes: list, node_deletes: list, edge_upserts: list, edge_deletes: list):
+        """向日志追加一次同步的变更
+
+        Args:
+            version: 本次变更后的图版本
+            node_changes: (概念, 强化时间, 记忆条数, 是否先清空记忆, 逐条的记忆变更) 列表
+            node_deletes: 被删除的概念列表
+            edge_upserts: (source, target, strength, 强化时间) 列表
+            edge_deletes: 被删除的 (source, target) 列表
+        """
+        if not os.path.exists(self.journal_path):
+            # 没有对应的快照，日志无从重放
+            return
+        payload = pickle.dumps(
+            (version, node_changes, node_deletes, edge_upserts, edge_deletes),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        with open(self.journal_path, "ab") as f:
+            f.write(_FRAME.pack(len(payload)))
+            f.write(payload)
+        self.journal_entries += 1
+
+    def load(self):
+        """读取快照并重放日志
+
+        Returns:
+            tuple: (图版本, 节点字典, 边字典, 节点强化时间, 边强化时间, 记忆元数据)，快照不存在或损坏时返回 None
+        """
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                magic, fmt, version = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _CHECKPOINT_MAGIC or fmt != _FORMAT_VERSION:
+                    return None
+                nodes, edges, node_times, edge_times, item_meta = pickle.load(f)
+        except (OSError, EOFError, struct.error, pickle.UnpicklingError):
+            return None
+
+        self.journal_entries = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                magic, fmt, base_version = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _JOURNAL_MAGIC or fmt != _FORMAT_VERSION or base_version != version:
+                    return None
+                while True:
+                    frame = f.read(_FRAME.size)
+                    if len(frame) < _FRAME.size:
+                        break
+                    (length,) = _FRAME.unpack(frame)
+                    payload = f.read(length)
+                    if len(payload) < length:
+                        # 进程在写日志时退出，丢弃不完整的尾部记录
+                        break
+                    version, node_changes, node_deletes, edge_upserts, edge_deletes = pickle.loads(payload)
+                    self._apply(nodes, edges, node_times, edge_times, item_meta, node_changes, node_deletes, edge_upserts, edge_deletes)
+                    self.journal_entries += 1
+        except (OSError, struct.error, pickle.UnpicklingError):
+            return None
+
+        return version, nodes, edges, node_times, edge_times, item_meta
+
+    @staticmethod
+    def _apply(nodes, edges, node_times, edge_times, item_meta, node_changes, node_deletes, edge_upserts, edge_deletes):
+        for concept, reinforced_at, count, reset, ops in node_changes:
+            memory_items = nodes.get(concept)
+            if concept in nodes and memory_items is None and not reset:
+                # 记忆尚未加载的节点只记录条数
+                item_meta[concept] = count
+            elif reset or ops or concept not in nodes:
+                if reset or memory_items is None:
+                    memory_items, meta = [], new_meta(0, reinforced_at)
+                else:
+                    meta, _ = decode_meta(item_meta.get(concept), len(memory_items), node_times.get(concept, reinforced_at))
+                memory_items, meta = apply_item_ops(memory_items, meta, ops)
+                nodes[concept] = memory_items
+                item_meta[concept] = encode_meta(meta)
+            node_times[concept] = reinforced_at
+        for concept in node_deletes:
+            nodes.pop(concept, None)
+            node_times.pop(concept, None)
+            item_meta.pop(concept, None)
+        for source, target, strength, reinforced_at in edge_upserts:
+            edges[(source, target)] = strength
+            edge_times[(source, target)] = reinforced_at
+        for source, target in edge_deletes:
+            edges.pop((source, target), None)
+            edge_times.pop((source, target), None)
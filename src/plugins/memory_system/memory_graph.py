@@ -0,0 +1,884 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+from collections import Counter
+
+import numpy as np
+
+from ...common.database import Database
+from .forget_queue import ForgetQueue
+from .graph_store import create_graph_store
+from .item_meta import (
+    apply_item_ops,
+    decode_meta,
+    group_code,
+    new_meta,
+    older_than_slice,
+    realign_meta,
+    recent_slice,
+)
+from .merge_queue import MergeQueue
+from .simhash import find_near_duplicate, simhash
+from .snapshot import GraphSnapshot, NodeView
+from .topic_index import TopicIndex
+
+
+class Memory_graph:
+    def __init__(self, backend: str = "networkx", half_life: float = 7 * 24 * 3600, dedup_distance: int = None,
+                 node_capacity: int = None, merge_threshold: int = None, merge_queue_size: int = 1000):
+        """
+        Args:
+            backend: 图存储后端，"networkx" 或 "compact"（数组化存储，适合大规模记忆图）
+            half_life: 节点和边的强度衰减一半所需的秒数
+            dedup_distance: 新记忆与节点已有记忆的 SimHash 距离不超过该值时视为重复，None 表示不去重
+            node_capacity: 每个节点最多保存的记忆条数，None 表示不限制
+            merge_threshold: 节点的记忆条数达到该值时进入合并队列，None 表示不自动合并
+            merge_queue_size: 合并队列最多容纳的节点数
+        """
+        self.backend = backend
+        self.store = create_graph_store(backend)
+        # 按衰减后强度排序的遗忘候选
+        self.forget_queue = ForgetQueue(half_life)
+        self.topic_index = TopicIndex()  # 节点名的倒排索引，用于主题匹配
+        self.embedding_index = None  # 启用语义匹配时由海马体设置
+        
+        # 每次修改图都会递增，检索缓存以它判断结果是否过期
+        self.version = 0
+        
+        # 近似重复记忆的检测：概念 -> 与 memory_items 一一对应的指纹，在第一次需要时计算
+        self.dedup_distance = dedup_distance
+        self._fingerprints = {}
+        self.dedup_stats = {'rejected': 0, 'replaced': 0, 'bytes_saved': 0}
+        
+        # 节点容量：记忆条数达到合并阈值时排队等待合并；合并跟不上、达到容量上限时，
+        # 按水库抽样保留该节点收到过的所有记忆的均匀样本
+        self.node_capacity = node_capacity
+        self.merge_threshold = merge_threshold
+        self.merge_queue = MergeQueue(merge_queue_size)
+        self._items_seen = {}  # 达到容量上限的节点 -> 它收到过的记忆总数
+        self.capacity_stats = {'sampled_out': 0, 'replaced': 0}
+        
+        # 概念 -> 与 memory_items 一一对应的元数据（创建时间、最近使用时间、来源群），按创建时间排列
+        self.item_meta = {}
+        self.legacy_meta = set()  # 元数据是加载时补全的节点，尚未写回数据库
+
+        # 按需加载：记忆尚未从数据库读取的节点 -> 记忆条数，由 item_loader 批量读取
+        self.item_loader = None
+        self._lazy_counts = {}
+        # 数据库中仍以数组保存全部记忆的节点，记忆按条存储时下次写入需要整体迁移
+        self.legacy_layout = set()
+
+        # 自上次同步数据库以来发生变化的节点和边
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.dirty_edges = set()
+        self.deleted_edges = set()
+        # 逐条的记忆变更，记忆按条存储时只写入变化的记忆：
+        # 概念 -> {'reset': 是否先删除该概念已保存的全部记忆, 'ops': 按发生顺序的 ('add', 记忆, 元数据) / ('remove', 创建时间, 记忆)}
+        self.item_changes = {}
+        self.accessed_updates = {}  # (概念, 创建时间, 记忆) -> 最近使用时间
+
+        # 读者使用的最新已发布版本，修改在 publish 之后才对读者可见
+        self._snapshot = GraphSnapshot(self, self.version)
+        
+    @property
+    def db(self):
+        return Database.get_instance()
+        
+    @property
+    def G(self):
+        """networkx 形式的只读图，仅用于可视化等离线场景
+        
+        compact 后端下是导出的副本，networkx 后端下是存储的只读视图；绕过记忆图直接修改会漏掉索引和变更记录，
+        因此增删节点或边时抛出 NetworkXError，修改请使用 add_dot / connect_dot / remove_dot 等方法
+        """
+        return self.store.to_networkx().copy(as_view=True)
+        
+    def snapshot(self) -> GraphSnapshot:
+        """最新发布的只读版本，读者在一次检索中只使用它，不会看到写入者修改到一半的图"""
+        return self._snapshot
+        
+    def publish(self) -> GraphSnapshot:
+        """把目前为止的修改发布为新版本：创建新快照并替换指针，已拿到旧快照的读者不受影响"""
+        current = self._snapshot
+        if current.version == self.version:
+            return current
+        snapshot = GraphSnapshot(self, self.version)
+        current._newer = snapshot
+        self._snapshot = snapshot
+        return snapshot
+        
+    def _preserve(self, *concepts):
+        """修改节点之前，把它在最新发布版本中的状态保存到该版本的快照里（每个版本只保存一次）
+        
+        记忆尚未加载的节点只保存强化时间、连接和记忆条数，不会为了只改连接或强化时间去读取数据库；
+        修改记忆的操作会先加载节点，这里再补存修改前的记忆
+        """
+        saved = self._snapshot._saved
+        for concept in concepts:
+            if concept not in saved:
+                saved[concept] = self._node_view(concept)
+                continue
+            view = saved[concept]
+            if view is not None and view.items is None and concept not in self._lazy_counts and concept in self.store:
+                # 保存之后节点才被加载，记忆在此期间没有变过
+                saved[concept] = NodeView(
+                    tuple(self.store.get_items(concept)), self.get_item_meta(concept).copy(),
+                    view.reinforced_at, view.neighbors,
+                )
+                
+    def _remove_embedding(self, concept):
+        """从向量索引中删除概念，向量保存到最新发布的快照中，旧版本的读者仍能匹配到它"""
+        if self.embedding_index is None:
+            return
+        vector = self.embedding_index.get(concept)
+        if vector is not None:
+            # 索引删除时会用最后一行覆盖这一行，需要复制
+            self._snapshot._vectors.setdefault(concept, vector.copy())
+        self.embedding_index.remove(concept)
+        
+    def set_embedding_index(self, index):
+        """设置或替换向量索引，已发布的快照继续使用原来的索引"""
+        self.embedding_index = index
+        self._snapshot._embedding_index = index
+        
+    def _node_view(self, concept):
+        if concept not in self.store:
+            return None
+        neighbors = {
+            neighbor: (self.store.get_strength(concept, neighbor), self.store.get_edge_time(concept, neighbor))
+            for neighbor in self.store.neighbors(concept)
+        }
+        reinforced_at = self.store.get_node_time(concept)
+        count = self._lazy_counts.get(concept)
+        if count is not None:
+            return NodeView(None, None, reinforced_at, neighbors, count)
+        memory_items = tuple(self.store.get_items(concept))
+        return NodeView(memory_items, self.get_item_meta(concept).copy(), reinforced_at, neighbors)
+        
+    def __contains__(self, concept) -> bool:
+        return concept in self.store
+        
+    def __len__(self) -> int:
+        return len(self.store)
+        
+    def nodes(self) -> list:
+        return list(self.store.nodes())
+        
+    def edges(self):
+        """遍历所有边，产出 (源概念, 目标概念, 强度)"""
+        return self.store.edges()
+        
+    def neighbors(self, concept) -> list:
+        return list(self.store.neighbors(concept))
+        
+    def degree(self, concept) -> int:
+        return self.store.degree(concept)
+        
+    def get_strength(self, concept1, concept2, default=None):
+        """获取两个概念之间连接的强度（最近一次强化时的值），不相连时返回 default"""
+        return self.store.get_strength(concept1, concept2, default)
+        
+    def get_node_time(self, concept) -> float:
+        """节点最近一次被强化的时间"""
+        return self.store.get_node_time(concept)
+        
+    def get_edge_time(self, concept1, concept2) -> float:
+        """边最近一次被强化的时间"""
+        return self.store.get_edge_time(concept1, concept2)
+        
+    def decayed_strength(self, concept1, concept2, now: float = None) -> float:
+        """两个概念之间的连接强度按时间衰减后的值，不相连时返回 0"""
+        strength = self.store.get_strength(concept1, concept2)
+        if strength is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return self.forget_queue.decayed(strength, self.store.get_edge_time(concept1, concept2), now)
+        
+    def node_weight(self, concept) -> int:
+        """节点的基础强度：记忆项越多、连接越多越不容易被遗忘"""
+        return self.memory_count(concept) + self.store.degree(concept)
+        
+    def requeue(self, concept):
+        self.forget_queue.update(concept, self.node_weight(concept), self.store.get_node_time(concept))
+        
+    def _reinforce_node(self, concept, now: float):
+        self.store.set_node_time(concept, now)
+        self.requeue(concept)
+        
+    def ensure_loaded(self, concepts):
+        """从数据库读取尚未加载的节点的记忆，多个节点一次读取"""
+        if not self._lazy_counts:
+            return
+        missing = [concept for concept in dict.fromkeys(concepts) if concept in self._lazy_counts]
+        if not missing:
+            return
+        loaded = self.item_loader(missing) if self.item_loader is not None else {}
+        for concept in missing:
+            count = self._lazy_counts.pop(concept)
+            memory_items, meta = loaded.get(concept, ([], None))
+            if meta is None:
+                meta = new_meta(len(memory_items), self.store.get_node_time(concept))
+            self.store.set_items(concept, memory_items)
+            self.item_meta[concept] = meta
+            if len(memory_items) != count:
+                # 记录的条数与实际不一致（例如写入中途失败），以实际读到的为准
+                self.requeue(concept)
+                
+    def unloaded_count(self, concept):
+        """记忆尚未加载的节点的记忆条数，已加载的节点返回 None"""
+        return self._lazy_counts.get(concept)
+        
+    def get_memory_items(self, concept) -> list:
+        """获取节点记忆项的副本，节点不存在时返回空列表"""
+        if concept not in self.store:
+            return []
+        self.ensure_loaded((concept,))
+        return self.store.get_items(concept)
+        
+    def get_item_meta(self, concept):
+        """获取节点记忆的元数据数组，与 get_memory_items 的顺序一致"""
+        if concept not in self.store:
+            return new_meta(0, 0.0)
+        self.ensure_loaded((concept,))
+        meta = self.item_meta.get(concept)
+        count = self.store.item_count(concept)
+        if meta is None or len(meta) != count:
+            # 只通过连接创建的节点还没有记忆
+            meta = new_meta(count, self.store.get_node_time(concept))
+            self.item_meta[concept] = meta
+        return meta
+        
+    def recent_items(self, concept, k: int) -> list:
+        """最新的 k 条记忆，从旧到新"""
+        return self.get_memory_items(concept)[recent_slice(self.get_item_meta(concept), k)]
+        
+    def items_older_than(self, concept, timestamp: float) -> list:
+        """创建时间早于 timestamp 的记忆，从旧到新"""
+        return self.get_memory_items(concept)[older_than_slice(self.get_item_meta(concept), timestamp)]
+        
+    def touch_items(self, concept, memories, now: float = None):
+        """记录记忆被回忆的时间
+        
+        只修改内存中的元数据，不标记节点变更、不改变图版本，以免每次检索都让检索缓存失效；
+        最近使用时间在节点下次因其他变化写入数据库时一并保存，记忆按条存储时在下次同步时逐条更新
+        """
+        if concept not in self.store or not memories:
+            return
+        now = time.time() if now is None else now
+        meta = self.get_item_meta(concept)
+        wanted = set(memories)
+        for index, item in enumerate(self.store.get_items(concept)):
+            if item in wanted:
+                meta['accessed'][index] = now
+                self.accessed_updates[(concept, float(meta['created'][index]), item)] = now
+
+    def pop_accessed_updates(self) -> dict:
+        """取出并清空记录的最近使用时间
+
+        worker 模式下机器人进程不写记忆图，回忆时间由它取出后交给维护进程，否则会一直累积
+        """
+        updates = self.accessed_updates
+        self.accessed_updates = {}
+        return updates
+
+    def apply_recalls(self, recalls: dict) -> int:
+        """应用其他进程记录的回忆时间，只会把记忆的最近使用时间往后推
+
+        更新同样记入 accessed_updates，在下次同步时写入数据库；找不到的记忆（已被遗忘或合并）直接忽略
+
+        Args:
+            recalls: (概念, 创建时间, 记忆) -> 最近使用时间
+
+        Returns:
+            int: 更新了最近使用时间的记忆条数
+        """
+        by_concept = {}
+        for (concept, created, item), accessed in recalls.items():
+            if concept in self.store:
+                by_concept.setdefault(concept, []).append((float(created), item, accessed))
+        self.ensure_loaded(by_concept)
+        applied = 0
+        for concept, rows in by_concept.items():
+            meta = self.get_item_meta(concept)
+            positions = {
+                (float(created), item): index
+                for index, (created, item) in enumerate(zip(meta['created'], self.store.get_items(concept)))
+            }
+            for created, item, accessed in rows:
+                index = positions.get((created, item))
+                if index is None or accessed <= meta['accessed'][index]:
+                    continue
+                meta['accessed'][index] = accessed
+                self.accessed_updates[(concept, created, item)] = accessed
+                applied += 1
+        return applied
+
+    def memory_count(self, concept) -> int:
+        """获取节点的记忆项数量，记忆尚未加载的节点不会因此读取数据库"""
+        if concept not in self.store:
+            return 0
+        count = self._lazy_counts.get(concept)
+        if count is not None:
+            return count
+        return self.store.item_count(concept)
+        
+    def load(self, nodes: dict, edges: dict, node_times: dict = None, edge_times: dict = None, item_meta: dict = None):
+        """用节点和边字典一次性替换图的内容，并重建索引、清空变更记录
+        
+        Args:
+            nodes: 概念 -> memory_items，为 None 时该节点的记忆在第一次使用时才从数据库读取
+            item_meta: 概念 -> 编码后的记忆元数据，缺少时（旧数据）记忆的时间取节点的强化时间；
+                记忆未加载的节点为记忆条数
+        """
+        item_meta = item_meta or {}
+        lazy_counts = {concept: int(item_meta.get(concept) or 0) for concept, memory_items in nodes.items() if memory_items is None}
+        if lazy_counts:
+            nodes = {concept: memory_items if memory_items is not None else [] for concept, memory_items in nodes.items()}
+        # 换成新的存储和主题索引，已发布的快照继续读取原来的
+        self.store = create_graph_store(self.backend)
+        self.store.load(nodes, edges, node_times, edge_times)
+        self.topic_index = TopicIndex()
+        self.version += 1
+        self._fingerprints = {}
+        self.item_meta = {}
+        self.legacy_meta = set()
+        self._lazy_counts = lazy_counts
+        for concept in self.store.nodes():
+            if concept in lazy_counts:
+                continue
+            meta, legacy = decode_meta(item_meta.get(concept), self.store.item_count(concept), self.store.get_node_time(concept))
+            self.item_meta[concept] = meta
+            if legacy:
+                self.legacy_meta.add(concept)
+        self.topic_index.rebuild(self.store.nodes())
+        self.forget_queue.rebuild(
+            (concept, self.node_weight(concept), self.store.get_node_time(concept))
+            for concept in self.store.nodes()
+        )
+        self._items_seen = {}
+        self.merge_queue.clear()
+        for concept in self.store.nodes():
+            self._check_merge(concept)
+        self.clear_changes()
+        self._snapshot = GraphSnapshot(self, self.version)
+        
+    @staticmethod
+    def edge_key(concept1, concept2):
+        """边的规范键，保证同一条边无论方向都对应同一个键"""
+        return (concept1, concept2) if concept1 <= concept2 else (concept2, concept1)
+        
+    def _mark_node_dirty(self, concept):
+        self.version += 1
+        self.dirty_nodes.add(concept)
+        self.deleted_nodes.discard(concept)
+        
+    def _mark_edge_dirty(self, concept1, concept2):
+        self.version += 1
+        key = self.edge_key(concept1, concept2)
+        self.dirty_edges.add(key)
+        self.deleted_edges.discard(key)
+        
+    def pop_changes(self):
+        """取出并清空自上次同步以来的变更集合
+        
+        Returns:
+            tuple: (变化的节点, 删除的节点, 变化的边, 删除的边, 逐条的记忆变更, 记忆的最近使用时间)
+        """
+        changes = (self.dirty_nodes, self.deleted_nodes, self.dirty_edges, self.deleted_edges,
+                   self.item_changes, self.accessed_updates)
+        self.clear_changes()
+        return changes
+        
+    def restore_changes(self, changes):
+        """同步失败时把变更放回，等待下一次同步"""
+        dirty_nodes, deleted_nodes, dirty_edges, deleted_edges, item_changes, accessed_updates = changes
+        self.dirty_nodes |= dirty_nodes - self.deleted_nodes
+        self.deleted_nodes |= deleted_nodes - self.dirty_nodes
+        self.dirty_edges |= dirty_edges - self.deleted_edges
+        self.deleted_edges |= deleted_edges - self.dirty_edges
+        for concept, change in item_changes.items():
+            newer = self.item_changes.get(concept)
+            if newer is None:
+                self.item_changes[concept] = change
+            elif not newer['reset']:
+                # 失败的变更发生在前，按顺序排在新变更之前；新变更会先清空节点时旧变更已无意义
+                self.item_changes[concept] = {'reset': change['reset'], 'ops': change['ops'] + newer['ops']}
+        for key, accessed in accessed_updates.items():
+            self.accessed_updates.setdefault(key, accessed)
+        
+    def has_changes(self) -> bool:
+        return bool(self.dirty_nodes or self.deleted_nodes or self.dirty_edges or self.deleted_edges)
+        
+    def clear_changes(self):
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.dirty_edges = set()
+        self.deleted_edges = set()
+        self.item_changes = {}
+        self.accessed_updates = {}
+        
+    def _item_ops(self, concept) -> list:
+        change = self.item_changes.get(concept)
+        if change is None:
+            change = self.item_changes[concept] = {'reset': False, 'ops': []}
+        return change['ops']
+        
+    def _record_item_diff(self, concept, old_items, old_meta, new_items, new_meta):
+        """记忆列表被整体替换时，按 (创建时间, 文本) 比较前后两组记忆，记录逐条的删除和新增"""
+        old_keys = Counter(zip(old_meta['created'].tolist(), old_items))
+        new_keys = list(zip(new_meta['created'].tolist(), new_items))
+        added = Counter(new_keys) - old_keys
+        ops = self._item_ops(concept)
+        ops.extend(('remove', created, item) for created, item in (old_keys - Counter(new_keys)).elements())
+        for index, key in enumerate(new_keys):
+            if added[key] > 0:
+                added[key] -= 1
+                ops.append(('add', key[1], tuple(new_meta[index].tolist())))
+        
+    def _ensure_node(self, concept):
+        if concept not in self.store:
+            self.store.add_node(concept)
+            self.topic_index.add(concept)
+            
+    def apply_delta(self, node_changes, node_deletes, edge_upserts, edge_deletes) -> bool:
+        """应用其他进程已经写入数据库的变更
+        
+        整个过程中没有 await，对事件循环中的读者来说是原子的；这些变更已经持久化，不会记入本地变更集合。
+        记忆尚未加载的节点只更新记忆条数，记忆在下次使用时从数据库读取
+        
+        Args:
+            node_changes: (概念, 强化时间, 记忆条数, 是否先清空记忆, 逐条的记忆变更) 列表，记忆变更的格式同 item_changes
+            node_deletes: 被删除的概念列表
+            edge_upserts: (source, target, strength, 强化时间) 列表
+            edge_deletes: 被删除的 (source, target) 列表
+        
+        Returns:
+            bool: 应用后已加载节点的记忆条数是否都与发布方一致，不一致时应从数据库重新加载
+        """
+        self.version += 1
+        touched = set()
+        consistent = True
+        for concept, reinforced_at, count, reset, ops in node_changes:
+            self._preserve(concept)
+            self._ensure_node(concept)
+            self.store.set_node_time(concept, reinforced_at)
+            touched.add(concept)
+            if concept in self._lazy_counts and not reset:
+                self._lazy_counts[concept] = count
+                continue
+            self._lazy_counts.pop(concept, None)
+            if reset or ops:
+                if reset:
+                    memory_items, meta = [], new_meta(0, reinforced_at)
+                else:
+                    memory_items, meta = self.store.get_items(concept), self.get_item_meta(concept)
+                memory_items, meta = apply_item_ops(memory_items, meta, ops)
+                self.store.set_items(concept, memory_items)
+                self.item_meta[concept] = meta
+                self._fingerprints.pop(concept, None)
+                if reset:
+                    self.legacy_meta.discard(concept)
+            if self.store.item_count(concept) != count:
+                consistent = False
+        for source, target, strength, reinforced_at in edge_upserts:
+            self._preserve(source, target)
+            self._ensure_node(source)
+            self._ensure_node(target)
+            self.store.set_strength(source, target, strength, reinforced_at)
+            touched.update((source, target))
+        for source, target in edge_deletes:
+            if self.store.has_edge(source, target):
+                self._preserve(source, target)
+                self.store.remove_edge(source, target)
+                touched.update((source, target))
+        for concept in node_deletes:
+            if concept not in self.store:
+                continue
+            self._preserve(concept, *self.store.neighbors(concept))
+            touched.update(self.store.neighbors(concept))
+            self._fingerprints.pop(concept, None)
+            self._lazy_counts.pop(concept, None)
+            self.item_meta.pop(concept, None)
+            self.legacy_meta.discard(concept)
+            self.store.remove_node(concept)
+            self.topic_index.remove(concept)
+            self.forget_queue.remove(concept)
+            self.merge_queue.remove(concept)
+            self._items_seen.pop(concept, None)
+            self._remove_embedding(concept)
+        for concept in touched:
+            if concept in self.store:
+                self.requeue(concept)
+                self._check_merge(concept)
+        return consistent
+        
+    def connect_dot(self, concept1, concept2):
+        self._preserve(concept1, concept2)
+        now = time.time()
+        strength = self.store.get_strength(concept1, concept2)
+        if strength is None:
+            # 新边可能隐式创建节点，同步到索引
+            for concept in (concept1, concept2):
+                if concept not in self.store:
+                    self.store.add_node(concept)
+                    self._mark_node_dirty(concept)
+                    self.topic_index.add(concept)
+            # 如果是新边，初始化 strength 为 1
+            strength = 1
+        else:
+            # 如果边已存在，在衰减后的强度上加 1
+            decayed = self.forget_queue.decayed(strength, self.store.get_edge_time(concept1, concept2), now)
+            strength = round(decayed + 1, 4)
+        self.store.set_strength(concept1, concept2, strength, now)
+        self._mark_edge_dirty(concept1, concept2)
+        for concept in (concept1, concept2):
+            self._mark_node_dirty(concept)
+            self._reinforce_node(concept, now)
+    
+    def _node_fingerprints(self, concept) -> list:
+        fingerprints = self._fingerprints.get(concept)
+        if fingerprints is None:
+            fingerprints = [simhash(item) for item in self.get_memory_items(concept)]
+            self._fingerprints[concept] = fingerprints
+        return fingerprints
+
+    def add_dot(self, concept, memory, group_id=None):
+        self.ensure_loaded((concept,))
+        self._preserve(concept)
+        fingerprint = None
+        if self.dedup_distance is not None:
+            fingerprint = simhash(memory)
+            if concept in self.store:
+                fingerprints = self._node_fingerprints(concept)
+                duplicate = find_near_duplicate(fingerprint, fingerprints, self.dedup_distance)
+                if duplicate is not None:
+                    self._merge_duplicate(concept, duplicate, memory, fingerprint)
+                    return
+        if not self._make_room(concept):
+            # 水库抽样没有选中这条记忆，节点仍视为被强化
+            self._mark_node_dirty(concept)
+            self._reinforce_node(concept, time.time())
+            return
+        self._mark_node_dirty(concept)
+        if concept not in self.store:
+            # 如果是新节点，创建新的记忆列表
+            self.store.add_node(concept)
+            self.topic_index.add(concept)
+        now = time.time()
+        # 新记忆的创建时间最晚，追加到末尾后元数据仍按时间排列
+        meta = self.get_item_meta(concept)
+        row = new_meta(1, now, group_code(group_id))
+        self.item_meta[concept] = np.concatenate((meta, row))
+        self.store.append_item(concept, memory)
+        self._item_ops(concept).append(('add', memory, tuple(row[0].tolist())))
+        # 指纹已经计算过的节点直接追加，否则下次需要时连同这条一起计算
+        fingerprints = self._fingerprints.get(concept)
+        if fingerprint is not None and fingerprints is not None:
+            fingerprints.append(fingerprint)
+        self._reinforce_node(concept, now)
+        self._check_merge(concept)
+        
+    def _check_merge(self, concept):
+        """记忆条数达到合并阈值的节点进入合并队列"""
+        if self.merge_threshold is not None and self.memory_count(concept) >= self.merge_threshold:
+            self.merge_queue.push(concept)
+            
+    def _make_room(self, concept) -> bool:
+        """节点达到容量上限时按水库抽样决定新记忆是否保留
+        
+        节点收到的第 n 条记忆以 容量 / n 的概率保留，并替换掉随机的一条已有记忆，
+        节点里的记忆因此始终是它收到过的所有记忆的均匀样本，条数不超过容量
+        
+        Returns:
+            bool: 是否可以追加新记忆
+        """
+        if self.node_capacity is None or concept not in self.store:
+            return True
+        count = self.store.item_count(concept)
+        if count < self.node_capacity:
+            self._items_seen.pop(concept, None)
+            return True
+        seen = self._items_seen.get(concept, count) + 1
+        self._items_seen[concept] = seen
+        # 合并任务跟不上时，确保节点还在合并队列中
+        self._check_merge(concept)
+        index = random.randrange(seen)
+        if index >= count:
+            self.capacity_stats['sampled_out'] += 1
+            return False
+        memory_items = self.store.get_items(concept)
+        meta = self.get_item_meta(concept)
+        removed = memory_items.pop(index)
+        self._item_ops(concept).append(('remove', float(meta['created'][index]), removed))
+        self.item_meta[concept] = np.delete(meta, index)
+        self.store.set_items(concept, memory_items)
+        fingerprints = self._fingerprints.get(concept)
+        if fingerprints is not None:
+            del fingerprints[index]
+        self.capacity_stats['replaced'] += 1
+        return True
+        
+    def _merge_duplicate(self, concept, index, memory, fingerprint):
+        """新记忆与已有记忆近似重复：保留较长的一条，节点仍视为被强化"""
+        now = time.time()
+        memory_items = self.store.get_items(concept)
+        existing = memory_items[index]
+        # 同样的内容又被提到一次，保留原来的创建时间
+        meta = self.get_item_meta(concept)
+        meta['accessed'][index] = now
+        created = float(meta['created'][index])
+        if len(memory) > len(existing):
+            memory_items[index] = memory
+            self.store.set_items(concept, memory_items)
+            self._item_ops(concept).extend((('remove', created, existing), ('add', memory, tuple(meta[index].tolist()))))
+            self._fingerprints[concept][index] = fingerprint
+            self.dedup_stats['replaced'] += 1
+            self.dedup_stats['bytes_saved'] += len(existing.encode('utf-8'))
+        else:
+            self.accessed_updates[(concept, created, existing)] = now
+            self.dedup_stats['rejected'] += 1
+            self.dedup_stats['bytes_saved'] += len(memory.encode('utf-8'))
+        self._mark_node_dirty(concept)
+        self._reinforce_node(concept, now)
+        
+    def get_dot(self, concept):
+        # 检查节点是否存在于图中
+        if concept in self.store:
+            return concept, {'memory_items': self.get_memory_items(concept)}
+        return None
+
+    def set_memory_items(self, concept, memory_items):
+        """替换节点的全部记忆项
+        
+        保留下来的记忆沿用原来的元数据，新出现的记忆视为刚刚创建，并按创建时间重新排列
+        """
+        if concept not in self.store:
+            return
+        self.ensure_loaded((concept,))
+        self._preserve(concept)
+        old_items = self.get_memory_items(concept)
+        old_meta = self.get_item_meta(concept)
+        memory_items, meta = realign_meta(old_items, old_meta, memory_items, time.time())
+        self._record_item_diff(concept, old_items, old_meta, memory_items, meta)
+        self.item_meta[concept] = meta
+        self.store.set_items(concept, memory_items)
+        self._fingerprints.pop(concept, None)
+        self._mark_node_dirty(concept)
+        self.requeue(concept)
+        self._check_merge(concept)
+
+    def mark_legacy_meta_dirty(self) -> int:
+        """把元数据是加载时补全的节点标记为变更，下次同步时写回数据库
+        
+        Returns:
+            int: 标记的节点数
+        """
+        return self.mark_nodes_dirty(self.legacy_meta)
+
+    def mark_nodes_dirty(self, concepts) -> int:
+        """把节点标记为变更，下次同步时整体写回数据库
+        
+        记录为先清空、再逐条写入当前的全部记忆，记忆尚未加载的节点会先读取
+        
+        Returns:
+            int: 标记的节点数
+        """
+        concepts = [concept for concept in concepts if concept in self.store]
+        self.ensure_loaded(concepts)
+        for concept in concepts:
+            meta = self.get_item_meta(concept)
+            self.item_changes[concept] = {
+                'reset': True,
+                'ops': [('add', item, tuple(row.tolist())) for item, row in zip(self.store.get_items(concept), meta)],
+            }
+            self._mark_node_dirty(concept)
+        return len(concepts)
+
+    def remove_dot(self, concept):
+        """删除节点及其所有的边"""
+        if concept not in self.store:
+            return
+        self.version += 1
+        neighbors = list(self.store.neighbors(concept))
+        # 旧版本的读者仍能读到被删除节点的记忆
+        self.ensure_loaded((concept,))
+        self._preserve(concept, *neighbors)
+        for neighbor in neighbors:
+            key = self.edge_key(concept, neighbor)
+            self.dirty_edges.discard(key)
+            self.deleted_edges.add(key)
+        self.store.remove_node(concept)
+        self._fingerprints.pop(concept, None)
+        self._lazy_counts.pop(concept, None)
+        self.item_meta.pop(concept, None)
+        self.legacy_meta.discard(concept)
+        # 同一次同步内重新创建的同名节点不能沿用数据库中已删除的记忆
+        self.item_changes[concept] = {'reset': True, 'ops': []}
+        self.topic_index.remove(concept)
+        self.forget_queue.remove(concept)
+        self.merge_queue.remove(concept)
+        self._items_seen.pop(concept, None)
+        self._remove_embedding(concept)
+        self.dirty_nodes.discard(concept)
+        self.deleted_nodes.add(concept)
+        # 邻居的连接数变少了
+        for neighbor in neighbors:
+            if neighbor != concept:
+                self.requeue(neighbor)
+
+    def remove_edge(self, concept1, concept2):
+        """删除两个概念之间的连接"""
+        if not self.store.has_edge(concept1, concept2):
+            return
+        self._preserve(concept1, concept2)
+        self.store.remove_edge(concept1, concept2)
+        self.version += 1
+        key = self.edge_key(concept1, concept2)
+        self.dirty_edges.discard(key)
+        self.deleted_edges.add(key)
+        for concept in (concept1, concept2):
+            self.requeue(concept)
+
+    def merge_nodes(self, source, target) -> int:
+        """把 source 的记忆和连接并入 target，然后删除 source
+
+        记忆沿用原来的元数据，按创建时间重新排列；两者都连着同一个邻居时，两条连接衰减后的强度相加。
+        两者之间的连接直接丢弃
+
+        Returns:
+            int: 移入 target 的记忆条数
+        """
+        if source == target or source not in self.store:
+            return 0
+        neighbors = [neighbor for neighbor in self.store.neighbors(source) if neighbor not in (source, target)]
+        self.ensure_loaded((source, target))
+        self._preserve(source, target, *neighbors)
+        self._ensure_node(target)
+        now = time.time()
+
+        moved = self.store.get_items(source)
+        if moved:
+            moved_meta = self.get_item_meta(source)
+            memory_items = self.store.get_items(target) + moved
+            meta = np.concatenate((self.get_item_meta(target), moved_meta))
+            order = np.argsort(meta['created'], kind='stable')
+            self.store.set_items(target, [memory_items[i] for i in order])
+            self.item_meta[target] = meta[order]
+            self._item_ops(target).extend(('add', item, tuple(row.tolist())) for item, row in zip(moved, moved_meta))
+            self._fingerprints.pop(target, None)
+        self.store.set_node_time(target, max(self.store.get_node_time(target), self.store.get_node_time(source)))
+        self._mark_node_dirty(target)
+
+        for neighbor in neighbors:
+            strength = self.store.get_strength(source, neighbor)
+            reinforced_at = self.store.get_edge_time(source, neighbor)
+            existing = self.store.get_strength(target, neighbor)
+            if existing is not None:
+                strength = round(
+                    self.forget_queue.decayed(strength, reinforced_at, now)
+                    + self.forget_queue.decayed(existing, self.store.get_edge_time(target, neighbor), now), 4
+                )
+                reinforced_at = now
+            self.store.set_strength(target, neighbor, strength, reinforced_at)
+            self._mark_edge_dirty(target, neighbor)
+
+        self.remove_dot(source)
+        self.requeue(target)
+        self._check_merge(target)
+        return len(moved)
+
+    def get_related_item(self, topic, depth=1):
+        if topic not in self.store:
+            return [], []
+        neighbors = list(self.store.neighbors(topic)) if depth >= 2 else []
+        self.ensure_loaded([topic] + neighbors)
+            
+        # 获取当前节点的记忆项
+        first_layer_items = self.store.get_items(topic)
+        second_layer_items = []
+        
+        # 只在depth=2时获取第二层记忆
+        if depth >= 2:
+            # 获取相邻节点的记忆项
+            for neighbor in neighbors:
+                second_layer_items.extend(self.store.get_items(neighbor))
+        
+        return first_layer_items, second_layer_items
+    
+    @property
+    def dots(self):
+        # 返回所有节点对应的 Memory_dot 对象
+        self.ensure_loaded(list(self.store.nodes()))
+        return [self.get_dot(node) for node in self.store.nodes()]
+
+    def estimate_nbytes(self) -> int:
+        """粗略估计记忆图占用的内存，用于分区的内存预算"""
+        meta_bytes = sum(meta.nbytes + 100 for meta in self.item_meta.values())
+        if hasattr(self.store, 'nbytes'):
+            # 数组部分之外，每个概念名和索引项约 200 字节
+            return self.store.nbytes() + 200 * len(self.store) + meta_bytes
+        # networkx 的每个节点和每条边都是若干个字典，按经验值估计
+        item_bytes = sum(2 * len(item) + 80 for concept in self.store.nodes() for item in self.store.get_items(concept))
+        return 700 * len(self.store) + 400 * self.store.number_of_edges() + item_bytes + meta_bytes
+
+    def forget_weakest(self, max_count: int, threshold: float, min_age: float = 0.0, now: float = None):
+        """从遗忘队列中取出衰减后强度最低的节点进行遗忘
+        
+        每个节点遗忘一条记忆，并删除它衰减到阈值以下的连接；没有记忆项的节点直接删除。
+        最近 min_age 秒内强化过的节点不会被取出；节点的记忆和连接都不会比节点本身的强化时间更新，
+        因此刚构建的记忆和连接至少保留 min_age 秒
+        
+        Args:
+            max_count: 最多处理的节点数
+            threshold: 衰减后强度低于该值的节点和连接会被遗忘
+            min_age: 节点最近一次强化后至少经过的秒数
+        
+        Returns:
+            tuple: ((节点, 被遗忘的记忆, 衰减后强度) 列表，节点被整个删除时记忆为 None；删除的连接数)
+        """
+        now = time.time() if now is None else now
+        candidates = self.forget_queue.pop_weakest(max_count, now, threshold, reinforced_before=now - min_age)
+        forgotten = []
+        removed_edges = 0
+        for node, strength in candidates:
+            if node not in self.store:
+                continue
+            # 删除衰减到阈值以下的连接
+            for neighbor in self.neighbors(node):
+                if self.decayed_strength(node, neighbor, now) < threshold:
+                    self.remove_edge(node, neighbor)
+                    removed_edges += 1
+            if self.memory_count(node) == 0:
+                self.remove_dot(node)
+                forgotten.append((node, None, strength))
+                continue
+            removed_item = self.forget_topic(node)
+            if removed_item:
+                forgotten.append((node, removed_item, strength))
+            if node in self.store and node not in self.forget_queue:
+                self.requeue(node)
+        return forgotten, removed_edges
+
+    def forget_topic(self, topic):
+        """删除指定话题中最久没有被回忆过的一条记忆，如果话题没有记忆则移除该话题节点"""
+        if topic not in self.store:
+            return None
+            
+        memory_items = self.get_memory_items(topic)
+            
+        # 如果有记忆项可以删除
+        if memory_items:
+            meta = self.get_item_meta(topic)
+            removed_item = memory_items.pop(int(np.argmin(meta['accessed'])))
+            
+            # 更新节点的记忆项
+            if memory_items:
+                self.set_memory_items(topic, memory_items)
+            else:
+                # 如果没有记忆项了，删除整个节点
+                self.remove_dot(topic)
+                
+            return removed_item
+        
+        return None
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import random
+
+
+class MergeQueue:
+    """等待合并记忆的节点队列
+
+    节点的记忆条数越过合并阈值时入队，记忆合并任务按入队顺序取出处理，不再随机抽查全图。
+    队列满了（合并跟不上构建）时用水库抽样决定新节点是否入队、替换哪个节点，
+    队列始终是这段时间越过阈值的所有节点的均匀样本，而不是只剩最早入队的那一批；
+    没有入队的节点仍受容量上限约束，下次增加记忆时会再次尝试入队。
+    """
+
+    def __init__(self, max_size: int = 1000, rng: random.Random = None):
+        """
+        Args:
+            max_size: 队列最多容纳的节点数
+            rng: 水库抽样使用的随机数生成器
+        """
+        self.max_size = max(1, max_size)
+        self._rng = rng or random.Random()
+        self._items = []
+        self._members = set()
+        self._offered = 0  # 自上次取出以来尝试入队的节点数（不含已在队列中的）
+        self.dropped = 0  # 队列满时没有入队的次数
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, concept) -> bool:
+        return concept in self._members
+
+    def push(self, concept) -> bool:
+        """节点入队，已在队列中的节点不会重复入队
+
+        Returns:
+            bool: 节点是否在队列中
+        """
+        if concept in self._members:
+            return True
+        self._offered += 1
+        if len(self._items) < self.max_size:
+            self._items.append(concept)
+            self._members.add(concept)
+            return True
+        # 第 n 个候选以 max_size / n 的概率替换队列中随机的一个节点
+        index = self._rng.randrange(self._offered)
+        if index >= self.max_size:
+            self.dropped += 1
+            return False
+        self._members.discard(self._items[index])
+        self._items[index] = concept
+        self._members.add(concept)
+        self.dropped += 1
+        return True
+
+    def remove(self, concept):
+        if concept not in self._members:
+            return
+        self._members.discard(concept)
+        self._items.remove(concept)
+
+    def pop(self, count: int) -> list:
+        """按入队顺序取出最多 count 个节点"""
+        batch = self._items[:count]
+        del self._items[:count]
+        self._members.difference_update(batch)
+        # 剩下的节点成为新一轮抽样的起点
+        self._offered = len(self._items)
+        return batch
+
+    def clear(self):
+        self._items = []
+        self._members = set()
+        self._offered = 0
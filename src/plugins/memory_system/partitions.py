@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class MemoryPartitions:
+    """按群划分的记忆图分区
+
+    mode 为 "global" 时所有群共用全局记忆图，行为与不分区时相同；
+    为 "group" 时每个群有独立的记忆图、主题索引、本地快照和数据库集合，
+    不属于任何群的记忆进入全局分区，include_global 为 True 时各群检索时也会查询全局分区。
+
+    群分区在第一次被用到时于线程池中加载，已加载的群分区估计内存超过预算时，
+    按最近最少使用的顺序先同步再卸载；正在被检索、构建、整合或遗忘使用的分区不会被卸载。遗忘只处理已加载的分区，强度按时间衰减，
+    分区重新加载后的第一次遗忘会补上卸载期间的衰减。
+    """
+
+    GLOBAL = "global"
+
+    def __init__(self, global_partition, factory, mode: str = "global", include_global: bool = True,
+                 budget_bytes: int = 256 * 1024 * 1024, embed_on_load: bool = True, list_keys=None, ranked: bool = False):
+        """
+        Args:
+            global_partition: 全局分区的海马体
+            factory: 分区名 -> 尚未加载数据的海马体，在线程池中调用
+            list_keys: 返回数据库中已有的群分区名，用于需要遍历全部分区的离线任务
+            mode: 分区方式，global 或 group
+            include_global: 群分区检索时是否同时查询全局分区
+            budget_bytes: 已加载群分区的内存预算（估计值）
+            embed_on_load: 分区加载后是否在后台补齐缺少的embedding
+            ranked: 合并各分区的检索结果时取得分最高的几条而不是随机抽取，
+                与扩散激活和按新近程度加权的检索保持一致
+        """
+        self.global_partition = global_partition
+        self.factory = factory
+        self.mode = mode
+        self.include_global = include_global
+        self.budget_bytes = budget_bytes
+        self.embed_on_load = embed_on_load
+        self.list_keys = list_keys
+        self.ranked = ranked
+        self._partitions = OrderedDict()  # 分区名 -> 海马体，按最近使用排序
+        self._sizes = {}  # 分区名 -> 估计占用字节数
+        self._loading = {}  # 分区名 -> 正在进行的加载任务
+        self._busy = {}  # 分区名 -> 正在使用它的任务数，大于 0 时不卸载
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == "group"
+
+    def key_of(self, group_id) -> str:
+        """群号对应的分区名"""
+        if not self.enabled or group_id is None:
+            return self.GLOBAL
+        return f"group_{group_id}"
+
+    def keys_for(self, group_id) -> list:
+        """检索时需要查询的分区"""
+        key = self.key_of(group_id)
+        if key == self.GLOBAL or not self.include_global:
+            return [key]
+        return [key, self.GLOBAL]
+
+    def loaded(self) -> list:
+        """全局分区和所有已加载的群分区"""
+        return [self.global_partition] + list(self._partitions.values())
+
+    @contextmanager
+    def pinned(self, *keys):
+        """使用期间不卸载这些分区，可以嵌套"""
+        for key in keys:
+            self._busy[key] = self._busy.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            for key in keys:
+                self._busy[key] -= 1
+                if not self._busy[key]:
+                    del self._busy[key]
+
+    def peek(self, group_id):
+        """不触发加载地取群对应的分区，未加载时返回全局分区"""
+        return self._partitions.get(self.key_of(group_id), self.global_partition)
+
+    async def get(self, key: str):
+        """获取分区，未加载时加载，同一分区的并发请求共用一次加载"""
+        if key == self.GLOBAL:
+            return self.global_partition
+        partition = self._partitions.get(key)
+        if partition is not None:
+            self._partitions.move_to_end(key)
+            return partition
+        pending = self._loading.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load(key))
+            self._loading[key] = pending
+            pending.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _load(self, key: str):
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        partition = await loop.run_in_executor(None, self._create_partition, key)
+        self._partitions[key] = partition
+        self._sizes[key] = partition.memory_graph.estimate_nbytes()
+        print(f"\033[1;32m[记忆分区]\033[0m 加载分区 {key}: 节点 {len(partition.memory_graph)}, 约 {self._sizes[key] / 1024 / 1024:.1f} MB, 耗时 {time.time() - start_time:.2f} 秒")
+        if self.embed_on_load:
+            partition.schedule_embedding()
+        self._evict(keep=key)
+        return partition
+
+    def _create_partition(self, key: str):
+        partition = self.factory(key)
+        partition.sync_memory_from_db()
+        return partition
+
+    def _update_size(self, key: str):
+        partition = self._partitions.get(key)
+        if partition is not None:
+            self._sizes[key] = partition.memory_graph.estimate_nbytes()
+
+    def refresh_size(self, key: str):
+        """分区写入新记忆后更新它的估计内存，超出预算时卸载其他最近最少使用的分区"""
+        self._update_size(key)
+        self._evict(keep=key)
+
+    def _evict(self, keep: str = None):
+        """卸载最近最少使用的群分区，直到估计内存不超过预算"""
+        total = sum(self._sizes.values())
+        for key in list(self._partitions):
+            if total <= self.budget_bytes:
+                break
+            if key == keep or key in self._busy:
+                continue
+            partition = self._partitions[key]
+            if partition.memory_graph.has_changes():
+                # 还没写入数据库的变更先同步，同步失败的分区暂不卸载
+                partition.sync_memory_to_db()
+                if partition.memory_graph.has_changes():
+                    continue
+            del self._partitions[key]
+            total -= self._sizes.pop(key)
+            self.evictions += 1
+            print(f"\033[1;33m[记忆分区]\033[0m 卸载分区 {key}，已加载 {len(self._partitions)} 个群分区，约 {total / 1024 / 1024:.1f} MB")
+
+    async def _partitions_for(self, group_id) -> list:
+        partitions = []
+        for key in self.keys_for(group_id):
+            try:
+                partitions.append((key, await self.get(key)))
+            except Exception as e:
+                print(f"\033[1;31m[错误]\033[0m 加载记忆分区 {key} 失败: {e}")
+        return partitions
+
+    async def _each_loaded(self, operation):
+        """依次对已加载的分区执行 operation，执行期间分区不会被卸载，轮到之前已被卸载的分区跳过"""
+        for key, partition in [(self.GLOBAL, self.global_partition)] + list(self._partitions.items()):
+            if key != self.GLOBAL and self._partitions.get(key) is not partition:
+                continue
+            with self.pinned(key):
+                await operation(partition)
+
+    async def memory_activate_value(self, text: str, group_id=None, **kwargs) -> int:
+        """计算输入文本对相关分区记忆的激活程度，取各分区中的最大值"""
+        partitions = await self._partitions_for(group_id)
+        with self.pinned(*(key for key, _ in partitions)):
+            # 主题识别结果在分区之间共享，多个分区只请求一次模型
+            values = await asyncio.gather(*(partition.memory_activate_value(text, **kwargs) for _, partition in partitions))
+        return max(values, default=0)
+
+    async def get_relevant_memories(self, text: str, group_id=None, max_memory_num: int = 5, **kwargs) -> list:
+        """从相关分区中获取与输入文本相关的记忆"""
+        partitions = await self._partitions_for(group_id)
+        with self.pinned(*(key for key, _ in partitions)):
+            results = await asyncio.gather(*(
+                partition.get_relevant_memories(text, max_memory_num=max_memory_num, **kwargs)
+                for _, partition in partitions
+            ))
+        if len(results) == 1:
+            return results[0]
+        relevant_memories = [memory for memories in results for memory in memories]
+        relevant_memories.sort(key=lambda x: x['similarity'], reverse=True)
+        if len(relevant_memories) > max_memory_num:
+            if self.ranked:
+                relevant_memories = relevant_memories[:max_memory_num]
+            else:
+                relevant_memories = random.sample(relevant_memories, max_memory_num)
+        return relevant_memories
+
+    async def operation_build_memory(self, chat_size: int = 20):
+        """采样并压缩聊天记录，按片段所属的群写入对应分区"""
+        source = self.global_partition
+        if not self.enabled:
+            await source.operation_build_memory(chat_size=chat_size)
+            return
+        loop = asyncio.get_running_loop()
+        samples = await loop.run_in_executor(None, source.get_memory_sample, chat_size, source.BUILD_TIME_FREQUENCY, True)
+
+        build_started_at = datetime.datetime.now()
+        results = await source.compress_samples([text for _, text in samples])
+        by_partition = {}
+        for (group_id, _), compressed_memory in zip(samples, results):
+            partition_results, group_ids = by_partition.setdefault(self.key_of(group_id), ([], []))
+            partition_results.append(compressed_memory)
+            group_ids.append(group_id)
+
+        for key, (partition_results, group_ids) in by_partition.items():
+            try:
+                partition = await self.get(key)
+            except Exception as e:
+                print(f"\033[1;31m[错误]\033[0m 加载记忆分区 {key} 失败，丢弃本轮 {len(partition_results)} 个片段: {e}")
+                continue
+            print(f"\033[1;32m[记忆构建]\033[0m 写入分区 {key}: {len(partition_results)} 个片段")
+            with self.pinned(key):
+                partition_results = await partition.canonicalize_topics(partition_results)
+                partition.commit_memories(partition_results, group_ids)
+                partition.sync_memory_to_db()
+            self._update_size(key)
+        self._evict()
+        source._report_build_usage(build_started_at)
+
+    async def operation_forget_topic(self):
+        """对已加载的分区执行遗忘"""
+        await self._each_loaded(lambda partition: partition.operation_forget_topic())
+
+    async def operation_apply_recalls(self):
+        """维护进程为已加载的分区合并机器人进程记录的回忆时间，未加载的分区加载后再合并"""
+        await self._each_loaded(lambda partition: partition.operation_apply_recalls())
+
+    async def operation_merge_memory(self):
+        """对已加载的分区合并排队的节点，未加载的分区加载时重新检查"""
+        await self._each_loaded(lambda partition: partition.operation_merge_memory())
+
+    async def apply_worker_deltas(self):
+        """为已加载的分区应用维护进程发布的变更，未加载的分区下次加载时直接读取最新数据"""
+        await self._each_loaded(lambda partition: partition.apply_worker_deltas())
+        for key in self._partitions:
+            self._update_size(key)
+        self._evict()
+
+    async def _all_keys(self) -> list:
+        """全局记忆图和数据库中已有的所有分区（包括未加载的）"""
+        keys = [self.GLOBAL]
+        if self.enabled and self.list_keys is not None:
+            loop = asyncio.get_running_loop()
+            keys += await loop.run_in_executor(None, self.list_keys)
+        return keys
+
+    async def operation_compact_duplicates(self) -> dict:
+        """清理所有分区（包括未加载的）中的近似重复记忆"""
+        keys = await self._all_keys()
+        totals = {'nodes': 0, 'items_removed': 0, 'bytes_saved': 0}
+        for key in keys:
+            partition = await self.get(key)
+            stats = partition.compact_duplicates()
+            for name in totals:
+                totals[name] += stats[name]
+            self._update_size(key)
+            self._evict()
+        print(f"\033[1;32m[记忆去重]\033[0m 全部 {len(keys)} 个分区: 删除 {totals['items_removed']} 条记忆，节省 {totals['bytes_saved'] / 1024:.1f} KB")
+        return totals
+
+    async def operation_merge_synonyms(self) -> dict:
+        """合并所有分区（包括未加载的）中同一概念的不同写法"""
+        keys = await self._all_keys()
+        totals = {'nodes_before': 0, 'nodes_after': 0, 'merged': 0, 'items_moved': 0}
+        for key in keys:
+            partition = await self.get(key)
+            stats = partition.merge_synonyms()
+            for name in totals:
+                totals[name] += stats[name]
+            self._update_size(key)
+            self._evict()
+        shrink = (totals['nodes_before'] - totals['nodes_after']) / totals['nodes_before'] * 100 if totals['nodes_before'] else 0.0
+        print(f"\033[1;32m[概念归并]\033[0m 全部 {len(keys)} 个分区: 节点数 {totals['nodes_before']} -> {totals['nodes_after']} (减少 {shrink:.1f}%)，移动 {totals['items_moved']} 条记忆")
+        return totals
+
+    async def operation_migrate_item_meta(self) -> int:
+        """为所有分区中没有元数据的旧记忆写入元数据"""
+        keys = await self._all_keys()
+        total = 0
+        for key in keys:
+            partition = await self.get(key)
+            total += partition.migrate_item_meta()
+            self._evict()
+        print(f"\033[1;32m[记忆迁移]\033[0m 全部 {len(keys)} 个分区: 共写回 {total} 个节点")
+        return total
+
+    async def operation_migrate_item_storage(self) -> int:
+        """把所有分区中仍以数组保存的记忆改为逐条保存"""
+        keys = await self._all_keys()
+        total = 0
+        for key in keys:
+            partition = await self.get(key)
+            total += partition.migrate_item_storage()
+            self._update_size(key)
+            self._evict()
+        print(f"\033[1;32m[记忆迁移]\033[0m 全部 {len(keys)} 个分区: 共迁移 {total} 个节点")
+        return total
+
+    def schedule_embedding(self):
+        for partition in self.loaded():
+            partition.schedule_embedding()
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.mode,
+            'loaded': len(self._partitions),
+            'bytes': sum(self._sizes.values()),
+            'budget_bytes': self.budget_bytes,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import threading
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+from pymongo import UpdateOne
+
+# 一段消息时间区间 [start, end) 被用于构建记忆的次数
+RANGE_DTYPE = np.dtype([('start', '<f8'), ('end', '<f8'), ('count', '<u4')])
+
+
+def window_range(first_time: float, last_time: float) -> tuple:
+    """片段中第一条到最后一条消息对应的左闭右开区间"""
+    return first_time, float(np.nextafter(last_time, np.inf))
+
+
+class GroupRanges:
+    """一个群的采样记录：按开始时间排列、互不重叠的区间及其被采样的次数
+
+    相邻且次数相同的区间会合并，区间数只与采样过的不连续时间段数有关，与消息条数无关。
+    查询和记录都先二分定位，只处理与片段重叠的少数区间。
+
+    三个 Python 列表而不是平衡树或区间树：定位是 O(log n)，但 add 替换切片时要移动其后的元素，
+    最坏是 O(n) 的内存移动。一个群的区间通常只有几百到几千个，移动的只是指针（在最前面插入时
+    1 万个区间约 10 微秒，10 万个约 80 微秒），比树节点的分配和逐层比较更快，也能直接编码为一段二进制保存。
+    """
+
+    def __init__(self, starts: list = None, ends: list = None, counts: list = None):
+        self.starts = starts or []
+        self.ends = ends or []
+        self.counts = counts or []
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def decode(cls, data) -> "GroupRanges":
+        ranges = np.frombuffer(bytes(data), dtype=RANGE_DTYPE) if data else np.empty(0, dtype=RANGE_DTYPE)
+        return cls(ranges['start'].tolist(), ranges['end'].tolist(), ranges['count'].tolist())
+
+    def encode(self) -> bytes:
+        ranges = np.empty(len(self), dtype=RANGE_DTYPE)
+        ranges['start'] = self.starts
+        ranges['end'] = self.ends
+        ranges['count'] = self.counts
+        return ranges.tobytes()
+
+    def _overlapping(self, start: float, end: float) -> tuple:
+        """与 [start, end) 重叠的区间下标范围 [i, j)"""
+        return bisect_right(self.ends, start), bisect_left(self.starts, end)
+
+    def max_count(self, start: float, end: float) -> int:
+        """[start, end) 内的消息被采样的最多次数"""
+        i, j = self._overlapping(start, end)
+        return max(self.counts[i:j], default=0)
+
+    def add(self, start: float, end: float):
+        """[start, end) 内的消息各被采样一次
+
+        二分定位 O(log n)，改写重叠的 k 个区间 O(k)，插入或删除区间时切片赋值移动其后的元素 O(n)
+        """
+        if end <= start:
+            return
+        i, j = self._overlapping(start, end)
+        pieces = []
+        cursor = start
+        for k in range(i, j):
+            s, e, c = self.starts[k], self.ends[k], self.counts[k]
+            if s < start:
+                pieces.append((s, start, c))
+            elif s > cursor:
+                pieces.append((cursor, s, 1))
+            pieces.append((max(s, start), min(e, end), c + 1))
+            if e > end:
+                pieces.append((end, e, c))
+            cursor = max(cursor, e)
+        if cursor < end:
+            pieces.append((cursor, end, 1))
+
+        # 连同两侧的区间一起合并首尾相接且次数相同的区间
+        if i > 0:
+            i -= 1
+            pieces.insert(0, (self.starts[i], self.ends[i], self.counts[i]))
+        if j < len(self):
+            pieces.append((self.starts[j], self.ends[j], self.counts[j]))
+            j += 1
+        merged = [pieces[0]]
+        for s, e, c in pieces[1:]:
+            ps, pe, pc = merged[-1]
+            if pe == s and pc == c:
+                merged[-1] = (ps, e, c)
+            else:
+                merged.append((s, e, c))
+        self.starts[i:j] = [s for s, _, _ in merged]
+        self.ends[i:j] = [e for _, e, _ in merged]
+        self.counts[i:j] = [c for _, _, c in merged]
+
+
+class SamplingLedger:
+    """记忆构建的采样账本
+
+    记录每个群哪些时间段的聊天记录已经被总结过、总结过几次，代替在每条消息上累加 memorized 计数，
+    messages 集合因此只追加不修改。每个群一个文档，区间编码为二进制保存在 memory_sampling_ledger 集合中；
+    用到的群第一次使用时一次读取，之后在内存中维护，改动过的群在 save 时一次写回。
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._groups = {}  # 群号 -> GroupRanges
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(group_id) -> str:
+        return str(group_id)
+
+    def load(self, group_ids) -> int:
+        """读取还没有加载的群的采样记录
+
+        Returns:
+            int: 数据库往返次数
+        """
+        with self._lock:
+            missing = {self._key(group_id) for group_id in group_ids} - self._groups.keys()
+            if not missing:
+                return 0
+            for doc in self.collection.find({'_id': {'$in': list(missing)}}):
+                self._groups[doc['_id']] = GroupRanges.decode(doc.get('ranges'))
+            for key in missing:
+                self._groups.setdefault(key, GroupRanges())
+            return 1
+
+    def max_count(self, group_id, start: float, end: float) -> int:
+        with self._lock:
+            ranges = self._groups.get(self._key(group_id))
+            return ranges.max_count(start, end) if ranges is not None else 0
+
+    def record(self, group_id, start: float, end: float):
+        """记录 [start, end) 内的消息被用于构建了一次记忆，需要先 load 该群"""
+        key = self._key(group_id)
+        with self._lock:
+            self._groups.setdefault(key, GroupRanges()).add(start, end)
+            self._dirty.add(key)
+
+    def save(self) -> int:
+        """把改动过的群写回数据库
+
+        Returns:
+            int: 数据库往返次数
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            ops = [
+                UpdateOne({'_id': key}, {'$set': {'ranges': self._groups[key].encode(), 'range_count': len(self._groups[key])}}, upsert=True)
+                for key in self._dirty
+            ]
+            dirty = self._dirty
+            self._dirty = set()
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+        except Exception:
+            # 写入失败时保留改动，下次再写
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        return 1
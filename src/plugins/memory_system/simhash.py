@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+import jieba
+import numpy as np
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _features(text: str) -> dict:
+    """jieba 分词结果加上相邻两个字的片段，短句只差几个字时也能得到相近的指纹"""
+    counts = {}
+    for token in jieba.lcut(text):
+        token = token.strip()
+        if token:
+            counts[token] = counts.get(token, 0) + 1
+    compact = ''.join(text.split())
+    for i in range(len(compact) - 1):
+        shingle = '\x00' + compact[i:i + 2]  # 与分词结果区分开
+        counts[shingle] = counts.get(shingle, 0) + 1
+    return counts
+
+
+def simhash(text: str) -> int:
+    """计算文本的 64 位 SimHash 指纹，意思相同、措辞略有不同的句子指纹只相差少数几位"""
+    counts = _features(text)
+    if not counts:
+        return 0
+    hashes = np.array([_token_hash(token) for token in counts], dtype='<u8')
+    weights = np.array(list(counts.values()), dtype=np.int64)
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    # 每一位上，出现 1 的特征加权重，出现 0 的特征减权重
+    votes = weights @ (bits.astype(np.int64) * 2 - 1)
+    packed = np.packbits((votes > 0).astype(np.uint8), bitorder='little')
+    return int.from_bytes(packed.tobytes(), 'little')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def _distances(fingerprint: int, fingerprints: np.ndarray) -> np.ndarray:
+    xor = fingerprints ^ np.uint64(fingerprint)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def find_near_duplicate(fingerprint: int, fingerprints: list, max_distance: int):
+    """在指纹列表中查找距离不超过 max_distance 且最近的位置，没有时返回 None"""
+    if not fingerprints:
+        return None
+    distances = _distances(fingerprint, np.array(fingerprints, dtype=np.uint64))
+    best = int(np.argmin(distances))
+    return best if distances[best] <= max_distance else None
+
+
+def dedupe_items(items: list, max_distance: int):
+    """去除一组记忆中的近似重复项，每组近似重复的记忆保留最长的一条
+
+    Returns:
+        tuple: (保留的记忆列表（保持原顺序）, 对应的指纹列表)
+    """
+    fingerprints = [simhash(item) for item in items]
+    kept = []  # 保留项在 items 中的下标
+    kept_fingerprints = np.zeros(len(items), dtype=np.uint64)
+    for i, fingerprint in enumerate(fingerprints):
+        duplicate = None
+        if kept:
+            distances = _distances(fingerprint, kept_fingerprints[:len(kept)])
+            best = int(np.argmin(distances))
+            if distances[best] <= max_distance:
+                duplicate = best
+        if duplicate is None:
+            kept_fingerprints[len(kept)] = fingerprint
+            kept.append(i)
+        elif len(items[i]) > len(items[kept[duplicate]]):
+            # 保留信息更多的一条
+            kept[duplicate] = i
+            kept_fingerprints[duplicate] = fingerprint
+    kept.sort()
+    return [items[i] for i in kept], [fingerprints[i] for i in kept]
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+
+from .item_meta import new_meta
+from .topic_index import TopicIndex
+
+
+class NodeView:
+    """节点在某个图版本时的状态，创建后不再修改"""
+
+    __slots__ = ('items', 'meta', 'reinforced_at', 'neighbors', 'count')
+
+    def __init__(self, items, meta, reinforced_at: float, neighbors: dict, count: int = None):
+        """
+        Args:
+            items: 记忆的元组，记忆尚未加载的节点为 None
+            meta: 记忆元数据数组的副本，记忆尚未加载的节点为 None
+            reinforced_at: 强化时间
+            neighbors: 相邻概念 -> (连接强度, 连接的强化时间)
+            count: 记忆条数，默认为 items 的长度
+        """
+        self.items = items
+        self.meta = meta
+        self.reinforced_at = reinforced_at
+        self.neighbors = neighbors
+        self.count = len(items) if count is None else count
+
+
+class GraphSnapshot:
+    """记忆图某个版本的只读视图
+
+    发布快照之后，Memory_graph 在第一次修改某个节点（记忆、强化时间或连接）之前，把它修改前的状态保存到
+    当时最新的快照中。读取节点时依次查找这个快照和之后发布的快照保存的旧状态，都没有找到说明节点从这个版本起
+    没有变过，直接读取图中的当前数据。记忆尚未加载的节点只保存强化时间、连接和记忆条数，它的记忆此后第一次
+    变化之前一定会先加载并补存，因此读取记忆时继续向更新的快照查找。发布新版本只是创建一个空快照并替换指针，与图的大小无关；
+    读者不需要加锁，跨越 await 的多次读取也始终看到同一个版本，不会看到只应用了一半的修改。
+
+    主题倒排索引和向量索引同样只有一份：查询时过滤掉这个版本中还不存在的节点，并用保存的旧状态
+    补上之后被删除的节点（向量在删除时保存到当时最新的快照中）。
+    """
+
+    def __init__(self, graph, version: int):
+        self.version = version
+        self._graph = graph
+        # 图被整体重新加载时会换成新的存储，旧快照继续读取加载前的存储
+        self._store = graph.store
+        self._topic_index = graph.topic_index
+        self._embedding_index = graph.embedding_index
+        self._lazy_counts = graph._lazy_counts
+        self._item_meta = graph.item_meta
+        self._saved = {}  # 概念 -> 该版本时的 NodeView，None 表示该版本时节点不存在
+        self._vectors = {}  # 在该版本之后被删除的概念 -> 删除前的向量
+        self._preloaded = {}  # 记忆尚未加载的概念 -> 预先从数据库读取的 (记忆列表, 元数据)
+        self._newer = None
+
+    def _lookup(self, concept):
+        """查找节点在该版本时的状态
+
+        Returns:
+            tuple: (是否保存过旧状态, NodeView 或 None)
+        """
+        snapshot = self
+        while snapshot is not None:
+            saved = snapshot._saved
+            if concept in saved:
+                return True, saved[concept]
+            snapshot = snapshot._newer
+        return False, None
+
+    def _items_view(self, concept):
+        """查找保存了该版本时记忆的旧状态，跳过记忆尚未加载时保存的
+
+        Returns:
+            NodeView 或 None（记忆从这个版本起没有变过，读取图中的当前数据）
+        """
+        snapshot = self
+        while snapshot is not None:
+            view = snapshot._saved.get(concept)
+            if view is not None and view.items is not None:
+                return view
+            snapshot = snapshot._newer
+        return None
+
+    @property
+    def embedding_version(self) -> int:
+        """读取的向量索引的版本，检索缓存以它判断语义匹配的结果是否过期"""
+        return self._embedding_index.version if self._embedding_index is not None else 0
+
+    def _saved_states(self) -> dict:
+        """这个版本之后变化过的节点 -> 该版本时的 NodeView（None 表示当时不存在），耗时与之后的变更量成正比"""
+        states = {}
+        snapshot = self
+        while snapshot is not None:
+            for concept, view in snapshot._saved.items():
+                states.setdefault(concept, view)
+            snapshot = snapshot._newer
+        return states
+
+    def _saved_vector(self, concept):
+        snapshot = self
+        while snapshot is not None:
+            vector = snapshot._vectors.get(concept)
+            if vector is not None:
+                return vector
+            snapshot = snapshot._newer
+        return None
+
+    @property
+    def _live(self) -> bool:
+        return self._store is self._graph.store
+
+    def _unloaded(self, concept) -> bool:
+        """节点在这个版本中存在，且它的记忆只能从数据库读取"""
+        found, view = self._lookup(concept)
+        if found and view is None:
+            return False
+        return concept in self._lazy_counts and self._items_view(concept) is None and concept in self._store
+
+    def preload_items(self, concepts) -> int:
+        """一次读取这些节点中记忆尚未加载的节点的记忆，之后从这个快照读取它们不再访问数据库
+
+        读取是同步的数据库查询，检索时在线程池中调用，不阻塞事件循环；读到的记忆只保存在这个快照中，不修改图。
+
+        Returns:
+            int: 从数据库读取的节点数
+        """
+        loader = self._graph.item_loader
+        if loader is None:
+            return 0
+        missing = [concept for concept in dict.fromkeys(concepts) if concept not in self._preloaded and self._unloaded(concept)]
+        if not missing:
+            return 0
+        loaded = loader(missing)
+        for concept in missing:
+            memory_items, meta = loaded.get(concept, ([], None))
+            if meta is None:
+                meta = new_meta(len(memory_items), self._store.get_node_time(concept))
+            self._preloaded[concept] = (list(memory_items), meta)
+        return len(missing)
+
+    def _load_items(self, concept) -> tuple:
+        """读取记忆尚未加载的节点的记忆和元数据，预先读取过的不再访问数据库"""
+        preloaded = self._preloaded.get(concept)
+        if preloaded is not None:
+            return list(preloaded[0]), preloaded[1].copy()
+        if self._live:
+            return self._graph.get_memory_items(concept), self._graph.get_item_meta(concept).copy()
+        loader = self._graph.item_loader
+        memory_items, meta = loader([concept]).get(concept, ([], None)) if loader is not None else ([], None)
+        if meta is None:
+            meta = new_meta(len(memory_items), self._store.get_node_time(concept))
+        return list(memory_items), meta
+
+    def __contains__(self, concept) -> bool:
+        found, view = self._lookup(concept)
+        if found:
+            return view is not None
+        return concept in self._store
+
+    def nodes(self) -> list:
+        concepts = set(self._store.nodes())
+        seen = set()
+        snapshot = self
+        while snapshot is not None:
+            for concept, view in snapshot._saved.items():
+                if concept in seen:
+                    continue
+                seen.add(concept)
+                if view is None:
+                    concepts.discard(concept)
+                else:
+                    concepts.add(concept)
+            snapshot = snapshot._newer
+        return list(concepts)
+
+    def memory_count(self, concept) -> int:
+        found, view = self._lookup(concept)
+        if found:
+            return view.count if view is not None else 0
+        if concept not in self._store:
+            return 0
+        count = self._lazy_counts.get(concept)
+        return count if count is not None else self._store.item_count(concept)
+
+    def get_memory_items(self, concept) -> list:
+        found, view = self._lookup(concept)
+        if found and view is None:
+            return []
+        view = self._items_view(concept)
+        if view is not None:
+            return list(view.items)
+        if concept not in self._store:
+            return []
+        if concept in self._lazy_counts:
+            # 记忆尚未加载的节点按需从数据库读取
+            return self._load_items(concept)[0]
+        return self._store.get_items(concept)
+
+    def get_item_meta(self, concept):
+        """记忆元数据的副本，与 get_memory_items 的顺序一致"""
+        found, view = self._lookup(concept)
+        if found and view is None:
+            return new_meta(0, 0.0)
+        view = self._items_view(concept)
+        if view is not None:
+            return view.meta.copy()
+        if concept not in self._store:
+            return new_meta(0, 0.0)
+        if concept in self._lazy_counts:
+            return self._load_items(concept)[1]
+        meta = self._item_meta.get(concept)
+        if meta is not None and len(meta) == self._store.item_count(concept):
+            return meta.copy()
+        # 只通过连接创建的节点还没有记忆
+        return new_meta(self._store.item_count(concept), self._store.get_node_time(concept))
+
+    def get_node_time(self, concept) -> float:
+        found, view = self._lookup(concept)
+        if found:
+            return view.reinforced_at if view is not None else 0.0
+        return self._store.get_node_time(concept)
+
+    def neighbors(self, concept) -> list:
+        found, view = self._lookup(concept)
+        if found:
+            return list(view.neighbors) if view is not None else []
+        if concept not in self._store:
+            return []
+        return list(self._store.neighbors(concept))
+
+    def degree(self, concept) -> int:
+        return len(self.neighbors(concept))
+
+    def _edge(self, concept1, concept2):
+        """(强度, 强化时间)，不相连时返回 None"""
+        # 连接变化时两端的节点都会保存旧状态，查一端即可
+        found, view = self._lookup(concept1)
+        if found:
+            return view.neighbors.get(concept2) if view is not None else None
+        strength = self._store.get_strength(concept1, concept2)
+        if strength is None:
+            return None
+        return strength, self._store.get_edge_time(concept1, concept2)
+
+    def get_strength(self, concept1, concept2, default=None):
+        edge = self._edge(concept1, concept2)
+        return edge[0] if edge is not None else default
+
+    def decayed_strength(self, concept1, concept2, now: float = None) -> float:
+        edge = self._edge(concept1, concept2)
+        if edge is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return self._graph.forget_queue.decayed(edge[0], edge[1], now)
+
+    def get_related_item(self, topic, depth=1):
+        if topic not in self:
+            return [], []
+        first_layer_items = self.get_memory_items(topic)
+        second_layer_items = []
+        if depth >= 2:
+            for neighbor in self.neighbors(topic):
+                second_layer_items.extend(self.get_memory_items(neighbor))
+        return first_layer_items, second_layer_items
+
+    def get_dot(self, concept):
+        if concept in self:
+            return concept, {'memory_items': self.get_memory_items(concept)}
+        return None
+
+    def query_topics(self, text: str, similarity_threshold: float = 0.4) -> list:
+        """在主题倒排索引中查找相似的节点，只返回这个版本中存在的节点"""
+        results = [
+            (concept, similarity)
+            for concept, similarity in self._topic_index.query(text, similarity_threshold)
+            if concept in self
+        ]
+        removed = [
+            concept for concept, view in self._saved_states().items()
+            if view is not None and concept not in self._topic_index
+        ]
+        if removed:
+            overlay = TopicIndex()
+            for concept in removed:
+                overlay.add(concept)
+            results.extend(overlay.query(text, similarity_threshold))
+        return results
+
+    def query_embeddings(self, vector, top_k: int = 5, similarity_threshold: float = 0.0) -> list:
+        """在向量索引中查找最相似的节点，只返回这个版本中存在的节点
+
+        Returns:
+            list: 按相似度降序排列的 (概念, 相似度) 元组列表
+        """
+        index = self._embedding_index
+        if index is None:
+            return []
+        states = self._saved_states()
+        # 之后新增的节点可能占掉名额，多取这么多条再过滤
+        added = sum(1 for view in states.values() if view is None)
+        results = [
+            (concept, similarity)
+            for concept, similarity in index.query(vector, top_k + added, similarity_threshold)
+            if concept in self
+        ]
+        query = index.normalize(vector)
+        for concept, view in states.items():
+            if view is None or concept in index:
+                continue
+            saved = self._saved_vector(concept)
+            if saved is not None and saved.shape == query.shape:
+                similarity = float(np.dot(saved, query))
+                if similarity >= similarity_threshold:
+                    results.append((concept, similarity))
+        results.sort(key=lambda match: match[1], reverse=True)
+        return results[:top_k]
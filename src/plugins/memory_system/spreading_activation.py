@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import heapq
+import time
+
+
+def edge_weight(strength: float) -> float:
+    """连接强度对应的传播系数，在 (0, 1) 之间，强度越大越接近 1"""
+    return strength / (strength + 1.0) if strength > 0 else 0.0
+
+
+def spread_activation(graph, seeds: dict, decay: float = 0.5, max_hops: int = 2, max_nodes: int = 30,
+                      min_activation: float = 0.05, time_budget: float = None, now: float = None):
+    """从匹配到的概念出发，沿连接扩散激活值
+
+    激活值每经过一条边乘以 decay 和该边（按时间衰减后的）强度对应的系数，节点取所有路径中的最大值。
+    用最大堆按激活值从高到低展开节点，激活值只会越传越小，因此出堆顺序就是最终的激活值顺序，
+    可以在激活值低于 min_activation、已展开 max_nodes 个节点或超出 time_budget 时直接停止，
+    耗时只与展开的节点及其连接数有关，与图的大小无关。
+
+    Args:
+        graph: 记忆图，需要提供 neighbors 和 decayed_strength
+        seeds: 概念 -> 初始激活值（匹配相似度）
+        decay: 每传播一跳的衰减系数
+        max_hops: 最多传播的跳数，0 表示只返回种子概念
+        max_nodes: 最多返回的概念数
+        min_activation: 激活值低于该值的概念不再展开
+        time_budget: 耗时上限（秒），None 表示不限制
+        now: 计算连接强度衰减的时间，默认为当前时间
+
+    Returns:
+        tuple: ((概念, 激活值, 跳数) 列表（按激活值从高到低）, 统计信息)
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget is not None else None
+    now = time.time() if now is None else now
+
+    best = {}
+    heap = []
+    for concept, activation in seeds.items():
+        if activation >= min_activation and activation > best.get(concept, 0.0):
+            best[concept] = activation
+            heap.append((-activation, concept, 0))
+    heapq.heapify(heap)
+
+    activated = []
+    settled = set()
+    edges_scanned = 0
+    truncated = False
+    while heap and len(activated) < max_nodes:
+        if deadline is not None and time.perf_counter() > deadline:
+            truncated = True
+            break
+        negative, concept, hops = heapq.heappop(heap)
+        activation = -negative
+        if concept in settled or activation < best.get(concept, 0.0):
+            # 已经以更高的激活值出堆过
+            continue
+        settled.add(concept)
+        activated.append((concept, activation, hops))
+        if hops >= max_hops:
+            continue
+        spread = activation * decay
+        if spread < min_activation:
+            continue
+        for neighbor in graph.neighbors(concept):
+            edges_scanned += 1
+            # 连接很多的节点在展开过程中也检查耗时，超时后由外层循环结束
+            if deadline is not None and edges_scanned % 1024 == 0 and time.perf_counter() > deadline:
+                break
+            if neighbor in settled:
+                continue
+            value = spread * edge_weight(graph.decayed_strength(concept, neighbor, now))
+            if value < min_activation or value <= best.get(neighbor, 0.0):
+                continue
+            best[neighbor] = value
+            heapq.heappush(heap, (-value, neighbor, hops + 1))
+
+    stats = {
+        'nodes': len(activated),
+        'edges_scanned': edges_scanned,
+        'truncated': truncated,
+        'elapsed': time.perf_counter() - start,
+    }
+    return activated, stats
+
+
+def select_activated_memories(activated_topics: list, max_memory_num: int) -> list:
+    """按激活值从高到低选出记忆，每个主题最多 max_memory_num // 2 条（取最新的），不随机抽取
+
+    同一段文本每次检索得到相同的结果，激活值最高的主题的记忆总是排在前面。
+
+    Args:
+        activated_topics: (主题, 激活值, 记忆列表, 记忆创建时间) 元组列表
+        max_memory_num: 最多返回的记忆条数
+
+    Returns:
+        list: {'topic', 'similarity', 'content'} 字典列表，similarity 为主题的激活值
+    """
+    per_topic = max(1, max_memory_num // 2)
+    candidates = []
+    for topic, activation, memories, created in activated_topics:
+        # 同一主题内从新到旧，超出条数时先去掉较旧的
+        for index in sorted(range(len(memories)), key=lambda index: created[index], reverse=True)[:per_topic]:
+            candidates.append({
+                'topic': topic,
+                'similarity': activation,
+                'content': memories[index]
+            })
+    # 排序是稳定的，激活值相同的主题保持扩散时的出堆顺序
+    candidates.sort(key=lambda x: x['similarity'], reverse=True)
+    return candidates[:max_memory_num]
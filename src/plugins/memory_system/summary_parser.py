@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import json
+
+
+def parse_topic_summaries(content: str, topics: list) -> dict:
+    """严格解析批量概括的JSON输出，只接受请求过的话题和非空字符串
+
+    解析失败时返回空字典，缺失或格式不对的话题不在结果中，由调用方逐个话题重新请求
+
+    Args:
+        content: 模型的输出
+        topics: 请求概括的话题
+
+    Returns:
+        dict: 话题 -> 概括
+    """
+    # 允许模型用 ```json 代码块包裹输出
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        return {}
+    try:
+        data = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    summaries = {}
+    for topic in topics:
+        summary = data.get(topic)
+        if isinstance(summary, str) and summary.strip():
+            summaries[topic] = summary.strip()
+    return summaries
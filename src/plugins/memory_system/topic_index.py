@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import math
+from collections import Counter, defaultdict
+
+import jieba
+
+
+def tokenize_topic(text: str) -> Counter:
+    """将主题文本转换为词频向量，与 chat.utils.text_to_vector 的分词方式保持一致"""
+    return Counter(jieba.lcut(text))
+
+
+class TopicIndex:
+    """记忆主题的倒排索引
+
+    维护 词 -> 节点集合 的倒排表，以及每个节点预先计算好的词频向量和向量模长。
+    查询时只对与输入主题至少共享一个词的候选节点计算余弦相似度，
+    避免每条消息都对全图所有节点重新分词。
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)  # 词 -> 包含该词的节点
+        self._vectors = {}  # 节点 -> (词频向量, 模长)
+
+    def __contains__(self, concept) -> bool:
+        return concept in self._vectors
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def add(self, concept: str):
+        """将节点加入索引，已存在的节点直接跳过"""
+        if concept in self._vectors:
+            return
+        vector = tokenize_topic(concept)
+        norm = math.sqrt(sum(count * count for count in vector.values()))
+        self._vectors[concept] = (vector, norm)
+        for word in vector:
+            self._postings[word].add(concept)
+
+    def remove(self, concept: str):
+        """从索引中移除节点"""
+        entry = self._vectors.pop(concept, None)
+        if entry is None:
+            return
+        vector, _ = entry
+        for word in vector:
+            posting = self._postings.get(word)
+            if posting is None:
+                continue
+            posting.discard(concept)
+            if not posting:
+                del self._postings[word]
+
+    def clear(self):
+        self._postings.clear()
+        self._vectors.clear()
+
+    def rebuild(self, concepts):
+        """根据给定的节点列表重建索引"""
+        self.clear()
+        for concept in concepts:
+            self.add(concept)
+
+    def _score(self, vector: Counter, norm: float, concept: str) -> float:
+        memory_vector, memory_norm = self._vectors[concept]
+        if norm == 0 or memory_norm == 0:
+            return 0
+        # 只需遍历较短的向量即可得到点积
+        if len(vector) > len(memory_vector):
+            vector, memory_vector = memory_vector, vector
+        dot_product = sum(count * memory_vector.get(word, 0) for word, count in vector.items())
+        return dot_product / (norm * memory_norm)
+
+    def similarity(self, text: str, concept: str) -> float:
+        """计算任意文本与索引中某个节点的余弦相似度"""
+        if concept not in self._vectors:
+            return 0
+        vector = tokenize_topic(text)
+        norm = math.sqrt(sum(count * count for count in vector.values()))
+        return self._score(vector, norm, concept)
+
+    def query(self, text: str, similarity_threshold: float = 0.4) -> list:
+        """查找与文本相似的节点
+
+        Args:
+            text: 输入主题
+            similarity_threshold: 相似度阈值
+
+        Returns:
+            list: (节点, 相似度) 元组列表，按相似度从高到低排列，相似度相同时按节点名排列
+        """
+        vector = tokenize_topic(text)
+        norm = math.sqrt(sum(count * count for count in vector.values()))
+        if norm == 0:
+            return []
+
+        candidates = set()
+        for word in vector:
+            posting = self._postings.get(word)
+            if posting:
+                candidates |= posting
+
+        results = []
+        for concept in candidates:
+            similarity = self._score(vector, norm, concept)
+            if similarity >= similarity_threshold:
+                results.append((concept, similarity))
+        # 候选来自集合，排序后结果与集合的遍历顺序无关
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
+
+    def token_count(self, text: str) -> int:
+        """文本分词后不同词的个数，索引中的节点直接使用预先计算的词频向量"""
+        entry = self._vectors.get(text)
+        return len(entry[0]) if entry is not None else len(tokenize_topic(text))
+
+    def generalizations(self, text: str, similarity_threshold: float) -> list:
+        """查找 text 的更一般的写法：节点的词都出现在 text 中，且相似度不低于阈值（如"玩原神"之于"原神"）
+
+        Returns:
+            list: (节点, 相似度) 元组列表，不包含 text 本身
+        """
+        words = tokenize_topic(text).keys()
+        return [
+            (concept, similarity)
+            for concept, similarity in self.query(text, similarity_threshold)
+            if concept != text and self._vectors[concept][0].keys() <= words
+        ]
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+def record_information(record: dict) -> float:
+    """消息存储时算好的信息量，旧消息没有时按处理后的文本现算"""
+    information = record.get('info')
+    if information is None:
+        from ..chat.utils import calculate_message_information
+        information = calculate_message_information(record.get('processed_plain_text', ''))
+    return information
+
+
+def window_density(records: list) -> float:
+    """片段中平均每条消息的信息量（比特）"""
+    if not records:
+        return 0.0
+    return sum(record_information(record) for record in records) / len(records)
+
+
+class ChatWindowIndex:
+    """聊天片段的信息量索引
+
+    每个群的消息按存储顺序每 window_size 条组成一个片段，封口时写入平均信息量 density。
+    记忆构建直接从索引中挑选信息量高的片段，不读取消息本身就能跳过全是表情包、"哈哈"之类的片段。
+
+    索引不在消息存储时逐条维护，而是在采样前由 refresh 批量补上此后存储的消息：
+    读取进度（最后处理的消息 _id）和各群未满的片段都保存在同一个状态文档里，每个群同一时间只有一个未满的片段；
+    封口的片段以 群号:第一条消息的 _id 为主键写入，重复补录不会产生重复的片段。
+
+    消息间隔超过 max_gap 的两段聊天不放进同一个片段：群里隔了这么久才有新消息时，未满的片段先封口；
+    补录读到的最新消息比某个群未满片段的最后一条晚 max_gap 以上时，这个片段也封口，
+    不再活跃的群的最后一段聊天不会因为凑不满 window_size 条而一直不能被采样。
+    """
+
+    STATE_ID = 'refresh_state'
+
+    def __init__(self, collection, window_size: int = 20, batch_size: int = 5000, max_gap: float = 2 * 3600):
+        """
+        Args:
+            collection: 片段索引所在的集合
+            window_size: 每个片段的消息条数
+            batch_size: refresh 每次读取的消息条数
+            max_gap: 片段中相邻消息的最大间隔（秒），按消息时间而不是当前时间计算，补录历史记录时同样适用
+        """
+        self.collection = collection
+        self.window_size = window_size
+        self.batch_size = batch_size
+        self.max_gap = max_gap
+
+    def ensure_indexes(self):
+        self.collection.create_index([('closed', 1), ('start', 1)])
+
+    def _load_state(self) -> dict:
+        state = self.collection.find_one({'_id': self.STATE_ID})
+        if state is None:
+            state = {'_id': self.STATE_ID, 'last_id': None, 'open': {}}
+        return state
+
+    def refresh(self, messages, max_messages: int = 50000) -> int:
+        """把上次补录之后存储的消息计入各群的片段
+
+        Args:
+            messages: 消息集合
+            max_messages: 本次最多处理的消息条数，剩下的留到下次
+
+        Returns:
+            int: 数据库往返次数
+        """
+        state = self._load_state()
+        round_trips = 1
+        last_id = state['last_id']
+        open_windows = state['open']
+        processed = 0
+        while processed < max_messages:
+            query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+            records = list(messages.find(query, {'group_id': 1, 'time': 1, 'info': 1, 'processed_plain_text': 1})
+                           .sort('_id', 1).limit(min(self.batch_size, max_messages - processed)))
+            round_trips += 1
+            if not records:
+                break
+            closed = []
+            for record in records:
+                key = str(record.get('group_id'))
+                window = open_windows.get(key)
+                if window is not None and record['time'] - window['end'] > self.max_gap:
+                    # 隔了很久的新消息是另一段聊天
+                    closed.append(open_windows.pop(key))
+                    window = None
+                if window is None:
+                    window = open_windows[key] = {
+                        'group_id': record.get('group_id'), 'first_id': str(record['_id']),
+                        'start': record['time'], 'end': record['time'], 'count': 0, 'score': 0.0,
+                    }
+                window['start'] = min(window['start'], record['time'])
+                window['end'] = max(window['end'], record['time'])
+                window['count'] += 1
+                window['score'] += record_information(record)
+                if window['count'] >= self.window_size:
+                    closed.append(open_windows.pop(key))
+            latest = max(record['time'] for record in records)
+            for key in [key for key, window in open_windows.items() if latest - window['end'] > self.max_gap]:
+                closed.append(open_windows.pop(key))
+            if closed:
+                self.collection.bulk_write([
+                    UpdateOne(
+                        {'_id': f"{window['group_id']}:{window['first_id']}"},
+                        {'$set': {
+                            'group_id': window['group_id'], 'start': window['start'], 'end': window['end'],
+                            'count': window['count'], 'closed': True, 'density': window['score'] / window['count'],
+                        }},
+                        upsert=True
+                    )
+                    for window in closed
+                ], ordered=False)
+                round_trips += 1
+            # 只有读到的进度与开始时相同才推进，同时运行的另一次补录已经推进过时放弃本次结果
+            try:
+                result = self.collection.update_one(
+                    {'_id': self.STATE_ID, 'last_id': last_id},
+                    {'$set': {'last_id': records[-1]['_id'], 'open': open_windows}},
+                    upsert=last_id is None
+                )
+            except DuplicateKeyError:
+                # 第一次补录时另一次补录先创建了状态文档
+                break
+            round_trips += 1
+            if result.matched_count == 0 and result.upserted_id is None:
+                break
+            last_id = records[-1]['_id']
+            processed += len(records)
+            if len(records) < self.batch_size:
+                break
+        return round_trips
+
+    def top_windows(self, bands: list, min_density: float) -> list:
+        """一次查询取出每个时间段内平均信息量最高的若干个已封口片段
+
+        Args:
+            bands: (开始时间, 结束时间, 最多返回的片段数) 列表
+            min_density: 平均信息量低于该值的片段不返回
+
+        Returns:
+            list: 与 bands 一一对应的片段列表，按平均信息量降序排列
+        """
+        if not bands:
+            return []
+        facets = {
+            str(i): [
+                {'$match': {'start': {'$gte': start}, 'end': {'$lt': end}}},
+                {'$sort': {'density': -1}},
+                {'$limit': max(1, limit)},
+            ]
+            for i, (start, end, limit) in enumerate(bands)
+        }
+        pipeline = [
+            {'$match': {'closed': True, 'density': {'$gte': min_density}, 'start': {'$gte': min(start for start, _, _ in bands)}}},
+            {'$project': {'_id': 0, 'group_id': 1, 'start': 1, 'end': 1, 'density': 1}},
+            {'$facet': facets},
+        ]
+        result = next(iter(self.collection.aggregate(pipeline)), {})
+        return [result.get(str(i), []) for i in range(len(bands))]
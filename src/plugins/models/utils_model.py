@@ -346,12 +346,14 @@ class LLM_request:
             } 
         # 防止小朋友们截图自己的key
 
-    async def generate_response(self, prompt: str) -> Tuple[str, str]:
+    async def generate_response(self, prompt: str, request_type: str = "chat", user_id: str = "system") -> Tuple[str, str]:
         """根据输入的提示生成模型的异步响应"""
 
         content, reasoning_content = await self._execute_request(
             endpoint="/chat/completions",
-            prompt=prompt
+            prompt=prompt,
+            user_id=user_id,
+            request_type=request_type
         )
         return content, reasoning_content
 
@@ -365,7 +367,7 @@ class LLM_request:
         )
         return content, reasoning_content
 
-    async def generate_response_async(self, prompt: str, **kwargs) -> Union[str, Tuple[str, str]]:
+    async def generate_response_async(self, prompt: str, request_type: str = "chat", user_id: str = "system", **kwargs) -> Union[str, Tuple[str, str]]:
         """异步方式根据输入的提示生成模型的响应"""
         # 构建请求体
         data = {
@@ -378,7 +380,9 @@ class LLM_request:
         content, reasoning_content = await self._execute_request(
             endpoint="/chat/completions",
             payload=data,
-            prompt=prompt
+            prompt=prompt,
+            user_id=user_id,
+            request_type=request_type
         )
         return content, reasoning_content
 
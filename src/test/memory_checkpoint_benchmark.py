@@ -0,0 +1,125 @@
+"""
+记忆图冷启动耗时对比：逐条加载 vs 本地快照+日志
+
+用法:
+    python src/test/memory_checkpoint_benchmark.py
+    python src/test/memory_checkpoint_benchmark.py --sizes 10000 100000 --mongo-uri mongodb://127.0.0.1:27017
+
+不提供 --mongo-uri 时，逐条加载使用内存中的文档列表模拟，只统计建图开销（真实环境还要加上网络与反序列化耗时）
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import networkx as nx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.plugins.memory_system.item_meta import UNKNOWN_GROUP  # noqa: E402
+from src.plugins.memory_system.memory_checkpoint import MemoryCheckpoint  # noqa: E402
+
+
+def generate_graph_docs(node_count: int, avg_degree: int = 4, items_per_node: int = 3):
+    """生成与 graph_data 集合结构一致的节点和边文档"""
+    rng = random.Random(node_count)
+    node_docs = []
+    for i in range(node_count):
+        node_docs.append({
+            'concept': f'概念{i}',
+            'memory_items': [f'关于概念{i}的第{j}条记忆，群友们聊到了相关的话题' for j in range(items_per_node)],
+        })
+    edge_docs = []
+    seen = set()
+    for _ in range(node_count * avg_degree // 2):
+        a, b = rng.randrange(node_count), rng.randrange(node_count)
+        if a == b:
+            continue
+        key = (min(a, b), max(a, b))
+        if key in seen:
+            continue
+        seen.add(key)
+        edge_docs.append({'source': f'概念{key[0]}', 'target': f'概念{key[1]}', 'strength': rng.randint(1, 5)})
+    return node_docs, edge_docs
+
+
+def load_one_by_one(node_docs, edge_docs):
+    """原来的加载方式：逐个 add_node / add_edge"""
+    G = nx.Graph()
+    for node in node_docs:
+        G.add_node(node['concept'], memory_items=node.get('memory_items', []))
+    for edge in edge_docs:
+        if edge['source'] in G and edge['target'] in G:
+            G.add_edge(edge['source'], edge['target'], strength=edge.get('strength', 1))
+    return G
+
+
+def load_from_checkpoint(checkpoint: MemoryCheckpoint):
+    _, nodes, edges, _, _, _ = checkpoint.load()
+    G = nx.Graph()
+    G.add_nodes_from((concept, {'memory_items': items}) for concept, items in nodes.items())
+    G.add_edges_from(
+        (source, target, {'strength': strength})
+        for (source, target), strength in edges.items()
+        if source in nodes and target in nodes
+    )
+    return G
+
+
+def bench_mongo(uri, node_docs, edge_docs):
+    import pymongo
+
+    client = pymongo.MongoClient(uri)
+    db = client['memory_checkpoint_benchmark']
+    db.graph_data.nodes.drop()
+    db.graph_data.edges.drop()
+    db.graph_data.nodes.insert_many([dict(doc) for doc in node_docs])
+    db.graph_data.edges.insert_many([dict(doc) for doc in edge_docs])
+    start = time.perf_counter()
+    load_one_by_one(list(db.graph_data.nodes.find()), list(db.graph_data.edges.find()))
+    elapsed = time.perf_counter() - start
+    client.drop_database('memory_checkpoint_benchmark')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='记忆图冷启动耗时对比')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--journal', type=int, default=200, help='快照之后追加的日志条数')
+    parser.add_argument('--mongo-uri', default=None)
+    args = parser.parse_args()
+
+    print(f"{'节点数':>8} {'边数':>8} {'逐条加载(s)':>12} {'MongoDB(s)':>12} {'快照+日志(s)':>14} {'快照大小(MB)':>14}")
+    for size in args.sizes:
+        node_docs, edge_docs = generate_graph_docs(size)
+
+        start = time.perf_counter()
+        load_one_by_one(node_docs, edge_docs)
+        one_by_one = time.perf_counter() - start
+
+        mongo_time = bench_mongo(args.mongo_uri, node_docs, edge_docs) if args.mongo_uri else None
+
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = MemoryCheckpoint(directory)
+            nodes = {doc['concept']: doc['memory_items'] for doc in node_docs}
+            edges = {(doc['source'], doc['target']): doc['strength'] for doc in edge_docs}
+            checkpoint.write_checkpoint(1, nodes, edges)
+            for version in range(2, args.journal + 2):
+                concept = f'概念{version % size}'
+                added = ('add', '新的记忆', (float(version), float(version), UNKNOWN_GROUP))
+                checkpoint.append(version, [(concept, float(version), len(nodes[concept]) + 1, False, [added])], [], [], [])
+            size_mb = os.path.getsize(checkpoint.checkpoint_path) / 1024 / 1024
+
+            start = time.perf_counter()
+            G = load_from_checkpoint(checkpoint)
+            snapshot_time = time.perf_counter() - start
+            assert G.number_of_nodes() == size
+
+        mongo_str = f"{mongo_time:.3f}" if mongo_time is not None else "-"
+        print(f"{size:>8} {len(edge_docs):>8} {one_by_one:>12.3f} {mongo_str:>12} {snapshot_time:>14.3f} {size_mb:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+记忆图存储后端对比：networkx vs compact
+
+先用随机操作序列检查两个后端的行为是否一致，再在大规模图上对比内存占用和常用操作的耗时
+
+用法:
+    python src/test/memory_graph_backend_benchmark.py
+    python src/test/memory_graph_backend_benchmark.py --nodes 50000 --degree 6
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.plugins.memory_system.graph_store import CompactGraphStore, NxGraphStore  # noqa: E402
+
+
+def snapshot(store):
+    nodes = {concept: store.get_items(concept) for concept in store.nodes()}
+    edges = {}
+    for source, target, strength in store.edges():
+        edges[tuple(sorted((source, target)))] = strength
+    return nodes, edges
+
+
+def check_equivalence(operations: int = 20000, seed: int = 0):
+    """对两个后端执行相同的随机操作序列，比较每一步的读结果和最终状态"""
+    rng = random.Random(seed)
+    reference = NxGraphStore()
+    # 调小合并阈值，让增量缓冲区频繁合并进 CSR
+    compact = CompactGraphStore(min_delta=64)
+    concepts = [f'概念{i}' for i in range(300)]
+
+    for step in range(operations):
+        op = rng.random()
+        a, b = rng.choice(concepts), rng.choice(concepts)
+        for store in (reference, compact):
+            if op < 0.3:
+                store.add_node(a)
+                store.append_item(a, f'{a}的记忆{step}')
+                store.set_node_time(a, float(step))
+            elif op < 0.6:
+                store.add_node(a)
+                store.add_node(b)
+                store.set_strength(a, b, (store.get_strength(a, b) or 0) + 1, float(step))
+            elif op < 0.65 and a in store:
+                store.remove_node(a)
+            elif op < 0.7:
+                store.remove_edge(a, b)
+            elif op < 0.75 and a in store:
+                items = store.get_items(a)
+                store.set_items(a, items[1:])
+        assert (a in reference) == (a in compact), step
+        if a in reference:
+            assert reference.get_items(a) == compact.get_items(a), step
+            assert sorted(reference.neighbors(a)) == sorted(compact.neighbors(a)), step
+            assert reference.degree(a) == compact.degree(a), step
+            assert reference.get_node_time(a) == compact.get_node_time(a), step
+        assert reference.get_strength(a, b) == compact.get_strength(a, b), step
+        assert reference.get_edge_time(a, b) == compact.get_edge_time(a, b), step
+
+    assert snapshot(reference) == snapshot(compact)
+    nodes, edges = snapshot(reference)
+    reloaded = CompactGraphStore()
+    reloaded.load(nodes, edges)
+    assert snapshot(reloaded) == (nodes, edges)
+    print(f"行为一致性检查通过: {operations} 次随机操作, 最终节点 {len(nodes)}, 边 {len(edges)}")
+
+
+def generate_graph(node_count: int, avg_degree: int, items_per_node: int = 3):
+    rng = random.Random(node_count)
+    nodes = {
+        f'概念{i}': [f'关于概念{i}的第{j}条记忆，群友们聊到了相关的话题' for j in range(items_per_node)]
+        for i in range(node_count)
+    }
+    edges = {}
+    for _ in range(node_count * avg_degree // 2):
+        a, b = rng.randrange(node_count), rng.randrange(node_count)
+        if a != b:
+            edges[(f'概念{min(a, b)}', f'概念{max(a, b)}')] = rng.randint(1, 5)
+    return nodes, edges
+
+
+def measure(store_cls, nodes, edges, queries):
+    tracemalloc.start()
+    store = store_cls()
+    start = time.perf_counter()
+    store.load(nodes, edges)
+    load_time = time.perf_counter() - start
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for concept in queries:
+        for neighbor in store.neighbors(concept):
+            store.get_strength(concept, neighbor)
+    neighbor_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for concept in queries:
+        store.get_items(concept)
+    items_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, concept in enumerate(queries):
+        store.append_item(concept, f'新的记忆{i}')
+        store.set_strength(concept, queries[i - 1], 1)
+    write_time = time.perf_counter() - start
+    return load_time, memory_mb, neighbor_time, items_time, write_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='记忆图存储后端对比')
+    parser.add_argument('--nodes', type=int, default=50000)
+    parser.add_argument('--degree', type=int, default=6)
+    parser.add_argument('--queries', type=int, default=10000)
+    args = parser.parse_args()
+
+    check_equivalence()
+
+    nodes, edges = generate_graph(args.nodes, args.degree)
+    rng = random.Random(1)
+    queries = rng.sample(list(nodes), min(args.queries, len(nodes)))
+    print(f"\n节点 {len(nodes)}, 边 {len(edges)}, 查询 {len(queries)} 次")
+    print(f"{'后端':>10} {'加载(s)':>10} {'内存(MB)':>10} {'邻居+强度(ms)':>14} {'记忆项(ms)':>12} {'写入(ms)':>10}")
+    for name, store_cls in (('networkx', NxGraphStore), ('compact', CompactGraphStore)):
+        load_time, memory_mb, neighbor_time, items_time, write_time = measure(store_cls, nodes, edges, queries)
+        print(f"{name:>10} {load_time:>10.3f} {memory_mb:>10.1f} {neighbor_time * 1000:>14.1f} {items_time * 1000:>12.1f} {write_time * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
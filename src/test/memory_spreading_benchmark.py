@@ -0,0 +1,136 @@
+"""
+扩散激活检索的耗时：在约 10 万条连接的随机图上对比扩散激活与 depth=2 的全部邻居展开
+
+用法:
+    python src/test/memory_spreading_benchmark.py
+    python src/test/memory_spreading_benchmark.py --nodes 50000 --edges 100000 --degree-dist powerlaw --backend compact
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import networkx as nx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.plugins.memory_system.forget_queue import ForgetQueue  # noqa: E402
+from src.plugins.memory_system.graph_store import create_graph_store  # noqa: E402
+from src.plugins.memory_system.spreading_activation import spread_activation  # noqa: E402
+
+
+class BenchGraph:
+    """只包含扩散激活用到的接口，与 Memory_graph 的实现相同，不需要数据库"""
+
+    def __init__(self, backend: str, half_life: float):
+        self.store = create_graph_store(backend)
+        self.forget_queue = ForgetQueue(half_life)
+
+    def neighbors(self, concept) -> list:
+        return list(self.store.neighbors(concept))
+
+    def decayed_strength(self, concept1, concept2, now: float = None) -> float:
+        strength = self.store.get_strength(concept1, concept2)
+        if strength is None:
+            return 0.0
+        return self.forget_queue.decayed(strength, self.store.get_edge_time(concept1, concept2), now)
+
+
+def build_graph(node_count: int, edge_count: int, degree_dist: str, backend: str, seed: int) -> BenchGraph:
+    rng = random.Random(seed)
+    if degree_dist == 'powerlaw':
+        topology = nx.barabasi_albert_graph(node_count, max(1, edge_count // node_count), seed=seed)
+    else:
+        topology = nx.gnm_random_graph(node_count, edge_count, seed=seed)
+    now = time.time()
+    nodes = {f'概念{i}': [f'关于概念{i}的记忆{j}' for j in range(rng.randint(1, 5))] for i in range(node_count)}
+    edges = {}
+    edge_times = {}
+    for a, b in topology.edges():
+        key = (f'概念{min(a, b)}', f'概念{max(a, b)}')
+        edges[key] = rng.randint(1, 10)
+        edge_times[key] = now - rng.expovariate(1 / (7 * 24 * 3600))
+    graph = BenchGraph(backend, 7 * 24 * 3600)
+    graph.store.load(nodes, edges, {concept: now for concept in nodes}, edge_times)
+    return graph
+
+
+def naive_depth2(graph: BenchGraph, seeds: dict) -> int:
+    """原来的 get_related_item(depth=2)：取出所有邻居的全部记忆"""
+    count = 0
+    for concept in seeds:
+        count += len(graph.store.get_items(concept))
+        for neighbor in graph.store.neighbors(concept):
+            count += len(graph.store.get_items(neighbor))
+    return count
+
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扩散激活检索耗时')
+    parser.add_argument('--nodes', type=int, default=25000)
+    parser.add_argument('--edges', type=int, default=100000)
+    parser.add_argument('--degree-dist', choices=['uniform', 'powerlaw'], default='uniform')
+    parser.add_argument('--backend', choices=['networkx', 'compact'], default='networkx')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seeds', type=int, default=3, help='每次检索匹配到的主题数')
+    parser.add_argument('--max-hops', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--max-nodes', type=int, default=30)
+    parser.add_argument('--decay', type=float, default=0.5)
+    parser.add_argument('--min-activation', type=float, default=0.05)
+    parser.add_argument('--budget-ms', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = build_graph(args.nodes, args.edges, args.degree_dist, args.backend, args.seed)
+    print(f"生成图: 节点 {len(graph.store)}, 边 {graph.store.number_of_edges()}, 耗时 {time.perf_counter() - start:.2f} 秒")
+
+    rng = random.Random(args.seed + 1)
+    concepts = list(graph.store.nodes())
+    queries = [{concept: rng.uniform(0.4, 1.0) for concept in rng.sample(concepts, args.seeds)} for _ in range(args.queries)]
+    now = time.time()
+
+    samples = []
+    item_counts = []
+    for seeds in queries:
+        t = time.perf_counter()
+        item_counts.append(naive_depth2(graph, seeds))
+        samples.append(time.perf_counter() - t)
+    print(f"\n{'方式':<24} {'中位数(ms)':>12} {'p95(ms)':>10} {'最大(ms)':>10} {'主题数':>8} {'扫描连接':>10} {'超时比例':>10}")
+    print(f"{'depth=2 全部展开':<24} {statistics.median(samples) * 1000:>12.3f} {percentile(samples, 0.95) * 1000:>10.3f} "
+          f"{max(samples) * 1000:>10.3f} {'-':>8} {'-':>10} {'-':>10}   (平均返回 {statistics.fmean(item_counts):.0f} 条记忆)")
+
+    for max_hops in args.max_hops:
+        samples = []
+        node_counts = []
+        edge_counts = []
+        truncated = 0
+        for seeds in queries:
+            _, stats = spread_activation(
+                graph, seeds,
+                decay=args.decay,
+                max_hops=max_hops,
+                max_nodes=args.max_nodes,
+                min_activation=args.min_activation,
+                time_budget=args.budget_ms / 1000,
+                now=now,
+            )
+            samples.append(stats['elapsed'])
+            node_counts.append(stats['nodes'])
+            edge_counts.append(stats['edges_scanned'])
+            truncated += stats['truncated']
+        name = f'扩散激活 {max_hops} 跳'
+        print(f"{name:<24} {statistics.median(samples) * 1000:>12.3f} {percentile(samples, 0.95) * 1000:>10.3f} "
+              f"{max(samples) * 1000:>10.3f} {statistics.fmean(node_counts):>8.1f} {statistics.fmean(edge_counts):>10.1f} "
+              f"{truncated / len(queries):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
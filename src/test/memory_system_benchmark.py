@@ -0,0 +1,420 @@
+"""
+记忆系统基准测试：在合成的记忆图和聊天记录上测量记忆系统主要操作的耗时
+
+主题识别、话题概括和 embedding 使用本地桩函数立即返回，只测量记忆系统自身（索引、图操作、数据库读写）的开销。
+数据库默认使用进程内的 mongomock（pip install mongomock），提供 --mongo-uri 时使用真实的 MongoDB，
+数据写入单独的 memory_benchmark 数据库并在结束后删除。本地快照写入临时目录。
+
+结果写入 JSON 文件，--compare 指定之前版本的结果文件时打印各操作中位数耗时的变化，用于发现性能回退。
+需要与 bot.py 相同的运行环境（.env 与 config/bot_config.toml）。
+
+用法:
+    python src/test/memory_system_benchmark.py
+    python src/test/memory_system_benchmark.py --nodes 1000 10000 100000 --degree-dist powerlaw
+    python src/test/memory_system_benchmark.py --mongo-uri mongodb://127.0.0.1:27017 --output new.json --compare old.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import networkx as nx
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(ROOT)
+from src.common.database import Database  # noqa: E402
+
+DB_NAME = 'memory_benchmark'
+
+WORDS = [
+    '原神', '火锅', '考试', '论文', '显卡', '猫咪', '周末', '加班', '奶茶', '电影',
+    '游戏', '旅游', '地铁', '天气', '手机', '键盘', '代码', '老师', '宿舍', '食堂',
+    '篮球', '音乐', '演唱会', '小说', '动漫', '相机', '咖啡', '外卖', '快递', '房租',
+    '工资', '面试', '实习', '毕业', '考研', '健身', '跑步', '减肥', '烧烤', '夜宵',
+    '机器人', '服务器', '数据库', '模型', '表白', '约会', '生日', '蛋糕', '红包', '抽卡',
+    '台风', '高铁', '机票', '酒店', '博物馆', '图书馆', '钢琴', '吉他', '直播', '弹幕',
+    '编程', '算法', '比赛', '球鞋', '耳机', '电脑', '宠物', '狗狗', '甜品', '早餐',
+    '春节', '国庆', '暑假', '寒假', '同学', '室友', '老板', '同事', '网课', '作业',
+]
+PEOPLE = ['小明', '阿杰', '群主', '小红', '老王', '萌新', '大佬', '小李', '阿伟', '学姐']
+VERBS = ['说起了', '吐槽了', '推荐了', '问了问', '分享了', '讨论了', '抱怨了', '夸了夸']
+TAILS = ['大家都觉得挺有意思', '结果被群友反驳了', '还发了好几张图', '说下次一起去', '感觉很离谱', '最后不了了之']
+# 不会出现在概念名中的词，用来模拟检索时没有命中的主题
+UNSEEN_WORDS = ['量子', '火星', '恐龙', '潜水艇', '魔方', '刺绣', '油画', '陶艺']
+
+OPERATIONS = [
+    'sync_memory_to_db (full)',
+    'sync_memory_from_db (database)',
+    'sync_memory_from_db (checkpoint)',
+    'sync_memory_to_db (incremental)',
+    '_find_similar_topics',
+    'memory_activate_value',
+    'memory_activate_value (cached)',
+    'get_relevant_memories',
+    'get_relevant_memories (cached)',
+    'operation_forget_topic',
+    'operation_merge_memory',
+]
+
+
+def generate_concepts(count: int, rng: random.Random) -> list:
+    """由 1~3 个常用词组成的不重复概念名"""
+    concepts = list(WORDS[:count])
+    seen = set(concepts)
+    while len(concepts) < count:
+        name = ''.join(rng.sample(WORDS, rng.choice((2, 2, 3))))
+        if name not in seen:
+            seen.add(name)
+            concepts.append(name)
+    return concepts
+
+
+def memory_sentence(concept: str, index: int, rng: random.Random) -> str:
+    return f'{rng.choice(PEOPLE)}{rng.choice(VERBS)}{concept}，{rng.choice(TAILS)}（第{index}次）'
+
+
+def generate_graph(node_count: int, avg_degree: int, degree_dist: str, items_per_node: int,
+                   merge_fraction: float, max_age_days: float, seed: int):
+    """生成合成记忆图
+
+    Args:
+        degree_dist: uniform 为均匀随机图，powerlaw 为偏好连接的无标度图（少数概念连接很多）
+        merge_fraction: 记忆条数超过 100（加载时进入合并队列，会被 operation_merge_memory 合并）的节点比例
+        max_age_days: 节点和边的强化时间在这么多天内按指数分布
+
+    Returns:
+        tuple: (节点, 边, 节点强化时间, 边强化时间)，格式与 Memory_graph.load 相同
+    """
+    rng = random.Random(seed)
+    concepts = generate_concepts(node_count, rng)
+    now = time.time()
+
+    def reinforced_at():
+        return now - min(rng.expovariate(3 / max_age_days), max_age_days) * 24 * 3600
+
+    nodes = {}
+    node_times = {}
+    merge_count = int(node_count * merge_fraction)
+    for i, concept in enumerate(concepts):
+        count = 110 if i < merge_count else rng.randint(1, max(1, 2 * items_per_node - 1))
+        nodes[concept] = [memory_sentence(concept, j, rng) for j in range(count)]
+        node_times[concept] = reinforced_at()
+
+    if degree_dist == 'powerlaw':
+        graph = nx.barabasi_albert_graph(node_count, max(1, avg_degree // 2), seed=seed)
+    else:
+        graph = nx.gnm_random_graph(node_count, node_count * avg_degree // 2, seed=seed)
+    edges = {}
+    edge_times = {}
+    for a, b in graph.edges():
+        source, target = concepts[a], concepts[b]
+        key = (source, target) if source <= target else (target, source)
+        edges[key] = rng.randint(1, 10)
+        edge_times[key] = reinforced_at()
+    return nodes, edges, node_times, edge_times
+
+
+def generate_chat(concepts: list, count: int, seed: int) -> list:
+    """生成检索用的聊天消息，每条提到 1~3 个已有概念，部分消息带有图中没有的词"""
+    rng = random.Random(seed + 1)
+    messages = []
+    for _ in range(count):
+        mentioned = rng.sample(concepts, rng.randint(1, min(3, len(concepts))))
+        if rng.random() < 0.3:
+            mentioned.append(rng.choice(UNSEEN_WORDS))
+        messages.append(f'{rng.choice(PEOPLE)}：{"和".join(mentioned)}{rng.choice(TAILS)}')
+    return messages
+
+
+class StubLLM:
+    """代替 LLM_request，根据提示词立即返回结果，不发出网络请求"""
+
+    KNOWN_WORDS = sorted(WORDS + UNSEEN_WORDS, key=len, reverse=True)
+
+    model_name = 'benchmark-stub'
+
+    def __init__(self):
+        self.calls = 0
+
+    def _topics(self, prompt: str) -> list:
+        # 提示词中的原文之后是对模型的要求，按词表从原文中找出话题
+        text = prompt.split('。请你', 1)[0]
+        match = re.search(r'总结出(\d+)个', prompt)
+        limit = int(match.group(1)) if match else 5
+        return [word for word in self.KNOWN_WORDS if word in text][:limit]
+
+    def _respond(self, prompt: str) -> str:
+        self.calls += 1
+        if '关键的概念' in prompt:
+            return ','.join(self._topics(prompt))
+        if '分别概括' in prompt:
+            topics = re.findall(r'"([^"]+)"', prompt.split('分别概括', 1)[1].split('这几个概念', 1)[0])
+            return json.dumps({topic: f'群友们聊到了{topic}' for topic in topics}, ensure_ascii=False)
+        match = re.search(r'概括"([^"]+)"这个概念', prompt)
+        return f'群友们聊到了{match.group(1)}' if match else '群友们随便聊了聊'
+
+    async def generate_response(self, prompt: str, request_type: str = "chat"):
+        return self._respond(prompt), ""
+
+    async def generate_response_async(self, prompt: str, request_type: str = "chat", **kwargs):
+        return self._respond(prompt), ""
+
+    async def get_embedding(self, text: str):
+        """由文本哈希生成的固定随机向量"""
+        self.calls += 1
+        seed = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+        return np.random.default_rng(seed).standard_normal(256).astype(np.float32).tolist()
+
+
+def init_database(mongo_uri: str = None):
+    """在机器人初始化数据库之前换上基准测试用的数据库"""
+    if mongo_uri:
+        import pymongo
+        client = pymongo.MongoClient(mongo_uri)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            print("\033[1;31m[错误]\033[0m 未安装 mongomock，请 pip install mongomock 或通过 --mongo-uri 指定 MongoDB")
+            sys.exit(1)
+        client = mongomock.MongoClient()
+    client.drop_database(DB_NAME)
+    instance = Database.__new__(Database)
+    instance.client = client
+    instance.db = client[DB_NAME]
+    Database._instance = instance
+    return client
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 4),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 4),
+        'max_ms': round(samples[-1] * 1000, 4),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """记忆系统的日志输出较多，计时期间不打印"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+async def timed(samples: list, coroutine):
+    with quiet():
+        start = time.perf_counter()
+        result = await coroutine
+        samples.append(time.perf_counter() - start)
+    return result
+
+
+def timed_sync(samples: list, function, *args, **kwargs):
+    with quiet():
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        samples.append(time.perf_counter() - start)
+    return result
+
+
+async def bench_size(size: int, args, shared, checkpoint_root: str) -> dict:
+    from src.plugins.chat.config import global_config
+    from src.plugins.memory_system.memory import Hippocampus, Memory_graph
+    from src.plugins.memory_system.memory_cache import LRUCache
+
+    nodes, edges, node_times, edge_times = generate_graph(
+        size, args.degree, args.degree_dist, args.items, args.merge_fraction, args.max_age_days, args.seed)
+    messages = generate_chat(list(nodes), args.queries, args.seed)
+
+    graph = Memory_graph(args.backend or global_config.memory_graph_backend, global_config.memory_strength_half_life * 3600,
+                         node_capacity=global_config.memory_node_capacity if global_config.memory_node_capacity > 0 else None,
+                         merge_threshold=global_config.memory_merge_threshold if global_config.memory_merge_threshold > 0 else None)
+    hippocampus = Hippocampus(graph, checkpoint_dir=os.path.join(checkpoint_root, str(size)),
+                              namespace=f'memory_bench_{size}', shared=shared)
+    # 只替换这个海马体的模型和缓存，不影响共享的全局海马体
+    stub = StubLLM()
+    hippocampus.llm_topic_judge = stub
+    hippocampus.llm_summary_by_topic = stub
+    hippocampus.topic_cache = LRUCache(max_size=args.queries * 2, ttl=0)
+    hippocampus._pending_topic_tasks = {}
+    if hippocampus.embedding_index is not None:
+        hippocampus.llm_embedding = stub
+        hippocampus.topic_embedding_cache = LRUCache(max_size=4096, ttl=0)
+
+    results = {}
+
+    def record(name, samples):
+        results[name] = summarize(samples)
+
+    # 全量写入：所有节点和边都是新的
+    graph.load(nodes, edges, node_times, edge_times)
+    for concept in graph.nodes():
+        graph._mark_node_dirty(concept)
+    for source, target, _ in graph.edges():
+        graph._mark_edge_dirty(source, target)
+    samples = []
+    timed_sync(samples, hippocampus.sync_memory_to_db)
+    record('sync_memory_to_db (full)', samples)
+
+    samples = []
+    for _ in range(args.repeat):
+        timed_sync(samples, hippocampus.sync_memory_from_db, use_checkpoint=False)
+    record('sync_memory_from_db (database)', samples)
+
+    samples = []
+    for _ in range(args.repeat):
+        timed_sync(samples, hippocampus.sync_memory_from_db, use_checkpoint=True)
+    record('sync_memory_from_db (checkpoint)', samples)
+
+    if hippocampus.embedding_index is not None:
+        with quiet():
+            await hippocampus._embed_concepts(graph.nodes())
+
+    # 增量写入：每轮修改 1% 的节点
+    rng = random.Random(args.seed + 2)
+    samples = []
+    for round_index in range(args.repeat):
+        for concept in rng.sample(graph.nodes(), max(1, len(graph) // 100)):
+            graph.add_dot(concept, memory_sentence(concept, 1000 + round_index, rng))
+        timed_sync(samples, hippocampus.sync_memory_to_db)
+    record('sync_memory_to_db (incremental)', samples)
+
+    # 检索：先识别一遍主题（桩函数，不计时），再分别测量
+    with quiet():
+        topic_lists = [await hippocampus._identify_topics(text) for text in messages]
+    samples = []
+    for topics in topic_lists:
+        timed_sync(samples, hippocampus._find_similar_topics, topics, 0.4)
+    record('_find_similar_topics', samples)
+
+    for name, method in (('memory_activate_value', hippocampus.memory_activate_value),
+                         ('get_relevant_memories', hippocampus.get_relevant_memories)):
+        hippocampus.retrieval_cache.clear()
+        uncached = []
+        for text in messages:
+            await timed(uncached, method(text))
+        cached = []
+        for text in messages:
+            await timed(cached, method(text))
+        record(name, uncached)
+        record(f'{name} (cached)', cached)
+
+    samples = []
+    for _ in range(args.repeat):
+        await timed(samples, hippocampus.operation_forget_topic())
+    record('operation_forget_topic', samples)
+
+    samples = []
+    await timed(samples, hippocampus.operation_merge_memory(max_nodes=args.merge_max_nodes))
+    record('operation_merge_memory', samples)
+
+    results['graph'] = {
+        'nodes': len(nodes),
+        'edges': len(edges),
+        'memory_items': sum(len(items) for items in nodes.values()),
+        'estimated_mb': round(graph.estimate_nbytes() / 1024 / 1024, 2),
+        'stub_llm_calls': stub.calls,
+    }
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def print_results(results: dict, previous: dict = None):
+    for size, size_results in results['results'].items():
+        graph = size_results['graph']
+        print(f"\n节点 {graph['nodes']}, 边 {graph['edges']}, 记忆 {graph['memory_items']}, 约 {graph['estimated_mb']} MB")
+        old = (previous or {}).get('results', {}).get(size, {})
+        header = f"{'操作':<36} {'次数':>6} {'平均(ms)':>10} {'中位数(ms)':>12} {'p95(ms)':>10}"
+        print(header + (f" {'之前中位数(ms)':>16} {'变化':>8}" if old else ''))
+        for name in OPERATIONS:
+            stats = size_results.get(name)
+            if stats is None:
+                continue
+            line = f"{name:<36} {stats['runs']:>6} {stats['mean_ms']:>10.3f} {stats['p50_ms']:>12.3f} {stats['p95_ms']:>10.3f}"
+            if name in old:
+                before = old[name]['p50_ms']
+                change = f"{stats['p50_ms'] / before:.2f}x" if before > 0 else '-'
+                line += f" {before:>16.3f} {change:>8}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='记忆系统基准测试')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--degree', type=int, default=4, help='平均度数')
+    parser.add_argument('--degree-dist', choices=['uniform', 'powerlaw'], default='uniform')
+    parser.add_argument('--items', type=int, default=3, help='每个节点的平均记忆条数')
+    parser.add_argument('--merge-fraction', type=float, default=0.01, help='记忆超过 100 条的节点比例')
+    parser.add_argument('--merge-max-nodes', type=int, default=10, help='operation_merge_memory 最多合并的节点数')
+    parser.add_argument('--max-age-days', type=float, default=30, help='强化时间的范围')
+    parser.add_argument('--queries', type=int, default=200, help='检索测试的消息条数')
+    parser.add_argument('--repeat', type=int, default=3, help='加载、同步和遗忘的重复次数')
+    parser.add_argument('--backend', choices=['networkx', 'compact'], default=None, help='图存储后端，默认与配置相同')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mongo-uri', default=None, help='使用真实的 MongoDB，不提供时使用 mongomock')
+    parser.add_argument('--output', default='memory_benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='之前的结果文件')
+    args = parser.parse_args()
+
+    client = init_database(args.mongo_uri)
+    with tempfile.TemporaryDirectory() as checkpoint_root:
+        # 机器人自己的记忆图也从基准测试数据库加载，快照写到临时目录，不影响 data/ 下的快照
+        os.environ["MAIMBOT_MEMORY_CHECKPOINT_DIR"] = os.path.join(checkpoint_root, 'bot')
+        from memory_worker import init_memory_process
+        init_memory_process()
+        from src.plugins.chat.config import global_config
+        from src.plugins.memory_system.memory import hippocampus
+
+        results = {
+            'meta': {
+                'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': 'mongodb' if args.mongo_uri else 'mongomock',
+                'backend': args.backend or global_config.memory_graph_backend,
+                'semantic_match': global_config.memory_semantic_match,
+                'args': {key: value for key, value in vars(args).items() if key not in ('mongo_uri', 'output', 'compare')},
+            },
+            'results': {},
+        }
+        for size in args.nodes:
+            print(f"\033[1;32m[基准测试]\033[0m 测试 {size} 个节点的记忆图...")
+            results['results'][str(size)] = asyncio.run(bench_size(size, args, hippocampus, checkpoint_root))
+    client.drop_database(DB_NAME)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+记忆构建并发执行器的测试：同一服务商的请求数不超过上限，结果按输入顺序返回
+
+用法:
+    python -m pytest -q src/test/test_build_executor.py
+"""
+
+import asyncio
+
+from src.plugins.memory_system.build_executor import ProviderLimiter
+
+
+class Recorder:
+    """记录每个服务商同时在执行的请求数的峰值"""
+
+    def __init__(self):
+        self.running = {}
+        self.peak = {}
+
+    async def request(self, provider, result, delay=0.01):
+        self.running[provider] = self.running.get(provider, 0) + 1
+        self.peak[provider] = max(self.peak.get(provider, 0), self.running[provider])
+        await asyncio.sleep(delay)
+        self.running[provider] -= 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_provider_of_reads_base_url_name():
+    assert ProviderLimiter.provider_of({'name': 'deepseek-chat', 'base_url': 'DEEP_SEEK_BASE_URL'}) == 'DEEP_SEEK'
+    assert ProviderLimiter.provider_of({'base_url': 'https://example.com/v1'}) == 'https://example.com/v1'
+    assert ProviderLimiter.provider_of({}) == ''
+
+
+def test_limits_are_clamped_and_per_provider():
+    limiter = ProviderLimiter(0, {'SILICONFLOW': 3, 'DEEP_SEEK': -1})
+    assert limiter.limit_of('SILICONFLOW') == 3
+    assert limiter.limit_of('DEEP_SEEK') == 1
+    assert limiter.limit_of('其他') == 1
+
+
+def test_gather_bounds_concurrency_and_keeps_order():
+    limiter = ProviderLimiter(2, {'SILICONFLOW': 3})
+    recorder = Recorder()
+
+    async def main():
+        # 后提交的请求先完成，结果仍按提交顺序返回
+        fast = limiter.gather('SILICONFLOW', [recorder.request('SILICONFLOW', i, delay=0.05 - i * 0.005) for i in range(8)])
+        slow = limiter.gather('DEEP_SEEK', [recorder.request('DEEP_SEEK', i) for i in range(5)])
+        return await asyncio.gather(fast, slow)
+
+    fast, slow = asyncio.run(main())
+    assert fast == list(range(8))
+    assert slow == list(range(5))
+    assert recorder.peak == {'SILICONFLOW': 3, 'DEEP_SEEK': 2}
+
+
+def test_failed_request_does_not_cancel_the_others():
+    limiter = ProviderLimiter(2)
+    recorder = Recorder()
+    error = RuntimeError("请求失败")
+    results = asyncio.run(limiter.gather('SILICONFLOW', [
+        recorder.request('SILICONFLOW', '主题1'),
+        recorder.request('SILICONFLOW', error),
+        recorder.request('SILICONFLOW', '主题3'),
+    ]))
+    assert results == ['主题1', error, '主题3']
+
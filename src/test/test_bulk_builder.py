@@ -0,0 +1,202 @@
+"""
+批量记忆构建的测试：中断后从保存的进度继续、花费上限、只统计本次运行的用量和构建期间按预算卸载分区
+
+模型请求和记忆写入用只记录调用的假海马体代替，消息和进度保存在 mongomock 中。
+
+用法:
+    python -m pytest -q src/test/test_bulk_builder.py
+"""
+
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import mongomock
+
+from src.plugins.memory_system.bulk_builder import BulkMemoryBuilder
+from src.plugins.memory_system.partitions import MemoryPartitions
+from src.plugins.memory_system.sampling_ledger import SamplingLedger
+
+
+class LedgerCollection:
+    """只支持账本用到的按 _id 查询和 $set upsert 的内存集合"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query):
+        return [dict(self.docs[key], _id=key) for key in query['_id']['$in'] if key in self.docs]
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.docs.setdefault(op._filter['_id'], {}).update(op._doc['$set'])
+
+
+class FakeGraph:
+    def __init__(self):
+        self.nbytes = 0
+        self.dirty = False
+
+    def __len__(self):
+        return 0
+
+    def estimate_nbytes(self):
+        return self.nbytes
+
+    def has_changes(self):
+        return self.dirty
+
+
+class FakeHippocampus:
+    """记录压缩过的片段和写入的记忆，每次压缩在用量表中记一条请求"""
+
+    def __init__(self, usage=None, ledger=None, fail_on_call=None):
+        self.memory_graph = FakeGraph()
+        self.usage = usage if usage is not None else []
+        self.chat_sampler = SimpleNamespace(ledger=ledger, min_density=0.0)
+        self.usage_user_id = "system"
+        self.fail_on_call = fail_on_call
+        self.compressed = []
+        self.committed = []
+
+    async def compress_samples(self, texts):
+        if self.fail_on_call is not None and len(self.compressed) + 1 == self.fail_on_call:
+            raise RuntimeError("模型请求失败")
+        self.compressed.append(list(texts))
+        self.usage.append({
+            'user_id': self.usage_user_id, 'timestamp': datetime.datetime.now(),
+            'prompt_tokens': 100, 'completion_tokens': 50, 'cost': 0.01,
+        })
+        return [[('话题', text)] for text in texts]
+
+    def build_usage(self, since, user_id=None):
+        return [
+            item for item in self.usage
+            if item['timestamp'] >= since and (user_id is None or item['user_id'] == user_id)
+        ]
+
+    async def canonicalize_topics(self, results):
+        return results
+
+    def commit_memories(self, results, group_ids):
+        self.committed.extend(zip(group_ids, results))
+        self.memory_graph.nbytes += 100 * len(results)
+        self.memory_graph.dirty = True
+
+    def sync_memory_to_db(self):
+        self.memory_graph.dirty = False
+
+    def sync_memory_from_db(self):
+        pass
+
+    def schedule_embedding(self):
+        pass
+
+
+def make_builder(groups=(1,), messages_per_group=12, budget_bytes=10 ** 6, fail_on_call=None, **kwargs):
+    database = mongomock.MongoClient().db
+    database.messages.insert_many([
+        {'group_id': group_id, 'time': float(i), 'detailed_plain_text': f'群{group_id}的第{i:02d}条消息', 'info': 3.0}
+        for group_id in groups
+        for i in range(messages_per_group)
+    ])
+    db = SimpleNamespace(db=database)
+    ledger = SamplingLedger(LedgerCollection())
+    usage = []
+    hippocampus = FakeHippocampus(usage, ledger, fail_on_call)
+    created = {}
+
+    def factory(key):
+        created[key] = FakeHippocampus(usage, ledger)
+        return created[key]
+
+    partitions = MemoryPartitions(hippocampus, factory, mode="group", budget_bytes=budget_bytes, embed_on_load=False)
+    kwargs.setdefault('window_size', 2)
+    kwargs.setdefault('batch_windows', 2)
+    kwargs.setdefault('min_window_chars', 1)
+    builder = BulkMemoryBuilder(partitions, db, **kwargs)
+    return builder, hippocampus, created
+
+
+def committed_texts(created):
+    return [memory[0][1] for partition in created.values() for _, memory in partition.committed]
+
+
+def test_resumes_after_interrupt_without_redoing_saved_batches():
+    builder, hippocampus, created = make_builder(fail_on_call=3)
+    try:
+        asyncio.run(builder.run())
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("第三批的模型请求应当失败")
+    state = builder.load_state()
+    # 前两批已写入并记录进度
+    assert state['messages'] == 8
+    assert state['groups']['1'] == {'time': 7.0, 'id': state['groups']['1']['id']}
+    assert len(created['group_1'].committed) == 4
+    assert hippocampus.usage_user_id == "system"
+
+    hippocampus.fail_on_call = None
+    hippocampus.compressed = []
+    resumed = BulkMemoryBuilder(builder.partitions, builder.db, window_size=2, batch_windows=2, min_window_chars=1)
+    state = asyncio.run(resumed.run())
+    assert state['groups']['1']['done']
+    assert state['messages'] == 12
+    assert state['windows'] == 6
+    # 继续时只压缩剩下的消息，每个片段只写入一次
+    assert sum(len(texts) for texts in hippocampus.compressed) == 2
+    assert len(committed_texts(created)) == len(set(committed_texts(created))) == 6
+    # 总结过的片段记入采样账本
+    assert builder.ledger.max_count(1, 0.0, 12.0) == 1
+
+
+def test_stops_at_token_cap_and_continues_with_a_higher_cap():
+    builder, hippocampus, _ = make_builder(max_tokens=300)
+    state = asyncio.run(builder.run())
+    # 每批 150 tokens，两批之后达到上限
+    assert len(hippocampus.compressed) == 2
+    assert state['prompt_tokens'] + state['completion_tokens'] == 300
+    assert not state['groups']['1'].get('done')
+    assert builder.load_state()['messages'] == 8
+
+    # 同样的上限再次运行不再发出请求
+    asyncio.run(builder.run())
+    assert len(hippocampus.compressed) == 2
+
+    builder.max_tokens = None
+    builder.max_cost = 0.025
+    state = asyncio.run(builder.run())
+    assert len(hippocampus.compressed) == 3
+    assert state['cost'] >= 0.025
+    assert state['messages'] == 12
+
+
+def test_only_charges_its_own_requests():
+    builder, hippocampus, _ = make_builder(messages_per_group=4)
+    # 同时进行的定时记忆构建的请求不计入本次运行
+    original_compress = hippocampus.compress_samples
+
+    async def compress_during_periodic_build(texts):
+        hippocampus.usage.append({
+            'user_id': "system", 'timestamp': datetime.datetime.now(),
+            'prompt_tokens': 10000, 'completion_tokens': 0, 'cost': 5.0,
+        })
+        return await original_compress(texts)
+
+    hippocampus.compress_samples = compress_during_periodic_build
+    state = asyncio.run(builder.run())
+    assert state['prompt_tokens'] + state['completion_tokens'] == 150
+    assert {item['user_id'] for item in hippocampus.usage} == {"system", builder.usage_user_id}
+    assert builder.usage_user_id.startswith("memory_bulk:default:")
+
+
+def test_evicts_finished_groups_to_stay_within_budget():
+    builder, _, created = make_builder(groups=(1, 2, 3), messages_per_group=4, budget_bytes=250)
+    state = asyncio.run(builder.run())
+    assert all(state['groups'][str(group_id)]['done'] for group_id in (1, 2, 3))
+    # 每个群写入 200 字节，处理下一个群时卸载上一个
+    assert set(created) == {'group_1', 'group_2', 'group_3'}
+    assert list(builder.partitions._partitions) == ['group_3']
+    assert builder.partitions.evictions == 2
+    assert builder.partitions._busy == {}
@@ -0,0 +1,237 @@
+"""
+记忆构建批量采样的测试：一次聚合查询（$unionWith + $lookup）取回的窗口与逐个窗口查询的结果一致，
+以及按信息量采样时高信息量的片段用完后的补充方式
+
+mongomock 不支持带 let 的 $lookup，这里用一个只实现采样管道所用阶段的小解释器执行真实生成的管道。
+
+用法:
+    python -m pytest -q src/test/test_chat_sampler.py
+"""
+
+from types import SimpleNamespace
+
+import mongomock
+from pymongo.errors import OperationFailure
+
+from src.plugins.memory_system.chat_sampler import ChatSampler
+from src.plugins.memory_system.sampling_ledger import window_range
+
+
+def resolve(value, doc, variables):
+    if isinstance(value, str) and value.startswith('$$'):
+        return variables[value[2:]]
+    if isinstance(value, str) and value.startswith('$'):
+        return doc.get(value[1:])
+    return value
+
+
+def evaluate(expr, doc, variables):
+    """执行 $expr 中的 $and / $eq / $gt"""
+    (op, args), = expr.items()
+    if op == '$and':
+        return all(evaluate(arg, doc, variables) for arg in args)
+    left, right = (resolve(arg, doc, variables) for arg in args)
+    if op == '$eq':
+        return left == right
+    if op == '$gt':
+        return left > right
+    raise NotImplementedError(op)
+
+
+def matches(doc, query, variables):
+    for field, condition in query.items():
+        if field == '$expr':
+            if not evaluate(condition, doc, variables):
+                return False
+        elif isinstance(condition, dict):
+            if '$lte' in condition and not doc.get(field) <= condition['$lte']:
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+def project(doc, spec):
+    result = {} if spec.get('_id', 1) == 0 else {'_id': doc.get('_id')}
+    for field, value in spec.items():
+        if field == '_id':
+            continue
+        if isinstance(value, dict) and '$literal' in value:
+            result[field] = value['$literal']
+        elif field in doc:
+            result[field] = doc[field]
+    return result
+
+
+def run_pipeline(collections, name, pipeline, variables=None):
+    """按顺序执行采样管道用到的 $match、$sort、$limit、$lookup、$project 和 $unionWith"""
+    variables = variables or {}
+    docs = [dict(doc) for doc in collections[name].find()]
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == '$match':
+            docs = [doc for doc in docs if matches(doc, spec, variables)]
+        elif op == '$sort':
+            (field, direction), = spec.items()
+            docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        elif op == '$limit':
+            docs = docs[:spec]
+        elif op == '$lookup':
+            for doc in docs:
+                let = {key: resolve(value, doc, {}) for key, value in spec['let'].items()}
+                doc[spec['as']] = run_pipeline(collections, spec['from'], spec['pipeline'], let)
+        elif op == '$project':
+            docs = [project(doc, spec) for doc in docs]
+        elif op == '$unionWith':
+            docs += run_pipeline(collections, spec['coll'], spec['pipeline'])
+        else:
+            raise NotImplementedError(op)
+    return docs
+
+
+class PipelineMessages:
+    """消息集合：aggregate 用上面的解释器执行，其他查询交给 mongomock"""
+
+    def __init__(self, collection, supports_union=True):
+        self.collection = collection
+        self.supports_union = supports_union
+        self.pipelines = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        if not self.supports_union:
+            raise OperationFailure("Unrecognized pipeline stage name: '$unionWith'")
+        return run_pipeline({'messages': self.collection}, 'messages', pipeline)
+
+
+class LedgerCollection:
+    """只支持账本用到的按 _id 查询和 $set upsert 的内存集合"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query):
+        return [dict(self.docs[key], _id=key) for key in query['_id']['$in'] if key in self.docs]
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self.docs.setdefault(op._filter['_id'], {}).update(op._doc['$set'])
+
+
+def make_sampler(supports_union=True):
+    database = mongomock.MongoClient().db
+    # 两个群的消息交替出现，时间 0 到 19
+    database.messages.insert_many([
+        {'group_id': 1 if i % 2 == 0 else 2, 'time': float(i), 'detailed_plain_text': f'消息{i}', 'info': 3.0}
+        for i in range(20)
+    ])
+    messages = PipelineMessages(database.messages, supports_union)
+    db = SimpleNamespace(db=SimpleNamespace(
+        messages=messages,
+        memory_sampling_ledger=LedgerCollection(),
+        memory_chat_windows=database.memory_chat_windows,
+    ))
+    return ChatSampler(db), messages
+
+
+def test_pipeline_has_one_branch_per_timestamp():
+    sampler, messages = make_sampler()
+    sampler._fetch_windows([3.5, 8.0, 12.5], 2)
+    pipeline, = messages.pipelines
+    unions = [stage['$unionWith'] for stage in pipeline if '$unionWith' in stage]
+    assert len(unions) == 2
+    assert all(union['coll'] == 'messages' for union in unions)
+    # 每个分支用 $literal 标记自己的窗口序号，结果按序号还原为采样顺序
+    assert [union['pipeline'][-1]['$project']['window'] for union in unions] == [{'$literal': 1}, {'$literal': 2}]
+    assert sampler.round_trips == 1
+
+
+def test_union_windows_match_one_by_one_queries():
+    sampler, _ = make_sampler()
+    timestamps = [12.5, 3.5, 8.0, -1.0, 19.0]
+    windows = sampler._fetch_windows(timestamps, 3)
+    expected = sampler._fetch_windows_one_by_one(timestamps, 3)
+    # 找不到锚点的窗口为 None，锚点是最后一条消息时片段为空
+    assert windows[3] is None and expected[3] is None
+    for window, reference in zip(windows, expected):
+        if reference is None:
+            continue
+        assert (window['group_id'], window['time']) == (reference['group_id'], reference['time'])
+        assert [record['time'] for record in window['records']] == [record['time'] for record in reference['records']]
+    # 时间点 12.5 的锚点是群 1 的消息 12，片段取同一群之后的 3 条
+    assert [record['time'] for record in windows[0]['records']] == [14.0, 16.0, 18.0]
+    assert windows[4]['records'] == []
+
+
+def test_sample_returns_texts_in_timestamp_order_and_records_ledger():
+    sampler, _ = make_sampler()
+    texts = sampler.sample([8.0, 3.5], 2, with_group=True)
+    assert texts == [(1, '消息10消息12'), (2, '消息5消息7')]
+    # 采用的片段记入账本，并按群写回数据库
+    assert sampler.ledger.max_count(1, 10.0, 11.0) == 1
+    assert sorted(sampler.ledger.collection.docs) == ['1', '2']
+
+
+def test_old_database_falls_back_to_one_by_one_queries():
+    sampler, messages = make_sampler(supports_union=False)
+    assert sampler.sample([8.0, 3.5], 2) == ['消息10消息12', '消息5消息7']
+    assert not sampler._aggregate_supported
+    # 退回逐个查询后不再尝试聚合
+    sampler.sample([8.0], 2)
+    assert len(messages.pipelines) == 1
+
+
+class WindowCollection:
+    """mongomock 的集合不支持 pymongo 4 的 UpdateOne 批量写入，逐条执行"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self._collection.update_one(op._filter, op._doc, upsert=op._upsert)
+
+
+def make_dense_sampler():
+    """片段索引中每个时间段有两个已封口的片段，群 1 的信息量更高"""
+    sampler, messages = make_sampler()
+    windows = sampler.window_index.collection
+    sampler.window_index.collection = WindowCollection(windows)
+    windows.insert_many([
+        {'_id': 'a1', 'group_id': 1, 'start': 0.0, 'end': 4.0, 'closed': True, 'density': 5.0},
+        {'_id': 'a2', 'group_id': 2, 'start': 1.0, 'end': 5.0, 'closed': True, 'density': 4.0},
+        {'_id': 'b1', 'group_id': 1, 'start': 12.0, 'end': 16.0, 'closed': True, 'density': 5.0},
+        {'_id': 'b2', 'group_id': 2, 'start': 13.0, 'end': 17.0, 'closed': True, 'density': 4.0},
+    ])
+    return sampler, messages
+
+
+def summarize(sampler, *windows):
+    sampler.ledger.load([group_id for group_id, _, _ in windows])
+    for group_id, start, end in windows:
+        sampler.ledger.record(group_id, *window_range(start, end))
+
+
+def test_dense_sampling_carries_a_used_up_band_to_the_next():
+    sampler, messages = make_dense_sampler()
+    summarize(sampler, (1, 0.0, 4.0), (2, 1.0, 5.0))
+    texts = sampler.sample_dense([(0.0, 10.0, 1), (10.0, 20.0, 1)], 3, with_group=True)
+    # 第一个时间段的片段都总结过，缺的一个由第二个时间段的下一个片段补上，不随机采样
+    assert texts == [(1, '消息12消息14消息16'), (2, '消息13消息15消息17')]
+    assert messages.pipelines == []
+
+
+def test_dense_sampling_falls_back_to_random_when_every_band_is_used_up():
+    sampler, messages = make_dense_sampler()
+    summarize(sampler, (1, 0.0, 4.0), (2, 1.0, 5.0), (1, 12.0, 16.0), (2, 13.0, 17.0))
+    texts = sampler.sample_dense([(0.0, 10.0, 1), (10.0, 20.0, 1)], 2)
+    # 两个片段都改为在时间段内随机取时间点采样
+    pipeline, = messages.pipelines
+    assert len([stage for stage in pipeline if '$unionWith' in stage]) == 1
+    assert 1 <= len(texts) <= 2
@@ -0,0 +1,78 @@
+"""
+新话题归并到已有同义节点的判定测试
+
+用法:
+    python -m pytest -q src/test/test_concept_canonical.py
+"""
+
+import math
+
+import pytest
+
+from src.plugins.memory_system.concept_canonical import ConceptCanonicalizer
+from src.plugins.memory_system.embedding_index import ConceptEmbeddingIndex
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+EXISTING = ['喜欢', '开心', '考试', '苹果', '猫', '原神']
+
+
+def make_graph():
+    graph = Memory_graph()
+    for concept in EXISTING:
+        graph.add_dot(concept, f'群友聊到了{concept}')
+    return graph
+
+
+@pytest.mark.parametrize('topic, parent', [
+    ('不喜欢', '喜欢'),
+    ('不开心', '开心'),
+    ('没考试', '考试'),
+    ('苹果手机', '苹果'),
+    ('猫粮', '猫'),
+])
+def test_opposites_and_specific_concepts_are_not_merged(topic, parent):
+    canonicalizer = ConceptCanonicalizer()
+    graph = make_graph()
+    assert canonicalizer.find(graph, topic) is None
+    assert canonicalizer.surface_similarity(topic, parent) < canonicalizer.token_threshold
+
+
+@pytest.mark.parametrize('topic', ['不喜欢', '不开心', '没考试'])
+def test_negations_are_not_merged_at_any_threshold(topic):
+    assert ConceptCanonicalizer(token_threshold=0.01).find(make_graph(), topic) is None
+
+
+@pytest.mark.parametrize('topic', ['玩原神', '原神的', '原神相关'])
+def test_surface_variants_are_merged(topic):
+    assert ConceptCanonicalizer().find(make_graph(), topic) == '原神'
+
+
+def test_default_threshold_is_well_above_two_word_compounds():
+    assert ConceptCanonicalizer().token_threshold > 1 / math.sqrt(2) + 0.1
+
+
+def test_embedding_match_respects_negation_and_parents():
+    graph = make_graph()
+    index = ConceptEmbeddingIndex()
+    for concept in EXISTING:
+        index.add(concept, [1.0, 0.0])
+    index.add('高兴', [0.0, 1.0])
+    graph.add_dot('高兴', '群友今天很高兴')
+    graph.set_embedding_index(index)
+    canonicalizer = ConceptCanonicalizer(embedding_threshold=0.9)
+    assert canonicalizer.find(graph, '不开心', [1.0, 0.0]) is None
+    assert canonicalizer.find(graph, '苹果手机', [1.0, 0.0]) is None
+    assert canonicalizer.find(graph, '快乐', [0.0, 1.0]) == '高兴'
+
+
+def test_new_topics_merge_within_a_batch():
+    graph = Memory_graph()
+    mapping = ConceptCanonicalizer().resolve_new(graph, ['玩王者荣耀', '王者荣耀', '不玩王者荣耀'])
+    assert mapping == {'玩王者荣耀': '王者荣耀'}
+
+
+def test_plan_merges_existing_surface_variants_only():
+    graph = make_graph()
+    for concept in ('玩原神', '不开心', '猫粮'):
+        graph.add_dot(concept, f'群友聊到了{concept}')
+    assert ConceptCanonicalizer().plan(graph) == {'玩原神': '原神'}
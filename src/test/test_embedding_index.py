@@ -0,0 +1,85 @@
+"""
+概念向量索引和基于 embedding 的主题匹配测试
+
+用法:
+    python -m pytest -q src/test/test_embedding_index.py
+"""
+
+import numpy as np
+import pytest
+
+from src.plugins.memory_system.embedding_index import ConceptEmbeddingIndex
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+
+def brute_force(vectors, query, top_k, threshold):
+    """逐个概念计算余弦相似度，作为索引查询的参照"""
+    query = query / np.linalg.norm(query)
+    scores = {concept: float(vector @ query / np.linalg.norm(vector)) for concept, vector in vectors.items()}
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+    return [(concept, score) for concept, score in ranked if score >= threshold]
+
+
+def random_vectors(count, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f'概念{i}': rng.normal(size=dim).astype(np.float32) for i in range(count)}
+
+
+@pytest.mark.parametrize('top_k, threshold', [(1, 0.0), (5, 0.0), (50, -1.0), (10, 0.3)])
+def test_query_matches_brute_force(top_k, threshold):
+    vectors = random_vectors(40)
+    index = ConceptEmbeddingIndex(initial_capacity=4)
+    for concept, vector in vectors.items():
+        index.add(concept, vector)
+    assert len(index) == 40
+    query = np.random.default_rng(1).normal(size=16)
+    results = index.query(query, top_k=top_k, similarity_threshold=threshold)
+    expected = brute_force(vectors, query, top_k, threshold)
+    assert [concept for concept, _ in results] == [concept for concept, _ in expected]
+    for (_, score), (_, reference) in zip(results, expected):
+        assert score == pytest.approx(reference, abs=1e-5)
+
+
+def test_remove_and_replace_keep_rows_consistent():
+    vectors = random_vectors(6)
+    index = ConceptEmbeddingIndex(initial_capacity=2)
+    for concept, vector in vectors.items():
+        index.add(concept, vector)
+    version = index.version
+    index.remove('概念1')
+    index.remove('不存在')
+    assert index.version == version + 1
+    assert '概念1' not in index
+    # 最后一行被移到空位，其他概念的向量不受影响
+    for concept in ('概念0', '概念5'):
+        assert index.query(vectors[concept], top_k=1)[0][0] == concept
+    index.add('概念0', -vectors['概念0'])
+    assert len(index) == 5
+    assert index.query(-vectors['概念0'], top_k=1) == [('概念0', pytest.approx(1.0))]
+    index.retain({'概念0', '概念2'})
+    assert sorted(concept for concept, _ in index.query(vectors['概念2'], top_k=10, similarity_threshold=-1.0)) == ['概念0', '概念2']
+
+
+def test_dimension_mismatch():
+    index = ConceptEmbeddingIndex()
+    assert index.query([1.0, 0.0]) == []
+    index.add('猫', [1.0, 0.0])
+    with pytest.raises(ValueError):
+        index.add('狗', [1.0, 0.0, 0.0])
+    assert index.query([1.0, 0.0, 0.0]) == []
+
+
+def test_embedding_lookup_finds_topics_without_shared_words():
+    graph = Memory_graph()
+    graph.add_dot('猫', '猫喜欢吃鱼')
+    graph.add_dot('天气', '今天下雨了')
+    index = ConceptEmbeddingIndex()
+    index.add('猫', [1.0, 0.1, 0.0])
+    index.add('天气', [0.0, 0.1, 1.0])
+    graph.set_embedding_index(index)
+    graph.publish()
+    snapshot = graph.snapshot()
+    # "猫咪"与"猫"没有共同的词，只有语义匹配能找到
+    assert snapshot.query_topics('猫咪', 0.1) == []
+    matches = snapshot.query_embeddings(np.array([0.9, 0.2, 0.0]), top_k=2, similarity_threshold=0.75)
+    assert [concept for concept, _ in matches] == ['猫']
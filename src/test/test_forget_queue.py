@@ -0,0 +1,152 @@
+"""
+遗忘队列和记忆遗忘的行为测试
+
+用法:
+    python -m pytest -q src/test/test_forget_queue.py
+"""
+
+import time
+
+import pytest
+from pymongo import DeleteMany, DeleteOne, UpdateOne
+
+from src.plugins.memory_system.forget_queue import ForgetQueue
+from src.plugins.memory_system.graph_writer import GraphWriter
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+HALF_LIFE = 168 * 3600
+# 与配置 memory_forget_threshold / memory_forget_min_age 的默认值一致
+FORGET_THRESHOLD = 0.5
+FORGET_MIN_AGE = 24 * 3600
+
+
+def test_decay_halves_per_half_life():
+    queue = ForgetQueue(100)
+    assert queue.decayed(4, 0, 0) == 4
+    assert queue.decayed(4, 0, 100) == pytest.approx(2)
+    assert queue.decayed(4, 0, 300) == pytest.approx(0.5)
+    # 强化时间在未来时不增长
+    assert queue.decayed(4, 50, 0) == 4
+
+
+def test_pop_weakest_orders_by_decayed_strength():
+    queue = ForgetQueue(100)
+    queue.update('旧的强记忆', 8, 0)  # 在 t=400 时为 0.5
+    queue.update('新的弱记忆', 1, 250)  # 在 t=400 时约为 0.354
+    queue.update('新的强记忆', 4, 400)
+    queue.update('很旧的记忆', 1, 0)  # 在 t=400 时为 1/16
+    result = queue.pop_weakest(10, 400, 1.0)
+    assert [concept for concept, _ in result] == ['很旧的记忆', '新的弱记忆', '旧的强记忆']
+    assert result[0][1] == pytest.approx(1 / 16)
+    assert '新的强记忆' in queue
+    assert len(queue) == 1
+
+
+def test_update_replaces_stale_entry():
+    queue = ForgetQueue(100)
+    queue.update('猫', 1, 0)
+    queue.update('猫', 100, 0)
+    assert queue.pop_weakest(10, 100, 1.0) == []
+    queue.remove('猫')
+    assert len(queue) == 0
+    assert queue.pop_weakest(10, 10 ** 6, 1.0) == []
+
+
+def test_pop_weakest_respects_count_and_threshold():
+    queue = ForgetQueue(100)
+    queue.rebuild((f'记忆{i}', 1, -100 * i) for i in range(10))
+    assert [concept for concept, _ in queue.pop_weakest(3, 0, 1.0)] == ['记忆9', '记忆8', '记忆7']
+    assert [concept for concept, _ in queue.pop_weakest(10, 0, 0.1)] == ['记忆6', '记忆5', '记忆4']
+    assert len(queue) == 4
+
+
+def test_recently_reinforced_entries_stay_queued():
+    queue = ForgetQueue(100)
+    queue.update('刚创建的空节点', 0, 1000)
+    queue.update('旧节点', 1, 0)
+    result = queue.pop_weakest(10, 1000, 1.0, reinforced_before=900)
+    assert [concept for concept, _ in result] == ['旧节点']
+    assert '刚创建的空节点' in queue
+    assert [concept for concept, _ in queue.pop_weakest(10, 2000, 1.0, reinforced_before=1500)] == ['刚创建的空节点']
+
+
+def build_fresh_memory():
+    graph = Memory_graph(half_life=HALF_LIFE)
+    graph.add_dot('猫', '群友说家里的猫喜欢吃鱼')
+    graph.add_dot('天气', '今天下雨了')
+    graph.connect_dot('猫', '鱼')
+    return graph
+
+
+def test_fresh_memory_survives_a_forget_pass():
+    graph = build_fresh_memory()
+    # 遗忘任务在构建后的下一个周期运行
+    forgotten, removed_edges = graph.forget_weakest(20, FORGET_THRESHOLD, FORGET_MIN_AGE, now=time.time() + 300)
+    assert forgotten == []
+    assert removed_edges == 0
+    assert graph.get_memory_items('天气') == ['今天下雨了']
+    assert graph.get_strength('猫', '鱼') == 1
+
+
+def test_min_age_protects_memories_even_with_a_high_threshold():
+    graph = build_fresh_memory()
+    forgotten, removed_edges = graph.forget_weakest(20, 1.0, FORGET_MIN_AGE, now=time.time() + 3600)
+    assert forgotten == []
+    assert removed_edges == 0
+    assert len(graph) == 3
+
+
+def test_stale_memory_is_forgotten_item_by_item():
+    graph = build_fresh_memory()
+    graph.add_dot('天气', '昨天出太阳了')
+    later = time.time() + 10 * HALF_LIFE
+    forgotten, removed_edges = graph.forget_weakest(20, FORGET_THRESHOLD, FORGET_MIN_AGE, now=later)
+    assert {node for node, _, _ in forgotten} == {'猫', '鱼', '天气'}
+    assert removed_edges == 1
+    # 每个节点每次只遗忘一条记忆，没有记忆的节点直接删除
+    assert '鱼' not in graph
+    assert '猫' not in graph
+    assert graph.memory_count('天气') == 1
+    assert '天气' in graph.forget_queue
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.ops = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+
+@pytest.mark.parametrize('item_storage', [False, True])
+def test_forget_pass_removes_the_least_recalled_memory_from_the_database(item_storage):
+    """与 operation_forget_topic 相同的流程：按默认配置遗忘一批节点，再把变更写入数据库"""
+    graph = build_fresh_memory()
+    graph.add_dot('天气', '昨天出太阳了')
+    graph.add_dot('天气', '明天会降温')
+    writer = GraphWriter(RecordingCollection(), RecordingCollection(), RecordingCollection(), item_storage)
+    writer.write(graph)
+    later = time.time() + 10 * HALF_LIFE
+    # 回忆只更新最近使用时间，不强化节点，节点仍然会被遗忘，但被回忆过的记忆保留
+    graph.touch_items('天气', ['今天下雨了', '明天会降温'], now=later - 3600)
+    writer = GraphWriter(RecordingCollection(), RecordingCollection(), RecordingCollection(), item_storage)
+    writer.write(graph)
+
+    forgotten, removed_edges = graph.forget_weakest(20, FORGET_THRESHOLD, FORGET_MIN_AGE, now=later)
+    assert ('天气', '昨天出太阳了') in [(node, item) for node, item, _ in forgotten]
+    assert graph.get_memory_items('天气') == ['今天下雨了', '明天会降温']
+    assert removed_edges == 1
+
+    writer = GraphWriter(RecordingCollection(), RecordingCollection(), RecordingCollection(), item_storage)
+    writer.write(graph)
+    # 只有一条记忆的节点被整个删除，连接两个方向都删除
+    assert {op._filter['concept'] for op in writer.nodes.ops if isinstance(op, DeleteMany)} == {'猫', '鱼'}
+    assert {'$or': [{'source': '猫', 'target': '鱼'}, {'source': '鱼', 'target': '猫'}]} in [
+        op._filter for op in writer.edges.ops if isinstance(op, DeleteMany)
+    ]
+    weather = next(op._doc['$set'] for op in writer.nodes.ops if isinstance(op, UpdateOne) and op._filter['concept'] == '天气')
+    if item_storage:
+        assert [op._filter['text'] for op in writer.items.ops if isinstance(op, DeleteOne)] == ['昨天出太阳了']
+        assert weather['item_count'] == 2
+    else:
+        assert weather['memory_items'] == ['今天下雨了', '明天会降温']
@@ -0,0 +1,120 @@
+"""
+记忆图导出的测试：细节层级筛选、布局缓存的增量更新和无显示器的文件导出
+
+用法:
+    python -m pytest -q src/test/test_graph_export.py
+"""
+
+import json
+
+import networkx as nx
+import pytest
+
+from src.plugins.memory_system.graph_export import (
+    EXPORTERS,
+    LayoutCache,
+    decay_edges,
+    export_graphml,
+    export_json,
+    select_subgraph,
+)
+
+
+def star_graph():
+    """中心节点连接 5 个叶子，另有一个记忆很多但孤立的节点"""
+    memory_counts = {'中心': 1, '孤立': 9}
+    edges = {}
+    for i in range(5):
+        memory_counts[f'叶子{i}'] = 2
+        edges[('中心', f'叶子{i}')] = 1 if i == 0 else 3
+    return memory_counts, edges
+
+
+def test_select_subgraph_ranks_and_filters():
+    memory_counts, edges = star_graph()
+    G = select_subgraph(memory_counts, edges, top_k=3, rank_by='degree')
+    assert '中心' in G and '孤立' not in G
+    assert len(G) == 3
+    G = select_subgraph(memory_counts, edges, top_k=1, rank_by='memory')
+    assert list(G) == ['孤立']
+    # 强度低于阈值的边不展示，也不计入连接数
+    G = select_subgraph(memory_counts, edges, top_k=0, min_strength=2)
+    assert len(G) == len(memory_counts)
+    assert not G.has_edge('中心', '叶子0')
+    assert G.degree('中心') == 4
+    assert G.nodes['孤立']['memory_count'] == 9
+    assert G.edges['中心', '叶子1']['strength'] == 3
+
+
+def test_layout_cache_keeps_known_positions(tmp_path):
+    memory_counts, edges = star_graph()
+    G = select_subgraph(memory_counts, edges, top_k=0)
+    path = str(tmp_path / 'layout' / 'positions.json')
+    cache = LayoutCache(path)
+    pos = cache.layout(G, full_iterations=20)
+    assert set(pos) == set(G)
+    cache.save()
+
+    # 重新加载后，已有节点原地不动，只为新节点计算坐标
+    memory_counts['新节点'] = 1
+    edges[('新节点', '叶子2')] = 2
+    G = select_subgraph(memory_counts, edges, top_k=0)
+    reloaded = LayoutCache(path)
+    refined = reloaded.layout(G, refine_iterations=10)
+    for concept, (x, y) in pos.items():
+        assert refined[concept] == pytest.approx((x, y))
+    assert '新节点' in refined
+    # 没有新节点时直接返回缓存的坐标
+    assert reloaded.layout(G) == refined
+
+    reloaded.save(keep={'中心', '新节点'})
+    assert set(json.loads(open(path, encoding='utf-8').read())) == {'中心', '新节点'}
+
+
+def test_layout_cache_ignores_broken_file(tmp_path):
+    path = tmp_path / 'positions.json'
+    path.write_text('{损坏', encoding='utf-8')
+    assert LayoutCache(str(path)).positions == {}
+
+
+def test_json_and_graphml_exports_carry_positions(tmp_path):
+    memory_counts, edges = star_graph()
+    G = select_subgraph(memory_counts, edges, top_k=0)
+    pos = LayoutCache(str(tmp_path / 'positions.json')).layout(G, full_iterations=5)
+
+    json_path = tmp_path / 'graph.json'
+    export_json(G, pos, str(json_path))
+    data = json.loads(json_path.read_text(encoding='utf-8'))
+    assert {node['id'] for node in data['nodes']} == set(G)
+    center = next(node for node in data['nodes'] if node['id'] == '中心')
+    assert (center['x'], center['y']) == pytest.approx(pos['中心'])
+    assert center['degree'] == 5
+    assert len(data['edges']) == 5
+
+    graphml_path = tmp_path / 'graph.graphml'
+    export_graphml(G, pos, str(graphml_path))
+    H = nx.read_graphml(str(graphml_path))
+    assert H.nodes['中心']['x'] == pytest.approx(pos['中心'][0])
+    # 导出不修改原图
+    assert 'x' not in G.nodes['中心']
+    assert set(EXPORTERS) == {'.svg', '.png', '.graphml', '.json'}
+
+
+def test_decay_edges_halves_per_half_life():
+    edges = {('猫', '狗'): 4.0, ('猫', '鱼'): 4.0}
+    times = {('猫', '狗'): 0.0}
+    decayed = decay_edges(edges, times, half_life_hours=1, now=7200.0)
+    assert decayed[('猫', '狗')] == pytest.approx(1.0)
+    # 没有记录时间的边按刚刚强化处理
+    assert decayed[('猫', '鱼')] == pytest.approx(4.0)
+    assert decay_edges(edges, times, half_life_hours=0) is edges
+
+
+def test_svg_export_runs_without_display(tmp_path):
+    pytest.importorskip('matplotlib')
+    memory_counts, edges = star_graph()
+    G = select_subgraph(memory_counts, edges, top_k=0)
+    pos = LayoutCache(str(tmp_path / 'positions.json')).layout(G, full_iterations=5)
+    path = tmp_path / 'graph.svg'
+    EXPORTERS['.svg'](G, pos, str(path), label_limit=2, title='记忆图')
+    assert path.read_text(encoding='utf-8').lstrip().startswith('<?xml')
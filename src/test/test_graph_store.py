@@ -0,0 +1,124 @@
+"""
+记忆图存储后端的共享行为测试，同一组用例分别在 networkx 和 compact 两个后端上运行
+
+用法:
+    python -m pytest -q src/test/test_graph_store.py
+"""
+
+import networkx as nx
+import pytest
+
+from src.plugins.memory_system.graph_store import CompactGraphStore, NxGraphStore
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+
+@pytest.fixture(params=['networkx', 'compact'])
+def store(request):
+    if request.param == 'compact':
+        # 调小合并阈值，让增量缓冲区在用例中就合并进 CSR
+        return CompactGraphStore(min_delta=2)
+    return NxGraphStore()
+
+
+def test_add_and_remove_node(store):
+    store.add_node('猫')
+    store.add_node('猫')
+    assert '猫' in store
+    assert len(store) == 1
+    assert store.get_items('猫') == []
+    assert store.get_node_time('猫') == 0.0
+    store.remove_node('猫')
+    assert '猫' not in store
+    assert len(store) == 0
+
+
+def test_items(store):
+    store.add_node('猫')
+    store.append_item('猫', '猫喜欢吃鱼')
+    store.append_item('猫', '猫会抓老鼠')
+    assert store.get_items('猫') == ['猫喜欢吃鱼', '猫会抓老鼠']
+    assert store.item_count('猫') == 2
+    # 返回的是副本
+    store.get_items('猫').append('不应写入')
+    assert store.item_count('猫') == 2
+    store.set_items('猫', ['猫会抓老鼠'])
+    assert store.get_items('猫') == ['猫会抓老鼠']
+    store.set_node_time('猫', 42.0)
+    assert store.get_node_time('猫') == 42.0
+
+
+def test_edges_and_strength(store):
+    store.add_node('猫')
+    store.add_node('狗')
+    assert store.get_strength('猫', '狗') is None
+    assert store.get_strength('猫', '狗', 0) == 0
+    store.set_strength('猫', '狗', 1, 10.0)
+    store.set_strength('猫', '鱼', 2.5, 11.0)  # 边可以隐式创建节点
+    assert '鱼' in store
+    assert store.has_edge('狗', '猫')
+    assert store.get_strength('狗', '猫') == 1
+    assert isinstance(store.get_strength('狗', '猫'), int)
+    assert store.get_strength('鱼', '猫') == 2.5
+    assert store.get_edge_time('猫', '狗') == 10.0
+    # 不指定强化时间时保留原来的
+    store.set_strength('猫', '狗', 3)
+    assert store.get_strength('猫', '狗') == 3
+    assert store.get_edge_time('猫', '狗') == 10.0
+    assert store.number_of_edges() == 2
+    assert {tuple(sorted(edge[:2])) for edge in store.edges()} == {('狗', '猫'), ('猫', '鱼')}
+
+
+def test_neighbors_and_degree(store):
+    for target in ('狗', '鱼', '鸟'):
+        store.set_strength('猫', target, 1, 0.0)
+    assert sorted(store.neighbors('猫')) == sorted(['狗', '鱼', '鸟'])
+    assert store.degree('猫') == 3
+    assert list(store.neighbors('狗')) == ['猫']
+    store.remove_edge('猫', '鱼')
+    store.remove_edge('猫', '不存在')
+    assert sorted(store.neighbors('猫')) == sorted(['狗', '鸟'])
+    assert store.degree('鱼') == 0
+
+
+def test_remove_node_drops_its_edges(store):
+    store.set_strength('猫', '狗', 1, 0.0)
+    store.set_strength('猫', '鱼', 1, 0.0)
+    store.set_strength('狗', '鱼', 1, 0.0)
+    store.remove_node('猫')
+    assert not store.has_edge('狗', '猫')
+    assert list(store.neighbors('狗')) == ['鱼']
+    assert store.number_of_edges() == 1
+    # 删除后重新创建的同名节点没有旧的边和记忆
+    store.add_node('猫')
+    assert list(store.neighbors('猫')) == []
+    assert store.get_items('猫') == []
+
+
+def test_load_skips_dangling_edges(store):
+    store.load(
+        {'猫': ['猫喜欢吃鱼'], '狗': []},
+        {('猫', '狗'): 2, ('猫', '不存在'): 1},
+        {'猫': 5.0},
+        {('猫', '狗'): 6.0},
+    )
+    assert sorted(store.nodes()) == sorted(['猫', '狗'])
+    assert store.get_items('猫') == ['猫喜欢吃鱼']
+    assert store.get_node_time('猫') == 5.0
+    assert store.get_strength('狗', '猫') == 2
+    assert store.get_edge_time('狗', '猫') == 6.0
+    assert store.number_of_edges() == 1
+
+
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+def test_memory_graph_networkx_view_is_read_only(backend):
+    graph = Memory_graph(backend)
+    graph.add_dot('猫', '猫喜欢吃鱼')
+    graph.connect_dot('猫', '狗')
+    G = graph.G
+    assert G.nodes['猫']['memory_items'] == ['猫喜欢吃鱼']
+    assert G['猫']['狗']['strength'] == 1
+    with pytest.raises(nx.NetworkXError):
+        G.add_edge('猫', '鱼')
+    with pytest.raises(nx.NetworkXError):
+        G.remove_node('猫')
+    assert graph.neighbors('猫') == ['狗']
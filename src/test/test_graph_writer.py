@@ -0,0 +1,142 @@
+"""
+记忆图增量写入数据库的测试：只写入变化的节点和边，删除的节点和边发出删除操作
+
+用法:
+    python -m pytest -q src/test/test_graph_writer.py
+"""
+
+import time
+
+import pytest
+from pymongo import DeleteMany, DeleteOne, UpdateOne
+
+from src.plugins.memory_system.graph_writer import GraphWriter
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+
+class RecordingCollection:
+    """记录每次 bulk_write 收到的写操作"""
+
+    def __init__(self):
+        self.calls = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls.append((list(ops), ordered))
+
+    @property
+    def ops(self):
+        return [op for ops, _ in self.calls for op in ops]
+
+
+class FailingCollection(RecordingCollection):
+    def bulk_write(self, ops, ordered=True):
+        raise RuntimeError("写入失败")
+
+
+def make_writer(item_storage=False, edges=None):
+    return GraphWriter(RecordingCollection(), edges or RecordingCollection(), RecordingCollection(), item_storage)
+
+
+def make_graph():
+    now = time.time()
+    graph = Memory_graph()
+    graph.load(
+        {'猫': ['猫喜欢吃鱼'], '狗': ['狗会看家'], '鸟': ['鸟在唱歌']},
+        {('狗', '猫'): 1, ('猫', '鸟'): 1},
+        {'猫': now, '狗': now, '鸟': now},
+        {('狗', '猫'): now, ('猫', '鸟'): now},
+    )
+    return graph
+
+
+def filters(ops, kind):
+    return [op._filter for op in ops if isinstance(op, kind)]
+
+
+def test_unchanged_graph_writes_nothing():
+    writer = make_writer()
+    assert writer.write(make_graph()) == (0, None)
+    assert writer.nodes.calls == [] and writer.edges.calls == [] and writer.items.calls == []
+
+
+def test_only_dirty_nodes_and_edges_are_written():
+    graph = make_graph()
+    writer = make_writer()
+    graph.add_dot('猫', '猫会抓老鼠')
+    graph.connect_dot('猫', '鱼')
+    graph.remove_dot('鸟')
+    round_trips, delta = writer.write(graph)
+    assert round_trips == 2
+    upserted = {op._filter['concept'] for op in writer.nodes.ops if isinstance(op, UpdateOne)}
+    # 狗没有变化，不写入
+    assert upserted == {'猫', '鱼'}
+    assert filters(writer.nodes.ops, DeleteMany) == [{'concept': '鸟'}]
+    cat = next(op._doc['$set'] for op in writer.nodes.ops if isinstance(op, UpdateOne) and op._filter['concept'] == '猫')
+    assert cat['memory_items'] == ['猫喜欢吃鱼', '猫会抓老鼠']
+    # 新连接先删除反向记录再按规范方向写入，删除的连接两个方向都删除
+    assert filters(writer.edges.ops, UpdateOne) == [{'source': '猫', 'target': '鱼'}]
+    assert {'$or': [{'source': '猫', 'target': '鸟'}, {'source': '鸟', 'target': '猫'}]} in filters(writer.edges.ops, DeleteMany)
+    assert writer.edges.calls[0][1] is True
+    node_changes, node_deletes, edge_upserts, edge_deletes = delta
+    assert sorted(change[0] for change in node_changes) == ['猫', '鱼']
+    assert node_deletes == ['鸟']
+    assert [edge[:2] for edge in edge_upserts] == [('猫', '鱼')]
+    assert edge_deletes == [('猫', '鸟')]
+    # 变更已经取出，再次写入不会重复
+    assert not graph.has_changes()
+    assert writer.write(graph) == (0, None)
+
+
+def test_reinforced_node_without_item_changes_only_writes_its_time():
+    graph = make_graph()
+    writer = make_writer()
+    graph.connect_dot('猫', '狗')
+    writer.write(graph)
+    for op in writer.nodes.ops:
+        assert set(op._doc['$set']) == {'reinforced_at'}
+
+
+def test_item_storage_writes_individual_items():
+    graph = make_graph()
+    writer = make_writer(item_storage=True)
+    graph.add_dot('猫', '猫会抓老鼠')
+    graph.remove_dot('鸟')
+    writer.write(graph)
+    assert writer.items.calls[0][1] is True
+    added = [op._filter for op in writer.items.ops if isinstance(op, UpdateOne)]
+    assert [(doc['concept'], doc['text']) for doc in added] == [('猫', '猫会抓老鼠')]
+    assert {'concept': '鸟'} in filters(writer.items.ops, DeleteMany)
+    cat = next(op._doc for op in writer.nodes.ops if isinstance(op, UpdateOne) and op._filter['concept'] == '猫')
+    assert cat['$set']['item_count'] == 2
+    assert 'memory_items' not in cat['$set']
+
+
+def test_item_storage_writes_removed_items_and_access_times():
+    graph = make_graph()
+    writer = make_writer(item_storage=True)
+    graph.add_dot('猫', '猫会抓老鼠')
+    writer.write(graph)
+    writer = make_writer(item_storage=True)
+    graph.set_memory_items('猫', ['猫会抓老鼠'])
+    writer.write(graph)
+    assert [op._filter['text'] for op in writer.items.ops if isinstance(op, DeleteOne)] == ['猫喜欢吃鱼']
+
+    writer = make_writer(item_storage=True)
+    graph.touch_items('狗', ['狗会看家'], now=123.0)
+    round_trips, delta = writer.write(graph)
+    # 最近使用时间只更新记忆文档，不写节点，也不计入图版本
+    assert (round_trips, delta) == (1, None)
+    assert [op._doc for op in writer.items.ops] == [{'$set': {'accessed': 123.0}}]
+    assert writer.nodes.calls == []
+
+
+def test_failed_write_keeps_changes():
+    graph = make_graph()
+    writer = make_writer(edges=FailingCollection())
+    graph.connect_dot('猫', '鱼')
+    with pytest.raises(RuntimeError):
+        writer.write(graph)
+    assert graph.has_changes()
+    writer.edges = RecordingCollection()
+    writer.write(graph)
+    assert filters(writer.edges.ops, UpdateOne) == [{'source': '猫', 'target': '鱼'}]
@@ -0,0 +1,112 @@
+"""
+LRUCache 和按图版本失效的检索缓存的行为测试
+
+用法:
+    python -m pytest -q src/test/test_memory_cache.py
+"""
+
+import asyncio
+
+from src.plugins.memory_system import memory_cache
+from src.plugins.memory_system.embedding_index import ConceptEmbeddingIndex
+from src.plugins.memory_system.memory_cache import LRUCache, RetrievalCache
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=0)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # a 变为最近使用
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_expired_entries_count_as_misses(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(memory_cache.time, 'monotonic', lambda: now[0])
+    cache = LRUCache(max_size=4, ttl=10)
+    cache.set('a', 1)
+    now[0] += 5
+    assert cache.get('a') == 1
+    now[0] += 6
+    assert cache.get('a', 'default') == 'default'
+    assert len(cache) == 0
+    assert cache.stats() == {'size': 0, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_cached_none_is_a_hit():
+    cache = LRUCache(max_size=4, ttl=0)
+    cache.set('a', None)
+    assert cache.get('a', 'default') is None
+    assert cache.hits == 1
+    cache.clear()
+    assert cache.get('a', 'default') == 'default'
+    assert cache.misses == 1
+
+
+def retrieve(cache, graph, topics, calls):
+    """按最新发布的图版本检索一次，返回 (结果, 是否命中)"""
+    snapshot = graph.snapshot()
+
+    async def compute():
+        calls.append(snapshot.version)
+        return sorted(concept for concept in topics if concept in snapshot)
+
+    return asyncio.run(cache.get_or_compute(cache.key(snapshot, 'relevant', topics, 5, 0.4), compute))
+
+
+def test_retrieval_cache_invalidates_on_graph_version_bump():
+    graph = Memory_graph()
+    graph.add_dot('猫', '猫喜欢吃鱼')
+    graph.publish()
+    cache = RetrievalCache(max_size=8, ttl=0)
+    calls = []
+    assert retrieve(cache, graph, ['猫', '狗'], calls) == (['猫'], False)
+    # 主题顺序不影响命中
+    assert retrieve(cache, graph, ['狗', '猫'], calls) == (['猫'], True)
+    assert len(calls) == 1
+
+    # 未发布的修改对读者不可见，结果仍然命中
+    graph.add_dot('狗', '狗会看家')
+    assert retrieve(cache, graph, ['猫', '狗'], calls) == (['猫'], True)
+    graph.publish()
+    assert retrieve(cache, graph, ['猫', '狗'], calls) == (['狗', '猫'], False)
+    assert calls == [calls[0], graph.snapshot().version]
+    assert calls[1] > calls[0]
+
+    # 删除节点同样会使旧结果失效
+    graph.remove_dot('猫')
+    graph.publish()
+    assert retrieve(cache, graph, ['猫', '狗'], calls) == (['狗'], False)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 3)
+    assert stats['saved_time'] >= 0
+
+
+def test_retrieval_cache_invalidates_on_embedding_version_bump():
+    graph = Memory_graph()
+    graph.add_dot('猫', '猫喜欢吃鱼')
+    index = ConceptEmbeddingIndex()
+    graph.set_embedding_index(index)
+    graph.publish()
+    cache = RetrievalCache(max_size=8, ttl=0)
+    calls = []
+    retrieve(cache, graph, ['猫'], calls)
+    # 向量索引变化时图版本不变，但语义匹配的结果可能不同
+    index.add('猫', [1.0, 0.0])
+    assert retrieve(cache, graph, ['猫'], calls) == (['猫'], False)
+    assert len(calls) == 2
+
+
+def test_retrieval_cache_keeps_falsy_results():
+    graph = Memory_graph()
+    graph.publish()
+    cache = RetrievalCache(max_size=8, ttl=0)
+    calls = []
+    assert retrieve(cache, graph, ['猫'], calls) == ([], False)
+    assert retrieve(cache, graph, ['猫'], calls) == ([], True)
+    assert len(calls) == 1
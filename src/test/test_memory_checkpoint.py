@@ -0,0 +1,103 @@
+"""
+记忆图本地快照与变更日志的行为测试
+
+用法:
+    python -m pytest -q src/test/test_memory_checkpoint.py
+"""
+
+from src.plugins.memory_system.item_meta import decode_meta
+from src.plugins.memory_system.memory_checkpoint import MemoryCheckpoint
+
+
+def write_base(checkpoint):
+    checkpoint.write_checkpoint(
+        5,
+        {'猫': ['猫喜欢吃鱼'], '狗': ['狗会看家'], '鱼': None},
+        {('猫', '狗'): 2, ('猫', '鱼'): 1},
+        {'猫': 10.0, '狗': 11.0, '鱼': 12.0},
+        {('猫', '狗'): 10.0, ('猫', '鱼'): 12.0},
+        {'鱼': 3},
+    )
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    write_base(checkpoint)
+    version, nodes, edges, node_times, edge_times, item_meta = MemoryCheckpoint(str(tmp_path)).load()
+    assert version == 5
+    assert nodes == {'猫': ['猫喜欢吃鱼'], '狗': ['狗会看家'], '鱼': None}
+    assert edges == {('猫', '狗'): 2, ('猫', '鱼'): 1}
+    assert node_times['狗'] == 11.0
+    assert edge_times[('猫', '鱼')] == 12.0
+    assert item_meta == {'鱼': 3}
+
+
+def test_journal_replay_applies_changes_in_order(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    write_base(checkpoint)
+    checkpoint.append(6, [('猫', 20.0, 2, False, [('add', '猫会抓老鼠', (20.0, 20.0, 7))])], [], [('猫', '狗', 3, 20.0)], [])
+    checkpoint.append(7, [], ['狗'], [], [('猫', '狗')])
+    loaded = MemoryCheckpoint(str(tmp_path))
+    version, nodes, edges, node_times, edge_times, item_meta = loaded.load()
+    assert version == 7
+    assert loaded.journal_entries == 2
+    assert nodes == {'猫': ['猫喜欢吃鱼', '猫会抓老鼠'], '鱼': None}
+    assert edges == {('猫', '鱼'): 1}
+    assert node_times == {'猫': 20.0, '鱼': 12.0}
+    meta, legacy = decode_meta(item_meta['猫'], 2, 0.0)
+    assert not legacy
+    assert meta['created'].tolist() == [10.0, 20.0]
+    assert meta['group'].tolist()[1] == 7
+
+
+def test_journal_replay_applies_removals_and_resets(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    write_base(checkpoint)
+    checkpoint.append(6, [
+        ('猫', 20.0, 0, False, [('remove', 10.0, '猫喜欢吃鱼')]),
+        ('狗', 21.0, 1, True, [('add', '狗会握手', (21.0, 21.0, -1))]),
+    ], [], [], [])
+    _, nodes, _, node_times, _, _ = MemoryCheckpoint(str(tmp_path)).load()
+    assert nodes['猫'] == []
+    assert nodes['狗'] == ['狗会握手']
+    assert node_times['猫'] == 20.0
+
+
+def test_journal_replay_keeps_unloaded_nodes_unloaded(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    write_base(checkpoint)
+    # 只被强化的节点和记忆尚未加载的节点都只记录强化时间和条数
+    checkpoint.append(6, [('鱼', 20.0, 4, False, [('add', '鱼会游泳', (20.0, 20.0, -1))]), ('猫', 20.0, 1, False, [])], [], [], [])
+    _, nodes, _, node_times, _, item_meta = MemoryCheckpoint(str(tmp_path)).load()
+    assert nodes['鱼'] is None
+    assert item_meta['鱼'] == 4
+    assert nodes['猫'] == ['猫喜欢吃鱼']
+    assert node_times['猫'] == 20.0
+
+
+def test_truncated_journal_tail_is_ignored(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    write_base(checkpoint)
+    checkpoint.append(6, [], ['狗'], [], [('猫', '狗')])
+    checkpoint.append(7, [], ['猫'], [], [])
+    with open(checkpoint.journal_path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 3)
+    version, nodes, _, _, _, _ = MemoryCheckpoint(str(tmp_path)).load()
+    assert version == 6
+    assert set(nodes) == {'猫', '鱼'}
+
+
+def test_mismatched_journal_invalidates_checkpoint(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    write_base(checkpoint)
+    other = MemoryCheckpoint(str(tmp_path / 'other'))
+    other.write_checkpoint(9, {}, {})
+    (tmp_path / 'memory_graph.journal').write_bytes((tmp_path / 'other' / 'memory_graph.journal').read_bytes())
+    assert MemoryCheckpoint(str(tmp_path)).load() is None
+
+
+def test_missing_checkpoint_loads_nothing(tmp_path):
+    checkpoint = MemoryCheckpoint(str(tmp_path))
+    checkpoint.append(1, [], ['猫'], [], [])
+    assert checkpoint.load() is None
+    assert checkpoint.journal_entries == 0
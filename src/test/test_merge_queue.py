@@ -0,0 +1,83 @@
+"""
+记忆合并队列和节点容量上限的行为测试
+
+用法:
+    python -m pytest -q src/test/test_merge_queue.py
+"""
+
+import random
+
+from src.plugins.memory_system.memory_graph import Memory_graph
+from src.plugins.memory_system.merge_queue import MergeQueue
+
+
+def test_pop_in_push_order_without_duplicates():
+    queue = MergeQueue(10)
+    for concept in ('猫', '狗', '猫', '鱼'):
+        assert queue.push(concept)
+    assert len(queue) == 3
+    assert queue.pop(2) == ['猫', '狗']
+    assert '猫' not in queue
+    assert queue.pop(10) == ['鱼']
+    assert queue.pop(10) == []
+
+
+def test_remove_and_clear():
+    queue = MergeQueue(10)
+    queue.push('猫')
+    queue.push('狗')
+    queue.remove('猫')
+    queue.remove('不存在')
+    assert queue.pop(10) == ['狗']
+    queue.push('鱼')
+    queue.clear()
+    assert len(queue) == 0
+    assert '鱼' not in queue
+
+
+def test_full_queue_keeps_a_uniform_sample():
+    kept = {}
+    for seed in range(300):
+        queue = MergeQueue(2, rng=random.Random(seed))
+        for concept in 'abcd':
+            queue.push(concept)
+        assert len(queue) == 2
+        assert queue.dropped == 2
+        for concept in queue.pop(2):
+            kept[concept] = kept.get(concept, 0) + 1
+    # 每个节点留在队列中的概率都是 2/4
+    assert set(kept) == set('abcd')
+    assert all(100 < count < 200 for count in kept.values())
+
+
+def test_graph_queues_nodes_at_the_merge_threshold():
+    graph = Memory_graph(merge_threshold=2)
+    graph.add_dot('猫', '猫喜欢吃鱼')
+    assert '猫' not in graph.merge_queue
+    graph.add_dot('猫', '猫会抓老鼠')
+    assert '猫' in graph.merge_queue
+    graph.remove_dot('猫')
+    assert '猫' not in graph.merge_queue
+
+
+def test_default_graph_neither_merges_nor_caps_nodes():
+    graph = Memory_graph()
+    for i in range(200):
+        graph.add_dot('猫', f'关于猫的第{i}条记忆')
+    assert graph.memory_count('猫') == 200
+    assert len(graph.merge_queue) == 0
+    assert graph.capacity_stats == {'sampled_out': 0, 'replaced': 0}
+
+
+def test_node_capacity_samples_incoming_memories():
+    random.seed(0)
+    graph = Memory_graph(node_capacity=5, merge_threshold=4)
+    for i in range(50):
+        graph.add_dot('猫', f'关于猫的第{i}条记忆')
+    assert graph.memory_count('猫') == 5
+    assert graph.capacity_stats['sampled_out'] + graph.capacity_stats['replaced'] == 45
+    assert '猫' in graph.merge_queue
+    # 元数据仍与记忆一一对应并按创建时间排列
+    created = graph.get_item_meta('猫')['created'].tolist()
+    assert len(created) == 5
+    assert created == sorted(created)
@@ -0,0 +1,176 @@
+"""
+按群划分的记忆分区测试：按需加载、按预算卸载、使用中的分区不被卸载以及跨分区合并检索结果
+
+用法:
+    python -m pytest -q src/test/test_partitions.py
+"""
+
+import asyncio
+
+from src.plugins.memory_system.partitions import MemoryPartitions
+
+
+class FakeGraph:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+        self.dirty = False
+
+    def __len__(self):
+        return 0
+
+    def estimate_nbytes(self):
+        return self.nbytes
+
+    def has_changes(self):
+        return self.dirty
+
+
+class FakePartition:
+    """只记录调用的海马体，合并任务在 release 被设置之前一直挂起"""
+
+    def __init__(self, key, nbytes=100, memories=None):
+        self.key = key
+        self.memory_graph = FakeGraph(nbytes)
+        self.memories = memories or []
+        self.syncs = 0
+        self.sync_fails = False
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    def sync_memory_from_db(self):
+        pass
+
+    def sync_memory_to_db(self):
+        self.syncs += 1
+        if not self.sync_fails:
+            self.memory_graph.dirty = False
+
+    def schedule_embedding(self):
+        pass
+
+    async def operation_merge_memory(self):
+        self.started.set()
+        await self.release.wait()
+
+    async def get_relevant_memories(self, text, max_memory_num=5, **kwargs):
+        return list(self.memories)
+
+
+def make_partitions(budget_bytes=250, **kwargs):
+    created = []
+
+    def factory(key):
+        partition = FakePartition(key, **kwargs.get(key, {}))
+        created.append(partition)
+        return partition
+
+    global_partition = FakePartition(MemoryPartitions.GLOBAL, memories=kwargs.get('global_memories'))
+    partitions = MemoryPartitions(global_partition, factory, mode="group", budget_bytes=budget_bytes, embed_on_load=False)
+    return partitions, created
+
+
+def test_concurrent_gets_share_one_load_and_peek_never_loads():
+    async def main():
+        partitions, created = make_partitions()
+        assert partitions.peek(123) is partitions.global_partition
+        assert await partitions.get(MemoryPartitions.GLOBAL) is partitions.global_partition
+        first, second = await asyncio.gather(partitions.get('group_123'), partitions.get('group_123'))
+        assert first is second
+        assert len(created) == 1
+        assert partitions.peek(123) is first
+        assert partitions.peek(None) is partitions.global_partition
+        assert partitions._loading == {}
+
+    asyncio.run(main())
+
+
+def test_evicts_least_recently_used_and_syncs_first():
+    async def main():
+        partitions, _ = make_partitions(budget_bytes=250)
+        group1 = await partitions.get('group_1')
+        group2 = await partitions.get('group_2')
+        group1.memory_graph.dirty = True
+        # 重新使用 group_1 之后，最近最少使用的是 group_2
+        await partitions.get('group_1')
+        await partitions.get('group_3')
+        assert list(partitions._partitions) == ['group_1', 'group_3']
+        assert partitions.evictions == 1
+        assert group2.syncs == 0
+
+        # 有未写入的变更时先同步，同步失败的分区保留
+        group1.memory_graph.dirty = True
+        group1.sync_fails = True
+        await partitions.get('group_4')
+        assert group1.syncs == 1
+        assert list(partitions._partitions) == ['group_1', 'group_4']
+        assert partitions.stats()['bytes'] == 200
+
+    asyncio.run(main())
+
+
+def test_busy_partition_is_not_evicted():
+    async def main():
+        partitions, _ = make_partitions(budget_bytes=150)
+        group1 = await partitions.get('group_1')
+        partitions.global_partition.release.set()
+        merge = asyncio.ensure_future(partitions.operation_merge_memory())
+        await group1.started.wait()
+        # 整合进行中加载新分区，超出预算也不卸载正在整合的分区
+        await partitions.get('group_2')
+        assert 'group_1' in partitions._partitions
+        assert partitions._busy == {'group_1': 1}
+        group1.release.set()
+        await merge
+        assert partitions._busy == {}
+        partitions._evict(keep='group_2')
+        assert list(partitions._partitions) == ['group_2']
+
+    asyncio.run(main())
+
+
+def test_loop_skips_partitions_evicted_before_their_turn():
+    async def main():
+        partitions, _ = make_partitions(budget_bytes=1000)
+        group1 = await partitions.get('group_1')
+        group2 = await partitions.get('group_2')
+        partitions.global_partition.release.set()
+        merge = asyncio.ensure_future(partitions.operation_merge_memory())
+        await group1.started.wait()
+        # group_1 整合期间 group_2 被卸载，轮到它时跳过
+        partitions.budget_bytes = 0
+        partitions._evict()
+        assert list(partitions._partitions) == ['group_1']
+        group1.release.set()
+        await merge
+        assert not group2.started.is_set()
+
+    asyncio.run(main())
+
+
+def test_relevant_memories_are_merged_across_partitions():
+    group_memories = [{'topic': '猫', 'similarity': 0.6, 'content': '群里的猫'}]
+    global_memories = [
+        {'topic': '天气', 'similarity': 0.9, 'content': '今天下雨了'},
+        {'topic': '狗', 'similarity': 0.3, 'content': '狗会看家'},
+    ]
+
+    async def main():
+        partitions, _ = make_partitions(group_1={'memories': group_memories}, global_memories=global_memories)
+        merged = await partitions.get_relevant_memories('文本', group_id=1, max_memory_num=5)
+        assert [memory['content'] for memory in merged] == ['今天下雨了', '群里的猫', '狗会看家']
+        limited = await partitions.get_relevant_memories('文本', group_id=1, max_memory_num=2)
+        assert len(limited) == 2
+        assert all(memory in group_memories + global_memories for memory in limited)
+        assert partitions._busy == {}
+
+        # 扩散激活等按得分选择记忆时，合并结果也取得分最高的几条
+        partitions.ranked = True
+        for _ in range(5):
+            ranked = await partitions.get_relevant_memories('文本', group_id=1, max_memory_num=2)
+            assert [memory['content'] for memory in ranked] == ['今天下雨了', '群里的猫']
+
+        # 不查询全局分区时只返回群分区的结果
+        partitions.include_global = False
+        assert await partitions.get_relevant_memories('文本', group_id=1) == group_memories
+
+    asyncio.run(main())
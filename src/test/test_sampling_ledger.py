@@ -0,0 +1,116 @@
+"""
+记忆构建采样账本的行为测试
+
+用法:
+    python -m pytest -q src/test/test_sampling_ledger.py
+"""
+
+import pytest
+
+from src.plugins.memory_system.sampling_ledger import GroupRanges, SamplingLedger, window_range
+
+
+def as_tuples(ranges):
+    return list(zip(ranges.starts, ranges.ends, ranges.counts))
+
+
+def test_overlapping_windows_split_and_count():
+    ranges = GroupRanges()
+    ranges.add(10, 20)
+    ranges.add(15, 30)
+    assert as_tuples(ranges) == [(10, 15, 1), (15, 20, 2), (20, 30, 1)]
+    assert ranges.max_count(0, 10) == 0
+    assert ranges.max_count(12, 14) == 1
+    assert ranges.max_count(0, 100) == 2
+    # 区间左闭右开，恰好在结束时间的消息不算被采样
+    assert ranges.max_count(30, 40) == 0
+
+
+def test_adjacent_ranges_with_same_count_merge():
+    ranges = GroupRanges()
+    ranges.add(10, 20)
+    ranges.add(30, 40)
+    ranges.add(20, 30)
+    assert as_tuples(ranges) == [(10, 40, 1)]
+    ranges.add(10, 40)
+    assert as_tuples(ranges) == [(10, 40, 2)]
+
+
+def test_window_covering_gaps_fills_them():
+    ranges = GroupRanges()
+    ranges.add(10, 20)
+    ranges.add(30, 40)
+    ranges.add(0, 50)
+    assert as_tuples(ranges) == [(0, 10, 1), (10, 20, 2), (20, 30, 1), (30, 40, 2), (40, 50, 1)]
+    ranges.add(5, 5)
+    assert len(ranges) == 5
+
+
+def test_encode_round_trip():
+    ranges = GroupRanges()
+    ranges.add(1.5, 2.5)
+    ranges.add(2.0, 3.0)
+    assert as_tuples(GroupRanges.decode(ranges.encode())) == as_tuples(ranges)
+    assert len(GroupRanges.decode(None)) == 0
+
+
+def test_window_range_includes_last_message():
+    start, end = window_range(100.0, 200.0)
+    ranges = GroupRanges()
+    ranges.add(start, end)
+    assert ranges.max_count(200.0, 201.0) == 1
+    assert ranges.max_count(end, 300.0) == 0
+
+
+class MemoryCollection:
+    """只支持账本用到的按 _id 查询和 $set upsert 的内存集合"""
+
+    def __init__(self):
+        self.docs = {}
+        self.round_trips = 0
+
+    def find(self, query):
+        self.round_trips += 1
+        return [dict(self.docs[key], _id=key) for key in query['_id']['$in'] if key in self.docs]
+
+    def bulk_write(self, ops, ordered=True):
+        self.round_trips += 1
+        for op in ops:
+            doc = self.docs.setdefault(op._filter['_id'], {})
+            doc.update(op._doc['$set'])
+
+
+def test_ledger_persists_per_group():
+    collection = MemoryCollection()
+    ledger = SamplingLedger(collection)
+    assert ledger.load([123, 456]) == 1
+    assert ledger.load([123]) == 0
+    ledger.record(123, 10, 20)
+    ledger.record(123, 10, 20)
+    assert ledger.max_count(123, 15, 16) == 2
+    assert ledger.max_count(456, 15, 16) == 0
+    assert ledger.save() == 1
+    assert ledger.save() == 0
+    # 没有改动的群不写入
+    assert list(collection.docs) == ['123']
+    assert collection.docs['123']['range_count'] == 1
+
+    reloaded = SamplingLedger(collection)
+    reloaded.load(['123'])
+    assert reloaded.max_count(123, 15, 16) == 2
+    assert collection.round_trips == 3
+
+
+class FailingCollection(MemoryCollection):
+    def bulk_write(self, ops, ordered=True):
+        raise RuntimeError("写入失败")
+
+
+def test_failed_save_keeps_changes():
+    ledger = SamplingLedger(FailingCollection())
+    ledger.record(1, 0, 10)
+    with pytest.raises(RuntimeError):
+        ledger.save()
+    ledger.collection = MemoryCollection()
+    assert ledger.save() == 1
+    assert ledger.collection.docs['1']['range_count'] == 1
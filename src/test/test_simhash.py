@@ -0,0 +1,49 @@
+"""
+SimHash 近似重复检测和记忆去重的行为测试
+
+用法:
+    python -m pytest -q src/test/test_simhash.py
+"""
+
+from src.plugins.memory_system.memory_graph import Memory_graph
+from src.plugins.memory_system.simhash import dedupe_items, find_near_duplicate, hamming, simhash
+
+SAME = '群友小明说他昨天晚上去吃了火锅，觉得很好吃'
+REWORDED = '群友小明说他昨天晚上去吃了火锅，觉得很好吃呢'
+DIFFERENT = '今天群里在讨论原神的新版本什么时候更新'
+
+
+def test_reworded_sentences_are_close():
+    assert hamming(simhash(SAME), simhash(SAME)) == 0
+    assert hamming(simhash(SAME), simhash(REWORDED)) <= 8
+    assert hamming(simhash(SAME), simhash(DIFFERENT)) > 8
+
+
+def test_find_near_duplicate():
+    fingerprints = [simhash(DIFFERENT), simhash(SAME)]
+    assert find_near_duplicate(simhash(REWORDED), fingerprints, 8) == 1
+    assert find_near_duplicate(simhash(REWORDED), fingerprints, -1) is None
+    assert find_near_duplicate(simhash(REWORDED), [], 8) is None
+
+
+def test_dedupe_items_keeps_longest_in_original_order():
+    kept, fingerprints = dedupe_items([SAME, DIFFERENT, REWORDED], 8)
+    assert kept == [DIFFERENT, REWORDED]
+    assert fingerprints == [simhash(DIFFERENT), simhash(REWORDED)]
+
+
+def test_graph_keeps_duplicates_when_dedup_is_off():
+    graph = Memory_graph()
+    graph.add_dot('火锅', SAME)
+    graph.add_dot('火锅', REWORDED)
+    assert graph.get_memory_items('火锅') == [SAME, REWORDED]
+
+
+def test_graph_replaces_shorter_duplicate_when_enabled():
+    graph = Memory_graph(dedup_distance=8)
+    graph.add_dot('火锅', SAME)
+    graph.add_dot('火锅', REWORDED)
+    graph.add_dot('火锅', SAME)
+    assert graph.get_memory_items('火锅') == [REWORDED]
+    assert graph.dedup_stats['replaced'] == 1
+    assert graph.dedup_stats['rejected'] == 1
@@ -0,0 +1,131 @@
+"""
+记忆图快照的版本隔离测试：发布之后的修改、删除和重新加载都不影响已拿到的快照
+
+用法:
+    python -m pytest -q src/test/test_snapshot.py
+"""
+
+import numpy as np
+
+from src.plugins.memory_system.embedding_index import ConceptEmbeddingIndex
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+
+def make_graph():
+    graph = Memory_graph()
+    graph.add_dot('猫粮', '猫粮快吃完了')
+    graph.add_dot('狗粮', '狗粮在打折')
+    graph.connect_dot('猫粮', '狗粮')
+    graph.publish()
+    return graph
+
+
+def topics(matches):
+    return sorted(concept for concept, _ in matches)
+
+
+def test_items_and_edges_are_isolated():
+    graph = make_graph()
+    snapshot = graph.snapshot()
+    graph.add_dot('猫粮', '买了新的猫粮')
+    graph.remove_edge('猫粮', '狗粮')
+    graph.publish()
+    assert snapshot.get_memory_items('猫粮') == ['猫粮快吃完了']
+    assert snapshot.memory_count('猫粮') == 1
+    assert snapshot.neighbors('猫粮') == ['狗粮']
+    assert graph.snapshot().get_memory_items('猫粮') == ['猫粮快吃完了', '买了新的猫粮']
+    assert graph.snapshot().neighbors('猫粮') == []
+
+
+def test_unpublished_changes_are_invisible():
+    graph = make_graph()
+    graph.add_dot('猫砂', '猫砂用完了')
+    assert '猫砂' not in graph.snapshot()
+    assert graph.snapshot().query_topics('猫砂', 0.1) == []
+    graph.publish()
+    assert topics(graph.snapshot().query_topics('猫砂', 0.1)) == ['猫砂']
+
+
+def test_topic_query_sees_nodes_removed_later():
+    graph = make_graph()
+    snapshot = graph.snapshot()
+    graph.remove_dot('狗粮')
+    graph.add_dot('狗绳', '狗绳断了')
+    graph.publish()
+    assert topics(snapshot.query_topics('狗粮', 0.99)) == ['狗粮']
+    assert '狗绳' not in topics(snapshot.query_topics('狗绳', 0.1))
+    assert graph.snapshot().query_topics('狗粮', 0.99) == []
+    assert topics(graph.snapshot().query_topics('狗绳', 0.99)) == ['狗绳']
+
+
+def test_topic_query_survives_reload():
+    graph = make_graph()
+    snapshot = graph.snapshot()
+    graph.load({'鸟食': ['鸟食放在阳台']}, {})
+    assert topics(snapshot.query_topics('猫粮', 0.99)) == ['猫粮']
+    assert snapshot.query_topics('鸟食', 0.1) == []
+    assert topics(graph.snapshot().query_topics('鸟食', 0.1)) == ['鸟食']
+
+
+def make_embedded_graph():
+    graph = make_graph()
+    index = ConceptEmbeddingIndex()
+    index.add('猫粮', [1.0, 0.0, 0.0])
+    index.add('狗粮', [0.0, 1.0, 0.0])
+    graph.set_embedding_index(index)
+    return graph, index
+
+
+def test_embedding_query_sees_nodes_removed_later():
+    graph, index = make_embedded_graph()
+    snapshot = graph.snapshot()
+    graph.remove_dot('猫粮')
+    graph.publish()
+    assert '猫粮' not in index
+    # 删除时最后一行被移到空位，保存的向量不受影响
+    assert snapshot.query_embeddings(np.array([1.0, 0.0, 0.0]), top_k=1) == [('猫粮', 1.0)]
+    assert graph.snapshot().query_embeddings(np.array([1.0, 0.0, 0.0]), top_k=1, similarity_threshold=0.5) == []
+
+
+def test_embedding_query_skips_nodes_added_later():
+    graph, index = make_embedded_graph()
+    snapshot = graph.snapshot()
+    graph.add_dot('猫薄荷', '猫薄荷让猫很兴奋')
+    index.add('猫薄荷', [0.9, 0.1, 0.0])
+    graph.publish()
+    assert topics(snapshot.query_embeddings(np.array([1.0, 0.0, 0.0]), top_k=1)) == ['猫粮']
+    assert topics(graph.snapshot().query_embeddings(np.array([1.0, 0.0, 0.0]), top_k=2)) == ['猫粮', '猫薄荷']
+
+
+def test_embedding_index_replaced_on_reload_is_versioned():
+    graph, _ = make_embedded_graph()
+    snapshot = graph.snapshot()
+    # 重新加载时海马体换上新的索引
+    graph.load({'猫粮': ['猫粮快吃完了'], '狗粮': ['狗粮在打折']}, {})
+    graph.set_embedding_index(ConceptEmbeddingIndex())
+    assert topics(snapshot.query_embeddings(np.array([0.0, 1.0, 0.0]), top_k=1)) == ['狗粮']
+    assert graph.snapshot().query_embeddings(np.array([0.0, 1.0, 0.0])) == []
+
+
+def test_preloaded_items_are_read_without_the_database():
+    calls = []
+
+    def loader(concepts):
+        calls.append(list(concepts))
+        return {'猫': (['猫喜欢吃鱼', '猫会抓老鼠'], None)}
+
+    graph = Memory_graph()
+    graph.item_loader = loader
+    graph.load({'猫': None, '狗': None, '鱼': ['鱼在游']}, {('狗', '猫'): 1}, item_meta={'猫': 2, '狗': 0})
+    snapshot = graph.snapshot()
+    # 检索时在线程池中一次读取所有需要的节点，已加载的和不存在的节点不查询
+    assert snapshot.preload_items(['猫', '狗', '鱼', '不存在', '猫']) == 2
+    assert calls == [['猫', '狗']]
+    assert snapshot.get_memory_items('猫') == ['猫喜欢吃鱼', '猫会抓老鼠']
+    assert len(snapshot.get_item_meta('猫')) == 2
+    assert snapshot.get_memory_items('狗') == []
+    assert snapshot.get_memory_items('鱼') == ['鱼在游']
+    assert snapshot.preload_items(['猫']) == 0
+    assert len(calls) == 1
+    # 只保存在快照中，不修改图
+    assert graph.unloaded_count('猫') == 2
@@ -0,0 +1,103 @@
+"""
+扩散激活检索的测试：每跳衰减、跳数和节点数上限、提前结束，以及按激活值确定地选出记忆
+
+用法:
+    python -m pytest -q src/test/test_spreading_activation.py
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from src.plugins.memory_system.spreading_activation import edge_weight, select_activated_memories, spread_activation
+
+
+class FakeGraph:
+    """无向图，连接强度不随时间衰减；delay 模拟每次展开节点的耗时"""
+
+    def __init__(self, edges, delay=0.0):
+        self.strengths = {}
+        self.adjacency = {}
+        self.delay = delay
+        for (concept1, concept2), strength in edges.items():
+            self.strengths[frozenset((concept1, concept2))] = strength
+            self.adjacency.setdefault(concept1, []).append(concept2)
+            self.adjacency.setdefault(concept2, []).append(concept1)
+
+    def neighbors(self, concept):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.adjacency.get(concept, [])
+
+    def decayed_strength(self, concept1, concept2, now=None):
+        return self.strengths.get(frozenset((concept1, concept2)), 0.0)
+
+
+def chain_graph():
+    """猫 - 狗 - 鱼 - 鸟，强度都为 1（传播系数 0.5）"""
+    return FakeGraph({('猫', '狗'): 1, ('狗', '鱼'): 1, ('鱼', '鸟'): 1})
+
+
+def test_activation_decays_per_hop():
+    activated, stats = spread_activation(chain_graph(), {'猫': 1.0}, decay=0.5, max_hops=3, min_activation=0.001)
+    assert [(concept, hops) for concept, _, hops in activated] == [('猫', 0), ('狗', 1), ('鱼', 2), ('鸟', 3)]
+    # 每跳乘以 decay × 连接的传播系数
+    assert [activation for _, activation, _ in activated] == pytest.approx([1.0, 0.25, 0.0625, 0.015625])
+    assert edge_weight(1) == 0.5 and edge_weight(0) == 0.0
+    assert stats['nodes'] == 4 and not stats['truncated']
+
+
+def test_max_hops_limits_the_depth():
+    activated, _ = spread_activation(chain_graph(), {'猫': 1.0}, max_hops=1, min_activation=0.001)
+    assert [concept for concept, _, _ in activated] == ['猫', '狗']
+    activated, stats = spread_activation(chain_graph(), {'猫': 1.0}, max_hops=0)
+    assert activated == [('猫', 1.0, 0)]
+    assert stats['edges_scanned'] == 0
+
+
+def test_node_takes_the_strongest_path():
+    # 鱼 直接连到 猫 的连接很弱，经过 狗 的路径激活值更高
+    graph = FakeGraph({('猫', '狗'): 9, ('狗', '鱼'): 9, ('猫', '鱼'): 0.01})
+    activated, _ = spread_activation(graph, {'猫': 1.0}, decay=0.5, min_activation=0.001)
+    fish = next(item for item in activated if item[0] == '鱼')
+    assert fish[1] == pytest.approx(0.5 * 0.9 * 0.5 * 0.9)
+    assert fish[2] == 2
+
+
+def test_node_budget_keeps_the_most_activated():
+    graph = FakeGraph({('中心', f'叶子{i}'): i + 1 for i in range(10)})
+    activated, stats = spread_activation(graph, {'中心': 1.0}, max_nodes=3)
+    # 强度越大的连接传播的激活值越高
+    assert [concept for concept, _, _ in activated] == ['中心', '叶子9', '叶子8']
+    assert stats['nodes'] == 3
+
+
+def test_stops_below_min_activation():
+    activated, stats = spread_activation(chain_graph(), {'猫': 1.0, '鸟': 0.01}, max_hops=5, min_activation=0.2)
+    # 低于阈值的种子不加入，狗 (0.25) 再传播一跳最多 0.125，不再展开
+    assert [concept for concept, _, _ in activated] == ['猫', '狗']
+    assert stats['edges_scanned'] == 1
+
+
+def test_time_budget_ends_early():
+    graph = FakeGraph({('猫', '狗'): 1, ('狗', '鱼'): 1}, delay=0.02)
+    activated, stats = spread_activation(graph, {'猫': 1.0}, min_activation=0.001, time_budget=0.005)
+    # 展开种子就超出了时间预算，已出堆的结果仍然返回
+    assert activated == [('猫', 1.0, 0)]
+    assert stats['truncated']
+
+
+def test_select_activated_memories_is_deterministic():
+    activated_topics = [
+        ('猫', 0.9, ['猫1', '猫2', '猫3'], np.array([1.0, 3.0, 2.0])),
+        ('狗', 0.5, ['狗1'], np.array([5.0])),
+        ('鱼', 0.5, [], np.array([])),
+        ('鸟', 0.2, ['鸟1', '鸟2'], np.array([1.0, 2.0])),
+    ]
+    selected = select_activated_memories(activated_topics, max_memory_num=4)
+    # 每个主题最多 2 条，取最新的，按激活值从高到低，同一主题内从新到旧
+    assert [memory['content'] for memory in selected] == ['猫2', '猫3', '狗1', '鸟2']
+    assert [memory['similarity'] for memory in selected] == [0.9, 0.9, 0.5, 0.2]
+    assert select_activated_memories(activated_topics, max_memory_num=4) == selected
+    assert [memory['content'] for memory in select_activated_memories(activated_topics, max_memory_num=1)] == ['猫2']
@@ -0,0 +1,53 @@
+"""
+批量概括输出的解析测试：格式不对、不完整或缺少话题时只保留能确认的概括
+
+用法:
+    python -m pytest -q src/test/test_summary_parser.py
+"""
+
+import json
+
+import pytest
+
+from src.plugins.memory_system.summary_parser import parse_topic_summaries
+
+TOPICS = ['猫', '天气']
+
+
+def test_plain_and_fenced_json():
+    content = '{"猫": "猫喜欢吃鱼", "天气": "今天下雨了"}'
+    assert parse_topic_summaries(content, TOPICS) == {'猫': '猫喜欢吃鱼', '天气': '今天下雨了'}
+    fenced = '好的，概括如下：\n```json\n{"猫": " 猫喜欢吃鱼 \\n", "天气": "今天下雨了"}\n```'
+    assert parse_topic_summaries(fenced, TOPICS) == {'猫': '猫喜欢吃鱼', '天气': '今天下雨了'}
+
+
+def test_missing_and_unrequested_topics():
+    content = '{"猫": "猫喜欢吃鱼", "狗": "狗会看家"}'
+    # 缺少的话题不在结果中，没有请求过的话题被丢弃
+    assert parse_topic_summaries(content, TOPICS) == {'猫': '猫喜欢吃鱼'}
+
+
+@pytest.mark.parametrize('value', ['', '   ', None, 42, ['今天', '下雨了'], {'内容': '今天下雨了'}])
+def test_non_string_or_empty_summaries_are_dropped(value):
+    content = json.dumps({'猫': '猫喜欢吃鱼', '天气': value}, ensure_ascii=False)
+    assert parse_topic_summaries(content, TOPICS) == {'猫': '猫喜欢吃鱼'}
+
+
+@pytest.mark.parametrize('content', [
+    '',
+    '猫喜欢吃鱼，今天下雨了',
+    # 被截断的输出
+    '{"猫": "猫喜欢吃鱼", "天气": "今天下',
+    '{"猫": "猫喜欢吃鱼", "天气": }',
+    # 顺序颠倒的括号
+    '} 猫 {',
+    # 数组而不是对象
+    '["猫喜欢吃鱼", "今天下雨了"]',
+    '"猫喜欢吃鱼"',
+])
+def test_malformed_responses_yield_nothing(content):
+    assert parse_topic_summaries(content, TOPICS) == {}
+
+
+def test_no_topics_requested():
+    assert parse_topic_summaries('{"猫": "猫喜欢吃鱼"}', []) == {}
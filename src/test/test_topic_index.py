@@ -0,0 +1,94 @@
+"""
+TopicIndex 倒排索引的行为测试
+
+用法:
+    python -m pytest -q src/test/test_topic_index.py
+"""
+
+import math
+
+import pytest
+
+from src.plugins.memory_system.topic_index import TopicIndex, tokenize_topic
+
+
+def brute_force(concepts, text, threshold):
+    """逐个节点计算余弦相似度，作为索引查询的参照"""
+    vector = tokenize_topic(text)
+    norm = math.sqrt(sum(count * count for count in vector.values()))
+    results = {}
+    for concept in concepts:
+        other = tokenize_topic(concept)
+        other_norm = math.sqrt(sum(count * count for count in other.values()))
+        dot = sum(count * other.get(word, 0) for word, count in vector.items())
+        similarity = dot / (norm * other_norm) if norm and other_norm else 0
+        if similarity >= threshold:
+            results[concept] = similarity
+    return results
+
+
+def make_index(*concepts):
+    index = TopicIndex()
+    for concept in concepts:
+        index.add(concept)
+    return index
+
+
+def test_add_is_idempotent_and_remove_drops_postings():
+    index = make_index('原神', '原神游戏')
+    index.add('原神')
+    assert len(index) == 2
+    index.remove('原神游戏')
+    index.remove('不存在')
+    assert '原神游戏' not in index
+    assert [concept for concept, _ in index.query('游戏', 0.1)] == []
+
+
+@pytest.mark.parametrize('text', ['原神', '玩原神游戏', '猫粮', '喜欢猫', '今天天气'])
+def test_query_matches_brute_force(text):
+    concepts = ['原神', '原神游戏', '玩原神', '猫', '猫粮', '喜欢猫', '今天天气', '天气']
+    index = make_index(*concepts)
+    for threshold in (0.0001, 0.4, 0.7):
+        expected = brute_force(concepts, text, threshold)
+        results = dict(index.query(text, threshold))
+        assert results.keys() == expected.keys()
+        for concept, similarity in results.items():
+            assert similarity == pytest.approx(expected[concept])
+
+
+def test_similarity_of_unknown_concept_is_zero():
+    index = make_index('原神')
+    assert index.similarity('原神', '原神') == pytest.approx(1.0)
+    assert index.similarity('原神', '星铁') == 0
+
+
+def test_rebuild_replaces_contents():
+    index = make_index('原神', '猫')
+    index.rebuild(['天气'])
+    assert len(index) == 1
+    assert index.query('原神', 0.1) == []
+    assert [concept for concept, _ in index.query('天气', 0.1)] == ['天气']
+
+
+def test_generalizations_only_returns_subsets():
+    index = make_index('原神', '游戏', '原神游戏', '手机游戏')
+    found = {concept for concept, _ in index.generalizations('原神游戏', 0.5)}
+    assert found == {'原神', '游戏'}
+    assert index.token_count('原神游戏') == 2
+    assert index.token_count('不在索引中的玩原神') == len(tokenize_topic('不在索引中的玩原神'))
+
+
+def test_query_orders_by_similarity_then_name():
+    concepts = ['原神游戏', '游戏原神', '原神', '原神攻略']
+    expected = None
+    for order in (concepts, concepts[::-1], sorted(concepts)):
+        results = make_index(*order).query('原神', 0.1)
+        names = [concept for concept, _ in results]
+        assert names[0] == '原神'
+        similarities = [similarity for _, similarity in results]
+        assert similarities == sorted(similarities, reverse=True)
+        tied = [concept for concept, similarity in results if similarity == pytest.approx(similarities[1])]
+        assert tied == sorted(tied)
+        if expected is None:
+            expected = names
+        assert names == expected
@@ -0,0 +1,123 @@
+"""
+聊天片段信息量索引的补录测试
+
+用法:
+    python -m pytest -q src/test/test_window_index.py
+"""
+
+import pytest
+
+from src.plugins.memory_system.window_index import ChatWindowIndex, window_density
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class WindowCollection:
+    """mongomock 的集合不支持 pymongo 4 的 UpdateOne 批量写入，逐条执行"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            self._collection.update_one(op._filter, op._doc, upsert=op._upsert)
+
+
+def make_index(window_size=3, batch_size=100):
+    db = mongomock.MongoClient().db
+    return db.messages, ChatWindowIndex(WindowCollection(db.memory_chat_windows), window_size, batch_size)
+
+
+def store(messages, group_id, time, info):
+    messages.insert_one({'group_id': group_id, 'time': time, 'info': info, 'processed_plain_text': '消息'})
+
+
+def closed_windows(index):
+    return sorted(
+        (window['group_id'], window['start'], window['end'], window['density'])
+        for window in index.collection.find({'closed': True})
+    )
+
+
+def test_window_density_uses_stored_information():
+    assert window_density([]) == 0.0
+    assert window_density([{'info': 2.0}, {'info': 4.0}]) == 3.0
+
+
+def test_refresh_builds_one_open_window_per_group():
+    messages, index = make_index()
+    for i in range(4):
+        store(messages, 1, 100 + i, 6.0)
+        store(messages, 2, 100 + i, 0.0)
+    index.refresh(messages)
+    assert closed_windows(index) == [(1, 100, 102, 6.0), (2, 100, 102, 0.0)]
+    state = index.collection.find_one({'_id': ChatWindowIndex.STATE_ID})
+    assert sorted(state['open']) == ['1', '2']
+    assert state['open']['1']['count'] == 1
+
+
+def test_refresh_continues_where_it_stopped():
+    messages, index = make_index()
+    for i in range(4):
+        store(messages, 1, 100 + i, 3.0)
+    index.refresh(messages)
+    # 没有新消息时不写入任何东西
+    assert index.refresh(messages) == 2
+    for i in range(4, 6):
+        store(messages, 1, 100 + i, 9.0)
+    index.refresh(messages)
+    assert closed_windows(index) == [(1, 100, 102, 3.0), (1, 103, 105, 7.0)]
+
+
+def test_refresh_reads_in_batches_and_respects_the_limit():
+    messages, index = make_index(window_size=2, batch_size=3)
+    for i in range(10):
+        store(messages, 1, 100 + i, 1.0)
+    index.refresh(messages, max_messages=6)
+    assert len(closed_windows(index)) == 3
+    index.refresh(messages)
+    assert len(closed_windows(index)) == 5
+
+
+def test_repeated_refresh_does_not_duplicate_windows():
+    messages, index = make_index()
+    for i in range(3):
+        store(messages, 1, 100 + i, 1.0)
+    index.refresh(messages)
+    # 另一次补录从旧的进度重新处理同一批消息
+    index.collection.update_one({'_id': ChatWindowIndex.STATE_ID}, {'$set': {'last_id': None, 'open': {}}})
+    index.refresh(messages)
+    assert len(closed_windows(index)) == 1
+
+
+def test_gap_in_a_group_closes_its_window():
+    messages, index = make_index(window_size=5)
+    index.max_gap = 60
+    for time in (100, 101, 102, 500, 501):
+        store(messages, 1, time, 3.0)
+    index.refresh(messages)
+    # 隔了很久的消息另起一个片段，前一个片段不满 window_size 条也封口
+    assert closed_windows(index) == [(1, 100, 102, 3.0)]
+    state = index.collection.find_one({'_id': ChatWindowIndex.STATE_ID})
+    assert state['open']['1']['start'] == 500
+    assert state['open']['1']['count'] == 2
+
+
+def test_idle_group_window_closes_when_other_groups_move_on():
+    messages, index = make_index(window_size=5)
+    index.max_gap = 60
+    store(messages, 1, 100, 2.0)
+    store(messages, 1, 101, 4.0)
+    store(messages, 2, 120, 1.0)
+    index.refresh(messages)
+    assert closed_windows(index) == []
+    # 群 1 不再说话，群 2 的新消息比它的片段晚 max_gap 以上
+    store(messages, 2, 170, 1.0)
+    index.refresh(messages)
+    assert closed_windows(index) == [(1, 100, 101, 3.0)]
+    state = index.collection.find_one({'_id': ChatWindowIndex.STATE_ID})
+    assert sorted(state['open']) == ['2']
+    assert state['open']['2']['count'] == 2
@@ -0,0 +1,220 @@
+"""
+维护进程发布的图变更在机器人进程中的应用，以及机器人进程的回忆时间交给维护进程的测试
+
+用法:
+    python -m pytest -q src/test/test_worker_delta.py
+"""
+
+import time
+
+from src.plugins.memory_system.graph_writer import GraphWriter, recall_ops
+from src.plugins.memory_system.item_meta import encode_meta
+from src.plugins.memory_system.memory_graph import Memory_graph
+
+
+def make_reader():
+    graph = Memory_graph()
+    graph.load(
+        {'猫': ['猫喜欢吃鱼'], '狗': ['狗会看家']},
+        {('狗', '猫'): 2},
+        {'猫': 10.0, '狗': 10.0},
+        {('狗', '猫'): 10.0},
+    )
+    return graph
+
+
+def test_apply_delta_updates_graph_without_recording_changes():
+    graph = make_reader()
+    version = graph.version
+    consistent = graph.apply_delta(
+        [('猫', 20.0, 2, False, [('add', '猫会抓老鼠', (20.0, 20.0, -1))])],
+        [],
+        [('猫', '鱼', 1, 20.0)],
+        [('狗', '猫')],
+    )
+    assert consistent
+    assert graph.version > version
+    assert graph.get_memory_items('猫') == ['猫喜欢吃鱼', '猫会抓老鼠']
+    assert graph.get_node_time('猫') == 20.0
+    assert graph.neighbors('猫') == ['鱼']
+    assert '鱼' in graph.topic_index
+    # 变更已经由维护进程写入数据库，本地不再记录
+    assert not graph.has_changes()
+    assert graph.item_changes == {}
+
+
+def test_apply_delta_deletes_nodes_and_indexes():
+    graph = make_reader()
+    graph.apply_delta([], ['狗'], [], [])
+    assert '狗' not in graph
+    assert '狗' not in graph.topic_index
+    assert '狗' not in graph.forget_queue
+    assert graph.neighbors('猫') == []
+    assert graph.degree('猫') == 0
+
+
+def test_old_snapshot_is_unaffected_by_delta():
+    graph = make_reader()
+    snapshot = graph.snapshot()
+    graph.apply_delta([('猫', 20.0, 1, True, [('add', '猫会抓老鼠', (20.0, 20.0, -1))])], ['狗'], [], [])
+    graph.publish()
+    assert snapshot.get_memory_items('猫') == ['猫喜欢吃鱼']
+    assert '狗' in snapshot
+    assert graph.snapshot().get_memory_items('猫') == ['猫会抓老鼠']
+    assert '狗' not in graph.snapshot()
+
+
+def test_resync_replaces_graph_state():
+    graph = make_reader()
+    graph.apply_delta([('猫', 20.0, 1, False, [('remove', 10.0, '猫喜欢吃鱼'), ('add', '猫会抓老鼠', (20.0, 20.0, -1))])], [], [], [])
+    old_snapshot = graph.snapshot()
+    # 版本不连续时从数据库完整重新加载
+    graph.load({'鸟': ['鸟会飞']}, {}, {'鸟': 30.0})
+    assert graph.nodes() == ['鸟']
+    assert not graph.has_changes()
+    assert len(graph.forget_queue) == 1
+    assert [concept for concept, _ in graph.topic_index.query('鸟', 0.1)] == ['鸟']
+    assert graph.topic_index.query('猫', 0.1) == []
+    assert '猫' in old_snapshot
+    assert '鸟' not in old_snapshot
+
+
+def test_mismatched_count_asks_for_resync():
+    graph = make_reader()
+    assert not graph.apply_delta([('猫', 20.0, 5, False, [])], [], [], [])
+
+
+def make_lazy_graph():
+    loads = []
+
+    def loader(concepts):
+        loads.extend(concepts)
+        return {'猫': (['猫喜欢吃鱼'], None), '狗': (['狗会看家', '狗会握手'], None)}
+
+    now = time.time()
+    graph = Memory_graph()
+    graph.item_loader = loader
+    graph.load({'猫': None, '狗': None}, {('狗', '猫'): 1}, {'猫': now, '狗': now}, {('狗', '猫'): now}, {'猫': 1, '狗': 2})
+    return graph, loads
+
+
+def test_delta_keeps_unloaded_nodes_unloaded():
+    graph, loads = make_lazy_graph()
+    snapshot = graph.snapshot()
+    assert graph.apply_delta([('猫', 20.0, 2, False, [('add', '猫会抓老鼠', (20.0, 20.0, -1))])], [], [('猫', '鱼', 1, 20.0)], [])
+    graph.publish()
+    assert loads == []
+    assert graph.unloaded_count('猫') == 2
+    assert snapshot.memory_count('猫') == 1
+    assert snapshot.neighbors('猫') == ['狗']
+    assert sorted(graph.snapshot().neighbors('猫')) == ['狗', '鱼']
+
+
+def test_reinforcing_edges_does_not_load_or_rewrite_nodes():
+    graph, loads = make_lazy_graph()
+    snapshot = graph.snapshot()
+    graph.connect_dot('猫', '狗')
+    graph.publish()
+    assert loads == []
+    assert graph.unloaded_count('猫') == 1
+    assert graph.item_changes == {}
+    assert snapshot.get_strength('猫', '狗') == 1
+    assert graph.snapshot().get_strength('猫', '狗') == 2
+    # 旧版本的记忆没有变过，按需读取的就是当时的记忆
+    assert snapshot.get_memory_items('狗') == ['狗会看家', '狗会握手']
+
+
+def test_old_snapshot_keeps_items_of_nodes_loaded_later():
+    graph, _ = make_lazy_graph()
+    graph.connect_dot('猫', '狗')
+    snapshot = graph.snapshot()
+    graph.connect_dot('猫', '鱼')
+    graph.add_dot('猫', '猫会抓老鼠')
+    graph.remove_dot('狗')
+    graph.publish()
+    assert snapshot.get_memory_items('猫') == ['猫喜欢吃鱼']
+    assert snapshot.memory_count('猫') == 1
+    assert snapshot.get_memory_items('狗') == ['狗会看家', '狗会握手']
+    assert graph.snapshot().get_memory_items('猫') == ['猫喜欢吃鱼', '猫会抓老鼠']
+    assert '狗' not in graph.snapshot()
+
+
+HALF_LIFE = 168 * 3600
+
+
+class RecallCollection:
+    """只支持 recall_ops 用到的 $max upsert 的内存集合"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            key = (op._filter['concept'], op._filter['created'], op._filter['text'])
+            self.docs[key] = max(self.docs.get(key, float('-inf')), op._doc['$max']['accessed'])
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.ops = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+
+def make_worker_and_bot():
+    """维护进程构建的记忆图，以及机器人进程从数据库加载的同一张图"""
+    worker = Memory_graph(half_life=HALF_LIFE)
+    for item in ('今天下雨了', '昨天出太阳了', '明天会降温'):
+        worker.add_dot('天气', item)
+    worker.clear_changes()
+    bot = Memory_graph(half_life=HALF_LIFE)
+    bot.load(
+        {'天气': worker.get_memory_items('天气')},
+        {},
+        {'天气': worker.get_node_time('天气')},
+        {},
+        {'天气': encode_meta(worker.get_item_meta('天气'))},
+    )
+    return worker, bot
+
+
+def test_bot_recalls_are_handed_over_and_cleared():
+    worker, bot = make_worker_and_bot()
+    created = bot.get_item_meta('天气')['created']
+    bot.touch_items('天气', ['今天下雨了'], now=created[0] + 100)
+    bot.touch_items('天气', ['今天下雨了', '明天会降温'], now=created[0] + 200)
+    recalls = RecallCollection()
+    recalls.bulk_write(recall_ops(bot.pop_accessed_updates()))
+    # 交出之后机器人进程不再保留，不会一直累积
+    assert bot.accessed_updates == {}
+    assert bot.pop_accessed_updates() == {}
+    assert len(recalls.docs) == 2
+    # 同一条记忆只保留最晚的回忆时间
+    recalls.bulk_write(recall_ops({('天气', float(created[0]), '今天下雨了'): created[0] + 50}))
+    assert recalls.docs[('天气', float(created[0]), '今天下雨了')] == created[0] + 200
+
+    assert worker.apply_recalls(recalls.docs) == 2
+    assert list(worker.get_item_meta('天气')['accessed']) == [created[0] + 200, created[1], created[0] + 200]
+    # 重复应用或更早的时间不会把最近使用时间往前推
+    assert worker.apply_recalls(recalls.docs) == 0
+    assert worker.apply_recalls({('天气', float(created[0]), '今天下雨了'): 0.0, ('不存在', 0.0, '记忆'): 1.0}) == 0
+
+
+def test_worker_forgets_by_bot_recall_time_and_persists_it():
+    worker, bot = make_worker_and_bot()
+    later = time.time() + 10 * HALF_LIFE
+    # 最早创建的记忆最近被回忆过，应该遗忘的是没有被回忆过的那两条中最早的一条
+    bot.touch_items('天气', ['今天下雨了'], now=later - 3600)
+    recalls = RecallCollection()
+    recalls.bulk_write(recall_ops(bot.pop_accessed_updates()))
+    worker.apply_recalls(recalls.docs)
+
+    forgotten, _ = worker.forget_weakest(20, 0.5, 24 * 3600, now=later)
+    assert [(node, item) for node, item, _ in forgotten] == [('天气', '昨天出太阳了')]
+    assert worker.get_memory_items('天气') == ['今天下雨了', '明天会降温']
+
+    writer = GraphWriter(RecordingCollection(), RecordingCollection(), RecordingCollection(), item_storage=True)
+    writer.write(worker)
+    accessed = [op._doc['$set']['accessed'] for op in writer.items.ops if op._filter.get('text') == '今天下雨了']
+    assert accessed == [later - 3600]